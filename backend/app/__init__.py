@@ -23,6 +23,8 @@ def create_app() -> Flask:
     from .models import Base
     with engine.begin() as conn:
         Base.metadata.create_all(conn)
+    from .db import add_missing_columns_and_indexes
+    add_missing_columns_and_indexes(engine, Base.metadata)
 
     # Register blueprints
     from .api.accounting import accounting_bp
@@ -40,6 +42,7 @@ def create_app() -> Flask:
     from .api.signal_service import signal_bp
     from .api.livekit_service import livekit_bp
     from .api.health import health_bp
+    from .api.usage import usage_bp
 
     app.register_blueprint(health_bp, url_prefix="/api/health")
     app.register_blueprint(accounting_bp, url_prefix="/api/accounting")
@@ -56,6 +59,11 @@ def create_app() -> Flask:
     app.register_blueprint(profile_bp, url_prefix="/api/profile")
     app.register_blueprint(stripe_bp, url_prefix="/api/stripe")
     app.register_blueprint(elster_bp, url_prefix="/api/elster")
+    app.register_blueprint(usage_bp, url_prefix="/api/usage")
+
+    # Build the shared LLM model handles before the first request
+    from .services.model_context_manager import model_manager
+    model_manager.warm_up()
 
     @app.get("/health")
     def health():  # simple health endpoint
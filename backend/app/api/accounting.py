@@ -1,14 +1,14 @@
-import time
 from flask import Blueprint, request, Response, stream_with_context, jsonify, g, current_app
-from .utils import jwt_required, get_thread_for_module, save_message
-from ..models import ModuleEnum
-from ..services.accounting_service import get_accounting_response
+from .utils import jwt_required, usage_quota_required, get_thread_for_module, save_message
+from ..models import ModuleEnum, ConversationThread
+from ..services.accounting_service import stream_accounting_response
 
 accounting_bp = Blueprint("accounting", __name__)
 
 
 @accounting_bp.post("/chat")
 @jwt_required
+@usage_quota_required
 def chat_stream():
     """Streaming endpoint for Accounting module.
     Accepts JSON { "message": "..." } and streams back response from accounting model.
@@ -21,46 +21,34 @@ def chat_stream():
 
     # Store user message in database
     Session = getattr(current_app, "session_factory")
+    user_id = g.user_id
     with Session() as session:
         # Get or create conversation thread for this user and module
-        thread = get_thread_for_module(session, g.user_id, ModuleEnum.accounting)
+        thread = get_thread_for_module(session, user_id, ModuleEnum.accounting)
+        thread_id = thread.id
         
         # Save user message
-        save_message(session, thread.id, "user", message)
-        
-        try:
-            # Получаем ответ от бухгалтерского сервиса
-            response = get_accounting_response(
-                message=message,
-                user_id=g.user_id,
-                conversation_id=str(thread.id)
-            )
-            
-            reply_text = response["text"]
-            
-            # Извлекаем метаданные для сохранения
-            metadata = {
-                "model": response.get("model", "unknown")
-            }
-            
-            # Сохраняем ответ AI в базу
-            save_message(session, thread.id, "ai", reply_text, metadata=metadata)
-            
-            # Update thread's last activity time
-            thread.updated_at = __import__("datetime").datetime.utcnow()
-            session.commit()
-        
-        except Exception as e:
-            current_app.logger.error(f"Error getting accounting response: {e}")
-            reply_text = "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже."
-            save_message(session, thread.id, "ai", reply_text, metadata={"error": str(e)})
-            thread.updated_at = __import__("datetime").datetime.utcnow()
-            session.commit()
+        save_message(session, thread_id, "user", message)
+        session.commit()
 
     def generate():
-        # Stream word by word to simulate token streaming
-        for word in reply_text.split():
-            yield word + " "
-            time.sleep(0.02)  # Чуть быстрее
+        parts = []
+        try:
+            # Фрагменты ответа контейнера отдаются клиенту сразу по мере генерации
+            for chunk in stream_accounting_response(message, user_id=user_id, conversation_id=str(thread_id)):
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Сохраняем ответ AI после завершения стрима (в том числе частичный при обрыве)
+            if parts:
+                with Session() as session:
+                    save_message(session, thread_id, "ai", "".join(parts))
+                    thread = session.get(ConversationThread, thread_id)
+                    thread.updated_at = __import__("datetime").datetime.utcnow()
+                    session.commit()
 
-    return Response(stream_with_context(generate()), mimetype="text/plain")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/plain",
+        headers={"X-Accel-Buffering": "no"}  # disable nginx buffering so chunks arrive immediately
+    )
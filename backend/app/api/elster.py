@@ -1,11 +1,17 @@
 """API endpoints for ELSTER integration."""
 import os
+import logging
 from datetime import datetime
 from flask import Blueprint, request, jsonify, g, current_app
-from ..models import UserElsterAccount, Submission, SubmissionFrequency, Transaction
+from ..models import UserElsterAccount, Submission, SubmissionFrequency, SubmissionJob, SubmissionStatus
 from ..services.elster_service import ElsterService
+from ..services.elster_jobs import enqueue_submission, job_status
+from ..services.vat_totals import (aggregate_vat_totals, count_submission_transactions,
+                                   link_submission_transactions, submission_transaction_ids)
 from .utils import jwt_required
 
+logger = logging.getLogger(__name__)
+
 # Initialize the ELSTER service on module load
 ElsterService.initialize()
 
@@ -87,17 +93,17 @@ def get_submissions():
             Submission.timestamp.desc()
         ).all()
         
+        # Counted in the database; the IDs are paged through /submissions/<id>/transactions
+        counts = count_submission_transactions(session, [sub.id for sub in submissions])
+        
         result = []
         for sub in submissions:
-            # Get transaction IDs included in this submission
-            transaction_ids = [tx.id for tx in sub.transactions]
-            
             result.append({
                 "id": sub.id,
                 "timestamp": sub.timestamp.isoformat(),
                 "period": sub.period,
-                "status": sub.status.value,
-                "transactionIds": transaction_ids
+                "status": sub.status,
+                "transactionCount": counts.get(sub.id, 0)
             })
         
         return jsonify(result)
@@ -116,31 +122,60 @@ def get_submission(submission_id):
         if not sub:
             return jsonify({"error": "Submission not found"}), 404
         
-        # Get transaction IDs included in this submission
-        transaction_ids = [tx.id for tx in sub.transactions]
-        
         return jsonify({
             "id": sub.id,
             "timestamp": sub.timestamp.isoformat(),
             "period": sub.period,
-            "status": sub.status.value,
-            "transactionIds": transaction_ids
+            "status": sub.status,
+            "transactionCount": count_submission_transactions(session, [sub.id]).get(sub.id, 0)
+        })
+
+
+@elster_bp.get("/submissions/<submission_id>/transactions")
+@jwt_required
+def get_submission_transactions(submission_id):
+    """Get one page of the transaction IDs included in a submission."""
+    limit = min(request.args.get("limit", 500, type=int), 1000)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    Session = getattr(current_app, "session_factory")
+    with Session() as session:
+        sub = session.query(Submission).filter_by(
+            id=submission_id, user_id=g.user_id
+        ).first()
+        
+        if not sub:
+            return jsonify({"error": "Submission not found"}), 404
+        
+        return jsonify({
+            "transactionIds": submission_transaction_ids(session, sub.id, offset=offset, limit=limit),
+            "transactionCount": count_submission_transactions(session, [sub.id]).get(sub.id, 0),
+            "offset": offset,
+            "limit": limit
         })
 
 
 @elster_bp.post("/submit")
 @jwt_required
 def submit_declaration():
-    """Submit a tax declaration for a period."""
+    """Submit a tax declaration for a period.
+    
+    Without transaction_ids, every transaction of the user dated within the
+    period ('Q2 2024', '07 2024') is declared. With transaction_ids, exactly
+    those transactions are declared.
+    """
     data = request.get_json(silent=True) or {}
     period = data.get("period", "").strip()
-    transaction_ids = data.get("transaction_ids", [])
+    transaction_ids = data.get("transaction_ids") or None
     
     if not period:
         return jsonify({"error": "Period is required"}), 400
     
-    if not transaction_ids:
-        return jsonify({"error": "No transactions selected for submission"}), 400
+    try:
+        start, end = ElsterService.period_range(period)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Explicit IDs select by ID only; otherwise the period selects by date
+    selection = {"transaction_ids": transaction_ids} if transaction_ids else {"start": start, "end": end}
     
     Session = getattr(current_app, "session_factory")
     with Session() as session:
@@ -150,15 +185,6 @@ def submit_declaration():
         if not account or not account.is_connected:
             return jsonify({"error": "ELSTER account not connected"}), 400
         
-        # Verify transactions belong to the user
-        transactions = session.query(Transaction).filter(
-            Transaction.id.in_(transaction_ids),
-            Transaction.user_id == g.user_id
-        ).all()
-        
-        if len(transactions) != len(transaction_ids):
-            return jsonify({"error": "Some transactions were not found"}), 400
-        
         # Check if a submission for this period already exists
         existing = session.query(Submission).filter_by(
             user_id=g.user_id, period=period
@@ -169,56 +195,63 @@ def submit_declaration():
                 "error": f"A submission for period {period} already exists"
             }), 400
         
-        # Get user's tax ID
-        account = session.query(UserElsterAccount).filter_by(user_id=g.user_id).first()
-        if not account:
-            return jsonify({"error": "ELSTER account not found"}), 404
+        # Totals are summed by the database instead of per transaction in Python;
+        # the count also verifies that the transactions belong to the user
+        totals = aggregate_vat_totals(session, g.user_id, **selection)
+        transaction_count = totals.pop("count")
         
-        # Prepare transaction data for ELSTER service
-        tx_data = []
-        for tx in transactions:
-            tx_data.append({
-                "id": tx.id,
-                "date": tx.date.isoformat(),
-                "amount": float(tx.amount),
-                "tax_amount": float(tx.tax_amount) if tx.tax_amount else None,
-                "is_expense_claimed": tx.is_expense_claimed
-            })
+        if transaction_ids and transaction_count != len(set(transaction_ids)):
+            return jsonify({"error": "Some transactions were not found"}), 400
+        if not transaction_count:
+            return jsonify({"error": f"No transactions found for period {period}"}), 400
         
         try:
-            # Use ELSTER service to prepare and submit the declaration
-            declaration = ElsterService.prepare_vat_declaration(
-                transactions=tx_data, 
-                tax_id=account.tax_id,
-                period=period
-            )
-            
-            result = ElsterService.submit_declaration(declaration)
-            
-            # Create a new submission record
+            # Create a new submission record; the ERiC pipeline runs in the
+            # ELSTER workers (elster_worker.py), which also poll its status
             submission = Submission(
                 user_id=g.user_id,
                 timestamp=datetime.utcnow(),
                 period=period,
-                transactions=transactions,
-                status=SubmissionStatus.processing  # Start with processing status
+                status=SubmissionStatus.submitted.value
             )
             
             session.add(submission)
+            session.flush()
+            link_submission_transactions(session, submission.id, g.user_id, **selection)
+            job = enqueue_submission(session, submission, account.tax_id, totals)
             session.commit()
             
-            return jsonify({
+            response = {
                 "id": submission.id,
+                "jobId": job.id,
                 "timestamp": submission.timestamp.isoformat(),
                 "period": submission.period,
-                "status": submission.status.value,
-                "transactionIds": transaction_ids
-            })
+                "status": submission.status,
+                "transactionCount": transaction_count
+            }
+            if transaction_ids:
+                response["transactionIds"] = transaction_ids
+            return jsonify(response), 202
         except Exception as e:
             logger.error(f"Error submitting declaration: {str(e)}")
             return jsonify({"error": str(e)}), 500
 
 
+@elster_bp.get("/jobs/<job_id>")
+@jwt_required
+def get_submission_job(job_id):
+    """Get the state of a background submission job."""
+    Session = getattr(current_app, "session_factory")
+    with Session() as session:
+        job = session.query(SubmissionJob).filter_by(id=job_id, user_id=g.user_id).first()
+        
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        submission = session.get(Submission, job.submission_id)
+        return jsonify(job_status(job, submission.status if submission else None))
+
+
 @elster_bp.get("/frequency")
 @jwt_required
 def get_frequency():
@@ -3,6 +3,8 @@ import requests
 import logging
 from ..models import ModuleEnum
 from ..services.model_service import openai_client
+from ..services.vat_cache import get_vat_cache
+from ..services.response_cache import get_response_cache
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -24,6 +26,46 @@ def health_check():
     }
     return jsonify(response)
 
+@health_bp.get("/caches")
+def cache_stats():
+    """Счётчики попаданий в кэши (для мониторинга hit ratio)."""
+    return jsonify({
+        "vies": get_vat_cache().stats(),
+        "responses": get_response_cache().stats()
+    })
+
+@health_bp.get("/vies")
+def vies_status():
+    """Состояние circuit breaker'ов VIES по странам (open — страна временно не опрашивается)."""
+    from ..services.vies_async import get_vies_client
+    return jsonify({
+        "breakers": get_vies_client().breaker_states()
+    })
+
+@health_bp.get("/models")
+def model_stats():
+    """Число экземпляров моделей и суммарное время их создания и генерации по моделям."""
+    from ..services.model_registry import get_model_registry
+    return jsonify(get_model_registry().stats())
+
+@health_bp.get("/gateway")
+def gateway_stats():
+    """Счётчики и гистограммы задержек запросов к контейнерам моделей по модулям."""
+    from ..services.model_gateway import get_model_gateway
+    return jsonify(get_model_gateway().stats())
+
+@health_bp.get("/providers")
+def provider_stats():
+    """Задержки p50/p95, доля ошибок и исправность провайдеров LLM по моделям."""
+    from ..services.provider_router import get_provider_router
+    return jsonify(get_provider_router().stats())
+
+@health_bp.get("/usage")
+def usage_ledger_stats():
+    """Счётчики журнала расхода LLM: записано, в очереди, потеряно."""
+    from ..services.usage_ledger import get_usage_ledger
+    return jsonify(get_usage_ledger().stats())
+
 def check_module_health(url):
     """Проверяет доступность модуля по URL."""
     try:
@@ -1,11 +1,10 @@
-import time
 import json
 import uuid
 from flask import Blueprint, request, Response, stream_with_context, jsonify, g, current_app
-from .utils import jwt_required, get_thread_for_module, save_message
+from .utils import jwt_required, usage_quota_required, get_thread_for_module, save_message
 from ..models import ModuleEnum
 from ..services.marketing_service import get_marketing_response, generate_marketing_content
-from ..services.model_context_manager import generate_module_response
+from ..services.model_context_manager import stream_module_response
 from ..services.module_data_access import get_data_access_for_module, MarketingDataAccess
 
 marketing_bp = Blueprint("marketing", __name__)
@@ -18,6 +17,7 @@ posts_db = {}     # user_id -> list of posts
 
 @marketing_bp.post("/chat")
 @jwt_required
+@usage_quota_required
 def chat_stream():
     data = request.get_json(silent=True) or {}
     message = (data.get("message") or "").strip()
@@ -28,9 +28,10 @@ def chat_stream():
 
     # Store user message in database
     Session = getattr(current_app, "session_factory")
+    user_id = g.user_id
     with Session() as session:
         # Используем специфичный класс доступа к данным для маркетингового модуля
-        data_access = get_data_access_for_module(session, g.user_id, ModuleEnum.marketing)
+        data_access = get_data_access_for_module(session, user_id, ModuleEnum.marketing)
         
         # Сохраняем сообщение пользователя
         data_access.save_message("user", message)
@@ -38,28 +39,39 @@ def chat_stream():
         # Получаем поток для модуля
         thread = data_access.get_module_thread()
         
-        # Generate response using the enhanced model context manager
-        reply_text = generate_module_response(
+        # Контекст загружается сейчас, сами фрагменты ответа приходят уже во время стриминга
+        chunks = stream_module_response(
             ModuleEnum.marketing,
             message,
             thread_id=thread.id,
             session=session,
             model_type=model_type
         )
-        
-        # Сохраняем ответ AI
-        data_access.save_message("ai", reply_text)
-        
-        # Update thread's last activity time
-        thread.updated_at = __import__("datetime").datetime.utcnow()
+        # Persist token counts the context builder filled in for older messages
         session.commit()
 
     def generate():
-        for token in reply_text.split():
-            yield token + " "
-            time.sleep(0.05)
+        parts = []
+        try:
+            # Отдаем фрагменты клиенту сразу по мере поступления от модели
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Сохраняем ответ AI после завершения стрима (в том числе частичный при обрыве)
+            if parts:
+                with Session() as session:
+                    data_access = get_data_access_for_module(session, user_id, ModuleEnum.marketing)
+                    data_access.save_message("ai", "".join(parts))
+                    thread = data_access.get_module_thread()
+                    thread.updated_at = __import__("datetime").datetime.utcnow()
+                    session.commit()
 
-    return Response(stream_with_context(generate()), mimetype="text/plain")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/plain",
+        headers={"X-Accel-Buffering": "no"}  # disable nginx buffering so chunks arrive immediately
+    )
 
 
 @marketing_bp.route("/channels", methods=["GET", "POST", "DELETE"])
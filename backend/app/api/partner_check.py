@@ -1,18 +1,23 @@
-import time
 import json
-import re
 from flask import Blueprint, request, Response, stream_with_context, jsonify, g, current_app
-from .utils import jwt_required, get_thread_for_module, save_message
-from ..models import ModuleEnum
+from .utils import jwt_required, usage_quota_required, get_thread_for_module, save_message
+from ..models import ModuleEnum, ConversationThread
 from ..services.counterparty_check import CounterpartyCheckService
+from ..services.bulk_partner_check import BulkUploadError, detect_format, parse_rows, screen_rows
 from ..services.partner_check_service import get_partner_check_response
+from ..services.entity_extractor import extract_entities
+from ..services.module_data_access import PartnerCheckDataAccess
 from ..prompts import PARTNER_CHECK_SYSTEM_PROMPT
 
 partner_check_bp = Blueprint("partner_check", __name__)
 
+# Separator between the replies for several counterparties in one chat answer
+REPLY_SEPARATOR = "\n\n---\n\n"
+
 
 @partner_check_bp.post("/chat")
 @jwt_required
+@usage_quota_required
 def chat_stream():
 	data = request.get_json(silent=True) or {}
 	message = (data.get("message") or "").strip()
@@ -21,43 +26,45 @@ def chat_stream():
 
 	# Store user message in database
 	Session = getattr(current_app, "session_factory")
+	user_id = g.user_id
 	with Session() as session:
 		# Get or create conversation thread for this user and module
-		thread = get_thread_for_module(session, g.user_id, ModuleEnum.partner_check)
+		thread = get_thread_for_module(session, user_id, ModuleEnum.partner_check)
+		thread_id = thread.id
 		
 		# Save user message
-		save_message(session, thread.id, "user", message)
-		
-		# Process the message to determine if it's a check request
-		check_result = None
-		company_name, vat_id = extract_company_info(message)
-		
-		if company_name or vat_id:
-			# Perform actual counterparty check
-			check_result = CounterpartyCheckService.check_counterparty(
-				name=company_name or "Unknown",
-				vat_id=vat_id
-			)
+		save_message(session, thread_id, "user", message)
+		session.commit()
+	
+	def generate():
+		# Extract the counterparties mentioned in the message and send each reply as
+		# soon as its check finishes instead of waiting for all of them
+		replies = []
+		for entity in extract_entities(message):
+			reply = format_entity_reply(entity, message, user_id)
+			yield (REPLY_SEPARATOR if replies else "") + reply
+			replies.append(reply)
 		
-		# Format a response based on check results or use a general response
-		if check_result:
-			reply_text = format_check_result(check_result, message)
+		if replies:
+			reply_text = REPLY_SEPARATOR.join(replies)
 		else:
 			reply_text = f"Ich habe keine Firmennamen oder USt-IdNr. in Ihrer Anfrage erkannt. Bitte geben Sie den Namen oder die USt-IdNr. des Unternehmens an, das Sie überprüfen möchten."
+			yield reply_text
 		
-		# Save AI response
-		save_message(session, thread.id, "ai", reply_text)
-		
-		# Update thread's last activity time
-		thread.updated_at = __import__("datetime").datetime.utcnow()
-		session.commit()
-
-	def generate():
-		for token in reply_text.split():
-			yield token + " "
-			time.sleep(0.03)  # Slightly faster than before
-
-	return Response(stream_with_context(generate()), mimetype="text/plain")
+		# Save AI response once the stream is complete
+		with Session() as session:
+			save_message(session, thread_id, "ai", reply_text)
+			
+			# Update thread's last activity time
+			thread = session.get(ConversationThread, thread_id)
+			thread.updated_at = __import__("datetime").datetime.utcnow()
+			session.commit()
+	
+	return Response(
+		stream_with_context(generate()),
+		mimetype="text/plain",
+		headers={"X-Accel-Buffering": "no"}  # disable nginx buffering so replies arrive immediately
+	)
 
 
 @partner_check_bp.post("/check")
@@ -72,57 +79,132 @@ def check_counterparty():
 		return jsonify({"error": "Either name or vat_id must be provided"}), 400
 	
 	# Get the user's profile information to include in the check
-	checker_profile = None
-	Session = getattr(current_app, "session_factory")
-	with Session() as session:
-		from ..models import UserProfile
-		profile = session.query(UserProfile).filter_by(user_id=g.user_id).first()
-		if profile:
-			checker_profile = {
-				"company_name": profile.company_name,
-				"vat_id": profile.vat_id,
-				"country": profile.country,
-				"address": profile.address
-			}
+	checker_profile = get_checker_profile(g.user_id)
 	
-	# Perform comprehensive counterparty check
+	# Perform comprehensive counterparty check, reusing a recent stored result
+	# unless the client asks for a fresh one
 	result = CounterpartyCheckService.check_counterparty(
 		name=name or "Unknown",
 		vat_id=vat_id if vat_id else None,
-		checker_profile=checker_profile
+		checker_profile=checker_profile,
+		user_id=g.user_id,
+		max_age=0 if data.get("refresh") else None
 	)
 	
 	return jsonify(result)
 
 
-def extract_company_info(message: str):
-	"""Extract company name and VAT ID from message"""
-	# Look for VAT ID pattern (e.g., DE123456789, GB123456789)
-	vat_pattern = r'\b([A-Z]{2}[0-9A-Z]{7,12})\b'
-	vat_match = re.search(vat_pattern, message, re.IGNORECASE)
-	vat_id = vat_match.group(1).upper() if vat_match else None
-	
-	# Try to extract company name - this is much more challenging and would need NLP
-	# Simple heuristic: look for capitalized phrases that could be company names
-	company_patterns = [
-		r'(?:Firma|Unternehmen|company)[\s:]+([A-Z][A-Za-z0-9\s&\.]{2,50}(?:GmbH|AG|Ltd|Inc|KG|OHG|UG)?)',
-		r'\b([A-Z][A-Za-z0-9\s&\.]{2,20}\s(?:GmbH|AG|Ltd|Inc|KG|OHG|UG))\b'
-	]
-	
-	company_name = None
-	for pattern in company_patterns:
-		company_match = re.search(pattern, message)
-		if company_match:
-			company_name = company_match.group(1).strip()
-			break
-	
-	# If no structured pattern found, use simple heuristics on the whole message
-	if not company_name and not vat_id:
-		# Check if the message is short and could be just a company name
-		if len(message.split()) <= 5 and any(x.isupper() for x in message[:1]):
-			company_name = message.strip()
-	
-	return company_name, vat_id
+@partner_check_bp.get("/partners")
+@jwt_required
+def list_partners():
+	"""The user's checked counterparties with their latest status"""
+	limit = min(request.args.get("limit", 100, type=int), 500)
+	offset = max(request.args.get("offset", 0, type=int), 0)
+	Session = getattr(current_app, "session_factory")
+	with Session() as session:
+		partners = PartnerCheckDataAccess(session, g.user_id).get_partners(limit=limit, offset=offset)
+		return jsonify({"partners": [
+			{
+				"id": partner.id,
+				"name": partner.name,
+				"vat_id": partner.vat_id or None,
+				"country_code": partner.country_code,
+				"last_status": partner.last_status,
+				"is_sanctioned": partner.is_sanctioned,
+				"last_checked_at": partner.last_checked_at.isoformat() if partner.last_checked_at else None
+			}
+			for partner in partners
+		]})
+
+
+@partner_check_bp.get("/partners/<partner_id>/checks")
+@jwt_required
+def list_partner_checks(partner_id):
+	"""Stored check results for one of the user's counterparties"""
+	limit = min(request.args.get("limit", 10, type=int), 100)
+	Session = getattr(current_app, "session_factory")
+	with Session() as session:
+		checks = PartnerCheckDataAccess(session, g.user_id).get_partner_checks(partner_id=partner_id, limit=limit)
+		return jsonify({"checks": [
+			{
+				"id": check.id,
+				"overall_status": check.overall_status,
+				"checked_at": check.checked_at.isoformat(),
+				"result": json.loads(check.result)
+			}
+			for check in checks
+		]})
+
+
+@partner_check_bp.post("/check/bulk")
+@jwt_required
+def check_counterparties_bulk():
+	"""Bulk counterparty screening.
+	Accepts a CSV or JSONL upload (multipart field "file" or raw request body) with
+	name / vat_id / country_code columns and streams one NDJSON line per row as each
+	check finishes, followed by a summary line.
+	"""
+	upload = request.files.get("file")
+	if upload:
+		stream, filename, content_type = upload.stream, upload.filename, upload.mimetype
+	elif request.content_length:
+		stream, filename, content_type = request.stream, None, request.mimetype
+	else:
+		return jsonify({"error": "CSV or JSONL upload required"}), 400
+	
+	try:
+		fmt = request.args.get("format") or detect_format(filename, content_type)
+		rows = parse_rows(stream, fmt)
+	except BulkUploadError as e:
+		return jsonify({"error": str(e)}), 400
+	
+	checker_profile = get_checker_profile(g.user_id)
+	user_id = g.user_id
+	
+	def generate():
+		for item in screen_rows(rows, checker_profile=checker_profile, user_id=user_id):
+			yield json.dumps(item, default=str) + "\n"
+	
+	return Response(
+		stream_with_context(generate()),
+		mimetype="application/x-ndjson",
+		headers={"X-Accel-Buffering": "no"}  # disable nginx buffering so lines arrive immediately
+	)
+
+
+def get_checker_profile(user_id):
+	"""Load the requesting user's company profile for inclusion in checks"""
+	Session = getattr(current_app, "session_factory")
+	with Session() as session:
+		from ..models import UserProfile
+		profile = session.query(UserProfile).filter_by(user_id=user_id).first()
+		if not profile:
+			return None
+		return {
+			"company_name": profile.company_name,
+			"vat_id": profile.vat_id,
+			"country": profile.country,
+			"address": profile.address
+		}
+
+
+def format_entity_reply(entity, original_query, user_id):
+	"""Check one counterparty extracted from a chat message and format the reply for it"""
+	vat_id = entity["vat_id"]
+	note = ""
+	# VAT IDs failing the offline checksum are rejected without calling any provider
+	if vat_id and not entity["vat_valid"]:
+		note = f"⚠️ Die USt-IdNr. **{vat_id}** ist ungültig ({entity['vat_error']}) und wurde nicht abgefragt.\n\n"
+		if not entity["name"]:
+			return note + "Bitte überprüfen Sie die Nummer auf Tippfehler."
+		vat_id = None
+	
+	check_result = CounterpartyCheckService.check_counterparty(
+		name=entity["name"] or "Unknown",
+		vat_id=vat_id,
+		user_id=user_id
+	)
+	return note + format_check_result(check_result, original_query)
 
 
 def format_check_result(check_result, original_query):
@@ -1,8 +1,9 @@
-import time
+import json
 from flask import Blueprint, request, Response, stream_with_context, jsonify, g, current_app
-from .utils import jwt_required, get_thread_for_module, save_message
-from ..models import ModuleEnum
-from ..services.secretary_service import get_secretary_response
+from .utils import jwt_required, usage_quota_required, get_thread_for_module, save_message, \
+    update_message_metadata
+from ..models import ModuleEnum, ConversationThread
+from ..services.secretary_service import get_secretary_response, iter_hybrid_response
 from .calendar import calendar_blueprint
 
 secretary_bp = Blueprint("secretary", __name__)
@@ -13,57 +14,78 @@ secretary_bp.register_blueprint(calendar_blueprint, url_prefix='/calendar')
 
 @secretary_bp.post("/chat")
 @jwt_required
+@usage_quota_required
 def chat_stream():
+    """
+    Ответ секретаря. По умолчанию поток text/plain только с текстом ответа.
+    С заголовком Accept: application/x-ndjson отдаются события по строкам:
+    {"type": "text", ...}, затем {"type": "calendar", "data": ...}, если
+    календарные данные пришли позже текста, и в конце {"type": "done"}.
+    """
     data = request.get_json(silent=True) or {}
     message = (data.get("message") or "").strip()
     mode = data.get("mode", "hybrid")  # hybrid, openai, gemini, container
+    events_requested = request.accept_mimetypes.best == "application/x-ndjson"
     
     if not message:
         return jsonify({"error": "message field required"}), 400
 
     # Store user message in database
     Session = getattr(current_app, "session_factory")
+    user_id = g.user_id
     with Session() as session:
         # Get or create conversation thread for this user and module
-        thread = get_thread_for_module(session, g.user_id, ModuleEnum.secretary)
+        thread = get_thread_for_module(session, user_id, ModuleEnum.secretary)
+        thread_id = thread.id
         
         # Save user message
-        save_message(session, thread.id, "user", message)
-        
-        try:
-            # Получаем ответ от сервиса
-            response = get_secretary_response(
+        save_message(session, thread_id, "user", message)
+        session.commit()
+
+    def events():
+        # В гибридном режиме текст отдается сразу, календарные данные — отдельным событием
+        if mode == "hybrid":
+            yield from iter_hybrid_response(message)
+        else:
+            yield "text", get_secretary_response(
                 message=message,
-                user_id=g.user_id,
-                conversation_id=str(thread.id),
+                user_id=user_id,
+                conversation_id=str(thread_id),
                 mode=mode
             )
-            
-            reply_text = response["text"]
-            
-            # Извлекаем метаданные для сохранения
-            metadata = {
-                "model": response.get("model", "unknown"),
-                "calendar_data": response.get("metadata", {}).get("calendar_data")
-            }
-            
-            # Сохраняем ответ AI в базу
-            save_message(session, thread.id, "ai", reply_text, metadata=metadata)
-            
-            # Update thread's last activity time
-            thread.updated_at = __import__("datetime").datetime.utcnow()
-            session.commit()
-        
-        except Exception as e:
-            current_app.logger.error(f"Error getting secretary response: {e}")
-            reply_text = "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже."
-            save_message(session, thread.id, "ai", reply_text, metadata={"error": str(e)})
-            thread.updated_at = __import__("datetime").datetime.utcnow()
-            session.commit()
 
     def generate():
-        for token in reply_text.split():
-            yield token + " "
-            time.sleep(0.02)  # Немного ускоряем поток токенов
+        message_id = None
+        for event, payload in events():
+            if event == "text":
+                # Сохраняем ответ AI в базу сразу, не дожидаясь календарных данных
+                with Session() as session:
+                    ai_message = save_message(session, thread_id, "ai", payload["text"], metadata={
+                        "model": payload.get("model", "unknown"),
+                        "calendar_data": payload.get("metadata", {}).get("calendar_data")
+                    })
+                    message_id = ai_message.id
+                    thread = session.get(ConversationThread, thread_id)
+                    thread.updated_at = __import__("datetime").datetime.utcnow()
+                    session.commit()
+                if events_requested:
+                    yield json.dumps({"type": "text", "text": payload["text"], "model": payload.get("model"),
+                                      "metadata": payload.get("metadata", {})}, default=str) + "\n"
+                else:
+                    yield payload["text"]
+            elif event == "calendar":
+                # Календарные данные пришли позже текста — дописываем их в уже сохраненное сообщение
+                if payload is not None and message_id is not None:
+                    with Session() as session:
+                        update_message_metadata(session, message_id, calendar_data=payload)
+                        session.commit()
+                if events_requested:
+                    yield json.dumps({"type": "calendar", "data": payload}, default=str) + "\n"
+        if events_requested:
+            yield json.dumps({"type": "done"}) + "\n"
 
-    return Response(stream_with_context(generate()), mimetype="text/plain")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson" if events_requested else "text/plain",
+        headers={"X-Accel-Buffering": "no"}  # disable nginx buffering so events arrive immediately
+    )
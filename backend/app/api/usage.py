@@ -0,0 +1,82 @@
+"""LLM usage API endpoints (capacity planning and quotas)."""
+from datetime import datetime
+from flask import Blueprint, jsonify, g, current_app, request
+from sqlalchemy import select
+from .utils import jwt_required, admin_required
+from ..models import UsageQuota, User
+from ..services.usage_ledger import get_usage_ledger, month_start, GROUP_BY
+
+usage_bp = Blueprint("usage", __name__)
+
+
+def _parse_date(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+@usage_bp.get("/me")
+@jwt_required
+def my_usage():
+    """Token usage of the current user this month, per module, with their quota."""
+    ledger = get_usage_ledger()
+    Session = getattr(current_app, "session_factory")
+    with Session() as session:
+        modules = ledger.aggregate(session, "module", since=month_start(), user_id=g.user_id)
+    return jsonify({
+        "month": month_start().strftime("%Y-%m"),
+        "quota": ledger.check_quota(g.user_id),
+        "modules": modules,
+    })
+
+
+@usage_bp.get("/summary")
+@admin_required
+def usage_summary():
+    """Calls, tokens, latency and cache hits grouped by module, provider, model, user, source or day.
+
+    Query parameters: group_by (default module), since / until (ISO dates, default
+    the last 30 days), user_id.
+    """
+    group_by = request.args.get("group_by", "module")
+    if group_by not in GROUP_BY:
+        return jsonify({"error": {"code": 400, "message": f"group_by must be one of {', '.join(GROUP_BY)}"}}), 400
+    try:
+        since, until = _parse_date("since"), _parse_date("until")
+    except ValueError:
+        return jsonify({"error": {"code": 400, "message": "since and until must be ISO dates"}}), 400
+
+    Session = getattr(current_app, "session_factory")
+    with Session() as session:
+        rows = get_usage_ledger().aggregate(session, group_by, since=since, until=until,
+                                            user_id=request.args.get("user_id"))
+    return jsonify({"group_by": group_by, "rows": rows, "ledger": get_usage_ledger().stats()})
+
+
+@usage_bp.put("/quotas/<user_id>")
+@admin_required
+def set_quota(user_id):
+    """Set a user's monthly token limit; null removes the override (default limit applies)."""
+    data = request.get_json(silent=True) or {}
+    monthly_tokens = data.get("monthly_tokens")
+    if monthly_tokens is not None and (not isinstance(monthly_tokens, int) or monthly_tokens < 0):
+        return jsonify({"error": {"code": 400, "message": "monthly_tokens must be a non-negative integer or null"}}), 400
+
+    Session = getattr(current_app, "session_factory")
+    with Session() as session:
+        if session.get(User, user_id) is None:
+            return jsonify({"error": {"code": 404, "message": "User not found"}}), 404
+        quota = session.scalar(select(UsageQuota).where(UsageQuota.user_id == user_id))
+        if monthly_tokens is None:
+            if quota is not None:
+                session.delete(quota)
+        elif quota is None:
+            session.add(UsageQuota(user_id=user_id, monthly_tokens=monthly_tokens))
+        else:
+            quota.monthly_tokens = monthly_tokens
+            quota.updated_at = datetime.utcnow()
+        session.commit()
+
+    get_usage_ledger().forget_quota(user_id)
+    return jsonify({"user_id": user_id, "monthly_tokens": monthly_tokens})
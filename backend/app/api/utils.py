@@ -1,9 +1,11 @@
 """API authentication helpers."""
+import json
 from functools import wraps
 from flask import request, jsonify, g, current_app
 from ..security import decode_token
 from sqlalchemy import select
 from ..models import User
+from ..services.context_builder import estimate_tokens
 
 
 def jwt_required(f):
@@ -46,6 +48,23 @@ def admin_required(f):
     return decorated_function
 
 
+def usage_quota_required(f):
+    """Decorator rejecting LLM requests of users over their monthly token quota (apply below jwt_required)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from ..services.usage_ledger import get_usage_ledger
+        try:
+            quota = get_usage_ledger().check_quota(g.user_id)
+        except Exception as e:
+            # The ledger must not take the chat down; fail open
+            current_app.logger.warning(f"Usage quota check failed: {e}")
+            return f(*args, **kwargs)
+        if quota["exceeded"]:
+            return jsonify({"error": {"code": 429, "message": "Monthly token quota exceeded", "quota": quota}}), 429
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 def get_thread_for_module(session, user_id, module):
     """Get or create conversation thread for a user and module."""
     from ..models import ConversationThread
@@ -68,12 +87,26 @@ def get_thread_for_module(session, user_id, module):
     return thread
 
 
-def save_message(session, thread_id, role, content):
-    """Save a message to the database."""
+def save_message(session, thread_id, role, content, metadata=None):
+    """Save a message to the database; metadata (e.g. model, calendar data) is stored as JSON."""
     from ..models import Message
     
-    message = Message(thread_id=thread_id, role=role, content=content)
+    message = Message(thread_id=thread_id, role=role, content=content, token_count=estimate_tokens(content),
+                      meta=json.dumps(metadata, default=str) if metadata else None)
     session.add(message)
     session.flush()  # Get ID without committing
     
     return message
+
+
+def update_message_metadata(session, message_id, **fields):
+    """Merge fields into a saved message's JSON metadata (e.g. calendar data that arrived after the text)."""
+    from ..models import Message
+
+    message = session.get(Message, message_id)
+    if message is None:
+        return None
+    metadata = json.loads(message.meta) if message.meta else {}
+    metadata.update(fields)
+    message.meta = json.dumps(metadata, default=str)
+    return message
@@ -1,7 +1,7 @@
 """Database setup (SQLAlchemy 2.0)"""
 from __future__ import annotations
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 def init_engine():
@@ -14,3 +14,33 @@ def init_engine():
 
 def create_session_factory(engine):
     return sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+
+# Shared session factory for services that run outside a Flask request
+# (worker threads, background jobs), created on first use
+_session_factory = None
+
+def get_session_factory():
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = create_session_factory(init_engine())
+    return _session_factory
+
+
+def add_missing_columns_and_indexes(engine, metadata):
+    """Add nullable columns and indexes that were added to models after their tables
+    were created (create_all only creates missing tables). Stopgap until Alembic."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
@@ -1,9 +1,9 @@
 """ORM models (initial subset). Use Alembic later for migrations."""
 from __future__ import annotations
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, DateTime, ForeignKey, Text, Boolean, Numeric, Table, Column
+from sqlalchemy import String, DateTime, Date, ForeignKey, Text, Boolean, Numeric, Integer, Table, Column, Index
 import uuid
 
 class Base(DeclarativeBase):
@@ -35,7 +35,8 @@ submission_transactions = Table(
     'submission_transactions',
     Base.metadata,
     Column('submission_id', String, ForeignKey('submissions.id')),
-    Column('transaction_id', String, ForeignKey('transactions.id'))
+    Column('transaction_id', String, ForeignKey('transactions.id')),
+    Index("ix_submission_transactions_submission", "submission_id"),
 )
 
 class User(Base):
@@ -66,12 +67,59 @@ class ConversationThread(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_thread_created", "thread_id", "created_at"),
+    )
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
     thread_id: Mapped[str] = mapped_column(ForeignKey("conversation_threads.id", ondelete="CASCADE"))
     role: Mapped[str] = mapped_column(String(16))  # user / ai
     content: Mapped[str] = mapped_column(Text)
+    token_count: Mapped[int | None] = mapped_column(Integer, nullable=True)  # estimated prompt tokens, filled lazily
+    # JSON (model, calendar data, error); "metadata" is reserved on declarative classes
+    meta: Mapped[str | None] = mapped_column("metadata", Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     thread: Mapped[ConversationThread] = relationship(back_populates="messages")  # type: ignore
+
+class ConversationSummary(Base):
+    """Rolling summary of the thread messages that no longer fit into the prompt context."""
+    __tablename__ = "conversation_summaries"
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    thread_id: Mapped[str] = mapped_column(ForeignKey("conversation_threads.id", ondelete="CASCADE"), unique=True)
+    summary: Mapped[str] = mapped_column(Text, default="")
+    token_count: Mapped[int] = mapped_column(Integer, default=0)
+    covered_until: Mapped[datetime] = mapped_column(DateTime)  # created_at of the newest summarized message
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    
+class LlmUsage(Base):
+    """One LLM call or response cache hit, for cost accounting, capacity planning and quotas."""
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_user_created", "user_id", "created_at"),
+        Index("ix_llm_usage_module_created", "module", "created_at"),
+        Index("ix_llm_usage_created", "created_at"),
+    )
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    user_id: Mapped[str | None] = mapped_column(String, nullable=True)  # no FK: the ledger outlives deleted users
+    module: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    source: Mapped[str] = mapped_column(String(32))  # context_manager / model_service / container
+    provider: Mapped[str] = mapped_column(String(32))
+    model: Mapped[str] = mapped_column(String(64))
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    tokens_estimated: Mapped[bool] = mapped_column(Boolean, default=False)  # provider reported no usage
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)
+    cache_hit: Mapped[bool] = mapped_column(Boolean, default=False)
+    ok: Mapped[bool] = mapped_column(Boolean, default=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class UsageQuota(Base):
+    """Monthly token limit of a user, overriding USAGE_MONTHLY_TOKEN_QUOTA."""
+    __tablename__ = "usage_quotas"
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    user_id: Mapped[str] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), unique=True)
+    monthly_tokens: Mapped[int] = mapped_column(Integer)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -123,6 +171,10 @@ class UserElsterAccount(Base):
 class Transaction(Base):
     """Transaction model."""
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Declarations select a user's transactions by period
+        Index("ix_transactions_user_date", "user_id", "date"),
+    )
     
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
@@ -151,3 +203,99 @@ class Submission(Base):
     
     user: Mapped[User] = relationship(back_populates="submissions")  # type: ignore
     transactions: Mapped[list[Transaction]] = relationship(secondary=submission_transactions, back_populates="submissions")  # type: ignore
+
+class SubmissionJob(Base):
+    """Background job that sends a submission to ELSTER and polls its transfer ticket."""
+    __tablename__ = "submission_jobs"
+    __table_args__ = (
+        # Workers claim due jobs by state and run_at
+        Index("ix_submission_jobs_claim", "state", "run_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    submission_id: Mapped[str] = mapped_column(ForeignKey("submissions.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[str] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    state: Mapped[str] = mapped_column(String(16), default="queued")  # queued / sending / polling / done / failed
+    payload: Mapped[str] = mapped_column(Text)  # JSON: tax_id, period, totals
+    transfer_ticket: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class VatValidationCacheEntry(Base):
+    """Cached VIES validation result, shared across worker processes."""
+    __tablename__ = "vat_validation_cache"
+
+    # Normalized country code + number, e.g. 'DE123456789'
+    cache_key: Mapped[str] = mapped_column(String(32), primary_key=True)
+    valid: Mapped[bool] = mapped_column(Boolean, default=False)
+    details: Mapped[str] = mapped_column(Text)  # JSON-encoded validation details
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+class JudicialCase(Base):
+    """Court case imported from bulk court-register exports."""
+    __tablename__ = "judicial_cases"
+    __table_args__ = (
+        Index("ix_judicial_cases_party", "party_name_normalized", "date_filed"),
+        Index("ix_judicial_cases_country_party", "country_code", "party_name_normalized"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    source: Mapped[str] = mapped_column(String(64), index=True)  # export the case was loaded from
+    case_number: Mapped[str] = mapped_column(String(64))
+    court: Mapped[str] = mapped_column(String(255))
+    date_filed: Mapped[date | None] = mapped_column(Date, nullable=True)
+    description: Mapped[str] = mapped_column(Text, default="")
+    status: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    outcome: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    party_name: Mapped[str] = mapped_column(String(255))
+    party_name_normalized: Mapped[str] = mapped_column(String(255))
+    country_code: Mapped[str | None] = mapped_column(String(2), nullable=True)
+    imported_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Partner(Base):
+    """Counterparty checked by a user; keeps the latest check outcome."""
+    __tablename__ = "partners"
+    __table_args__ = (
+        Index("ix_partners_user_name_vat", "user_id", "normalized_name", "vat_id"),
+        Index("ix_partners_user_checked", "user_id", "last_checked_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    user_id: Mapped[str] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    name: Mapped[str] = mapped_column(String(255))
+    normalized_name: Mapped[str] = mapped_column(String(255))
+    vat_id: Mapped[str] = mapped_column(String(32), default="")  # empty when checked by name only
+    country_code: Mapped[str | None] = mapped_column(String(2), nullable=True)
+    last_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    is_sanctioned: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
+    last_checked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    checks: Mapped[list["PartnerCheckResult"]] = relationship(back_populates="partner", cascade="all, delete-orphan")  # type: ignore
+
+class PartnerCheckResult(Base):
+    """Stored result of a single counterparty check."""
+    __tablename__ = "partner_check_results"
+    __table_args__ = (
+        Index("ix_partner_check_results_lookup", "user_id", "normalized_name", "vat_id", "checked_at"),
+        Index("ix_partner_check_results_user_checked", "user_id", "checked_at"),
+        Index("ix_partner_check_results_partner_checked", "partner_id", "checked_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=_uuid)
+    partner_id: Mapped[str] = mapped_column(ForeignKey("partners.id", ondelete="CASCADE"))
+    user_id: Mapped[str] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    normalized_name: Mapped[str] = mapped_column(String(255))
+    vat_id: Mapped[str] = mapped_column(String(32), default="")
+    overall_status: Mapped[str] = mapped_column(String(20))
+    result: Mapped[str] = mapped_column(Text)  # JSON-encoded check result
+    checked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    partner: Mapped[Partner] = relationship(back_populates="checks")  # type: ignore
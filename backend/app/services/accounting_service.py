@@ -6,6 +6,8 @@ from .model_service import ModelService
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ERROR_TEXT = "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже."
+
 def get_accounting_response(message, user_id=None, conversation_id=None):
     """
     Получение ответа от бухгалтерского модуля
@@ -24,7 +26,27 @@ def get_accounting_response(message, user_id=None, conversation_id=None):
     except Exception as e:
         logger.error(f"Error getting accounting response: {e}")
         return {
-            "text": "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже.",
+            "text": ERROR_TEXT,
             "model": "error",
             "error": str(e)
         }
+
+def stream_accounting_response(message, user_id=None, conversation_id=None):
+    """
+    Потоковый ответ бухгалтерского модуля: фрагменты отдаются по мере генерации в контейнере
+    """
+    sent = False
+    try:
+        for chunk in ModelService.stream_container_model(
+            module="accounting",
+            message=message,
+            conversation_id=conversation_id,
+            metadata={"user_id": user_id}
+        ):
+            sent = True
+            yield chunk
+    
+    except Exception as e:
+        logger.error(f"Error streaming accounting response: {e}")
+        # Если часть ответа уже отправлена, сообщение об ошибке дописывается в конец
+        yield "\n\n" + ERROR_TEXT if sent else ERROR_TEXT
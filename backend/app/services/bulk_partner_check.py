@@ -0,0 +1,221 @@
+"""Bulk counterparty screening over a bounded worker pool."""
+import os
+import io
+import csv
+import json
+import time
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from .counterparty_check import CounterpartyCheckService
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_WORKERS = int(os.getenv("PARTNER_CHECK_BULK_WORKERS", "8"))
+BULK_MAX_ROWS = int(os.getenv("PARTNER_CHECK_BULK_MAX_ROWS", "50000"))
+
+# Accepted column names per field (CSV headers / JSONL keys)
+NAME_FIELDS = ("name", "company_name", "company", "firma")
+VAT_FIELDS = ("vat_id", "vat", "ust_id", "ust_idnr", "vat_number")
+COUNTRY_FIELDS = ("country_code", "country", "land")
+
+
+class BulkUploadError(ValueError):
+    """Raised when a bulk upload cannot be parsed"""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Detect the upload format ("csv" or "jsonl") from filename or content type"""
+    filename = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if filename.endswith((".jsonl", ".ndjson", ".json")) or "json" in content_type:
+        return "jsonl"
+    if filename.endswith(".csv") or "csv" in content_type or "text/plain" in content_type:
+        return "csv"
+    raise BulkUploadError("Unsupported upload format, expected CSV or JSONL")
+
+
+def _pick(row: Dict[str, Any], fields: Tuple[str, ...]) -> str:
+    for field in fields:
+        value = row.get(field)
+        if value:
+            return str(value).strip()
+    return ""
+
+
+def parse_rows(stream, fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    Parse an uploaded file into row dicts
+
+    The format and the CSV header are checked right away, so an unusable
+    upload raises before a response is started; the rows themselves are
+    parsed lazily while they are consumed.
+
+    Args:
+        stream: Binary file-like object (e.g. werkzeug FileStorage.stream)
+        fmt: "csv" or "jsonl"
+
+    Returns:
+        Iterator of dicts with "name", "vat_id", "country_code", or a
+        "parse_error" key for unparsable rows
+
+    Raises:
+        BulkUploadError: Unsupported format or CSV without a usable header
+    """
+    if fmt not in ("csv", "jsonl"):
+        raise BulkUploadError(f"Unsupported format: {fmt}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        return _normalize(_iter_jsonl(text))
+
+    # Sniff the delimiter on the header line only (Excel exports often use ";")
+    try:
+        header = text.readline()
+    except UnicodeDecodeError:
+        raise BulkUploadError("CSV upload must be UTF-8 encoded")
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(itertools.chain([header], text), dialect=dialect)
+    fieldnames = [(field or "").strip().lower() for field in reader.fieldnames or []]
+    if not set(fieldnames) & set(NAME_FIELDS + VAT_FIELDS):
+        raise BulkUploadError("CSV header must contain a name or VAT ID column")
+    reader.fieldnames = fieldnames
+    return _normalize(reader)
+
+
+def _normalize(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for record in records:
+        if "parse_error" in record:
+            yield record
+            continue
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        yield {
+            "name": _pick(record, NAME_FIELDS),
+            "vat_id": _pick(record, VAT_FIELDS).replace(" ", "").upper(),
+            "country_code": _pick(record, COUNTRY_FIELDS)[:2].upper(),
+        }
+
+
+def _iter_jsonl(text) -> Iterator[Dict[str, Any]]:
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"parse_error": f"Invalid JSON: {e.msg}"}
+            continue
+        if not isinstance(record, dict):
+            yield {"parse_error": "Expected a JSON object per line"}
+            continue
+        yield record
+
+
+def dedup_key(row: Dict[str, Any]) -> str:
+    """Rows with the same VAT ID, or without VAT ID and the same name, share one check"""
+    if row.get("vat_id"):
+        return "vat:" + row["vat_id"]
+    return "name:" + " ".join(row.get("name", "").casefold().split())
+
+
+def screen_rows(rows: Iterable[Dict[str, Any]],
+                checker_profile: Optional[Dict[str, Any]] = None,
+                user_id: Optional[str] = None,
+                max_workers: int = BULK_MAX_WORKERS,
+                max_rows: int = BULK_MAX_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Screen rows with CounterpartyCheckService, yielding one result per row as checks finish
+
+    Rows are pulled lazily so at most ``max_workers * 2`` checks are in flight and the
+    first results are available before the upload has been fully read. Duplicate names
+    and VAT IDs are checked only once; every row still gets its own result line.
+    A final {"summary": ...} item is yielded after all rows.
+
+    Args:
+        rows: Iterable of row dicts as produced by parse_rows
+        checker_profile: Optional information about the entity performing the check
+        user_id: Optional ID of the checking user; reuses and stores results in the check history
+        max_workers: Size of the worker pool
+        max_rows: Maximum number of rows accepted
+
+    Yields:
+        Dicts with "row", "input" and either "result" or "error"
+    """
+    started = time.monotonic()
+    window = max_workers * 2
+    completed: Dict[str, Dict[str, Any]] = {}
+    waiting: Dict[str, list] = {}
+    futures = {}
+    stats = {"rows": 0, "unique_checks": 0, "duplicates": 0, "errors": 0, "truncated": False}
+
+    def check(row):
+        return CounterpartyCheckService.check_counterparty(
+            name=row["name"] or "Unknown",
+            vat_id=row["vat_id"] or None,
+            country_code=row["country_code"] or None,
+            checker_profile=checker_profile,
+            user_id=user_id
+        )
+
+    def drain(done):
+        for future in done:
+            key = futures.pop(future)
+            try:
+                outcome = {"result": future.result()}
+            except Exception as e:
+                logger.error(f"Bulk counterparty check failed for {key}: {e}")
+                outcome = {"error": f"Check failed: {e}"}
+                stats["errors"] += 1
+            completed[key] = outcome
+            for row_number, row in waiting.pop(key):
+                yield {"row": row_number, "input": row, **outcome}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk-partner-check") as executor:
+        row_number = 0
+        for row in rows:
+            row_number += 1
+            if row_number > max_rows:
+                stats["truncated"] = True
+                break
+            stats["rows"] += 1
+
+            if "parse_error" in row:
+                stats["errors"] += 1
+                yield {"row": row_number, "error": row["parse_error"]}
+                continue
+            if not row["name"] and not row["vat_id"]:
+                stats["errors"] += 1
+                yield {"row": row_number, "input": row, "error": "Either name or vat_id must be provided"}
+                continue
+
+            key = dedup_key(row)
+            if key in completed:
+                stats["duplicates"] += 1
+                yield {"row": row_number, "input": row, **completed[key]}
+                continue
+            if key in waiting:
+                stats["duplicates"] += 1
+                waiting[key].append((row_number, row))
+                continue
+
+            stats["unique_checks"] += 1
+            waiting[key] = [(row_number, row)]
+            futures[executor.submit(check, row)] = key
+
+            # Emit whatever is already done; block only when the window is full
+            done = [f for f in futures if f.done()]
+            if not done and len(futures) >= window:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            yield from drain(done)
+
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            yield from drain(done)
+
+    stats["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    yield {"summary": stats}
@@ -0,0 +1,49 @@
+"""Local classifier for calendar intent in secretary messages.
+
+Calendar extraction is a full model call on the secretary container, so it
+only runs for messages that look like they are about appointments. The
+classifier is a weighted sum of precompiled features for Russian, German
+and English: scheduling vocabulary, dates and times. A score at or above the
+threshold counts as calendar intent. A scheduling word alone is enough; a
+date or a time alone is not, but both together are.
+"""
+import os
+import re
+from typing import List, Tuple
+
+CALENDAR_INTENT_THRESHOLD = float(os.getenv("CALENDAR_INTENT_THRESHOLD", "1.0"))
+
+_SCHEDULING_WORDS = re.compile(
+    r"календар|встреч|событи|созвон|совещани|заплани|перенес|напомн|напомин|запиши|"
+    r"\btermin|kalender|besprechung|meeting|treffen|verabred|einladung|erinner|verschieb|einplan|"
+    r"\bappointment|\bcalendar|\bschedul|\breschedul|\binvite|\bremind|\bcall with\b",
+    re.IGNORECASE,
+)
+_TIME = re.compile(
+    r"\b\d{1,2}[:.]\d{2}\s*(?:uhr|h|am|pm)?\b|\b\d{1,2}\s*(?:uhr|am|pm|h)\b|\bв\s\d{1,2}(?::\d{2})?\b",
+    re.IGNORECASE,
+)
+_DATE = re.compile(
+    r"\b\d{1,2}\.\d{1,2}\.(?:\d{2,4})?|\b\d{4}-\d{2}-\d{2}\b|"
+    r"\b(?:сегодня|завтра|послезавтра|понедельник|вторник|сред[уа]|четверг|пятниц|суббот|воскресень|"
+    r"на следующей неделе|heute|morgen|übermorgen|montag|dienstag|mittwoch|donnerstag|freitag|samstag|"
+    r"sonntag|nächste[nr]? woche|today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|"
+    r"sunday|next week)",
+    re.IGNORECASE,
+)
+
+FEATURES: List[Tuple[float, "re.Pattern[str]"]] = [
+    (1.0, _SCHEDULING_WORDS),
+    (0.6, _TIME),
+    (0.6, _DATE),
+]
+
+
+def calendar_intent_score(message: str) -> float:
+    """Sum of the weights of the features present in the message"""
+    return sum(weight for weight, pattern in FEATURES if pattern.search(message or ""))
+
+
+def has_calendar_intent(message: str, threshold: float = CALENDAR_INTENT_THRESHOLD) -> bool:
+    """True if calendar extraction is worth running for the message"""
+    return calendar_intent_score(message) >= threshold
@@ -0,0 +1,202 @@
+"""Token-budgeted conversation context.
+
+The prompt context of a thread is filled newest-first until a token budget is
+used up. Token counts are estimated once per message and stored on the row.
+Messages that no longer fit are folded into a rolling per-thread summary. The
+summary is extended incrementally in a background thread, so a request never
+waits for it and prompt size stays bounded however long the thread grows.
+"""
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+# Tokens of conversation history (summary included) sent with each prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Single messages longer than this are shortened in the context
+CONTEXT_MESSAGE_MAX_TOKENS = int(os.getenv("CONTEXT_MESSAGE_MAX_TOKENS", "600"))
+# Newest messages inspected per request
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "50"))
+# Messages that must drop out of the context before the summary is extended
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "4"))
+# Tokens of old messages folded into the summary per update
+SUMMARY_INPUT_BUDGET = int(os.getenv("SUMMARY_INPUT_BUDGET", "4000"))
+
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARK = " …[gekürzt]"
+
+# summarize(previous_summary, [{"role", "content"}, ...]) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count (about four characters per token for German/English text)"""
+    return max(1, (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten text to roughly max_tokens, marking the cut"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK))] + TRUNCATION_MARK
+
+
+def message_tokens(message) -> int:
+    """Token count of a Message row, computed once and cached on the row"""
+    if message.token_count is None:
+        message.token_count = estimate_tokens(message.content)
+    return message.token_count
+
+
+class ContextBuilder:
+    """Assembles the prompt context of a thread within a token budget"""
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 message_max_tokens: int = CONTEXT_MESSAGE_MAX_TOKENS,
+                 max_messages: int = CONTEXT_MAX_MESSAGES,
+                 summarizer: Optional[Summarizer] = None,
+                 summary_min_messages: int = SUMMARY_MIN_MESSAGES,
+                 summary_input_budget: int = SUMMARY_INPUT_BUDGET,
+                 session_factory=None, background: bool = True):
+        self.token_budget = token_budget
+        self.message_max_tokens = message_max_tokens
+        self.max_messages = max_messages
+        self.summarizer = summarizer
+        self.summary_min_messages = summary_min_messages
+        self.summary_input_budget = summary_input_budget
+        self.background = background
+        self._session_factory = session_factory
+        self._updating = set()
+        self._lock = threading.Lock()
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from ..db import get_session_factory
+            self._session_factory = get_session_factory()
+        return self._session_factory
+
+    def build(self, session, thread_id: str, token_budget: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Context for the next prompt of a thread
+
+        Args:
+            session: Open database session; commit it afterwards to keep the token
+                counts filled in for older messages
+            thread_id: Conversation thread
+            token_budget: Overrides the configured budget
+
+        Returns:
+            Chronological list of {"role", "content"} dicts; a stored summary of
+            older turns comes first with role "summary"
+        """
+        from ..models import ConversationSummary, Message
+        budget = self.token_budget if token_budget is None else token_budget
+
+        summary = session.scalar(select(ConversationSummary).where(ConversationSummary.thread_id == thread_id))
+        query = select(Message).where(Message.thread_id == thread_id)
+        if summary is not None:
+            query = query.where(Message.created_at > summary.covered_until)
+        messages = session.scalars(
+            query.order_by(Message.created_at.desc()).limit(self.max_messages)
+        ).all()
+
+        summary_text = ""
+        if summary is not None and summary.summary:
+            # The summary never takes more than half of the budget
+            summary_text = truncate_to_tokens(summary.summary, budget // 2)
+        remaining = budget - (estimate_tokens(summary_text) if summary_text else 0)
+        selected = []
+        overflow = []
+        for message in messages:
+            tokens = min(message_tokens(message), self.message_max_tokens)
+            if overflow or tokens > remaining:
+                # Everything older than the first message that does not fit is left out,
+                # so the context never skips a turn in the middle
+                overflow.append(message)
+                continue
+            remaining -= tokens
+            selected.append(message)
+
+        if len(overflow) >= self.summary_min_messages and self.summarizer is not None:
+            self._schedule_summary(thread_id, overflow[0].created_at)
+
+        context = [
+            {"role": message.role, "content": truncate_to_tokens(message.content, self.message_max_tokens)}
+            for message in reversed(selected)
+        ]
+        if summary_text:
+            context.insert(0, {"role": "summary", "content": summary_text})
+        return context
+
+    def _schedule_summary(self, thread_id: str, until: datetime):
+        with self._lock:
+            if thread_id in self._updating:
+                return
+            self._updating.add(thread_id)
+        if not self.background:
+            self._run_summary(thread_id, until)
+            return
+        threading.Thread(target=self._run_summary, args=(thread_id, until), daemon=True,
+                         name=f"summary-{thread_id[:8]}").start()
+
+    def _run_summary(self, thread_id: str, until: datetime):
+        try:
+            self.update_summary(thread_id, until)
+        except Exception as e:
+            logger.warning(f"Updating the summary of thread {thread_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._updating.discard(thread_id)
+
+    def update_summary(self, thread_id: str, until: datetime) -> bool:
+        """
+        Fold the messages up to ``until`` that are not yet summarized into the
+        thread's summary, oldest first and at most ``summary_input_budget`` tokens
+        per call (the rest is folded on a later turn)
+
+        Returns:
+            True if the summary was extended
+        """
+        from ..models import ConversationSummary, Message
+        with self.session_factory() as session:
+            summary = session.scalar(select(ConversationSummary).where(ConversationSummary.thread_id == thread_id))
+            query = select(Message).where(Message.thread_id == thread_id, Message.created_at <= until)
+            if summary is not None:
+                query = query.where(Message.created_at > summary.covered_until)
+            batch = []
+            remaining = self.summary_input_budget
+            for message in session.scalars(query.order_by(Message.created_at).limit(self.max_messages)):
+                # Counts are not written back here: the request that triggered the
+                # update stores them, and updating the rows from two sessions would block
+                tokens = min(message.token_count or estimate_tokens(message.content), self.message_max_tokens)
+                if batch and tokens > remaining:
+                    break
+                remaining -= tokens
+                batch.append(message)
+            if not batch:
+                return False
+
+            previous = summary.summary if summary is not None else ""
+            text = self.summarizer(previous, [
+                {"role": message.role, "content": truncate_to_tokens(message.content, self.message_max_tokens)}
+                for message in batch
+            ]).strip()
+            if not text:
+                return False
+
+            if summary is None:
+                summary = ConversationSummary(thread_id=thread_id, message_count=0)
+                session.add(summary)
+            summary.summary = text
+            summary.token_count = estimate_tokens(text)
+            summary.covered_until = batch[-1].created_at
+            summary.message_count = (summary.message_count or 0) + len(batch)
+            summary.updated_at = datetime.utcnow()
+            session.commit()
+            return True
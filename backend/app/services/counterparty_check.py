@@ -1,101 +1,358 @@
 """Counterparty check service that combines various checks."""
+import os
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 from typing import Dict, Any, List, Tuple, Optional
 from datetime import datetime
 
 from .vat_validation import VatValidationService
 from .sanctions_check import SanctionsCheckService
 from .judicial_check import JudicialCheckService
+from .partner_history import get_partner_history
 
 logger = logging.getLogger(__name__)
 
+# Fan-out configuration
+FANOUT_MAX_WORKERS = int(os.getenv("PARTNER_CHECK_MAX_WORKERS", "16"))
+PROVIDER_DEADLINES = {
+    "vat_validation": float(os.getenv("PARTNER_CHECK_VAT_DEADLINE", "10")),
+    "sanctions_check": float(os.getenv("PARTNER_CHECK_SANCTIONS_DEADLINE", "5")),
+    "judicial_check": float(os.getenv("PARTNER_CHECK_JUDICIAL_DEADLINE", "5")),
+}
+
+# Shared executor for the fan-out mode, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_check_executor() -> ThreadPoolExecutor:
+    """Get or create the shared executor used for provider fan-out"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=FANOUT_MAX_WORKERS,
+                    thread_name_prefix="counterparty-check"
+                )
+    return _executor
+
+
+def _normalize_name(name: Optional[str]) -> str:
+    """Normalize a name for equality comparison (case and whitespace insensitive)"""
+    return " ".join((name or "").casefold().split())
+
+
 class CounterpartyCheckService:
     """Service to perform comprehensive checks on counterparties"""
-    
+
     @classmethod
-    def check_counterparty(cls, 
-                           name: str, 
-                           vat_id: Optional[str] = None, 
+    def check_counterparty(cls,
+                           name: str,
+                           vat_id: Optional[str] = None,
                            country_code: Optional[str] = None,
-                           checker_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                           checker_profile: Optional[Dict[str, Any]] = None,
+                           concurrent: bool = False,
+                           deadlines: Optional[Dict[str, float]] = None,
+                           user_id: Optional[str] = None,
+                           max_age: Optional[float] = None) -> Dict[str, Any]:
         """
         Perform a comprehensive check on a counterparty
-        
+
         Args:
             name: Company or entity name
             vat_id: Optional VAT ID (format: 'CCNNNNNNNNN')
             country_code: Optional country code (e.g. 'DE')
             checker_profile: Optional information about the entity performing the check
-            
+            concurrent: Run the providers concurrently on the shared executor
+                        (see check_counterparty_concurrent)
+            deadlines: Optional per-provider deadlines in seconds (concurrent mode only)
+            user_id: Optional ID of the checking user; enables the check history
+                     (see check_counterparty_with_history)
+            max_age: Maximum age in seconds of a reusable stored result
+                     (defaults to PARTNER_CHECK_REUSE_WINDOW, 0 forces a fresh check)
+
         Returns:
             Dictionary with comprehensive check results
         """
-        results = {
-            "counterparty_name": name,
-            "check_date": datetime.now().isoformat(),
-            "overall_status": "unknown",  # Default status
-            "checks": {},
-            "checker_info": checker_profile or {}
-        }
-        
+        if user_id is not None:
+            return cls.check_counterparty_with_history(
+                user_id, name, vat_id, country_code, checker_profile,
+                concurrent=concurrent, deadlines=deadlines, max_age=max_age
+            )
+        if concurrent:
+            return cls.check_counterparty_concurrent(
+                name, vat_id, country_code, checker_profile, deadlines=deadlines
+            )
+
+        results = cls._init_results(name, checker_profile)
+
         # Extract country_code from VAT ID if not provided
         if not country_code and vat_id and len(vat_id) >= 2:
             country_code = vat_id[:2].upper()
-        
-        # Extract checker profile information
-        requester_vat = None
-        requester_name = None
-        requester_country = None
-        if checker_profile:
-            requester_vat = checker_profile.get("vat_id")
-            requester_name = checker_profile.get("company_name")
-            requester_country = checker_profile.get("country")
-            if requester_country and len(requester_country) >= 2:
-                requester_country = requester_country[:2].upper()
-        
+
+        requester = cls._extract_requester(checker_profile)
+
         # 1. VAT validation check
         if vat_id:
-            is_valid_vat, vat_details = VatValidationService.validate_vat_mock(
-                vat_id, 
-                requester_vat=requester_vat,
-                requester_name=requester_name,
-                requester_country=requester_country
-            )
+            is_valid_vat, vat_details = cls._run_vat_validation(vat_id, requester)
             results["checks"]["vat_validation"] = vat_details
-            
+
             # If VAT is valid, we can use the company details
-            if is_valid_vat and "company_name" in vat_details and vat_details["company_name"]:
-                # Use the official name for other checks if possible
-                official_name = vat_details["company_name"]
+            official_name = cls._official_name(is_valid_vat, vat_details)
+            if official_name:
+                # Use the official name for further checks
                 results["official_name"] = official_name
-                # Use the official name for further checks if it's available
                 name_for_checks = official_name
             else:
                 name_for_checks = name
         else:
-            results["checks"]["vat_validation"] = {
-                "valid": False, 
-                "error": "No VAT ID provided",
-                "requester_info_included": bool(requester_vat or requester_name),
-            }
+            results["checks"]["vat_validation"] = cls._missing_vat_details(requester)
             name_for_checks = name
-        
+
         # 2. Sanctions check
         is_sanctioned, sanctions_details = SanctionsCheckService.check_sanctions(name_for_checks, country_code, vat_id)
         results["checks"]["sanctions_check"] = sanctions_details
-        
+
         # 3. Judicial cases check
         judicial_cases = JudicialCheckService.check_judicial_cases(name_for_checks, country_code)
         results["checks"]["judicial_check"] = judicial_cases
-        
+
         # 4. Determine overall status
-        if is_sanctioned:
-            results["overall_status"] = "sanctioned"
-        elif vat_id and not results["checks"]["vat_validation"].get("valid", False):
-            results["overall_status"] = "warning"
-        elif judicial_cases.get("case_count", 0) > 0:
-            results["overall_status"] = "warning"
-        elif vat_id and results["checks"]["vat_validation"].get("valid", False):
-            results["overall_status"] = "verified"
-        
+        results["overall_status"] = cls._determine_overall_status(results, vat_id, is_sanctioned)
+
         return results
+
+    @classmethod
+    def check_counterparty_with_history(cls,
+                                        user_id: str,
+                                        name: str,
+                                        vat_id: Optional[str] = None,
+                                        country_code: Optional[str] = None,
+                                        checker_profile: Optional[Dict[str, Any]] = None,
+                                        concurrent: bool = False,
+                                        deadlines: Optional[Dict[str, float]] = None,
+                                        max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Return the user's stored result for this counterparty if it is fresh enough,
+        otherwise run the check and store it. Partial results are not stored.
+        History failures are logged and never fail the check itself.
+
+        Returns:
+            Dictionary with check results; reused results carry "cached" and "checked_at"
+        """
+        history = get_partner_history()
+        try:
+            stored = history.find_fresh_result(user_id, name, vat_id, max_age=max_age)
+            if stored is not None:
+                return stored
+        except Exception as e:
+            logger.warning(f"Partner check history lookup failed: {e}")
+
+        results = cls.check_counterparty(
+            name, vat_id, country_code, checker_profile, concurrent=concurrent, deadlines=deadlines
+        )
+        if not results.get("partial"):
+            try:
+                results["partner_id"] = history.record_result(user_id, name, vat_id, country_code, results)
+            except Exception as e:
+                logger.warning(f"Partner check history store failed: {e}")
+        return results
+
+    @classmethod
+    def check_counterparty_concurrent(cls,
+                                      name: str,
+                                      vat_id: Optional[str] = None,
+                                      country_code: Optional[str] = None,
+                                      checker_profile: Optional[Dict[str, Any]] = None,
+                                      deadlines: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        Perform a comprehensive check with the providers fanned out concurrently
+
+        VAT validation, sanctions and judicial lookups are submitted at the same time,
+        the name-dependent checks using the name supplied by the caller. They are only
+        re-run when VIES returns an official name that actually differs from it.
+        Every provider has its own deadline; a provider that misses it is reported with
+        a timeout error and the result is flagged as partial instead of failing.
+
+        Args:
+            name: Company or entity name
+            vat_id: Optional VAT ID (format: 'CCNNNNNNNNN')
+            country_code: Optional country code (e.g. 'DE')
+            checker_profile: Optional information about the entity performing the check
+            deadlines: Optional per-provider deadlines in seconds, overriding PROVIDER_DEADLINES
+
+        Returns:
+            Dictionary with comprehensive check results; includes "partial" and
+            "timed_out_checks" when a provider did not answer in time
+        """
+        started = time.monotonic()
+        deadlines = {**PROVIDER_DEADLINES, **(deadlines or {})}
+        executor = get_check_executor()
+        results = cls._init_results(name, checker_profile)
+
+        if not country_code and vat_id and len(vat_id) >= 2:
+            country_code = vat_id[:2].upper()
+
+        requester = cls._extract_requester(checker_profile)
+
+        # Fan out all providers speculatively using the supplied name
+        vat_future = None
+        if vat_id:
+            vat_future = executor.submit(cls._run_vat_validation, vat_id, requester)
+        name_futures = cls._submit_name_checks(executor, name, country_code, vat_id)
+
+        timed_out: List[str] = []
+
+        # 1. VAT validation check
+        if vat_future is not None:
+            vat_result = cls._await(vat_future, "vat_validation", deadlines, time.monotonic() - started)
+            if vat_result is None:
+                timed_out.append("vat_validation")
+                is_valid_vat, vat_details = False, cls._timeout_details("vat_validation", deadlines)
+            else:
+                is_valid_vat, vat_details = vat_result
+            results["checks"]["vat_validation"] = vat_details
+
+            official_name = cls._official_name(is_valid_vat, vat_details)
+            if official_name:
+                results["official_name"] = official_name
+                # Re-run the name-dependent checks only if VIES resolved a different name
+                if _normalize_name(official_name) != _normalize_name(name):
+                    for future, _ in name_futures.values():
+                        future.cancel()
+                    name_futures = cls._submit_name_checks(executor, official_name, country_code, vat_id)
+        else:
+            results["checks"]["vat_validation"] = cls._missing_vat_details(requester)
+
+        # 2. Sanctions check
+        future, submitted_at = name_futures["sanctions_check"]
+        sanctions_result = cls._await(future, "sanctions_check", deadlines, time.monotonic() - submitted_at)
+        if sanctions_result is None:
+            timed_out.append("sanctions_check")
+            is_sanctioned, sanctions_details = False, cls._timeout_details("sanctions_check", deadlines)
+        else:
+            is_sanctioned, sanctions_details = sanctions_result
+        results["checks"]["sanctions_check"] = sanctions_details
+
+        # 3. Judicial cases check
+        future, submitted_at = name_futures["judicial_check"]
+        judicial_cases = cls._await(future, "judicial_check", deadlines, time.monotonic() - submitted_at)
+        if judicial_cases is None:
+            timed_out.append("judicial_check")
+            judicial_cases = cls._timeout_details("judicial_check", deadlines)
+        results["checks"]["judicial_check"] = judicial_cases
+
+        # 4. Determine overall status
+        results["overall_status"] = cls._determine_overall_status(results, vat_id, is_sanctioned, timed_out)
+        if timed_out:
+            results["partial"] = True
+            results["timed_out_checks"] = timed_out
+
+        results["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return results
+
+    @staticmethod
+    def _init_results(name: str, checker_profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create the base result skeleton"""
+        return {
+            "counterparty_name": name,
+            "check_date": datetime.now().isoformat(),
+            "overall_status": "unknown",  # Default status
+            "checks": {},
+            "checker_info": checker_profile or {}
+        }
+
+    @staticmethod
+    def _extract_requester(checker_profile: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Extract requester VAT, name and country from the checker profile"""
+        requester = {"vat": None, "name": None, "country": None}
+        if checker_profile:
+            requester["vat"] = checker_profile.get("vat_id")
+            requester["name"] = checker_profile.get("company_name")
+            requester_country = checker_profile.get("country")
+            if requester_country and len(requester_country) >= 2:
+                requester_country = requester_country[:2].upper()
+            requester["country"] = requester_country
+        return requester
+
+    @staticmethod
+    def _run_vat_validation(vat_id: str, requester: Dict[str, Optional[str]]) -> Tuple[bool, Dict[str, Any]]:
+        """Run the VAT validation provider"""
+        return VatValidationService.validate_vat_mock(
+            vat_id,
+            requester_vat=requester["vat"],
+            requester_name=requester["name"],
+            requester_country=requester["country"]
+        )
+
+    @staticmethod
+    def _missing_vat_details(requester: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """VAT validation details when no VAT ID was supplied"""
+        return {
+            "valid": False,
+            "error": "No VAT ID provided",
+            "requester_info_included": bool(requester["vat"] or requester["name"]),
+        }
+
+    @staticmethod
+    def _official_name(is_valid_vat: bool, vat_details: Dict[str, Any]) -> Optional[str]:
+        """Return the official company name from a valid VAT result, if any"""
+        if is_valid_vat and vat_details.get("company_name"):
+            return vat_details["company_name"]
+        return None
+
+    @staticmethod
+    def _submit_name_checks(executor: ThreadPoolExecutor, name: str, country_code: Optional[str],
+                            vat_id: Optional[str]) -> Dict[str, Tuple[Future, float]]:
+        """Submit the name-dependent providers, returning futures with their submit time"""
+        submitted_at = time.monotonic()
+        return {
+            "sanctions_check": (
+                executor.submit(SanctionsCheckService.check_sanctions, name, country_code, vat_id),
+                submitted_at
+            ),
+            "judicial_check": (
+                executor.submit(JudicialCheckService.check_judicial_cases, name, country_code),
+                submitted_at
+            ),
+        }
+
+    @staticmethod
+    def _await(future: Future, provider: str, deadlines: Dict[str, float], elapsed: float):
+        """Wait for a provider future within what remains of its deadline; None on timeout"""
+        remaining = max(deadlines[provider] - elapsed, 0.0)
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            logger.warning(f"Counterparty check provider {provider} exceeded its {deadlines[provider]}s deadline")
+            future.cancel()
+            return None
+
+    @staticmethod
+    def _timeout_details(provider: str, deadlines: Dict[str, float]) -> Dict[str, Any]:
+        """Details recorded for a provider that missed its deadline"""
+        return {
+            "error": f"{provider} did not complete within {deadlines[provider]}s",
+            "timed_out": True
+        }
+
+    @staticmethod
+    def _determine_overall_status(results: Dict[str, Any], vat_id: Optional[str], is_sanctioned: bool,
+                                  timed_out: Optional[List[str]] = None) -> str:
+        """Derive the overall status from the individual check results"""
+        checks = results["checks"]
+        vat_details = checks["vat_validation"]
+        if is_sanctioned:
+            return "sanctioned"
+        if vat_id and not vat_details.get("valid", False) and not vat_details.get("timed_out"):
+            return "warning"
+        if checks["judicial_check"].get("case_count", 0) > 0:
+            return "warning"
+        if timed_out:
+            # A check that did not complete can never yield "verified"
+            return "unknown"
+        if vat_id and vat_details.get("valid", False):
+            return "verified"
+        return "unknown"
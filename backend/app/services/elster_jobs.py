@@ -0,0 +1,357 @@
+"""Background queue for ELSTER submissions.
+
+The submit endpoint only stores a submission_jobs row. Worker processes
+(backend/elster_worker.py) claim due jobs in batches with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers never take the same
+job and never wait on each other. A claim is a lease. If a worker dies, its
+jobs become claimable again once the lease runs out. On SQLite, which has
+no row locks, the conditional claim UPDATE alone keeps claims exclusive.
+The lease is renewed right before each job of a batch is processed, and a
+job whose lease was taken over by another worker is skipped. Results are
+only written while this worker still holds the job.
+
+A queued job runs the ERiC pipeline: create_xml_document, validate_xml,
+encrypt_and_sign and send_data. Right before sending it is marked as
+"sending". Sending jobs are never claimed again. If a worker dies or loses
+the lease mid-send, the job fails with a note to check ELSTER, so an
+expired lease never files a declaration twice. Right after sending, the
+transfer ticket is written and the job turns into a polling job, without
+waiting for the rest of the batch. Polls back off exponentially until
+ELSTER reports accepted or error. Poll results and failed sends of a batch
+are written together in one transaction. With
+ELSTER_XML_ARCHIVE_DIR set, the XML of every sent declaration is stored
+exactly as it was sent, named after its submission.
+"""
+import os
+import json
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+
+from .elster_xml import ELSTER_XML_ARCHIVE_DIR, archive_declaration
+from .mock_eric_service import ERiCIntegration
+
+logger = logging.getLogger(__name__)
+
+# Jobs claimed per round and how long a claim is held
+ELSTER_JOB_BATCH_SIZE = int(os.getenv("ELSTER_JOB_BATCH_SIZE", "20"))
+ELSTER_JOB_LEASE_SECONDS = float(os.getenv("ELSTER_JOB_LEASE_SECONDS", "300"))
+# Attempts at sending before the submission is marked as error
+ELSTER_JOB_MAX_ATTEMPTS = int(os.getenv("ELSTER_JOB_MAX_ATTEMPTS", "5"))
+ELSTER_JOB_RETRY_DELAY = float(os.getenv("ELSTER_JOB_RETRY_DELAY", "10"))
+# Status polls: first delay, cap of the exponential backoff and give-up limit
+ELSTER_POLL_INITIAL_DELAY = float(os.getenv("ELSTER_POLL_INITIAL_DELAY", "30"))
+ELSTER_POLL_MAX_DELAY = float(os.getenv("ELSTER_POLL_MAX_DELAY", "900"))
+ELSTER_POLL_MAX_ATTEMPTS = int(os.getenv("ELSTER_POLL_MAX_ATTEMPTS", "40"))
+# Seconds a worker sleeps when no job is due
+ELSTER_WORKER_IDLE_SECONDS = float(os.getenv("ELSTER_WORKER_IDLE_SECONDS", "2"))
+
+FINAL_STATUSES = ("accepted", "error")
+
+INTERRUPTED_SEND_ERROR = ("Worker stopped while sending; the declaration may have reached ELSTER. "
+                          "Check before submitting again.")
+
+
+def backoff(attempt: int, initial: float, maximum: float) -> float:
+    """Exponential delay before the given (0-based) retry, capped at maximum"""
+    return min(maximum, initial * (2 ** attempt))
+
+
+def enqueue_submission(session, submission, tax_id: str, totals: Dict[str, Decimal]):
+    """
+    Queue a submission for sending; the caller commits
+
+    Args:
+        session: Open database session
+        submission: Flushed Submission row
+        tax_id: Tax number of the user
+        totals: Declaration totals (see vat_totals.aggregate_vat_totals)
+
+    Returns:
+        The SubmissionJob
+    """
+    from ..models import SubmissionJob
+
+    job = SubmissionJob(
+        submission_id=submission.id,
+        user_id=submission.user_id,
+        payload=json.dumps({"tax_id": tax_id, "period": submission.period, "totals": totals}, default=str),
+    )
+    session.add(job)
+    session.flush()
+    return job
+
+
+def job_status(job, submission_status: Optional[str] = None) -> Dict[str, Any]:
+    """API representation of a job"""
+    return {
+        "id": job.id,
+        "submissionId": job.submission_id,
+        "state": job.state,
+        "submissionStatus": submission_status,
+        "transferTicket": job.transfer_ticket,
+        "attempts": job.attempts,
+        "nextRunAt": job.run_at.isoformat() if job.state in ("queued", "polling") else None,
+        "lastError": job.last_error,
+    }
+
+
+class SubmissionWorker:
+    """Claims due submission jobs and sends or polls them in batches"""
+
+    def __init__(self, session_factory=None, worker_id: Optional[str] = None, eric=ERiCIntegration,
+                 batch_size: int = ELSTER_JOB_BATCH_SIZE, lease_seconds: float = ELSTER_JOB_LEASE_SECONDS,
+                 max_attempts: int = ELSTER_JOB_MAX_ATTEMPTS, retry_delay: float = ELSTER_JOB_RETRY_DELAY,
+                 poll_initial_delay: float = ELSTER_POLL_INITIAL_DELAY,
+                 poll_max_delay: float = ELSTER_POLL_MAX_DELAY, poll_max_attempts: int = ELSTER_POLL_MAX_ATTEMPTS,
+                 concurrency: int = 1, archive_dir: str = ELSTER_XML_ARCHIVE_DIR, clock=datetime.utcnow):
+        """
+        Args:
+            eric: ERiCIntegration, or an eric_pool.ERiCPool to process jobs in parallel
+            concurrency: Jobs of a batch processed at the same time (the pool size)
+            archive_dir: Directory the sent declaration XML is stored in (empty = off)
+        """
+        if session_factory is None:
+            from ..db import get_session_factory
+            session_factory = get_session_factory()
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.eric = eric
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_initial_delay = poll_initial_delay
+        self.poll_max_delay = poll_max_delay
+        self.poll_max_attempts = poll_max_attempts
+        self.concurrency = concurrency
+        self.archive_dir = archive_dir
+        self.clock = clock
+        self._executor = None
+
+    def claim(self) -> List[Any]:
+        """Lease up to batch_size due jobs to this worker"""
+        from ..models import SubmissionJob
+
+        now = self.clock()
+        claimable = (
+            SubmissionJob.state.in_(("queued", "polling")),
+            SubmissionJob.run_at <= now,
+            or_(SubmissionJob.locked_until.is_(None), SubmissionJob.locked_until < now),
+        )
+        with self.session_factory() as session:
+            self._fail_interrupted_sends(session, now)
+            ids = session.scalars(
+                select(SubmissionJob.id).where(*claimable).order_by(SubmissionJob.run_at)
+                .limit(self.batch_size).with_for_update(skip_locked=True)
+            ).all()
+            if not ids:
+                session.commit()
+                return []
+            # Repeating the conditions keeps the claim exclusive where FOR UPDATE is not supported
+            session.execute(
+                update(SubmissionJob).where(SubmissionJob.id.in_(ids), *claimable)
+                .values(locked_by=self.worker_id, locked_until=now + timedelta(seconds=self.lease_seconds)),
+                execution_options={"synchronize_session": False},
+            )
+            session.commit()
+            return session.scalars(
+                select(SubmissionJob).where(SubmissionJob.id.in_(ids), SubmissionJob.locked_by == self.worker_id)
+            ).all()
+
+    def _fail_interrupted_sends(self, session, now: datetime):
+        """Fail jobs whose worker lost its lease while sending; resending could file twice"""
+        from ..models import Submission, SubmissionJob
+
+        interrupted = (SubmissionJob.state == "sending", SubmissionJob.locked_until < now)
+        submission_ids = session.scalars(select(SubmissionJob.submission_id).where(*interrupted)).all()
+        if not submission_ids:
+            return
+        session.execute(
+            update(SubmissionJob).where(*interrupted)
+            .values(state="failed", locked_by=None, locked_until=None, last_error=INTERRUPTED_SEND_ERROR,
+                    updated_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        session.execute(
+            update(Submission).where(Submission.id.in_(submission_ids)).values(status="error"),
+            execution_options={"synchronize_session": False},
+        )
+        logger.error(f"{len(submission_ids)} ELSTER submissions were interrupted while sending")
+
+    def _hold(self, job, **values) -> bool:
+        """Extend the lease of a job this worker still holds; False if another worker took it over"""
+        from ..models import SubmissionJob
+
+        conditions = [SubmissionJob.id == job.id, SubmissionJob.locked_by == self.worker_id]
+        if "state" in values:
+            conditions.append(SubmissionJob.state == job.state)
+        with self.session_factory() as session:
+            held = session.execute(
+                update(SubmissionJob).where(*conditions)
+                .values(locked_until=self.clock() + timedelta(seconds=self.lease_seconds), **values),
+                execution_options={"synchronize_session": False},
+            ).rowcount == 1
+            session.commit()
+        if not held:
+            logger.warning(f"Lease on submission job {job.id} was lost; skipping it")
+        return held
+
+    def run_once(self) -> int:
+        """Claim and process one batch; returns the number of processed jobs"""
+        jobs = self.claim()
+        if not jobs:
+            return 0
+        if self.concurrency > 1 and len(jobs) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="elster-job")
+            results = list(self._executor.map(self._process, jobs))
+        else:
+            results = [self._process(job) for job in jobs]
+        job_updates = []
+        for job, result in zip(jobs, results):
+            # None: already written (sent) or taken over by another worker
+            if result is None:
+                continue
+            changes, submission_status = result
+            changes.update(locked_by=None, locked_until=None, updated_at=self.clock())
+            job_updates.append((job, changes, submission_status))
+        self._apply(job_updates)
+        return len(jobs)
+
+    def _process(self, job):
+        # Batches can outlast the lease that was taken at claim time
+        if not self._hold(job):
+            return None
+        return (self._send if job.state == "queued" else self._poll)(job)
+
+    def _send(self, job):
+        """Run the ERiC pipeline for a queued job"""
+        payload = json.loads(job.payload)
+        totals = {name: Decimal(value) for name, value in payload["totals"].items()}
+        try:
+            declaration = self.eric.prepare_vat_declaration(None, payload["tax_id"], payload["period"], totals=totals)
+            if not self._hold(job, state="sending"):
+                return None
+            result = self.eric.submit_declaration(declaration)
+            if not result.get("success"):
+                raise RuntimeError(f"ELSTER rejected the transfer: {result}")
+        except Exception as e:
+            attempts = job.attempts + 1
+            logger.warning(f"Sending submission {job.submission_id} failed (attempt {attempts}): {e}")
+            if attempts >= self.max_attempts:
+                return {"state": "failed", "attempts": attempts, "last_error": str(e)}, "error"
+            return {"state": "queued", "attempts": attempts, "last_error": str(e), "run_at": self.clock() + timedelta(
+                seconds=backoff(attempts - 1, self.retry_delay, self.poll_max_delay))}, None
+        self._record_sent(job, result["transfer_ticket"])
+        self._archive(job, declaration)
+        return None
+
+    def _record_sent(self, job, transfer_ticket: str):
+        """
+        Persist the transfer ticket of a sent declaration at once
+
+        The job turns into a polling job and its submission into "processing".
+        If the job was failed as interrupted meanwhile (the lease ran out while
+        sending), it is recovered: the declaration did reach ELSTER.
+        """
+        from ..models import Submission, SubmissionJob
+
+        now = self.clock()
+        with self.session_factory() as session:
+            updated = session.execute(
+                update(SubmissionJob)
+                .where(SubmissionJob.id == job.id, or_(
+                    and_(SubmissionJob.state == "sending", SubmissionJob.locked_by == self.worker_id),
+                    and_(SubmissionJob.state == "failed", SubmissionJob.last_error == INTERRUPTED_SEND_ERROR)))
+                .values(state="polling", transfer_ticket=transfer_ticket, attempts=0, last_error=None,
+                        run_at=now + timedelta(seconds=self.poll_initial_delay), locked_by=None,
+                        locked_until=None, updated_at=now),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            if updated:
+                session.execute(
+                    update(Submission).where(Submission.id == job.submission_id).values(status="processing"),
+                    execution_options={"synchronize_session": False},
+                )
+            session.commit()
+        if not updated:
+            logger.error(f"Submission {job.submission_id} was sent with ticket {transfer_ticket}, "
+                         f"but its job could not be updated")
+
+    def _archive(self, job, declaration):
+        """Store the sent declaration XML under the submission's ID"""
+        if not self.archive_dir:
+            return
+        try:
+            archive_declaration(job.submission_id, declaration["xml_data"], directory=self.archive_dir)
+        except Exception as e:
+            # The declaration is already sent; a missing archive copy must not resend it
+            logger.error(f"Archiving submission {job.submission_id} failed: {e}")
+
+    def _poll(self, job):
+        """Check the transfer ticket of a polling job"""
+        attempts = job.attempts + 1
+        try:
+            status = self.eric.check_submission_status(job.transfer_ticket).get("status")
+            error = None
+        except Exception as e:
+            status, error = None, str(e)
+            logger.warning(f"Status check for {job.transfer_ticket} failed: {e}")
+        if status in FINAL_STATUSES:
+            return {"state": "done", "attempts": attempts, "last_error": None}, status
+        if attempts >= self.poll_max_attempts:
+            return {"state": "failed", "attempts": attempts,
+                    "last_error": error or "No final status from ELSTER"}, "error"
+        return {"attempts": attempts, "last_error": error, "run_at": self.clock() + timedelta(
+            seconds=backoff(attempts, self.poll_initial_delay, self.poll_max_delay))}, None
+
+    def _apply(self, job_updates: List[Tuple[Any, Dict[str, Any], Optional[str]]]):
+        """
+        Write the job changes of a batch and one status UPDATE per new submission status
+
+        A job is only updated while this worker still holds it; results for
+        jobs taken over by another worker are dropped with their status change.
+        """
+        from ..models import Submission, SubmissionJob
+
+        submission_statuses: Dict[str, List[str]] = {}
+        with self.session_factory() as session:
+            for job, changes, submission_status in job_updates:
+                updated = session.execute(
+                    update(SubmissionJob)
+                    .where(SubmissionJob.id == job.id, SubmissionJob.locked_by == self.worker_id)
+                    .values(**changes),
+                    execution_options={"synchronize_session": False},
+                ).rowcount
+                if not updated:
+                    logger.warning(f"Lease on submission job {job.id} was lost; result dropped")
+                elif submission_status:
+                    submission_statuses.setdefault(submission_status, []).append(job.submission_id)
+            for status, submission_ids in submission_statuses.items():
+                session.execute(
+                    update(Submission).where(Submission.id.in_(submission_ids)).values(status=status),
+                    execution_options={"synchronize_session": False},
+                )
+            session.commit()
+
+    def run_forever(self, stop: Optional[threading.Event] = None, idle_seconds: float = ELSTER_WORKER_IDLE_SECONDS):
+        """Process batches until stop is set, sleeping while no job is due"""
+        stop = stop or threading.Event()
+        self.eric.initialize()
+        logger.info(f"ELSTER submission worker {self.worker_id} started")
+        while not stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"ELSTER submission worker error: {e}")
+                processed = 0
+            if not processed:
+                stop.wait(idle_seconds)
+        logger.info(f"ELSTER submission worker {self.worker_id} stopped")
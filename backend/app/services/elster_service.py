@@ -2,11 +2,14 @@
 
 import os
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import uuid
 import tempfile
 import json
 from datetime import datetime
+from decimal import Decimal
+
+from .vat_totals import TOTAL_FIELDS, totals_from_transactions
 
 # In a real implementation, you would use the ERiC library directly
 # via ctypes or a wrapper. For this prototype, we simulate the interaction.
@@ -30,9 +33,10 @@ class ElsterService:
     
     @classmethod
     def prepare_vat_declaration(cls, 
-                               transactions: List[Dict[str, Any]], 
+                               transactions: Optional[List[Dict[str, Any]]], 
                                tax_id: str, 
-                               period: str) -> Dict[str, Any]:
+                               period: str,
+                               totals: Optional[Dict[str, Decimal]] = None) -> Dict[str, Any]:
         """
         Prepare VAT declaration (Umsatzsteuervoranmeldung) for ELSTER.
         
@@ -40,6 +44,8 @@ class ElsterService:
             transactions: List of transactions with amounts and tax information
             tax_id: Tax ID of the user
             period: The period for the declaration (e.g., 'Q2 2024')
+            totals: Totals already aggregated by the database
+                (see vat_totals.aggregate_vat_totals); transactions are then not needed
             
         Returns:
             Dictionary with declaration data
@@ -48,18 +54,9 @@ class ElsterService:
         # and the relevant time range
         period_info = cls._parse_period(period)
         
-        # Calculate totals from transactions
-        total_revenue = sum(tx["amount"] for tx in transactions if tx["amount"] > 0)
-        total_tax_collected = sum(tx["tax_amount"] for tx in transactions 
-                                if tx["amount"] > 0 and tx.get("tax_amount"))
-        
-        total_expenses = abs(sum(tx["amount"] for tx in transactions 
-                              if tx["amount"] < 0 and tx.get("is_expense_claimed")))
-        total_tax_paid = sum(tx.get("tax_amount", 0) for tx in transactions 
-                           if tx["amount"] < 0 and tx.get("is_expense_claimed"))
-        
-        # Net tax to be paid or refunded
-        net_tax = total_tax_collected - total_tax_paid
+        # Calculate totals from transactions (net tax is to be paid or refunded)
+        if totals is None:
+            totals = totals_from_transactions(transactions or [])
         
         # In a real implementation, you would create the appropriate XML 
         # structure for the ERiC library based on the transaction data
@@ -75,13 +72,7 @@ class ElsterService:
             "tax_id": tax_id,
             "submission_id": str(uuid.uuid4()),
             "timestamp": datetime.utcnow().isoformat(),
-            "totals": {
-                "revenue": total_revenue,
-                "tax_collected": total_tax_collected,
-                "expenses": total_expenses,
-                "tax_paid": total_tax_paid,
-                "net_tax": net_tax
-            }
+            "totals": {field: totals[field] for field in TOTAL_FIELDS}
         }
     
     @classmethod
@@ -136,6 +127,28 @@ class ElsterService:
             "description": f"Submission is {status}"
         }
     
+    @classmethod
+    def period_range(cls, period: str) -> Tuple[datetime, datetime]:
+        """
+        Date range of a period string like 'Q2 2024' or '07 2024'.
+        
+        Args:
+            period: Period string
+            
+        Returns:
+            (start, end) with the end exclusive
+        """
+        period_info = cls._parse_period(period)
+        year = period_info["year"]
+        if period_info["type"] == "quarterly":
+            first_month, months = (period_info["quarter"] - 1) * 3 + 1, 3
+        else:
+            first_month, months = period_info["month"], 1
+        start = datetime(year, first_month, 1)
+        end_month = first_month + months
+        end = datetime(year + 1, 1, 1) if end_month > 12 else datetime(year, end_month, 1)
+        return start, end
+    
     @classmethod
     def _parse_period(cls, period: str) -> Dict[str, Any]:
         """
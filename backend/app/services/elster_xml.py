@@ -0,0 +1,203 @@
+"""Streaming ElsterXML writer and cached XSD validation.
+
+Declarations are serialized incrementally with lxml's ``xmlfile``. Each
+element goes to the target (file path, file object or socket file) as soon
+as it is complete, so memory stays flat no matter how many itemized
+positions a declaration has. Positions are consumed from an iterator,
+e.g. a server-side database cursor.
+
+Compiled XSD schemas are cached per path and modification time. Validation
+parses only the document, never the schema. Files are validated while they
+are parsed, with each finished element released, so large declarations
+can be checked without loading them whole. lxml validators keep their error
+log on the instance; ERiC calls are serialized per process, so sharing the
+cached schema is safe.
+"""
+import io
+import os
+import uuid
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from lxml import etree
+
+from .vat_totals import to_decimal
+
+logger = logging.getLogger(__name__)
+
+ELSTER_NAMESPACE = "http://www.elster.de/elsterxml/schema/v11"
+ELSTER_SCHEMA_PATH = os.getenv(
+    "ELSTER_SCHEMA_PATH", os.path.join(os.path.dirname(__file__), "schemas", "elster_v11.xsd"))
+# Directory for archived declaration XML (empty = no archive)
+ELSTER_XML_ARCHIVE_DIR = os.getenv("ELSTER_XML_ARCHIVE_DIR", "")
+# Positions written between flushes of the serializer
+ELSTER_XML_FLUSH_EVERY = int(os.getenv("ELSTER_XML_FLUSH_EVERY", "1000"))
+
+_schemas: Dict[str, Any] = {}
+_schemas_lock = threading.Lock()
+
+
+def _q(tag: str) -> str:
+    return f"{{{ELSTER_NAMESPACE}}}{tag}"
+
+
+def _leaf(xf, tag: str, text: Any, **attrib):
+    with xf.element(_q(tag), attrib):
+        xf.write(str(text))
+
+
+def write_declaration(target: Union[str, Any], document_type: str, declaration: Dict[str, Any],
+                      items: Optional[Iterable[Dict[str, Any]]] = None,
+                      flush_every: int = ELSTER_XML_FLUSH_EVERY) -> int:
+    """
+    Serialize a declaration to a file or stream element by element
+
+    Args:
+        target: File path or binary file object (e.g. socket.makefile("wb"))
+        document_type: DatenArt, e.g. "UStVA"
+        declaration: Prepared declaration (submission_id, tax_id, period, totals)
+        items: Itemized positions with id, date, amount and tax_amount; consumed lazily
+        flush_every: Positions written between flushes to the target
+
+    Returns:
+        Number of positions written
+    """
+    totals = declaration.get("totals", {})
+    written = 0
+    with etree.xmlfile(target, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(_q("Elster"), nsmap={None: ELSTER_NAMESPACE}):
+            with xf.element(_q("TransferHeader"), version="11"):
+                _leaf(xf, "Verfahren", "ElsterAnmeldung")
+                _leaf(xf, "DatenArt", document_type)
+                _leaf(xf, "Vorgang", "send-DIRECT")
+                _leaf(xf, "TransferId", uuid.uuid4())
+                _leaf(xf, "TransferVersion", 1)
+            with xf.element(_q("DatenTeil")), xf.element(_q("Nutzdatenblock")):
+                with xf.element(_q("NutzdatenHeader"), version="11"):
+                    _leaf(xf, "NutzdatenTicket", declaration.get("submission_id"))
+                    _leaf(xf, "Empfaenger", "9999", id="F")
+                with xf.element(_q("Nutzdaten")):
+                    if declaration.get("tax_id"):
+                        _leaf(xf, "Steuernummer", declaration["tax_id"])
+                    if declaration.get("period"):
+                        _leaf(xf, "Zeitraum", declaration["period"])
+                    for tag, field in (("Umsaetze", "revenue"), ("Umsatzsteuer", "tax_collected"),
+                                       ("Ausgaben", "expenses"), ("Vorsteuer", "tax_paid")):
+                        if field in totals:
+                            _leaf(xf, tag, to_decimal(totals[field]))
+                    _leaf(xf, "Summe", to_decimal(totals.get("net_tax", 0)))
+                    if items is not None:
+                        with xf.element(_q("Positionen")):
+                            for item in items:
+                                attrib = {
+                                    "id": str(item["id"]),
+                                    "datum": _date(item["date"]),
+                                    "betrag": str(to_decimal(item["amount"])),
+                                }
+                                if item.get("tax_amount") is not None:
+                                    attrib["steuer"] = str(to_decimal(item["tax_amount"]))
+                                with xf.element(_q("Position"), attrib):
+                                    pass
+                                written += 1
+                                if written % flush_every == 0:
+                                    xf.flush()
+    return written
+
+
+def _date(value: Any) -> str:
+    return value.date().isoformat() if hasattr(value, "date") else str(value)[:10]
+
+
+def declaration_xml(document_type: str, declaration: Dict[str, Any],
+                    items: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+    """The declaration as an XML string (for APIs that take the document in memory)"""
+    buffer = io.BytesIO()
+    write_declaration(buffer, document_type, declaration, items)
+    return buffer.getvalue().decode("utf-8")
+
+
+def archive_declaration(submission_id: str, xml_data: Union[str, bytes],
+                        directory: str = ELSTER_XML_ARCHIVE_DIR) -> Optional[str]:
+    """
+    Store the document that was sent to ELSTER as <directory>/<submission_id>.xml
+
+    The file is written under a temporary name and renamed when complete, so
+    the archive never holds a truncated document.
+
+    Args:
+        submission_id: Submission.id the document belongs to
+        xml_data: The exact document passed to submit_declaration
+
+    Returns:
+        Path of the archived file, None if archiving is disabled
+    """
+    if not directory:
+        return None
+    if isinstance(xml_data, str):
+        xml_data = xml_data.encode("utf-8")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{submission_id}.xml")
+    partial = f"{path}.part"
+    try:
+        with open(partial, "wb") as f:
+            f.write(xml_data)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def load_schema(path: str = ELSTER_SCHEMA_PATH):
+    """Compiled XSD schema, parsed once per path and file version"""
+    key = f"{path}:{os.path.getmtime(path)}"
+    schema = _schemas.get(key)
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(key)
+            if schema is None:
+                schema = etree.XMLSchema(etree.parse(path))
+                for stale in [cached for cached in _schemas if cached.startswith(f"{path}:")]:
+                    del _schemas[stale]
+                _schemas[key] = schema
+                logger.info(f"Compiled XSD schema {path}")
+    return schema
+
+
+def _errors(error_log) -> List[str]:
+    return [f"line {error.line}: {error.message}" for error in error_log]
+
+
+def validate_xml(xml_data: Union[str, bytes], schema_path: str = ELSTER_SCHEMA_PATH) -> Dict[str, Any]:
+    """
+    Validate a document against the cached schema
+
+    Returns:
+        {"valid": True} or {"valid": False, "errors": [...]}
+    """
+    if isinstance(xml_data, str):
+        xml_data = xml_data.encode("utf-8")
+    try:
+        document = etree.fromstring(xml_data, parser=etree.XMLParser(resolve_entities=False))
+    except etree.XMLSyntaxError as e:
+        return {"valid": False, "errors": [str(e)]}
+    schema = load_schema(schema_path)
+    if schema.validate(document):
+        return {"valid": True}
+    return {"valid": False, "errors": _errors(schema.error_log)}
+
+
+def validate_xml_file(path: str, schema_path: str = ELSTER_SCHEMA_PATH) -> Dict[str, Any]:
+    """Validate a (large) XML file while parsing it, releasing each finished element"""
+    try:
+        for _, element in etree.iterparse(path, events=("end",), schema=load_schema(schema_path),
+                                          resolve_entities=False):
+            element.clear(keep_tail=True)
+            # Drop already processed siblings so the tree does not grow
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        return {"valid": False, "errors": _errors(e.error_log) or [str(e)]}
+    return {"valid": True}
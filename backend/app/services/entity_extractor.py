@@ -0,0 +1,225 @@
+"""Company name and VAT ID extraction for partner-check chat messages.
+
+All patterns are compiled once at import time. A message can mention several
+counterparties; each is returned with its legal form and, if one is written
+next to it, its VAT ID. VAT IDs are validated offline (format and check digit)
+so malformed numbers never reach a provider.
+"""
+import re
+from typing import Dict, Any, List, Optional
+
+from .vat_checksum import VAT_FORMATS, check_vat_number, split_vat
+
+MAX_ENTITIES = 5
+# Maximum distance in characters between a company name and the VAT ID that belongs to it
+VAT_PAIRING_DISTANCE = 80
+
+# Legal-form suffixes across EU jurisdictions (plus common UK/US forms)
+LEGAL_FORMS = [
+    # DE / AT / CH
+    "GmbH & Co. KG", "GmbH & Co. KGaA", "UG (haftungsbeschränkt)", "gGmbH", "GmbH", "KGaA", "AG",
+    "KG", "OHG", "GbR", "PartG", "UG", "e.K.", "e.V.", "eG", "SE",
+    # FR / BE / LU
+    "SASU", "SAS", "SARL", "S.à r.l.", "EURL", "SNC", "SCI", "SCS", "SA", "SPRL", "SRL", "BVBA", "SC",
+    # IT
+    "S.p.A.", "S.r.l.s.", "S.r.l.", "S.a.s.", "S.n.c.",
+    # ES / PT
+    "S.L.U.", "S.L.", "S.A.", "S.Coop.", "Lda.", "Lda",
+    # NL
+    "B.V.", "N.V.", "V.O.F.", "C.V.",
+    # PL / CZ / SK
+    "Sp. z o.o.", "sp. z o.o.", "sp.k.", "sp.j.", "s.r.o.", "a.s.", "k.s.", "v.o.s.",
+    # Nordics / Baltics
+    "ApS", "A/S", "I/S", "P/S", "AB", "HB", "KB", "Oyj", "Oy", "OÜ", "AS", "SIA", "UAB",
+    # HU / RO / BG / HR / SI / EL
+    "Kft.", "Zrt.", "Nyrt.", "Bt.", "S.R.L.", "EOOD", "OOD", "EAD", "AD", "d.o.o.", "d.d.",
+    "A.E.", "E.P.E.", "I.K.E.",
+    # IE / UK / US
+    "Limited", "Ltd.", "Ltd", "LTD", "PLC", "plc", "LLP", "DAC", "Inc.", "Inc", "LLC", "Corp.", "Corp",
+]
+
+# Words that start a request rather than a company name ("Prüfe Müller GmbH")
+LEADING_STOPWORDS = frozenset("""
+    bitte prüfe prüfen überprüfe überprüfen checke check verify please kannst können sie du
+    die der das den dem des ein eine einen einem wir ich ist sind gibt es und oder auch
+    firma unternehmen company lieferant kunde partner the a an is are our my
+    wie was wer welche information informationen infos zu über about for für von
+""".split())
+
+# Words that introduce a company name ("Firma AS Trading"); never part of the name itself
+LEAD_KEYWORDS = ("Firma", "Unternehmen", "company", "Lieferant", "Kunde")
+
+_FORM_ALTERNATION = "|".join(
+    re.escape(form).replace(r"\ ", r"\s*").replace(r"\.", r"\.?")
+    for form in sorted(LEGAL_FORMS, key=len, reverse=True)
+)
+FORM_RE = re.compile(rf"(?<![\w&])(?:{_FORM_ALTERNATION})(?![\w&])")
+KEYWORD_RE = re.compile(rf"\b(?:{'|'.join(LEAD_KEYWORDS)})\b[\s:]+", re.IGNORECASE)
+# Two letters followed by an alphanumeric run with a digit early on (a space after the
+# prefix only before a digit); the prefix is checked against the member states
+# afterwards, which is cheaper than an alternation
+VAT_RE = re.compile(
+    r"\b([A-Za-z]{2})(?:(\s)(?=\d)|())((?=[0-9A-Za-z+*]{0,3}\d)[0-9A-Za-z+*]{2,12}(?:[ .\-]\d{2,4}){0,4})\b"
+)
+_NAME_TOKEN_RE = re.compile(r"[^\W_][\w'’.\-&]*")
+_LEAD_KEYWORDS = frozenset(keyword.casefold() for keyword in LEAD_KEYWORDS)
+_DIGIT = re.compile(r"\d")
+
+VAT_PREFIXES = frozenset(VAT_FORMATS) | {"GR"}
+NAME_CONNECTORS = frozenset(["&", "+", "und", "and", "et", "e", "y"])
+MAX_NAME_TOKENS = 6
+
+
+def _strip_stopwords(tokens: List[str]) -> List[str]:
+    while len(tokens) > 1 and tokens[0].casefold() in LEADING_STOPWORDS:
+        tokens = tokens[1:]
+    # A lone keyword is no name: in "Firma AS Trading" the legal form starts the name
+    if tokens and tokens[0].casefold() in _LEAD_KEYWORDS:
+        return []
+    return tokens
+
+
+def _name_tokens(text: str, from_end: bool) -> List[str]:
+    """
+    Collect up to MAX_NAME_TOKENS capitalized tokens (joined by connectors such as
+    "&" or "und") from the end (before a legal form) or the start (after a keyword) of text
+    """
+    words = text.split()
+    if from_end:
+        words.reverse()
+    tokens: List[str] = []
+    pending = None
+    for word in words:
+        if from_end and not tokens:
+            word = word.rstrip(",")
+        if word.casefold() in NAME_CONNECTORS:
+            if not tokens or pending is not None:
+                break
+            pending = word
+            continue
+        if not (word[:1].isupper() or word[:1].isdigit()) or not _NAME_TOKEN_RE.fullmatch(word):
+            break
+        if pending is not None:
+            tokens.append(pending)
+            pending = None
+        tokens.append(word)
+        if len(tokens) >= MAX_NAME_TOKENS:
+            break
+    if from_end:
+        tokens.reverse()
+    return tokens
+
+
+def _continues_name(gap: str) -> bool:
+    """Whether the text between two legal forms consists of name tokens only"""
+    words = gap.split()
+    return bool(words) and _name_tokens(gap, from_end=False) == words
+
+
+def _find_vat_ids(message: str) -> List[Dict[str, Any]]:
+    vat_ids = []
+    for match in VAT_RE.finditer(message):
+        prefix, space, _, number = match.groups()
+        # Lower-case prefixes are only accepted when written without a space ("de123456789")
+        if prefix.upper() not in VAT_PREFIXES or (space and not prefix.isupper()):
+            continue
+        # Require mostly digits so words are not taken for VAT IDs
+        if len(_DIGIT.findall(number)) < 5:
+            continue
+        country, number = split_vat(prefix + number)
+        vat_id = country + number
+        is_valid, error = check_vat_number(vat_id)
+        vat_ids.append({
+            "vat_id": vat_id,
+            "vat_valid": is_valid,
+            "vat_error": error,
+            "start": match.start(),
+            "end": match.end(),
+        })
+    return vat_ids
+
+
+def _find_names(message: str) -> List[Dict[str, Any]]:
+    names = []
+    previous_end = 0
+    forms = list(FORM_RE.finditer(message))
+    for match, following in zip(forms, forms[1:] + [None]):
+        # A legal form only ends a name: in "AS Trading Ltd" the name runs on to "Ltd"
+        if following is not None and _continues_name(message[match.end():following.start()]):
+            continue
+        # The name is made of the tokens right before the legal form, never reaching
+        # back past the previous entity
+        tokens = _strip_stopwords(_name_tokens(message[previous_end:match.start()], from_end=True))
+        if not tokens:
+            # Without a name before it, the form starts the next name ("Firma AS Trading")
+            previous_end = match.start()
+            continue
+        previous_end = match.end()
+        form = match.group(0)
+        names.append({
+            "name": " ".join(tokens + [form]),
+            "legal_form": form,
+            "start": message.rfind(tokens[0], 0, match.start()),
+            "end": match.end(),
+        })
+    if names:
+        return names
+
+    match = KEYWORD_RE.search(message)
+    if match:
+        tokens = _name_tokens(message[match.end():], from_end=False)
+        if tokens:
+            return [{"name": " ".join(tokens), "legal_form": None, "start": match.end(), "end": match.end()}]
+    return []
+
+
+def extract_entities(message: str, max_entities: int = MAX_ENTITIES) -> List[Dict[str, Any]]:
+    """
+    Extract the counterparties mentioned in a message
+
+    Args:
+        message: Chat message
+        max_entities: Maximum number of entities returned
+
+    Returns:
+        List of dicts with "name", "legal_form", "vat_id", "vat_valid" and
+        "vat_error" (None where not applicable), in message order
+    """
+    vat_ids = _find_vat_ids(message)
+    names = _find_names(message)
+
+    # Short messages without any recognizable pattern are taken as a bare company name
+    if not names and not vat_ids:
+        stripped = message.strip().rstrip("?!.")
+        if stripped and len(stripped.split()) <= 5 and stripped[:1].isupper():
+            names = [{"name": stripped, "legal_form": None, "start": 0, "end": len(stripped)}]
+
+    positioned = []
+    unpaired = list(vat_ids)
+    for name in names:
+        vat = None
+        if unpaired:
+            # Pair with the closest VAT ID before or after the name
+            distance, nearest = min(
+                (max(candidate["start"] - name["end"], name["start"] - candidate["end"], 0), i)
+                for i, candidate in enumerate(unpaired)
+            )
+            if distance <= VAT_PAIRING_DISTANCE:
+                vat = unpaired.pop(nearest)
+        positioned.append(_entity(name, vat))
+    positioned.extend(_entity(None, vat) for vat in unpaired)
+
+    positioned.sort(key=lambda item: item[0])
+    return [entity for _, entity in positioned[:max_entities]]
+
+
+def _entity(name: Optional[Dict[str, Any]], vat: Optional[Dict[str, Any]]):
+    """Build an entity dict together with its position in the message"""
+    position = min(item["start"] for item in (name, vat) if item)
+    return position, {
+        "name": name["name"] if name else None,
+        "legal_form": name["legal_form"] if name else None,
+        "vat_id": vat["vat_id"] if vat else None,
+        "vat_valid": vat["vat_valid"] if vat else None,
+        "vat_error": vat["vat_error"] if vat else None,
+    }
@@ -0,0 +1,360 @@
+"""Pool of warm ERiC worker processes.
+
+The ERiC library is not thread-safe, and loading it together with the
+certificate takes hundreds of milliseconds. The pool therefore starts N
+worker processes up front. Each one initializes its own library once and
+keeps it loaded. A call borrows an idle worker, or waits up to the queue
+timeout for one, and runs the ERiCIntegration operation there. N
+declarations can run in parallel, and none of them pays for a cold start.
+
+A health check pings idle workers at an interval. A worker that died, hung
+or stopped answering is replaced, and so is a worker that breaks during a
+call. The pool offers the same methods as ERiCIntegration, so it can be
+passed wherever the integration class is used (e.g. SubmissionWorker).
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ERIC_POOL_SIZE = int(os.getenv("ERIC_POOL_SIZE", "2"))
+# Seconds a call waits for an idle worker, and for the worker's answer
+ERIC_POOL_QUEUE_TIMEOUT = float(os.getenv("ERIC_POOL_QUEUE_TIMEOUT", "60"))
+ERIC_POOL_CALL_TIMEOUT = float(os.getenv("ERIC_POOL_CALL_TIMEOUT", "120"))
+# Seconds between health checks and how long a ping may take
+ERIC_POOL_HEALTH_INTERVAL = float(os.getenv("ERIC_POOL_HEALTH_INTERVAL", "30"))
+ERIC_POOL_PING_TIMEOUT = float(os.getenv("ERIC_POOL_PING_TIMEOUT", "5"))
+# "spawn" starts workers without inheriting threads and connections of the parent
+ERIC_POOL_START_METHOD = os.getenv("ERIC_POOL_START_METHOD", "spawn")
+
+OPERATIONS = ("prepare_vat_declaration", "submit_declaration", "check_submission_status")
+
+
+class ERiCPoolError(RuntimeError):
+    """A worker failed, hung or could not be started"""
+
+
+class ERiCPoolBusyError(ERiCPoolError):
+    """No worker became idle within the queue timeout"""
+
+
+def _worker_main(conn, eric_path, certificate_path, init_latency, processing_latency):
+    """Worker process: initialize ERiC once, then serve calls until stopped"""
+    from .mock_eric_service import ERiCIntegration, mock_eric
+
+    if init_latency is not None:
+        mock_eric.init_latency = init_latency
+    if processing_latency is not None:
+        mock_eric.processing_latency = processing_latency
+    started = time.perf_counter()
+    try:
+        ERiCIntegration.initialize(eric_path, certificate_path)
+    except Exception as e:
+        conn.send(("error", (type(e).__name__, str(e))))
+        return
+    conn.send(("ready", {"pid": os.getpid(), "init_seconds": time.perf_counter() - started}))
+
+    calls = 0
+    while True:
+        try:
+            operation, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            break
+        if operation == "stop":
+            break
+        if operation == "ping":
+            conn.send(("ok", {"pid": os.getpid(), "initialized": mock_eric.initialized, "calls": calls}))
+            continue
+        try:
+            result = getattr(ERiCIntegration, operation)(*args, **kwargs)
+            calls += 1
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", (type(e).__name__, str(e))))
+    ERiCIntegration.cleanup()
+
+
+class _Worker:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.pid = process.pid
+        self.calls = 0
+        self.init_seconds: Optional[float] = None
+        self.last_health_check: Optional[float] = None
+
+
+class ERiCPool:
+    """Fixed number of pre-initialized ERiC processes behind a request queue"""
+
+    def __init__(self, size: int = ERIC_POOL_SIZE, eric_path: Optional[str] = None,
+                 certificate_path: Optional[str] = None, init_latency: Optional[float] = None,
+                 processing_latency: Optional[float] = None, queue_timeout: float = ERIC_POOL_QUEUE_TIMEOUT,
+                 call_timeout: float = ERIC_POOL_CALL_TIMEOUT, health_interval: float = ERIC_POOL_HEALTH_INTERVAL,
+                 ping_timeout: float = ERIC_POOL_PING_TIMEOUT, start_method: str = ERIC_POOL_START_METHOD):
+        """
+        Args:
+            size: Number of worker processes
+            eric_path, certificate_path: Passed to ERiCIntegration.initialize in every worker
+            init_latency, processing_latency: Simulated delays of the mock library (benchmarks)
+            queue_timeout: Seconds a call waits for an idle worker
+            call_timeout: Seconds a worker may take to answer a call
+            health_interval: Seconds between background health checks (0 disables them)
+            ping_timeout: Seconds a worker may take to answer a health check
+            start_method: multiprocessing start method of the workers
+        """
+        self.size = size
+        self.eric_path = eric_path
+        self.certificate_path = certificate_path
+        self.init_latency = init_latency
+        self.processing_latency = processing_latency
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._workers: List[Optional[_Worker]] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+        self._health_thread = None
+        self._counters = {"calls": 0, "errors": 0, "rejected": 0, "restarts": 0, "wait_seconds": 0.0}
+
+    def start(self):
+        """Start and initialize all workers in parallel; no-op if already running"""
+        with self._lock:
+            if self._started:
+                return
+            workers = [self._spawn(index) for index in range(self.size)]
+            self._workers = [self._await_ready(worker) for worker in workers]
+            for worker in self._workers:
+                if worker is not None:
+                    self._idle.put(worker)
+            self._started = True
+            self._stop.clear()
+        if self.health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="eric-pool-health", daemon=True)
+            self._health_thread.start()
+        ready = [worker for worker in self._workers if worker is not None]
+        logger.info(f"ERiC pool started {len(ready)}/{self.size} workers")
+
+    def _spawn(self, index: int) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f"eric-worker-{index}", daemon=True,
+            args=(child_conn, self.eric_path, self.certificate_path, self.init_latency, self.processing_latency),
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn)
+
+    def _await_ready(self, worker: _Worker) -> Optional[_Worker]:
+        """Wait for the worker's ready message; a worker that fails to start is discarded"""
+        try:
+            if worker.conn.poll(self.call_timeout):
+                status, payload = worker.conn.recv()
+                if status == "ready":
+                    worker.init_seconds = payload["init_seconds"]
+                    return worker
+                logger.error(f"ERiC worker {worker.index} failed to initialize: {payload}")
+            else:
+                logger.error(f"ERiC worker {worker.index} did not initialize within {self.call_timeout}s")
+        except (EOFError, OSError) as e:
+            logger.error(f"ERiC worker {worker.index} exited during initialization: {e}")
+        self._kill(worker)
+        return None
+
+    def _kill(self, worker: _Worker):
+        try:
+            worker.conn.close()
+        except OSError:
+            pass
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5)
+
+    def _replace(self, worker: _Worker) -> Optional[_Worker]:
+        """Kill a broken worker and start a fresh one in its slot"""
+        self._kill(worker)
+        replacement = self._await_ready(self._spawn(worker.index))
+        with self._lock:
+            self._workers[worker.index] = replacement
+            self._counters["restarts"] += 1
+        logger.warning(f"ERiC worker {worker.index} (pid {worker.pid}) replaced")
+        return replacement
+
+    def call(self, operation: str, *args, **kwargs) -> Any:
+        """
+        Run an ERiCIntegration operation on an idle worker
+
+        Raises:
+            ERiCPoolBusyError: No worker became idle within the queue timeout
+            ERiCPoolError: The worker broke or did not answer in time
+            ValueError: Raised by the operation (e.g. invalid tax number or XML)
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unsupported ERiC operation: {operation}")
+        self.start()
+        waited = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self._count("rejected")
+            raise ERiCPoolBusyError(f"No ERiC worker available within {self.queue_timeout}s")
+        self._count("wait_seconds", time.perf_counter() - waited)
+
+        healthy: Optional[_Worker] = worker
+        try:
+            worker.conn.send((operation, args, kwargs))
+            if not worker.conn.poll(self.call_timeout):
+                raise TimeoutError(f"no answer within {self.call_timeout}s")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            self._count("errors")
+            healthy = self._replace(worker)
+            raise ERiCPoolError(f"ERiC worker {worker.index} failed during {operation}: {e}")
+        finally:
+            if healthy is not None:
+                self._idle.put(healthy)
+
+        self._count("calls")
+        worker.calls += 1
+        if status == "error":
+            self._count("errors")
+            name, message = payload
+            raise ValueError(message) if name == "ValueError" else ERiCPoolError(f"{name}: {message}")
+        return payload
+
+    def health_check(self) -> Dict[str, int]:
+        """
+        Ping every idle worker and replace those that do not answer; restart empty slots
+
+        Busy workers are skipped; a call that breaks replaces its worker itself.
+
+        Returns:
+            Counts of checked and replaced workers
+        """
+        checked = replaced = 0
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in idle:
+            checked += 1
+            try:
+                worker.conn.send(("ping", (), {}))
+                ok = worker.conn.poll(self.ping_timeout) and worker.conn.recv()[0] == "ok"
+            except (EOFError, OSError):
+                ok = False
+            if ok and worker.process.is_alive():
+                worker.last_health_check = time.time()
+                self._idle.put(worker)
+                continue
+            replaced += 1
+            replacement = self._replace(worker)
+            if replacement is not None:
+                self._idle.put(replacement)
+        # Slots whose worker could not be restarted earlier
+        with self._lock:
+            empty = [index for index, worker in enumerate(self._workers) if worker is None]
+        for index in empty:
+            replacement = self._await_ready(self._spawn(index))
+            if replacement is not None:
+                with self._lock:
+                    self._workers[index] = replacement
+                self._idle.put(replacement)
+                replaced += 1
+        return {"checked": checked, "replaced": replaced}
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.health_check()
+            except Exception as e:
+                logger.error(f"ERiC pool health check failed: {e}")
+
+    def _count(self, counter: str, amount: float = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            workers = list(self._workers)
+        wait = counters.pop("wait_seconds")
+        counters["avg_wait_ms"] = round(wait / max(1, counters["calls"] + counters["errors"]) * 1000, 2)
+        counters["idle"] = self._idle.qsize()
+        counters["workers"] = [
+            None if worker is None else {
+                "pid": worker.pid,
+                "alive": worker.process.is_alive(),
+                "calls": worker.calls,
+                "init_seconds": worker.init_seconds,
+                "last_health_check": worker.last_health_check,
+            }
+            for worker in workers
+        ]
+        return counters
+
+    # ERiCIntegration interface
+
+    def initialize(self, eric_path=None, certificate_path=None):
+        """Start the workers (paths apply to workers started from now on)"""
+        self.eric_path = eric_path or self.eric_path
+        self.certificate_path = certificate_path or self.certificate_path
+        self.start()
+        return True
+
+    def prepare_vat_declaration(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.call("prepare_vat_declaration", *args, **kwargs)
+
+    def submit_declaration(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.call("submit_declaration", *args, **kwargs)
+
+    def check_submission_status(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.call("check_submission_status", *args, **kwargs)
+
+    def cleanup(self):
+        """Stop all workers"""
+        self._stop.set()
+        with self._lock:
+            workers, self._workers = [worker for worker in self._workers if worker is not None], []
+            self._started = False
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for worker in workers:
+            try:
+                worker.conn.send(("stop", (), {}))
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            self._kill(worker)
+
+
+# Initialize a global instance with default configuration
+_eric_pool = None
+_eric_pool_lock = threading.Lock()
+
+def get_eric_pool() -> ERiCPool:
+    """Get or create the global ERiC pool (workers start on first use)"""
+    global _eric_pool
+    if _eric_pool is None:
+        with _eric_pool_lock:
+            if _eric_pool is None:
+                _eric_pool = ERiCPool()
+                atexit.register(_eric_pool.cleanup)
+    return _eric_pool
@@ -1,6 +1,7 @@
 import os
 import google.generativeai as genai
 import logging
+from .model_registry import get_model_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -46,13 +47,17 @@ class GeminiService:
                 logger.error("Gemini API key not configured")
                 return "Error: Gemini API key not configured"
             
-            # Use specified model or default
-            if model_name and model_name != self.model_name:
-                self.model_name = model_name
-                self.model = genai.GenerativeModel(model_name)
+            # Use specified model or default. Other models come from the shared registry
+            # so the default handle is never swapped out under concurrent requests
+            model_name = model_name or self.model_name
+            if model_name == self.model_name:
+                model = self.model
+            else:
+                model = get_model_registry().get("gemini", model_name)
                 
             # Generate response
-            response = self.model.generate_content(prompt)
+            with get_model_registry().inference("gemini", model_name):
+                response = model.generate_content(prompt)
             
             if hasattr(response, 'text'):
                 return response.text
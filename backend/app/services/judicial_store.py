@@ -0,0 +1,250 @@
+"""Local judicial case store loaded from bulk court-register exports.
+
+Cases live in the ``judicial_cases`` table. Lookups are indexed queries:
+  - exact matches of the normalized party name against the token sub-phrases of
+    the queried name use the B-tree index on ``party_name_normalized``;
+  - party names containing the queried name use a trigram index
+    (FTS5 ``trigram`` tokenizer on SQLite, ``pg_trgm`` GIN index on PostgreSQL).
+Results are ordered deterministically and paginated.
+"""
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from datetime import datetime, date
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy import select, func, or_, and_, insert, delete, text
+
+from .sanctions_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+JUDICIAL_PAGE_SIZE = int(os.getenv("JUDICIAL_PAGE_SIZE", "20"))
+JUDICIAL_MAX_PAGE_SIZE = 100
+JUDICIAL_IMPORT_BATCH_SIZE = int(os.getenv("JUDICIAL_IMPORT_BATCH_SIZE", "5000"))
+# How long the "store has data" answer is trusted before asking the database again
+JUDICIAL_STORE_CHECK_INTERVAL = float(os.getenv("JUDICIAL_STORE_CHECK_INTERVAL", "60"))
+
+MAX_PHRASE_TOKENS = 8
+
+
+def token_phrases(normalized: str) -> List[str]:
+    """All contiguous token sub-phrases of a normalized name ("a b c" -> "a b c", "a b", "b c", "a", ...)"""
+    tokens = normalized.split()[:MAX_PHRASE_TOKENS]
+    phrases = []
+    for length in range(len(tokens), 0, -1):
+        for start in range(len(tokens) - length + 1):
+            phrases.append(" ".join(tokens[start:start + length]))
+    return phrases
+
+
+def _parse_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y%m%d"):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def load_case_export(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read a court-register export (CSV or JSONL) with the columns
+    case_number, court, date_filed, description, status, outcome, party_name, country_code
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+class JudicialCaseStore:
+    """Indexed judicial case lookups"""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._has_cases: Optional[bool] = None
+        self._has_cases_checked_at = 0.0
+        self._fts_ready: Optional[bool] = None
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from ..db import get_session_factory
+            self._session_factory = get_session_factory()
+        return self._session_factory
+
+    def _dialect(self, session) -> str:
+        return session.get_bind().dialect.name
+
+    def ensure_search_index(self) -> None:
+        """Create the table and the dialect-specific trigram index if missing"""
+        from ..models import JudicialCase
+        with self.session_factory() as session:
+            JudicialCase.__table__.create(session.get_bind(), checkfirst=True)
+            dialect = self._dialect(session)
+            if dialect == "sqlite":
+                session.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS judicial_cases_fts USING fts5("
+                    "party_name_normalized, content='judicial_cases', tokenize='trigram')"
+                ))
+            elif dialect == "postgresql":
+                session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                session.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_judicial_cases_party_trgm "
+                    "ON judicial_cases USING gin (party_name_normalized gin_trgm_ops)"
+                ))
+            session.commit()
+        self._fts_ready = None
+
+    def import_cases(self, rows: Iterable[Dict[str, Any]], source: str,
+                     batch_size: int = JUDICIAL_IMPORT_BATCH_SIZE) -> int:
+        """
+        Replace all cases of ``source`` with the given export rows (bulk insert in batches)
+
+        Returns:
+            Number of imported cases
+        """
+        from ..models import JudicialCase, _uuid
+        self.ensure_search_index()
+        imported_at = datetime.utcnow()
+        count = 0
+        with self.session_factory() as session:
+            session.execute(delete(JudicialCase).where(JudicialCase.source == source))
+            batch = []
+            for row in rows:
+                party_name = (row.get("party_name") or "").strip()
+                normalized = normalize_name(party_name)
+                if not normalized:
+                    continue
+                batch.append({
+                    "id": _uuid(),
+                    "source": source,
+                    "case_number": (row.get("case_number") or "").strip(),
+                    "court": (row.get("court") or "").strip(),
+                    "date_filed": _parse_date(row.get("date_filed")),
+                    "description": (row.get("description") or "").strip(),
+                    "status": (row.get("status") or "").strip() or None,
+                    "outcome": (row.get("outcome") or "").strip() or None,
+                    "party_name": party_name,
+                    "party_name_normalized": normalized,
+                    "country_code": (row.get("country_code") or "").strip()[:2].upper() or None,
+                    "imported_at": imported_at,
+                })
+                if len(batch) >= batch_size:
+                    session.execute(insert(JudicialCase), batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                session.execute(insert(JudicialCase), batch)
+                count += len(batch)
+            if self._dialect(session) == "sqlite":
+                session.execute(text("INSERT INTO judicial_cases_fts(judicial_cases_fts) VALUES('rebuild')"))
+            session.commit()
+        with self._lock:
+            self._has_cases = None
+        logger.info(f"Imported {count} judicial cases from {source}")
+        return count
+
+    def has_cases(self) -> bool:
+        """Whether the store holds any cases (cached for JUDICIAL_STORE_CHECK_INTERVAL seconds)"""
+        now = time.monotonic()
+        if self._has_cases is not None and now - self._has_cases_checked_at < JUDICIAL_STORE_CHECK_INTERVAL:
+            return self._has_cases
+        from ..models import JudicialCase
+        try:
+            with self.session_factory() as session:
+                has_cases = session.scalar(select(JudicialCase.id).limit(1)) is not None
+        except Exception as e:
+            logger.debug(f"Judicial case store unavailable: {e}")
+            has_cases = False
+        with self._lock:
+            self._has_cases, self._has_cases_checked_at = has_cases, now
+        return has_cases
+
+    def _fts_available(self, session) -> bool:
+        if self._fts_ready is None:
+            self._fts_ready = session.scalar(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'judicial_cases_fts'"
+            )) is not None
+        return self._fts_ready
+
+    def search(self, entity_name: str, country_code: Optional[str] = None, page: int = 1,
+               page_size: int = JUDICIAL_PAGE_SIZE) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Find cases for an entity
+
+        Returns:
+            Tuple of (total number of matching cases, cases on the requested page)
+        """
+        from ..models import JudicialCase
+        normalized = normalize_name(entity_name)
+        if not normalized:
+            return 0, []
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), JUDICIAL_MAX_PAGE_SIZE)
+
+        with self.session_factory() as session:
+            conditions = [JudicialCase.party_name_normalized.in_(token_phrases(normalized))]
+            if len(normalized) >= 3:
+                dialect = self._dialect(session)
+                if dialect == "sqlite" and self._fts_available(session):
+                    conditions.append(text(
+                        "judicial_cases.rowid IN (SELECT rowid FROM judicial_cases_fts "
+                        "WHERE judicial_cases_fts MATCH :fts_query)"
+                    ).bindparams(fts_query='"' + normalized.replace('"', '""') + '"'))
+                else:
+                    # Backed by the pg_trgm GIN index on PostgreSQL
+                    escaped = normalized.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                    conditions.append(JudicialCase.party_name_normalized.like(f"%{escaped}%", escape="\\"))
+            where = or_(*conditions)
+            if country_code:
+                where = and_(where, or_(JudicialCase.country_code == country_code[:2].upper(),
+                                        JudicialCase.country_code.is_(None)))
+
+            total = session.scalar(select(func.count()).select_from(JudicialCase).where(where)) or 0
+            if not total:
+                return 0, []
+            rows = session.scalars(
+                select(JudicialCase)
+                .where(where)
+                .order_by(JudicialCase.date_filed.desc(), JudicialCase.case_number, JudicialCase.id)
+                .limit(page_size)
+                .offset((page - 1) * page_size)
+            ).all()
+
+        return total, [
+            {
+                "case_number": row.case_number,
+                "court": row.court,
+                "date_filed": row.date_filed.isoformat() if row.date_filed else None,
+                "description": row.description,
+                "status": row.status,
+                "outcome": row.outcome,
+                "party_name": row.party_name,
+            }
+            for row in rows
+        ]
+
+
+# Initialize a global instance with default configuration
+_judicial_store = None
+
+def get_judicial_store() -> JudicialCaseStore:
+    """Get or create the global judicial case store"""
+    global _judicial_store
+    if _judicial_store is None:
+        _judicial_store = JudicialCaseStore()
+    return _judicial_store
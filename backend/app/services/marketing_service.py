@@ -1,6 +1,7 @@
 import os
 import logging
 from .model_service import ModelService
+from .model_gateway import get_model_gateway
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -42,17 +43,11 @@ def generate_marketing_content(topic, platform, tone="professional", length="med
             "keywords": keywords or []
         }
         
-        response = requests.post(
+        return get_model_gateway().post(
+            "marketing",
             f"{ModelService.get_model_by_module('marketing')}/generate_content",
-            json=data,
-            headers={"Content-Type": "application/json"}
+            data
         )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error(f"Error from marketing content generation: {response.status_code} - {response.text}")
-            raise Exception(f"Marketing service error: {response.status_code}")
     
     except Exception as e:
         logger.error(f"Error generating marketing content: {e}")
@@ -1,25 +1,43 @@
 """ELSTER integration service using a mock ERiC library."""
 
 import os
+import time
 import logging
+import threading
 import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+from decimal import Decimal
+
+from .elster_xml import declaration_xml, validate_xml
+from .vat_totals import TOTAL_FIELDS, totals_from_transactions
 
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
 
+# Имитация задержек настоящей ERiC (секунды): загрузка библиотеки и сертификата,
+# каждый шаг обработки (XML, проверка, шифрование, отправка, статус)
+MOCK_ERIC_INIT_LATENCY = float(os.getenv("MOCK_ERIC_INIT_LATENCY", "0"))
+MOCK_ERIC_PROCESSING_LATENCY = float(os.getenv("MOCK_ERIC_PROCESSING_LATENCY", "0"))
+
 class MockERiCLibrary:
     """
     Заглушка для ERiC-библиотеки, имитирующая основные функции.
     Может использоваться для разработки и тестирования до получения доступа к настоящей ERiC.
     """
     
-    def __init__(self):
+    def __init__(self, init_latency=None, processing_latency=None):
         """Инициализация библиотеки."""
         self.initialized = False
         self.certificate_path = None
         self.eric_path = None
+        self.init_latency = MOCK_ERIC_INIT_LATENCY if init_latency is None else init_latency
+        self.processing_latency = MOCK_ERIC_PROCESSING_LATENCY if processing_latency is None else processing_latency
+        
+    def _process(self):
+        """Имитация времени обработки одного шага"""
+        if self.processing_latency:
+            time.sleep(self.processing_latency)
         
     def initialize(self, eric_path=None, certificate_path=None):
         """
@@ -29,12 +47,20 @@ class MockERiCLibrary:
             eric_path: Путь к директории с ERiC
             certificate_path: Путь к сертификату ELSTER
         """
-        self.eric_path = eric_path or os.environ.get("ERIC_PATH", "/opt/eric")
-        self.certificate_path = certificate_path or os.environ.get("ELSTER_CERT_PATH")
+        eric_path = eric_path or os.environ.get("ERIC_PATH", "/opt/eric")
+        certificate_path = certificate_path or os.environ.get("ELSTER_CERT_PATH")
+        # Повторная инициализация с теми же путями ничего не делает
+        if self.initialized and (eric_path, certificate_path) == (self.eric_path, self.certificate_path):
+            return True
+        self.eric_path = eric_path
+        self.certificate_path = certificate_path
         
         if not self.certificate_path:
             logger.warning("ELSTER_CERT_PATH not set. Using simulated mode.")
-            
+        
+        # Загрузка библиотеки и сертификата
+        if self.init_latency:
+            time.sleep(self.init_latency)
         self.initialized = True
         logger.info(f"MockERiC initialized with eric_path={self.eric_path}, cert_path={self.certificate_path}")
         return True
@@ -66,29 +92,10 @@ class MockERiCLibrary:
         Returns:
             XML-документ в виде строки
         """
-        # В реальности ERiC создает сложный XML по спецификации ELSTER
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-        <Elster xmlns="http://www.elster.de/elsterxml/schema/v11">
-            <TransferHeader version="11">
-                <Verfahren>ElsterAnmeldung</Verfahren>
-                <DatenArt>{document_type}</DatenArt>
-                <Vorgang>send-DIRECT</Vorgang>
-                <TransferId>{uuid.uuid4()}</TransferId>
-                <TransferVersion>1</TransferVersion>
-            </TransferHeader>
-            <DatenTeil>
-                <!-- Здесь были бы реальные данные -->
-                <Nutzdatenblock>
-                    <NutzdatenHeader version="11">
-                        <NutzdatenTicket>{data.get('submission_id')}</NutzdatenTicket>
-                        <Empfaenger id="F">9999</Empfaenger>
-                    </NutzdatenHeader>
-                    <Nutzdaten>
-                        <Summe>{data.get('totals', {}).get('net_tax', 0)}</Summe>
-                    </Nutzdaten>
-                </Nutzdatenblock>
-            </DatenTeil>
-        </Elster>"""
+        # В реальности ERiC создает сложный XML по спецификации ELSTER;
+        # документ собирается потоковым writer'ом (для архива — сразу в файл)
+        self._process()
+        return declaration_xml(document_type, data)
     
     def validate_xml(self, xml_data: str) -> Dict[str, Any]:
         """
@@ -100,11 +107,9 @@ class MockERiCLibrary:
         Returns:
             Результат проверки
         """
-        # В реальности ERiC проверяет XML на соответствие схеме
-        if "<?xml" in xml_data and "<Elster" in xml_data:
-            return {"valid": True}
-        else:
-            return {"valid": False, "errors": ["Invalid XML format"]}
+        # Проверка по XSD; скомпилированная схема кешируется
+        self._process()
+        return validate_xml(xml_data)
             
     def encrypt_and_sign(self, xml_data: str) -> Dict[str, Any]:
         """
@@ -117,6 +122,7 @@ class MockERiCLibrary:
             Зашифрованный и подписанный документ
         """
         # В реальности ERiC шифрует и подписывает XML
+        self._process()
         return {
             "success": True,
             "encrypted_data": f"ENCRYPTED_{uuid.uuid4()}",
@@ -134,6 +140,7 @@ class MockERiCLibrary:
             Результат отправки
         """
         # В реальности ERiC отправляет данные через API ELSTER
+        self._process()
         transfer_ticket = f"ERIC-{uuid.uuid4()}"
         
         return {
@@ -155,6 +162,7 @@ class MockERiCLibrary:
         """
         # В реальности ERiC запрашивает статус у ELSTER
         # Для имитации используем псевдослучайный выбор статуса
+        self._process()
         import random
         statuses = ["processing", "accepted", "error"]
         status = random.choice(statuses)
@@ -174,6 +182,9 @@ class MockERiCLibrary:
 
 # Создаем глобальный экземпляр заглушки
 mock_eric = MockERiCLibrary()
+# ERiC не потокобезопасна: в одном процессе вызовы идут по очереди,
+# параллельная обработка — через пул процессов (eric_pool.ERiCPool)
+_eric_lock = threading.RLock()
 
 # Класс для интеграции с ERiC в приложении
 class ERiCIntegration:
@@ -191,13 +202,15 @@ class ERiCIntegration:
             eric_path: Путь к директории с ERiC
             certificate_path: Путь к сертификату ELSTER
         """
-        return mock_eric.initialize(eric_path, certificate_path)
+        with _eric_lock:
+            return mock_eric.initialize(eric_path, certificate_path)
     
     @classmethod
     def prepare_vat_declaration(cls, 
-                              transactions: List[Dict[str, Any]], 
+                              transactions: Optional[List[Dict[str, Any]]], 
                               tax_id: str, 
-                              period: str) -> Dict[str, Any]:
+                              period: str,
+                              totals: Optional[Dict[str, Decimal]] = None) -> Dict[str, Any]:
         """
         Подготовка декларации по НДС (Umsatzsteuervoranmeldung).
         
@@ -205,12 +218,15 @@ class ERiCIntegration:
             transactions: Список транзакций с суммами и информацией о налогах
             tax_id: Налоговый номер пользователя
             period: Период декларации (например, 'Q2 2024')
+            totals: Итоги, уже посчитанные базой данных (vat_totals.aggregate_vat_totals);
+                тогда транзакции не нужны
             
         Returns:
             Подготовленные данные декларации
         """
         # Проверяем налоговый номер
-        tax_validation = mock_eric.validate_tax_number(tax_id)
+        with _eric_lock:
+            tax_validation = mock_eric.validate_tax_number(tax_id)
         if not tax_validation["valid"]:
             raise ValueError(f"Invalid tax number: {tax_id}")
         
@@ -218,18 +234,9 @@ class ERiCIntegration:
         # и соответствующего временного диапазона
         period_info = cls._parse_period(period)
         
-        # Вычисляем итоги из транзакций
-        total_revenue = sum(tx["amount"] for tx in transactions if tx["amount"] > 0)
-        total_tax_collected = sum(tx["tax_amount"] for tx in transactions 
-                              if tx["amount"] > 0 and tx.get("tax_amount"))
-        
-        total_expenses = abs(sum(tx["amount"] for tx in transactions 
-                              if tx["amount"] < 0 and tx.get("is_expense_claimed")))
-        total_tax_paid = sum(tx.get("tax_amount", 0) for tx in transactions 
-                           if tx["amount"] < 0 and tx.get("is_expense_claimed"))
-        
-        # Чистый налог к уплате или возмещению
-        net_tax = total_tax_collected - total_tax_paid
+        # Вычисляем итоги из транзакций (чистый налог — к уплате или возмещению)
+        if totals is None:
+            totals = totals_from_transactions(transactions or [])
         
         # Готовим структуру данных для декларации
         declaration_data = {
@@ -242,20 +249,15 @@ class ERiCIntegration:
             "tax_id": tax_id,
             "submission_id": str(uuid.uuid4()),
             "timestamp": datetime.utcnow().isoformat(),
-            "totals": {
-                "revenue": total_revenue,
-                "tax_collected": total_tax_collected,
-                "expenses": total_expenses,
-                "tax_paid": total_tax_paid,
-                "net_tax": net_tax
-            }
+            "totals": {field: totals[field] for field in TOTAL_FIELDS}
         }
         
         # Создаем XML-документ
-        xml_data = mock_eric.create_xml_document("UStVA", declaration_data)
-        
-        # Проверяем XML
-        validation = mock_eric.validate_xml(xml_data)
+        with _eric_lock:
+            xml_data = mock_eric.create_xml_document("UStVA", declaration_data)
+            
+            # Проверяем XML
+            validation = mock_eric.validate_xml(xml_data)
         if not validation["valid"]:
             raise ValueError(f"Invalid XML: {validation['errors']}")
         
@@ -281,12 +283,13 @@ class ERiCIntegration:
             raise ValueError("XML data is missing in declaration")
         
         # Шифруем и подписываем данные
-        encrypted = mock_eric.encrypt_and_sign(xml_data)
-        if not encrypted["success"]:
-            raise RuntimeError("Failed to encrypt and sign declaration")
-        
-        # Отправляем данные
-        result = mock_eric.send_data(encrypted["encrypted_data"])
+        with _eric_lock:
+            encrypted = mock_eric.encrypt_and_sign(xml_data)
+            if not encrypted["success"]:
+                raise RuntimeError("Failed to encrypt and sign declaration")
+            
+            # Отправляем данные
+            result = mock_eric.send_data(encrypted["encrypted_data"])
         
         # Возвращаем результат
         return {
@@ -308,7 +311,8 @@ class ERiCIntegration:
         Returns:
             Информация о статусе
         """
-        return mock_eric.check_status(transfer_ticket)
+        with _eric_lock:
+            return mock_eric.check_status(transfer_ticket)
     
     @classmethod
     def _parse_period(cls, period: str) -> Dict[str, Any]:
@@ -354,4 +358,5 @@ class ERiCIntegration:
     @classmethod
     def cleanup(cls):
         """Очистка ресурсов библиотеки."""
-        mock_eric.cleanup()
+        with _eric_lock:
+            mock_eric.cleanup()
@@ -1,28 +1,33 @@
 import os
 import json
+import time
 import google.generativeai as genai
-from openai import OpenAI
 from flask import current_app
 from ..models import ModuleEnum
+from .model_registry import get_model_registry
+from .response_cache import get_response_cache
+from .context_builder import ContextBuilder, CONTEXT_TOKEN_BUDGET
+from .provider_router import STREAM, get_provider_router
+from .usage_ledger import get_usage_ledger, current_scope, gemini_usage, openai_usage
 
 # Настройка API-ключей
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
-# Инициализация клиентов
+# Gemini настраивается один раз: повторный configure сбрасывает клиентов и их соединения
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-# Принудительно инициализируем только с api_key
-try:
-    if OPENAI_API_KEY:
-        # Используем только параметр api_key для совместимости с v1.20.0
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    else:
-        openai_client = None
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    openai_client = None
+# Ответ пользователю, если ни одна модель не смогла сгенерировать ответ
+ERROR_REPLY = "Es tut mir leid, ich konnte keine Antwort generieren. Bitte versuchen Sie es später erneut."
+
+# Промпт для краткого содержания старой части переписки
+SUMMARY_PROMPT = f"""
+You maintain a running summary of a conversation between a user and an AI assistant.
+Merge the previous summary (if any) with the new messages into one updated summary.
+Keep facts, figures, names, decisions and open questions; drop small talk.
+Write at most {CONTEXT_TOKEN_BUDGET // 8} words in the language of the conversation.
+"""
 
 # Базовые промпты для каждого модуля
 MODULE_PROMPTS = {
@@ -90,7 +95,18 @@ MODULE_PROMPTS = {
 class ModelContextManager:
     """Manages AI model contexts for different modules"""
     
-    def __init__(self):
+    def __init__(self, registry=None, response_cache=None, context_builder=None, router=None, usage_ledger=None):
+        # Общие для всех потоков экземпляры моделей и клиентов провайдеров
+        self.registry = registry or get_model_registry()
+        # Выбор провайдера по задержкам и доле ошибок
+        self.router = router or get_provider_router()
+        # Учет токенов и задержек каждого вызова
+        self.usage_ledger = usage_ledger or get_usage_ledger()
+        # Кэш ответов на повторяющиеся вопросы
+        self.response_cache = response_cache or get_response_cache()
+        # Контекст переписки в пределах бюджета токенов, старые сообщения - в кратком содержании
+        self.context_builder = context_builder or ContextBuilder(summarizer=self.summarize_conversation)
+        
         # Конфигурация моделей (можно сохранить в БД)
         self.model_configs = {
             "gemini": {
@@ -110,6 +126,21 @@ class ModelContextManager:
         # Активная модель по умолчанию
         self.default_model = "gemini" if GEMINI_API_KEY else "openai"
     
+    def warm_up(self):
+        """Заранее создает экземпляры моделей для всех модулей у доступных провайдеров"""
+        specs = []
+        for model_type, available in (("gemini", GEMINI_API_KEY), ("openai", OPENAI_API_KEY)):
+            if available:
+                specs.extend(
+                    (model_type, config.get("model"), self._generation_config(config))
+                    for config in self.model_configs[model_type].values()
+                )
+        return self.registry.warm_up(specs)
+    
+    def _generation_config(self, config):
+        """Параметры генерации, с которыми создается экземпляр модели"""
+        return {"temperature": config.get("temperature", 0.4)}
+    
     def get_module_prompt(self, module_enum):
         """Получить базовый промпт для модуля"""
         return MODULE_PROMPTS.get(module_enum, "You are a helpful AI assistant.")
@@ -125,106 +156,259 @@ class ModelContextManager:
             self.model_configs[model_type].get(ModuleEnum.accounting)  # fallback
         )
     
-    def get_module_context(self, session, thread_id, limit=10):
-        """Получить контекст переписки для модуля"""
-        from ..models import Message
-        
-        # Получаем последние сообщения для этого потока
-        messages = (
-            session.query(Message)
-            .filter(Message.thread_id == thread_id)
-            .order_by(Message.created_at.desc())
-            .limit(limit)
-            .all()
-        )
+    def get_provider_candidates(self, module_enum):
+        """Пары (провайдер, модель), доступные для модуля; провайдер по умолчанию первым"""
+        available = [model_type for model_type, key in (("gemini", GEMINI_API_KEY), ("openai", OPENAI_API_KEY)) if key]
+        available.sort(key=lambda model_type: model_type != self.default_model)
+        return [(model_type, self.get_model_config(module_enum, model_type).get("model")) for model_type in available]
+    
+    def get_module_context(self, session, thread_id, token_budget=None):
+        """Получить контекст переписки для модуля в пределах бюджета токенов"""
+        return self.context_builder.build(session, thread_id, token_budget)
+    
+    def summarize_conversation(self, previous_summary, messages):
+        """Дополняет краткое содержание переписки более старыми сообщениями (вызывается в фоне)"""
+        lines = [f"Previous summary: {previous_summary}"] if previous_summary else []
+        lines.extend(f"{'User' if msg['role'] == 'user' else 'AI'}: {msg['content']}" for msg in messages)
+        prompt = "\n".join(lines)
         
-        # Разворачиваем список сообщений в хронологическом порядке
-        context = [{"role": msg.role, "content": msg.content} for msg in reversed(messages)]
-        return context
+        def call(model_type, model):
+            config = dict(self.get_model_config(ModuleEnum.accounting, model_type), temperature=0.0)
+            return self._generate(model_type, SUMMARY_PROMPT, prompt, None, config, usage={"source": "summary"})
+        
+        _, _, text = self.router.call(self.get_provider_candidates(ModuleEnum.accounting), call)
+        return text
     
-    def generate_response(self, module_enum, message, context=None, model_type=None):
-        """Генерирует ответ на основе модуля и контекста"""
-        model_type = model_type or self.default_model
+    def generate_response(self, module_enum, message, context=None, model_type=None, personalized=False):
+        """
+        Генерирует ответ на основе модуля и контекста.
+        Провайдер выбирает маршрутизатор: явно указанный model_type первым, пока он исправен,
+        иначе самый быстрый из исправных.
+        Повторные вопросы отдаются из кэша ответов; personalized=True обходит кэш.
+        """
+        # Пользователь определяется здесь: провайдер может вызываться в другом потоке
+        usage = {"user_id": current_scope()[0], "module": module_enum.value}
+        cached, cache_key = self.response_cache.lookup(module_enum, model_type or self.default_model, message,
+                                                       context, personalized)
+        if cached is not None:
+            self._record_cache_hit(module_enum, model_type, usage)
+            return cached
+        if model_type:
+            self.get_model_config(module_enum, model_type)  # проверка типа модели
+        
         module_prompt = self.get_module_prompt(module_enum)
-        model_config = self.get_model_config(module_enum, model_type)
+        
+        def call(provider, model):
+            return self._generate(provider, module_prompt, message, context,
+                                  self.get_model_config(module_enum, provider), usage=usage)
         
         try:
-            if model_type == "gemini" and GEMINI_API_KEY:
-                return self._generate_gemini_response(module_prompt, message, context, model_config)
-            elif model_type == "openai" and OPENAI_API_KEY:
-                return self._generate_openai_response(module_prompt, message, context, model_config)
-            else:
-                raise ValueError(f"Model type {model_type} not available with current API keys")
+            # Самый быстрый из исправных провайдеров, при ошибке - следующий
+            _, _, text = self.router.call(self.get_provider_candidates(module_enum), call, preferred=model_type)
         except Exception as e:
             current_app.logger.error(f"Error generating response: {e}")
-            # Fallback to the other model if available
-            fallback_model = "openai" if model_type == "gemini" and OPENAI_API_KEY else "gemini" if GEMINI_API_KEY else None
-            if fallback_model:
-                try:
-                    current_app.logger.info(f"Falling back to {fallback_model}")
-                    return self.generate_response(module_enum, message, context, fallback_model)
-                except:
-                    pass
-            return "Es tut mir leid, ich konnte keine Antwort generieren. Bitte versuchen Sie es später erneut."
+            return ERROR_REPLY
+        self.response_cache.store(cache_key, text)
+        return text
     
-    def _generate_gemini_response(self, system_prompt, message, context, config):
-        """Генерирует ответ с помощью Gemini"""
-        model = genai.GenerativeModel(
-            model_name=config.get("model", "gemini-pro"), 
-            generation_config={"temperature": config.get("temperature", 0.4)}
-        )
+    def stream_response(self, module_enum, message, context=None, model_type=None, personalized=False,
+                        allow_fallback=True):
+        """Генерирует ответ по частям, отдавая каждый фрагмент сразу по мере поступления от провайдера"""
+        usage = {"user_id": current_scope()[0], "module": module_enum.value}
+        cached, cache_key = self.response_cache.lookup(module_enum, model_type or self.default_model, message,
+                                                       context, personalized)
+        if cached is not None:
+            self._record_cache_hit(module_enum, model_type, usage)
+            yield cached
+            return
+        if model_type:
+            self.get_model_config(module_enum, model_type)  # проверка типа модели
+        
+        module_prompt = self.get_module_prompt(module_enum)
+        candidates = self.router.rank(self.get_provider_candidates(module_enum), preferred=model_type, kind=STREAM)
+        if not allow_fallback:
+            candidates = candidates[:1]
+        
+        def open_stream(provider, model):
+            model_config = self.get_model_config(module_enum, provider)
+            started = time.perf_counter()
+            parts = []
+            try:
+                if provider == "gemini":
+                    chunks = self._stream_gemini_response(module_prompt, message, context, model_config)
+                else:
+                    chunks = self._stream_openai_response(module_prompt, message, context, model_config)
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+            except Exception:
+                self._record_usage(provider, model, started, usage, ok=False)
+                raise
+            self._record_usage(provider, model, started, usage, prompt=self._prompt_text(
+                module_prompt, message, context), completion="".join(parts))
+        
+        try:
+            # Маршрутизатор выбирает провайдера по времени до первого фрагмента (TTFB) и
+            # переключается на следующего, пока ни один фрагмент еще не отправлен
+            provider, model, chunks = self.router.stream(candidates, open_stream, preferred=model_type)
+        except Exception as e:
+            current_app.logger.error(f"Error streaming response: {e}")
+            yield ERROR_REPLY
+            return
         
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            current_app.logger.error(f"Error streaming response from {provider}: {e}")
+            self.router.record(provider, model, None, ok=False, kind=STREAM)
+            # Часть ответа уже отправлена клиенту, переключаться на другую модель поздно
+            yield "\n\n" + ERROR_REPLY
+            return
+        # Кэшируем только полностью полученный ответ
+        self.response_cache.store(cache_key, "".join(parts))
+    
+    def _build_gemini_prompt(self, system_prompt, message, context):
+        """Собирает промпт для Gemini из системного промпта, контекста и сообщения"""
         prompt_parts = [system_prompt]
         
         # Добавляем контекст, если он есть
         if context:
             for msg in context:
-                if msg["role"] == "user":
+                if msg["role"] == "summary":
+                    prompt_parts.append(f"Summary of the earlier conversation: {msg['content']}")
+                elif msg["role"] == "user":
                     prompt_parts.append(f"User: {msg['content']}")
                 elif msg["role"] == "ai":
                     prompt_parts.append(f"AI: {msg['content']}")
         
         # Добавляем текущее сообщение
         prompt_parts.append(f"User: {message}\nAI: ")
-        
-        response = model.generate_content(prompt_parts)
-        return response.text
+        return prompt_parts
     
-    def _generate_openai_response(self, system_prompt, message, context, config):
-        """Генерирует ответ с помощью OpenAI"""
-        if not openai_client:
-            raise ValueError("OpenAI client not configured")
-            
+    def _build_openai_messages(self, system_prompt, message, context):
+        """Собирает список сообщений для OpenAI из системного промпта, контекста и сообщения"""
         messages = [{"role": "system", "content": system_prompt}]
         
         # Добавляем контекст, если он есть
         if context:
             for msg in context:
-                if msg["role"] == "user":
+                if msg["role"] == "summary":
+                    messages.append({"role": "system", "content": f"Summary of the earlier conversation: {msg['content']}"})
+                elif msg["role"] == "user":
                     messages.append({"role": "user", "content": msg["content"]})
                 elif msg["role"] == "ai":
                     messages.append({"role": "assistant", "content": msg["content"]})
         
         # Добавляем текущее сообщение
         messages.append({"role": "user", "content": message})
+        return messages
+    
+    def _gemini_model(self, config):
+        """Экземпляр модели Gemini из общего реестра"""
+        return self.registry.get("gemini", config.get("model", "gemini-pro"), self._generation_config(config))
+    
+    def _openai_model(self, config):
+        """Вызов chat.completions общего клиента OpenAI с параметрами модели"""
+        return self.registry.get("openai", config.get("model", "gpt-4o"), self._generation_config(config))
+    
+    def _generate(self, provider, system_prompt, message, context, config, usage=None):
+        """Генерирует ответ у указанного провайдера и записывает расход токенов в журнал"""
+        started = time.perf_counter()
+        try:
+            if provider == "gemini":
+                text, tokens = self._generate_gemini_response(system_prompt, message, context, config)
+            else:
+                text, tokens = self._generate_openai_response(system_prompt, message, context, config)
+        except Exception:
+            self._record_usage(provider, config.get("model"), started, usage, ok=False)
+            raise
+        self._record_usage(provider, config.get("model"), started, usage, tokens,
+                           prompt=self._prompt_text(system_prompt, message, context), completion=text)
+        return text
+    
+    def _prompt_text(self, system_prompt, message, context):
+        """Весь текст промпта (для оценки токенов, если провайдер их не сообщил)"""
+        return "\n".join([system_prompt, *(msg["content"] for msg in context or []), message])
+    
+    def _record_usage(self, provider, model, started, usage=None, tokens=None, prompt="", completion="", ok=True):
+        """Запись вызова в журнал расхода; без данных провайдера токены оцениваются по тексту"""
+        usage = dict(usage or {})
+        usage.setdefault("source", "context_manager")
+        self.usage_ledger.record_call(provider, model, started, tokens, prompt, completion, ok=ok, **usage)
+    
+    def _record_cache_hit(self, module_enum, model_type, usage):
+        model_type = model_type or self.default_model
+        self.usage_ledger.record(provider=model_type, model=self.get_model_config(module_enum, model_type).get("model"),
+                                 cache_hit=True, source="context_manager", **usage)
+    
+    def _generate_gemini_response(self, system_prompt, message, context, config):
+        """Генерирует ответ с помощью Gemini; возвращает текст и (prompt, completion) токены"""
+        model = self._gemini_model(config)
+        with self.registry.inference("gemini", config.get("model", "gemini-pro")):
+            response = model.generate_content(self._build_gemini_prompt(system_prompt, message, context))
+            return response.text, gemini_usage(response)
+    
+    def _stream_gemini_response(self, system_prompt, message, context, config):
+        """Потоковая генерация ответа с помощью Gemini"""
+        model = self._gemini_model(config)
+        with self.registry.inference("gemini", config.get("model", "gemini-pro")):
+            response = model.generate_content(
+                self._build_gemini_prompt(system_prompt, message, context),
+                stream=True
+            )
+            for chunk in response:
+                # Фрагменты без текста (например, только с метаданными безопасности) пропускаем
+                if chunk.parts:
+                    yield chunk.text
+    
+    def _generate_openai_response(self, system_prompt, message, context, config):
+        """Генерирует ответ с помощью OpenAI; возвращает текст и (prompt, completion) токены"""
+        create = self._openai_model(config)
+        with self.registry.inference("openai", config.get("model", "gpt-4o")):
+            response = create(messages=self._build_openai_messages(system_prompt, message, context))
         
-        response = openai_client.chat.completions.create(
-            model=config.get("model", "gpt-4o"),
-            messages=messages,
-            temperature=config.get("temperature", 0.4)
-        )
-        
-        return response.choices[0].message.content
+        return response.choices[0].message.content, openai_usage(response)
+    
+    def _stream_openai_response(self, system_prompt, message, context, config):
+        """Потоковая генерация ответа с помощью OpenAI"""
+        create = self._openai_model(config)
+        with self.registry.inference("openai", config.get("model", "gpt-4o")):
+            stream = create(messages=self._build_openai_messages(system_prompt, message, context), stream=True)
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Закрываем HTTP-соединение, если клиент отключился посреди ответа
+                stream.close()
 
 # Создаем экземпляр менеджера контекстов
 model_manager = ModelContextManager()
 
-def generate_module_response(module_enum, message, thread_id=None, session=None, model_type=None):
+def generate_module_response(module_enum, message, thread_id=None, session=None, model_type=None,
+                             personalized=False):
+    """
+    Публичная функция для генерации ответа с учетом модуля и контекста.
+    personalized=True - запрос содержит данные пользователя и не кэшируется.
+    """
+    context = None
+    if thread_id and session:
+        context = model_manager.get_module_context(session, thread_id)
+    
+    return model_manager.generate_response(module_enum, message, context, model_type, personalized)
+
+
+def stream_module_response(module_enum, message, thread_id=None, session=None, model_type=None,
+                           personalized=False):
     """
-    Публичная функция для генерации ответа с учетом модуля и контекста
+    Потоковый вариант generate_module_response: возвращает генератор фрагментов ответа.
+    Контекст загружается сразу, поэтому сессию можно закрыть до начала стриминга.
     """
     context = None
     if thread_id and session:
         context = model_manager.get_module_context(session, thread_id)
     
-    return model_manager.generate_response(module_enum, message, context, model_type)
+    return model_manager.stream_response(module_enum, message, context, model_type, personalized)
@@ -0,0 +1,352 @@
+"""HTTP gateway to the module model containers.
+
+Every container gets its own keep-alive ``requests.Session`` with a connection
+pool, so chat turns reuse TCP connections instead of opening a new one per
+call. Calls have connect/read timeouts and a bounded number of concurrent
+requests per module; a container that hangs or is saturated fails fast
+instead of tying up Flask workers. Transient failures are retried with
+jittered backoff. With MODEL_GATEWAY_HEDGING enabled, a request that is
+slower than the module's recent p95 is hedged with a second request, and
+whichever answers first wins. Hedging is off by default: the container chat
+and extraction endpoints run paid LLM calls, so a hedge doubles their cost.
+Enable it globally only for cheap containers, or per call with hedge=True
+for endpoints where a duplicate request is harmless. Per-module
+latency histograms are kept for monitoring. Streaming endpoints are read as
+NDJSON events while they arrive; their time to first event is tracked
+separately from full-call latency.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+MODEL_GATEWAY_CONNECT_TIMEOUT = float(os.getenv("MODEL_GATEWAY_CONNECT_TIMEOUT", "3"))
+MODEL_GATEWAY_READ_TIMEOUT = float(os.getenv("MODEL_GATEWAY_READ_TIMEOUT", "60"))
+# Concurrent requests per module; further calls wait up to MODEL_GATEWAY_QUEUE_TIMEOUT for a slot
+MODEL_GATEWAY_MAX_CONCURRENCY = int(os.getenv("MODEL_GATEWAY_MAX_CONCURRENCY", "8"))
+MODEL_GATEWAY_QUEUE_TIMEOUT = float(os.getenv("MODEL_GATEWAY_QUEUE_TIMEOUT", "5"))
+MODEL_GATEWAY_RETRIES = int(os.getenv("MODEL_GATEWAY_RETRIES", "2"))
+MODEL_GATEWAY_BACKOFF = float(os.getenv("MODEL_GATEWAY_BACKOFF", "0.2"))
+# Hedge a request once it is slower than the module's p95 (but never before the minimum delay);
+# a hedge is a second paid model call, so it is off unless enabled
+MODEL_GATEWAY_HEDGING = os.getenv("MODEL_GATEWAY_HEDGING", "false").lower() == "true"
+MODEL_GATEWAY_HEDGE_MIN_DELAY = float(os.getenv("MODEL_GATEWAY_HEDGE_MIN_DELAY", "2"))
+# Observations needed before the p95 is trusted for hedging
+MODEL_GATEWAY_HEDGE_MIN_SAMPLES = 20
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, float("inf"))
+RETRYABLE_STATUS = frozenset([429, 502, 503, 504])
+
+
+class GatewayError(Exception):
+    """A model container call failed"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class GatewayBusyError(GatewayError):
+    """No free request slot for the module within the queue timeout"""
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-quantile (None without data)"""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {"count": self.total, "sum": round(self.sum, 4), "buckets": buckets}
+
+
+class ModelGateway:
+    """Pooled, bounded, retrying and hedging client for the model containers"""
+
+    def __init__(self, connect_timeout: float = MODEL_GATEWAY_CONNECT_TIMEOUT,
+                 read_timeout: float = MODEL_GATEWAY_READ_TIMEOUT,
+                 max_concurrency: int = MODEL_GATEWAY_MAX_CONCURRENCY,
+                 queue_timeout: float = MODEL_GATEWAY_QUEUE_TIMEOUT,
+                 retries: int = MODEL_GATEWAY_RETRIES, backoff: float = MODEL_GATEWAY_BACKOFF,
+                 hedging: bool = MODEL_GATEWAY_HEDGING, hedge_min_delay: float = MODEL_GATEWAY_HEDGE_MIN_DELAY,
+                 session_factory=requests.Session):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self._session_factory = session_factory
+        self._sessions: Dict[str, requests.Session] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._ttfb: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _module_state(self, module: str):
+        """Session, slot semaphore and histogram of a module, created on first use"""
+        session = self._sessions.get(module)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(module)
+                if session is None:
+                    session = self._session_factory()
+                    # One pool per container; room for hedged requests on top of the slots
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency * 2)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update({"Content-Type": "application/json"})
+                    self._slots[module] = threading.BoundedSemaphore(self.max_concurrency)
+                    self._histograms[module] = LatencyHistogram()
+                    self._ttfb[module] = LatencyHistogram()
+                    self._counters[module] = {"calls": 0, "streams": 0, "errors": 0, "retries": 0, "hedges": 0,
+                                              "hedge_wins": 0, "rejected": 0}
+                    self._sessions[module] = session
+        return session, self._slots[module], self._histograms[module]
+
+    def post(self, module: str, url: str, payload: Dict[str, Any], timeout: Optional[float] = None,
+             hedge: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        POST JSON to a module container and return the decoded JSON answer
+
+        Args:
+            module: Module name (selects pool, concurrency limit and histogram)
+            url: Full endpoint URL
+            payload: JSON body
+            timeout: Read timeout overriding the default
+            hedge: Override hedging for this call (only for idempotent endpoints)
+
+        Raises:
+            GatewayBusyError: No request slot became free in time
+            GatewayError: The container failed after all retries
+        """
+        _, _, histogram = self._module_state(module)
+        self._count(module, "calls")
+        hedge = self.hedging if hedge is None else hedge
+        started = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    if hedge:
+                        result = self._hedged(module, url, payload, timeout)
+                    else:
+                        result = self._attempt(module, url, payload, timeout)
+                    histogram.observe(time.perf_counter() - started)
+                    return result
+                except GatewayError as e:
+                    if not e.retryable or attempt >= self.retries:
+                        raise
+                    attempt += 1
+                    self._count(module, "retries")
+                    # Full jitter keeps retries of concurrent callers apart
+                    time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        except GatewayError as e:
+            self._count(module, "rejected" if isinstance(e, GatewayBusyError) else "errors")
+            raise
+
+    def stream(self, module: str, url: str, payload: Dict[str, Any],
+               timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        POST JSON to a streaming (NDJSON) endpoint and yield its events as they arrive
+
+        Failures before the response starts are retried like ``post``; once events
+        flow, an interrupted stream raises. The request slot is held until the
+        stream is consumed or closed. Streams are never hedged.
+
+        Raises:
+            GatewayBusyError: No request slot became free in time
+            GatewayError: The container failed or the stream broke off
+        """
+        _, slots, _ = self._module_state(module)
+        self._count(module, "streams")
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = self._open_stream(module, url, payload, timeout)
+                break
+            except GatewayError as e:
+                if not e.retryable or attempt >= self.retries:
+                    self._count(module, "rejected" if isinstance(e, GatewayBusyError) else "errors")
+                    raise
+                attempt += 1
+                self._count(module, "retries")
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        first = True
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                if first:
+                    self._ttfb[module].observe(time.perf_counter() - started)
+                    first = False
+                yield json.loads(line)
+            self._histograms[module].observe(time.perf_counter() - started)
+        except requests.RequestException as e:
+            self._count(module, "errors")
+            raise GatewayError(f"Stream from model service {module} interrupted: {e}") from e
+        finally:
+            response.close()
+            slots.release()
+
+    def _open_stream(self, module: str, url: str, payload: Dict[str, Any], timeout: Optional[float]):
+        """Start a streaming request; on success the caller owns the acquired slot"""
+        session, slots, _ = self._module_state(module)
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise GatewayBusyError(f"No free request slot for module {module}", retryable=False)
+        try:
+            response = session.post(url, json=payload, stream=True,
+                                    timeout=(self.connect_timeout, timeout or self.read_timeout))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            slots.release()
+            raise GatewayError(f"Model service {module} unreachable: {e}", retryable=True) from e
+        if response.status_code != 200:
+            slots.release()
+            response.close()
+            logger.error(f"Error from model service {module}: {response.status_code}")
+            raise GatewayError(f"Model service error: {response.status_code}", status_code=response.status_code,
+                               retryable=response.status_code in RETRYABLE_STATUS)
+        return response
+
+    def _attempt(self, module: str, url: str, payload: Dict[str, Any], timeout: Optional[float],
+                 blocking: bool = True) -> Dict[str, Any]:
+        session, slots, _ = self._module_state(module)
+        acquired = slots.acquire(timeout=self.queue_timeout) if blocking else slots.acquire(blocking=False)
+        if not acquired:
+            raise GatewayBusyError(f"No free request slot for module {module}", retryable=False)
+        try:
+            response = session.post(url, json=payload,
+                                    timeout=(self.connect_timeout, timeout or self.read_timeout))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise GatewayError(f"Model service {module} unreachable: {e}", retryable=True) from e
+        finally:
+            slots.release()
+        if response.status_code != 200:
+            logger.error(f"Error from model service {module}: {response.status_code} - {response.text[:500]}")
+            raise GatewayError(f"Model service error: {response.status_code}", status_code=response.status_code,
+                               retryable=response.status_code in RETRYABLE_STATUS)
+        return response.json()
+
+    def _hedged(self, module: str, url: str, payload: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        """Send a second request once the first is slower than the hedge delay; the first success wins"""
+        executor = self._get_executor()
+        primary = executor.submit(self._attempt, module, url, payload, timeout)
+        done, _ = wait([primary], timeout=self.hedge_delay(module))
+        if done:
+            return primary.result()
+
+        # The hedge only uses a free slot; it never queues behind other requests
+        pending = [primary, executor.submit(self._attempt, module, url, payload, timeout, False)]
+        self._count(module, "hedges")
+        errors: List[Exception] = []
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                try:
+                    result = future.result()
+                except GatewayBusyError as e:
+                    if future is primary:
+                        errors.append(e)
+                    continue
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if future is not primary:
+                    self._count(module, "hedge_wins")
+                return result
+        raise errors[0]
+
+    def hedge_delay(self, module: str) -> float:
+        """Seconds to wait before hedging: the module's recent p95, at least the minimum delay"""
+        _, _, histogram = self._module_state(module)
+        if histogram.total < MODEL_GATEWAY_HEDGE_MIN_SAMPLES:
+            return max(self.hedge_min_delay, self.read_timeout / 2)
+        p95 = histogram.quantile(0.95)
+        if p95 is None or p95 == float("inf"):
+            return max(self.hedge_min_delay, self.read_timeout / 2)
+        return max(self.hedge_min_delay, p95)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency * 8,
+                                                        thread_name_prefix="model-gateway")
+        return self._executor
+
+    def _count(self, module: str, counter: str) -> None:
+        with self._lock:
+            self._counters[module][counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, p50/p95, latency and stream time-to-first-event histograms per module"""
+        with self._lock:
+            modules = list(self._sessions)
+            counters = {module: dict(self._counters[module]) for module in modules}
+        stats = {}
+        for module in modules:
+            histogram = self._histograms[module]
+            stats[module] = dict(counters[module], p50=histogram.quantile(0.5), p95=histogram.quantile(0.95),
+                                 latency=histogram.snapshot(), ttfb=self._ttfb[module].snapshot())
+        return stats
+
+
+# Initialize a global instance with default configuration
+_model_gateway = None
+_model_gateway_lock = threading.Lock()
+
+def get_model_gateway() -> ModelGateway:
+    """Get or create the global model gateway"""
+    global _model_gateway
+    if _model_gateway is None:
+        with _model_gateway_lock:
+            if _model_gateway is None:
+                _model_gateway = ModelGateway()
+    return _model_gateway
@@ -0,0 +1,185 @@
+"""Shared LLM model handles.
+
+Building a ``genai.GenerativeModel`` or an OpenAI client per request repeats
+setup work and, for OpenAI, throws away the pooled HTTP connections. Handles
+are built once per (provider, model, generation_config) and shared between
+threads. Construction time and inference time are reported separately through
+metrics hooks so slow setup is not mistaken for slow generation.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Seconds before an OpenAI request is abandoned
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Open provider connections during warm-up instead of on the first request
+MODEL_WARMUP_CONNECT = os.getenv("MODEL_WARMUP_CONNECT", "false").lower() == "true"
+
+# hook(kind, provider, model, seconds) with kind "construct" or "inference"
+MetricsHook = Callable[[str, str, str, float], None]
+
+
+def config_key(generation_config: Optional[Dict[str, Any]]) -> Tuple:
+    """Hashable form of a generation config"""
+    return tuple(sorted((generation_config or {}).items()))
+
+
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def get_openai_client():
+    """Shared OpenAI client; its HTTP connection pool is reused by all handles"""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_lock:
+            if _openai_client is None:
+                if not OPENAI_API_KEY:
+                    raise ValueError("OpenAI client not configured")
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+    return _openai_client
+
+
+def _gemini_factory(model: str, generation_config: Dict[str, Any]):
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name=model, generation_config=generation_config or None)
+
+
+def _openai_factory(model: str, generation_config: Dict[str, Any]):
+    # Chat completions are stateless; the handle binds model and sampling parameters
+    # to the shared client
+    return partial(get_openai_client().chat.completions.create, model=model, **generation_config)
+
+
+DEFAULT_FACTORIES = {
+    "gemini": _gemini_factory,
+    "openai": _openai_factory,
+}
+
+
+class ModelHandleRegistry:
+    """Thread-safe cache of model handles keyed on (provider, model, generation_config)"""
+
+    def __init__(self, factories: Optional[Dict[str, Callable]] = None,
+                 metrics_hooks: Optional[List[MetricsHook]] = None):
+        self.factories = dict(DEFAULT_FACTORIES if factories is None else factories)
+        self.metrics_hooks: List[MetricsHook] = list(metrics_hooks or [])
+        self._handles: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, provider: str, model: str, generation_config: Optional[Dict[str, Any]] = None):
+        """
+        Handle for the given provider, model and generation config, built on first use
+
+        Args:
+            provider: "gemini" or "openai"
+            model: Provider model name
+            generation_config: Sampling parameters baked into the handle
+
+        Returns:
+            A ``GenerativeModel`` for Gemini, a bound ``chat.completions.create`` for OpenAI
+        """
+        key = (provider, model, config_key(generation_config))
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                factory = self.factories.get(provider)
+                if factory is None:
+                    raise ValueError(f"Unsupported model provider: {provider}")
+                started = time.perf_counter()
+                handle = factory(model, dict(generation_config or {}))
+                self._report("construct", provider, model, time.perf_counter() - started)
+                self._handles[key] = handle
+        return handle
+
+    @contextmanager
+    def inference(self, provider: str, model: str):
+        """Time the block as one inference call for the metrics hooks"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._report("inference", provider, model, time.perf_counter() - started)
+
+    def warm_up(self, specs: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]],
+                connect: bool = MODEL_WARMUP_CONNECT) -> int:
+        """
+        Build handles ahead of the first request
+
+        Args:
+            specs: (provider, model, generation_config) triples
+            connect: Also open the provider connection with a cheap metadata call
+
+        Returns:
+            Number of handles built or already present
+        """
+        ready = 0
+        for provider, model, generation_config in specs:
+            try:
+                self.get(provider, model, generation_config)
+                if connect:
+                    self._connect(provider, model)
+                ready += 1
+            except Exception as e:
+                logger.warning(f"Warm-up of {provider}/{model} failed: {e}")
+        return ready
+
+    def _connect(self, provider: str, model: str):
+        if provider == "gemini":
+            import google.generativeai as genai
+            genai.get_model(model if model.startswith("models/") else f"models/{model}")
+        elif provider == "openai":
+            get_openai_client().models.retrieve(model)
+
+    def add_metrics_hook(self, hook: MetricsHook):
+        self.metrics_hooks.append(hook)
+
+    def _report(self, kind: str, provider: str, model: str, seconds: float):
+        with self._stats_lock:
+            stats = self._stats.setdefault((provider, model), {
+                "construct_count": 0, "construct_seconds": 0.0,
+                "inference_count": 0, "inference_seconds": 0.0,
+            })
+            stats[f"{kind}_count"] += 1
+            stats[f"{kind}_seconds"] += seconds
+        for hook in self.metrics_hooks:
+            try:
+                hook(kind, provider, model, seconds)
+            except Exception as e:
+                logger.warning(f"Model metrics hook failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of handles plus construction and inference totals per provider/model"""
+        with self._stats_lock:
+            models = {f"{provider}/{model}": dict(values) for (provider, model), values in self._stats.items()}
+        return {"handles": len(self._handles), "models": models}
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+
+# Initialize a global instance with default configuration
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelHandleRegistry:
+    """Get or create the global model handle registry"""
+    global _model_registry
+    if _model_registry is None:
+        with _model_registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelHandleRegistry()
+    return _model_registry
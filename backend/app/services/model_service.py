@@ -1,8 +1,12 @@
 import os
+import time
 import logging
-import requests
 import json
 import google.generativeai as genai
+from .model_gateway import get_model_gateway, GatewayError
+from .provider_router import get_provider_router
+from .response_cache import get_response_cache
+from .usage_ledger import get_usage_ledger, current_scope, gemini_usage, openai_usage
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -48,6 +52,9 @@ PARTNER_CHECK_MODEL_URL = os.getenv("PARTNER_CHECK_MODEL_URL", "http://partner-c
 SECRETARY_MODEL_URL = os.getenv("SECRETARY_MODEL_URL", "http://secretary-model:8000")
 MARKETING_MODEL_URL = os.getenv("MARKETING_MODEL_URL", "http://marketing-model:8000")
 
+# Модель Gemini, которая отвечает, если OpenAI недоступен
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-1.5-pro")
+
 class ModelService:
     """Сервис для работы с разными моделями и распределения запросов"""
     
@@ -66,38 +73,108 @@ class ModelService:
             raise ValueError(f"Unknown module: {module}")
     
     @staticmethod
-    def call_container_model(module, message, conversation_id=None, metadata=None):
-        """Вызов модели в контейнере для обработки запроса"""
+    def call_container_model(module, message, conversation_id=None, metadata=None, personalized=False):
+        """
+        Вызов модели в контейнере для обработки запроса.
+        Повторные вопросы модулей из RESPONSE_CACHE_MODULES отдаются из кэша ответов;
+        personalized=True обходит кэш.
+        """
+        # Подготовка данных запроса (нужны и для учета неудачного вызова)
+        request_data = {
+            "message": message,
+            "conversation_id": conversation_id,
+            "metadata": metadata or {}
+        }
+        cached, cache_key = get_response_cache().lookup(module, "container", message, personalized=personalized)
+        if cached is not None:
+            ModelService._record_container_cache_hit(module, request_data)
+            return {"text": cached, "model": "cache", "cached": True}
+        result = ModelService._post_container_chat(module, request_data)
+        get_response_cache().store(cache_key, result.get("text", ""))
+        return result
+    
+    @staticmethod
+    def _post_container_chat(module, request_data):
+        """Запрос к /chat контейнера без кэша"""
+        started = time.perf_counter()
         try:
             model_url = ModelService.get_model_by_module(module)
             
-            # Подготовка данных запроса
-            request_data = {
-                "message": message,
-                "conversation_id": conversation_id,
-                "metadata": metadata or {}
-            }
-            
-            # Выполнение запроса к соответствующему сервису модели
-            response = requests.post(
-                f"{model_url}/chat",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Error from model service: {response.status_code} - {response.text}")
-                raise Exception(f"Model service error: {response.status_code}")
+            # Запрос через шлюз: пул соединений, таймауты, ограничение параллельности и повторы
+            result = get_model_gateway().post(module, f"{model_url}/chat", request_data)
+            ModelService._record_container_usage(module, started, request_data, request_data["message"],
+                                                 result.get("text", ""), model=result.get("model"))
+            return result
         
         except Exception as e:
             logger.error(f"Error calling container model: {e}")
+            ModelService._record_container_usage(module, started, request_data, ok=False)
             raise
     
     @staticmethod
-    def call_gemini_api(prompt, model_name="gemini-1.5-pro"):
+    def stream_container_model(module, message, conversation_id=None, metadata=None, personalized=False):
+        """
+        Потоковый вызов модели в контейнере: генератор фрагментов текста по мере генерации.
+        Если у контейнера нет потокового эндпоинта, отдает ответ /chat одним фрагментом.
+        Ответ из кэша отдается одним фрагментом.
+        """
+        request_data = {
+            "message": message,
+            "conversation_id": conversation_id,
+            "metadata": metadata or {}
+        }
+        cache = get_response_cache()
+        cached, cache_key = cache.lookup(module, "container", message, personalized=personalized)
+        if cached is not None:
+            ModelService._record_container_cache_hit(module, request_data)
+            yield cached
+            return
+        started = time.perf_counter()
+        parts = []
+        try:
+            for chunk in ModelService.stream_container_endpoint(module, "chat/stream", request_data):
+                parts.append(chunk)
+                yield chunk
+        except GatewayError as e:
+            if e.status_code != 404:
+                ModelService._record_container_usage(module, started, request_data, ok=False)
+                raise
+            logger.warning(f"Model service {module} has no streaming endpoint, using /chat")
+            text = ModelService._post_container_chat(module, request_data).get("text", "")
+            cache.store(cache_key, text)
+            yield text
+            return
+        ModelService._record_container_usage(module, started, request_data, message, "".join(parts))
+        # Кэшируем только полностью полученный ответ
+        cache.store(cache_key, "".join(parts))
+    
+    @staticmethod
+    def stream_container_endpoint(module, endpoint, payload):
+        """Фрагменты текста потокового эндпоинта контейнера (события NDJSON chunk, done, error)"""
+        url = f"{ModelService.get_model_by_module(module)}/{endpoint}"
+        for event in get_model_gateway().stream(module, url, payload):
+            if event.get("type") == "chunk":
+                yield event.get("text", "")
+            elif event.get("type") == "error":
+                raise GatewayError(f"Model service {module} failed while streaming: {event.get('error')}")
+    
+    @staticmethod
+    def _record_container_usage(module, started, request_data, prompt="", completion="", model=None, ok=True):
+        """Запись вызова контейнера в журнал расхода (контейнеры не сообщают токены, они оцениваются)"""
+        get_usage_ledger().record_call("container", model or module, started, prompt=prompt, completion=completion,
+                                       ok=ok, source="model_service", module=module,
+                                       user_id=(request_data.get("metadata") or {}).get("user_id"))
+    
+    @staticmethod
+    def _record_container_cache_hit(module, request_data):
+        get_usage_ledger().record("container", module, cache_hit=True, source="model_service", module=module,
+                                  user_id=(request_data.get("metadata") or {}).get("user_id"))
+    
+    @staticmethod
+    def call_gemini_api(prompt, model_name="gemini-1.5-pro", usage=None):
         """Прямой вызов API Gemini"""
+        started = time.perf_counter()
+        usage = usage or ModelService._usage_scope()
         try:
             if not GEMINI_API_KEY:
                 raise ValueError("GEMINI_API_KEY not configured")
@@ -107,6 +184,8 @@ class ModelService:
             
             # Генерация ответа
             response = model.generate_content(prompt)
+            get_usage_ledger().record_call("gemini", model_name, started, gemini_usage(response), prompt,
+                                           response.text, **usage)
             
             return {
                 "text": response.text,
@@ -115,54 +194,71 @@ class ModelService:
         
         except Exception as e:
             logger.error(f"Error calling Gemini API: {e}")
+            get_usage_ledger().record_call("gemini", model_name, started, ok=False, **usage)
             raise
     
     @staticmethod
     def call_openai_api(prompt, model_name="gpt-3.5-turbo"):
-        """Прямой вызов API OpenAI"""
+        """Вызов API OpenAI; если OpenAI недоступен или неисправен, отвечает Gemini"""
+        candidates = [("gemini", GEMINI_FALLBACK_MODEL)]
+        if openai_client:
+            candidates.insert(0, ("openai", model_name))
+        else:
+            logger.warning("OpenAI client not configured, falling back to Gemini")
+        
+        # Пользователь и модуль определяются здесь: провайдер может вызываться в другом потоке
+        usage = ModelService._usage_scope()
+        
+        def call(provider, model):
+            if provider == "openai":
+                return ModelService._call_openai_completion(prompt, model, usage)
+            return ModelService.call_gemini_api(prompt, model, usage)
+        
+        try:
+            _, _, result = get_provider_router().call(candidates, call, preferred="openai")
+            return result
+        except Exception as e:
+            logger.error(f"Error calling OpenAI API (fallback included): {e}")
+            raise
+    
+    @staticmethod
+    def _call_openai_completion(prompt, model_name, usage):
+        """Прямой вызов chat.completions OpenAI"""
+        started = time.perf_counter()
         try:
-            if not openai_client:
-                logger.warning("OpenAI client not configured, falling back to Gemini")
-                # Если OpenAI недоступен, используем Gemini как запасной вариант
-                return call_gemini_api(prompt)
-                
-            # Генерация ответа
             response = openai_client.chat.completions.create(
                 model=model_name,
                 messages=[{"role": "user", "content": prompt}]
             )
-            
-            return {
-                "text": response.choices[0].message.content,
-                "model": model_name
-            }
+        except Exception:
+            get_usage_ledger().record_call("openai", model_name, started, ok=False, **usage)
+            raise
+        get_usage_ledger().record_call("openai", model_name, started, openai_usage(response), prompt,
+                                       response.choices[0].message.content or "", **usage)
         
-        except Exception as e:
-            logger.error(f"Error calling OpenAI API: {e}")
-            # Если произошла ошибка, используем Gemini как запасной вариант
-            logger.info("Falling back to Gemini API")
-            try:
-                return call_gemini_api(prompt)
-            except Exception as gemini_error:
-                logger.error(f"Gemini fallback also failed: {gemini_error}")
-                raise
+        return {
+            "text": response.choices[0].message.content,
+            "model": model_name
+        }
+    
+    @staticmethod
+    def _usage_scope():
+        """Пользователь и модуль текущего запроса для журнала расхода"""
+        user_id, module = current_scope()
+        return {"user_id": user_id, "module": module, "source": "model_service"}
     
     @staticmethod
     def call_secretary_specialized_endpoints(endpoint, data):
         """Вызов специализированных эндпоинтов модуля секретаря"""
+        started = time.perf_counter()
+        usage = dict(ModelService._usage_scope(), module="secretary")
         try:
-            response = requests.post(
-                f"{SECRETARY_MODEL_URL}/{endpoint}",
-                json=data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Error from secretary specialized endpoint: {response.status_code} - {response.text}")
-                raise Exception(f"Secretary service error: {response.status_code}")
+            result = get_model_gateway().post("secretary", f"{SECRETARY_MODEL_URL}/{endpoint}", data)
+            get_usage_ledger().record_call("container", result.get("model") or f"secretary/{endpoint}", started,
+                                           prompt=data.get("message", ""), completion=str(result), **usage)
+            return result
         
         except Exception as e:
             logger.error(f"Error calling secretary specialized endpoint: {e}")
+            get_usage_ledger().record_call("container", f"secretary/{endpoint}", started, ok=False, **usage)
             raise
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from ..models import User, Message, ConversationThread, ModuleEnum
+from ..models import User, Message, ConversationThread, ModuleEnum, Partner, PartnerCheckResult
+from .context_builder import estimate_tokens
 
 class ModuleDataAccess:
     """Базовый класс для доступа к данным, специфичным для каждого модуля"""
@@ -51,7 +52,8 @@ class ModuleDataAccess:
         message = Message(
             thread_id=thread.id,
             role=role,
-            content=content
+            content=content,
+            token_count=estimate_tokens(content)
         )
         
         self.session.add(message)
@@ -83,15 +85,28 @@ class PartnerCheckDataAccess(ModuleDataAccess):
     def __init__(self, session: Session, user_id: int):
         super().__init__(session, user_id, ModuleEnum.partner_check)
     
-    def get_partners(self, limit=100):
-        """Получить партнеров пользователя"""
-        # TODO: Реализовать запрос к таблице партнеров
-        return []
+    def get_partners(self, limit=100, offset=0):
+        """Получить партнеров пользователя (последние проверенные первыми, индекс user_id + last_checked_at)"""
+        return (
+            self.session.query(Partner)
+            .filter(Partner.user_id == self.user_id)
+            .order_by(Partner.last_checked_at.desc(), Partner.id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
     
     def get_partner_checks(self, partner_id=None, limit=10):
-        """Получить результаты проверок партнеров"""
-        # TODO: Реализовать запрос к таблице результатов проверок
-        return []
+        """Получить результаты проверок партнеров (новые первыми)"""
+        query = self.session.query(PartnerCheckResult).filter(PartnerCheckResult.user_id == self.user_id)
+        if partner_id is not None:
+            query = query.filter(PartnerCheckResult.partner_id == partner_id)
+        return (
+            query
+            .order_by(PartnerCheckResult.checked_at.desc())
+            .limit(limit)
+            .all()
+        )
 
 
 class SecretaryDataAccess(ModuleDataAccess):
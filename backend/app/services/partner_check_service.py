@@ -15,7 +15,7 @@ def get_partner_check_response(message, user_id=None, conversation_id=None):
     try:
         # Используем модель в контейнере для конфиденциальности
         return ModelService.call_container_model(
-            module="partnerCheck",
+            module="partner_check",
             message=message,
             conversation_id=conversation_id,
             metadata={"user_id": user_id}
@@ -0,0 +1,174 @@
+"""Persisted counterparty check history.
+
+Every completed check is stored per user in ``partner_check_results`` and the
+checked counterparty is kept in ``partners``. A stored result younger than the
+reuse window is returned instead of querying the upstream providers again.
+"""
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+from sqlalchemy import select, update
+
+from .sanctions_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Seconds a stored check result is reused for the same user, name and VAT ID
+PARTNER_CHECK_REUSE_WINDOW = int(os.getenv("PARTNER_CHECK_REUSE_WINDOW", str(24 * 3600)))
+
+
+def history_key(name: Optional[str], vat_id: Optional[str]) -> Dict[str, str]:
+    """Normalized (name, VAT ID) pair used to match checks of the same counterparty"""
+    normalized_vat = "".join(ch for ch in (vat_id or "") if ch.isalnum()).upper()
+    return {"normalized_name": normalize_name(name or ""), "vat_id": normalized_vat}
+
+
+class PartnerCheckHistory:
+    """Stores check results and serves fresh ones back"""
+
+    def __init__(self, session_factory=None, reuse_window: int = PARTNER_CHECK_REUSE_WINDOW):
+        self._session_factory = session_factory
+        self.reuse_window = reuse_window
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from ..db import get_session_factory
+            self._session_factory = get_session_factory()
+        return self._session_factory
+
+    def find_fresh_result(self, user_id: str, name: str, vat_id: Optional[str] = None,
+                          max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Latest stored result for this counterparty if it is younger than ``max_age``
+        seconds (defaults to the reuse window)
+
+        Returns:
+            The stored check result with "cached" and "checked_at" added, or None
+        """
+        from ..models import Partner, PartnerCheckResult
+        max_age = self.reuse_window if max_age is None else max_age
+        if max_age <= 0:
+            return None
+        key = history_key(name, vat_id)
+        with self.session_factory() as session:
+            row = session.scalars(
+                select(PartnerCheckResult)
+                .join(Partner, Partner.id == PartnerCheckResult.partner_id)
+                .where(
+                    PartnerCheckResult.user_id == user_id,
+                    PartnerCheckResult.normalized_name == key["normalized_name"],
+                    PartnerCheckResult.vat_id == key["vat_id"],
+                    PartnerCheckResult.checked_at >= datetime.utcnow() - timedelta(seconds=max_age),
+                    # A sanctions re-screen after the check invalidates it
+                    PartnerCheckResult.checked_at >= Partner.updated_at,
+                )
+                .order_by(PartnerCheckResult.checked_at.desc())
+                .limit(1)
+            ).first()
+            if row is None:
+                return None
+            result = json.loads(row.result)
+        result["cached"] = True
+        result["checked_at"] = row.checked_at.isoformat()
+        result["partner_id"] = row.partner_id
+        return result
+
+    def record_result(self, user_id: str, name: str, vat_id: Optional[str], country_code: Optional[str],
+                      result: Dict[str, Any]) -> str:
+        """
+        Store a check result and update the counterparty's latest status
+
+        Returns:
+            ID of the partner the result was stored for
+        """
+        from ..models import Partner, PartnerCheckResult
+        key = history_key(name, vat_id)
+        now = datetime.utcnow()
+        sanctions_check = result.get("checks", {}).get("sanctions_check", {})
+        if not country_code and key["vat_id"]:
+            country_code = key["vat_id"][:2]
+
+        with self.session_factory() as session:
+            partner = session.scalars(
+                select(Partner).where(
+                    Partner.user_id == user_id,
+                    Partner.normalized_name == key["normalized_name"],
+                    Partner.vat_id == key["vat_id"],
+                ).limit(1)
+            ).first()
+            if partner is None:
+                partner = Partner(user_id=user_id, created_at=now, **key)
+                session.add(partner)
+            partner.name = result.get("official_name") or name
+            partner.country_code = (country_code or "")[:2].upper() or None
+            partner.last_status = result.get("overall_status")
+            if "is_sanctioned" in sanctions_check:
+                partner.is_sanctioned = bool(sanctions_check["is_sanctioned"])
+            partner.last_checked_at = now
+            partner.updated_at = now
+            session.flush()
+
+            session.add(PartnerCheckResult(
+                partner_id=partner.id,
+                user_id=user_id,
+                overall_status=result.get("overall_status", "unknown"),
+                result=json.dumps(result, default=str),
+                checked_at=now,
+                **key
+            ))
+            session.commit()
+            return partner.id
+
+    def counterparties(self, user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stored partners as counterparty dicts for the sanctions refresh job"""
+        from ..models import Partner
+        query = select(Partner).order_by(Partner.id)
+        if user_id is not None:
+            query = query.where(Partner.user_id == user_id)
+        with self.session_factory() as session:
+            for partner in session.scalars(query).yield_per(1000):
+                yield {
+                    "id": partner.id,
+                    "name": partner.name,
+                    "country_code": partner.country_code,
+                    "vat_id": partner.vat_id or None,
+                    "is_sanctioned": partner.is_sanctioned,
+                }
+
+    def apply_rescreen_results(self, results: Iterable[Dict[str, Any]]) -> int:
+        """
+        Write re-screening outcomes back to the partners. Stored results older than
+        the update are no longer reused.
+
+        Returns:
+            Number of updated partners
+        """
+        from ..models import Partner
+        updated = 0
+        with self.session_factory() as session:
+            for item in results:
+                if item.get("change") == "unchanged":
+                    continue
+                values = {"is_sanctioned": item["is_sanctioned"], "updated_at": datetime.utcnow()}
+                if item.get("change") in ("newly_sanctioned", "cleared"):
+                    values["last_status"] = "sanctioned" if item["is_sanctioned"] else "unknown"
+                updated += session.execute(
+                    update(Partner).where(Partner.id == item["id"]).values(**values)
+                ).rowcount
+            session.commit()
+        return updated
+
+
+# Initialize a global instance with default configuration
+_partner_history = None
+
+def get_partner_history() -> PartnerCheckHistory:
+    """Get or create the global partner check history"""
+    global _partner_history
+    if _partner_history is None:
+        _partner_history = PartnerCheckHistory()
+    return _partner_history
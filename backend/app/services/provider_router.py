@@ -0,0 +1,373 @@
+"""Latency-aware routing between LLM providers.
+
+Every (provider, model) pair keeps a rolling window of recent call outcomes
+with p50/p95 latency and error rate. Candidates are tried fastest healthy
+first, so a slow or failing provider is avoided before a user has to wait
+for it to time out. A provider whose error rate in the window reaches the
+threshold is skipped for a cooldown and then probed again with a fresh
+window. Optionally, a second request to the next provider is hedged once
+the primary is slower than its own p95; the first answer wins.
+
+Streams are measured by their time to first chunk (TTFB), since the rest of
+their duration depends on the answer length and the client. TTFB samples are
+kept apart from full-call latencies: streamed requests are ranked by TTFB
+p50 and hedged once the first chunk is later than the TTFB p95.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Outcomes kept per provider/model, and how old they may be (seconds)
+PROVIDER_WINDOW_SIZE = int(os.getenv("PROVIDER_WINDOW_SIZE", "100"))
+PROVIDER_WINDOW_SECONDS = float(os.getenv("PROVIDER_WINDOW_SECONDS", "600"))
+# Outcomes needed before latency and error rate are trusted
+PROVIDER_MIN_SAMPLES = int(os.getenv("PROVIDER_MIN_SAMPLES", "5"))
+# Error rate at which a provider is skipped for PROVIDER_COOLDOWN seconds
+PROVIDER_ERROR_THRESHOLD = float(os.getenv("PROVIDER_ERROR_THRESHOLD", "0.5"))
+PROVIDER_COOLDOWN = float(os.getenv("PROVIDER_COOLDOWN", "30"))
+# Hedging sends a second paid request, so it is off unless enabled
+PROVIDER_HEDGING = os.getenv("PROVIDER_HEDGING", "false").lower() == "true"
+PROVIDER_HEDGE_MIN_DELAY = float(os.getenv("PROVIDER_HEDGE_MIN_DELAY", "2"))
+
+Candidate = Tuple[str, str]  # (provider, model)
+
+# Latency kinds: duration of a whole call, time to the first chunk of a stream
+CALL, STREAM = "call", "stream"
+_EMPTY = object()
+
+
+def quantile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank quantile of the values (None without data)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class ProviderStats:
+    """Rolling window of call outcomes of one provider/model"""
+
+    def __init__(self, size: int = PROVIDER_WINDOW_SIZE, max_age: float = PROVIDER_WINDOW_SECONDS):
+        self.max_age = max_age
+        self.outcomes = deque(maxlen=size)  # (timestamp, seconds or None, ok, kind)
+        self.unhealthy_until = 0.0
+        self.trips = 0
+
+    def record(self, now: float, seconds: Optional[float], ok: bool, kind: str = CALL) -> None:
+        self.outcomes.append((now, seconds, ok, kind))
+
+    def prune(self, now: float) -> None:
+        while self.outcomes and now - self.outcomes[0][0] > self.max_age:
+            self.outcomes.popleft()
+
+    def error_rate(self) -> Optional[float]:
+        if not self.outcomes:
+            return None
+        return sum(1 for _, _, ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    def latencies(self, kind: str = CALL) -> List[float]:
+        return [seconds for _, seconds, ok, k in self.outcomes if ok and seconds is not None and k == kind]
+
+
+class ProviderRouter:
+    """Orders provider candidates by health and latency and runs calls against them"""
+
+    def __init__(self, window_size: int = PROVIDER_WINDOW_SIZE, window_seconds: float = PROVIDER_WINDOW_SECONDS,
+                 min_samples: int = PROVIDER_MIN_SAMPLES, error_threshold: float = PROVIDER_ERROR_THRESHOLD,
+                 cooldown: float = PROVIDER_COOLDOWN, hedging: bool = PROVIDER_HEDGING,
+                 hedge_min_delay: float = PROVIDER_HEDGE_MIN_DELAY, clock: Callable[[], float] = time.monotonic):
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.clock = clock
+        self._stats: Dict[Candidate, ProviderStats] = {}
+        self._counters = {"hedges": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get(self, candidate: Candidate) -> ProviderStats:
+        stats = self._stats.get(candidate)
+        if stats is None:
+            stats = self._stats.setdefault(candidate, ProviderStats(self.window_size, self.window_seconds))
+        return stats
+
+    def record(self, provider: str, model: str, seconds: Optional[float], ok: bool, kind: str = CALL) -> None:
+        """
+        Record the outcome of one call
+
+        Args:
+            provider: "gemini" or "openai"
+            model: Provider model name
+            seconds: Latency of the call (time to first chunk for streams); None records only the outcome
+            ok: False if the call failed
+            kind: CALL or STREAM; latencies of each kind are kept apart, errors count for both
+        """
+        now = self.clock()
+        with self._lock:
+            stats = self._get((provider, model))
+            stats.prune(now)
+            stats.record(now, seconds, ok, kind)
+            error_rate = stats.error_rate()
+            if not ok and len(stats.outcomes) >= self.min_samples and error_rate >= self.error_threshold:
+                # Skip the provider for a while; after the cooldown it starts with a fresh window
+                stats.unhealthy_until = now + self.cooldown
+                stats.outcomes.clear()
+                stats.trips += 1
+                logger.warning(f"Provider {provider}/{model} disabled for {self.cooldown}s "
+                               f"(error rate {error_rate:.0%})")
+
+    def healthy(self, provider: str, model: str) -> bool:
+        with self._lock:
+            return self._get((provider, model)).unhealthy_until <= self.clock()
+
+    def percentile(self, provider: str, model: str, q: float, kind: str = CALL) -> Optional[float]:
+        """Latency quantile of successful calls of a kind, None until there are enough samples"""
+        now = self.clock()
+        with self._lock:
+            stats = self._get((provider, model))
+            stats.prune(now)
+            latencies = stats.latencies(kind)
+        if len(latencies) < self.min_samples:
+            return None
+        return quantile(latencies, q)
+
+    def rank(self, candidates: Sequence[Candidate], preferred: Optional[str] = None,
+             kind: str = CALL) -> List[Candidate]:
+        """
+        Candidates in the order they should be tried
+
+        Healthy providers come first, fastest p50 first. A provider without enough
+        samples ranks as fast so it gets explored; ties keep the given order.
+        Unhealthy providers stay at the end as a last resort.
+
+        Args:
+            candidates: (provider, model) pairs
+            preferred: Provider explicitly chosen by the caller; it goes first while healthy
+            kind: Rank by full-call latency (CALL) or time to first chunk (STREAM)
+        """
+        def key(candidate: Candidate):
+            provider, model = candidate
+            healthy = self.healthy(provider, model)
+            if preferred is not None:
+                return (not healthy, provider != preferred, 0.0)
+            return (not healthy, False, self.percentile(provider, model, 0.5, kind) or 0.0)
+        return sorted(candidates, key=key)
+
+    def hedge_delay(self, provider: str, model: str, kind: str = CALL) -> float:
+        """Seconds to wait before hedging: the provider's p95 of the kind, at least the minimum delay"""
+        p95 = self.percentile(provider, model, 0.95, kind)
+        return self.hedge_min_delay if p95 is None else max(self.hedge_min_delay, p95)
+
+    def call(self, candidates: Sequence[Candidate], fn: Callable[[str, str], Any], preferred: Optional[str] = None,
+             hedge: Optional[bool] = None) -> Tuple[str, str, Any]:
+        """
+        Run fn(provider, model) against the best candidate, falling back to the next on errors
+
+        Args:
+            candidates: (provider, model) pairs that can serve the request
+            fn: Performs the call and returns its result
+            preferred: Provider explicitly chosen by the caller
+            hedge: Override hedging for this call
+
+        Returns:
+            (provider, model, result) of the call that answered
+
+        Raises:
+            The last provider error if every candidate failed
+        """
+        ranked = self.rank(candidates, preferred)
+        if not ranked:
+            raise ValueError("No model provider available")
+        hedge = self.hedging if hedge is None else hedge
+        last_error: Optional[Exception] = None
+        if hedge and len(ranked) > 1:
+            try:
+                return self._hedged(ranked[0], ranked[1], fn)
+            except Exception as e:
+                last_error = e
+                ranked = ranked[2:]
+        for provider, model in ranked:
+            try:
+                return provider, model, self._timed(provider, model, fn)
+            except Exception as e:
+                logger.warning(f"Provider {provider}/{model} failed: {e}")
+                last_error = e
+        raise last_error
+
+    def _timed(self, provider: str, model: str, fn: Callable[[str, str], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            result = fn(provider, model)
+        except Exception:
+            self.record(provider, model, time.perf_counter() - started, ok=False)
+            raise
+        self.record(provider, model, time.perf_counter() - started, ok=True)
+        return result
+
+    def _hedged(self, primary: Candidate, secondary: Candidate, fn: Callable[[str, str], Any],
+                run: Optional[Callable] = None, kind: str = CALL,
+                discard: Optional[Callable[[Any], None]] = None) -> Tuple[str, str, Any]:
+        """
+        Start the secondary once the primary is slower than its p95; the first success wins
+
+        Args:
+            run: Runs fn against one candidate (defaults to a timed call)
+            kind: Latency kind whose p95 sets the hedge delay
+            discard: Called with the result of the losing request once it completes (e.g. to close a stream)
+        """
+        run = run or self._timed
+        executor = self._get_executor()
+        first = executor.submit(run, *primary, fn)
+        done, _ = wait([first], timeout=self.hedge_delay(*primary, kind))
+        if done and first.exception() is None:
+            return primary[0], primary[1], first.result()
+
+        hedged = not done
+        if hedged:
+            with self._lock:
+                self._counters["hedges"] += 1
+        # Without a hedge the primary already failed and the secondary is a plain fallback
+        futures = {first: primary, executor.submit(run, *secondary, fn): secondary}
+        pending = set(futures)
+        errors: List[Exception] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    continue
+                if hedged and future is not first:
+                    with self._lock:
+                        self._counters["hedge_wins"] += 1
+                # The slower request keeps running in the background and still feeds the stats
+                if discard is not None:
+                    for loser in pending:
+                        loser.add_done_callback(
+                            lambda f: discard(f.result()) if f.exception() is None else None)
+                provider, model = futures[future]
+                return provider, model, future.result()
+        raise errors[-1]
+
+    def stream(self, candidates: Sequence[Candidate], fn: Callable[[str, str], Iterable[Any]],
+               preferred: Optional[str] = None, hedge: Optional[bool] = None) -> Tuple[str, str, Iterator[Any]]:
+        """
+        Open a stream with fn(provider, model) on the best candidate by time to first chunk
+
+        Candidates that fail before their first chunk fall back to the next one.
+        With hedging, the next candidate is started once the first chunk is later
+        than the primary's TTFB p95; the stream that delivers first is used and
+        the other one is closed.
+
+        Returns:
+            (provider, model, chunks) of the stream that delivered its first chunk
+
+        Raises:
+            The last provider error if no candidate delivered a first chunk
+        """
+        ranked = self.rank(candidates, preferred, kind=STREAM)
+        if not ranked:
+            raise ValueError("No model provider available")
+        hedge = self.hedging if hedge is None else hedge
+        last_error: Optional[Exception] = None
+        if hedge and len(ranked) > 1:
+            try:
+                provider, model, (chunks, first) = self._hedged(ranked[0], ranked[1], fn, run=self._first_chunk,
+                                                                 kind=STREAM, discard=_close_stream)
+                return provider, model, _resume(chunks, first)
+            except Exception as e:
+                last_error = e
+                ranked = ranked[2:]
+        for provider, model in ranked:
+            try:
+                chunks, first = self._first_chunk(provider, model, fn)
+                return provider, model, _resume(chunks, first)
+            except Exception as e:
+                logger.warning(f"Provider {provider}/{model} failed before its first chunk: {e}")
+                last_error = e
+        raise last_error
+
+    def _first_chunk(self, provider: str, model: str, fn: Callable[[str, str], Iterable[Any]]):
+        """Open the stream and wait for its first chunk, recording the time to it"""
+        started = time.perf_counter()
+        chunks = iter(())
+        try:
+            chunks = iter(fn(provider, model))
+            first = next(chunks, _EMPTY)
+        except Exception:
+            self.record(provider, model, time.perf_counter() - started, ok=False, kind=STREAM)
+            _close_stream((chunks, None))
+            raise
+        self.record(provider, model, time.perf_counter() - started, ok=True, kind=STREAM)
+        return chunks, first
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider-router")
+        return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        """Latency percentiles, error rate and health per provider/model plus hedge counters"""
+        with self._lock:
+            candidates = list(self._stats)
+            counters = dict(self._counters)
+        providers = {}
+        for provider, model in candidates:
+            with self._lock:
+                stats = self._stats[(provider, model)]
+                stats.prune(self.clock())
+                calls, error_rate, trips = len(stats.outcomes), stats.error_rate(), stats.trips
+            providers[f"{provider}/{model}"] = {
+                "calls": calls,
+                "error_rate": error_rate,
+                "p50": self.percentile(provider, model, 0.5),
+                "p95": self.percentile(provider, model, 0.95),
+                "ttfb_p50": self.percentile(provider, model, 0.5, STREAM),
+                "ttfb_p95": self.percentile(provider, model, 0.95, STREAM),
+                "healthy": self.healthy(provider, model),
+                "trips": trips,
+            }
+        return dict(counters, providers=providers)
+
+
+def _resume(chunks: Iterator[Any], first: Any) -> Iterator[Any]:
+    """The stream again, starting with the chunk that was already read"""
+    if first is _EMPTY:
+        return
+    yield first
+    yield from chunks
+
+
+def _close_stream(opened) -> None:
+    """Close a stream opened by _first_chunk that is not going to be read (e.g. a hedge loser)"""
+    close = getattr(opened[0], "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Closing an unused stream failed: {e}")
+
+
+# Initialize a global instance with default configuration
+_provider_router = None
+_provider_router_lock = threading.Lock()
+
+def get_provider_router() -> ProviderRouter:
+    """Get or create the global provider router"""
+    global _provider_router
+    if _provider_router is None:
+        with _provider_router_lock:
+            if _provider_router is None:
+                _provider_router = ProviderRouter()
+    return _provider_router
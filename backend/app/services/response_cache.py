@@ -0,0 +1,248 @@
+"""Response cache for module assistants.
+
+Answers are cached per module, model, normalized prompt and a hash of the
+conversation context, so near-identical questions ("Wie hoch ist die
+Umsatzsteuer?" / "wie hoch ist die umsatzsteuer") are answered from memory.
+An optional embedding tier also matches paraphrases above a cosine-similarity
+threshold. Entries expire after a TTL and the least recently used ones are
+evicted first. Modules not listed in ``RESPONSE_CACHE_MODULES`` are never
+cached, and callers mark personalized requests so they bypass the cache.
+
+The cache is consulted on both answer paths: the provider path
+(ModelContextManager.generate_response / stream_response) and the container
+path (ModelService.call_container_model / stream_container_model) that the
+accounting and partner-check modules answer through. Container requests
+carry only the message and a conversation id, so container answers are keyed
+with the model type "container" and without context; callers pass
+personalized=True for questions that depend on the user's own data.
+"""
+import os
+import re
+import math
+import json
+import hashlib
+import logging
+import operator
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+# Modules whose answers may be cached; creative and personal modules are left out
+RESPONSE_CACHE_MODULES = os.getenv("RESPONSE_CACHE_MODULES", "accounting,partner_check")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+# Embedding-similarity tier (one embedding call per miss)
+RESPONSE_CACHE_EMBEDDINGS = os.getenv("RESPONSE_CACHE_EMBEDDINGS", "false").lower() == "true"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+# Most recent entries per module/context compared by similarity
+RESPONSE_CACHE_SIMILARITY_SCAN = int(os.getenv("RESPONSE_CACHE_SIMILARITY_SCAN", "256"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " ?!.…,;:"
+
+# exact: hash of module, model, prompt and context; bucket: hash of module, model
+# and context (the scope of similarity matches); embedding: normalized vector or None
+CacheKey = namedtuple("CacheKey", ["exact", "bucket", "embedding"])
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-folded prompt with collapsed whitespace and without trailing punctuation"""
+    text = unicodedata.normalize("NFKC", prompt or "").casefold()
+    return _WHITESPACE.sub(" ", text).strip(_TRAILING_PUNCTUATION)
+
+
+def context_hash(context: Optional[List[Dict[str, str]]]) -> str:
+    """Stable hash of the conversation context passed to the model"""
+    if not context:
+        return ""
+    payload = json.dumps([[msg.get("role"), msg.get("content")] for msg in context], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _unit(vector: Sequence[float]) -> Tuple[float, ...]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return tuple(value / norm for value in vector)
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+class ResponseCache:
+    """In-process TTL/LRU cache of generated answers with an optional similarity tier"""
+
+    def __init__(self, ttl: int = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 modules: Optional[Sequence[str]] = None, enabled: bool = RESPONSE_CACHE_ENABLED,
+                 embed: Optional[Callable[[str], Sequence[float]]] = None,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY,
+                 similarity_scan: int = RESPONSE_CACHE_SIMILARITY_SCAN):
+        """
+        Args:
+            ttl: Seconds an answer is served from the cache
+            max_entries: Entries kept before the least recently used are evicted
+            modules: Module names that may be cached (defaults to RESPONSE_CACHE_MODULES)
+            enabled: Master switch
+            embed: Function returning an embedding for a prompt; enables the similarity tier
+            similarity: Minimum cosine similarity for a similarity hit
+            similarity_scan: Most recent entries of a bucket compared by similarity
+        """
+        if modules is None:
+            modules = [name.strip() for name in RESPONSE_CACHE_MODULES.split(",") if name.strip()]
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.modules = frozenset(modules)
+        self.enabled = enabled
+        self.embed = embed
+        self.similarity = similarity
+        self.similarity_scan = similarity_scan
+        # exact key -> (expires_at, text, bucket, embedding)
+        self._entries: "OrderedDict[str, Tuple[datetime, str, str, Optional[Tuple[float, ...]]]]" = OrderedDict()
+        # bucket -> exact keys in insertion order (dict used as an ordered set)
+        self._buckets: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0,
+                          "bypassed": 0, "embedding_errors": 0}
+
+    def enabled_for(self, module: Any) -> bool:
+        return self.enabled and self.ttl > 0 and getattr(module, "value", module) in self.modules
+
+    def lookup(self, module: Any, model_type: str, prompt: str,
+               context: Optional[List[Dict[str, str]]] = None,
+               personalized: bool = False) -> Tuple[Optional[str], Optional[CacheKey]]:
+        """
+        Find a cached answer
+
+        Returns:
+            (answer or None, key to pass to store() after generating; None if the
+            request must not be cached)
+        """
+        if personalized:
+            self._count("bypassed")
+            return None, None
+        if not self.enabled_for(module):
+            return None, None
+
+        module_name = getattr(module, "value", module)
+        bucket = hashlib.sha256(f"{module_name}\0{model_type}\0{context_hash(context)}".encode("utf-8")).hexdigest()
+        normalized = normalize_prompt(prompt)
+        exact = hashlib.sha256(f"{bucket}\0{normalized}".encode("utf-8")).hexdigest()
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(exact)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(exact)
+                    self._counters["exact_hits"] += 1
+                    return entry[1], None
+                self._drop(exact)
+
+        embedding = self._embedding(normalized)
+        if embedding is not None:
+            text = self._similar(bucket, embedding, now)
+            if text is not None:
+                return text, None
+
+        self._count("misses")
+        return None, CacheKey(exact, bucket, embedding)
+
+    def store(self, key: Optional[CacheKey], text: str) -> None:
+        """Cache a generated answer under the key returned by lookup()"""
+        if key is None or not text:
+            return
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        with self._lock:
+            if key.exact in self._entries:
+                self._drop(key.exact)
+            self._entries[key.exact] = (expires_at, text, key.bucket, key.embedding)
+            self._buckets.setdefault(key.bucket, {})[key.exact] = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            self._counters["stores"] += 1
+
+    def _similar(self, bucket: str, embedding: Tuple[float, ...], now: datetime) -> Optional[str]:
+        with self._lock:
+            candidates = list(self._buckets.get(bucket, ()))[-self.similarity_scan:]
+            best_score, best_key = self.similarity, None
+            for exact in candidates:
+                expires_at, _, _, other = self._entries[exact]
+                if other is None or expires_at <= now:
+                    continue
+                score = _dot(embedding, other)
+                if score >= best_score:
+                    best_score, best_key = score, exact
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self._counters["similar_hits"] += 1
+            return self._entries[best_key][1]
+
+    def _embedding(self, normalized: str) -> Optional[Tuple[float, ...]]:
+        if self.embed is None:
+            return None
+        try:
+            return _unit(self.embed(normalized))
+        except Exception as e:
+            logger.warning(f"Prompt embedding failed, using exact matches only: {e}")
+            self._count("embedding_errors")
+            return None
+
+    def _drop(self, exact: str) -> None:
+        """Remove an entry; caller holds the lock"""
+        _, _, bucket, _ = self._entries.pop(exact)
+        keys = self._buckets.get(bucket)
+        if keys is not None:
+            keys.pop(exact, None)
+            if not keys:
+                del self._buckets[bucket]
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["exact_hits"] + stats["similar_hits"]) / lookups, 4) if lookups else None
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+
+def _default_embedder() -> Optional[Callable[[str], Sequence[float]]]:
+    """Embedding function of the first configured provider"""
+    if os.getenv("GEMINI_API_KEY"):
+        import google.generativeai as genai
+
+        def embed(text):
+            return genai.embed_content(model="models/text-embedding-004", content=text)["embedding"]
+        return embed
+    if os.getenv("OPENAI_API_KEY"):
+        from .model_registry import get_openai_client
+
+        def embed(text):
+            return get_openai_client().embeddings.create(model="text-embedding-3-small", input=text).data[0].embedding
+        return embed
+    return None
+
+
+# Initialize a global instance with default configuration
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the global response cache"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(embed=_default_embedder() if RESPONSE_CACHE_EMBEDDINGS else None)
+    return _response_cache
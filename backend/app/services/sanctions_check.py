@@ -6,8 +6,32 @@ import time
 import re
 from datetime import datetime
 
+from .sanctions_index import get_sanctions_index, normalize_name, name_similarity, SANCTIONS_MATCH_THRESHOLD
+
 logger = logging.getLogger(__name__)
 
+# Test sanctioned entities used when no local sanctions lists are available
+MOCK_SANCTIONED_ENTITIES = [
+    {
+        "name": "Sanctioned Entity",
+        "name_pattern": re.compile(r"sanction(ed|s)", re.IGNORECASE),
+        "country_codes": ["RU", "BY", "IR"],
+        "list_name": "EU Restrictive Measures",
+        "date_listed": "2022-03-15",
+        "reasons": ["Violation of international law", "Support for illegal activities"],
+        "source_url": "https://sanctionsmap.eu/#/main/details/1,2"
+    },
+    {
+        "name": "North Korea Trading Co",
+        "name_pattern": re.compile(r"korea.*trading", re.IGNORECASE),
+        "country_codes": ["KP"],
+        "list_name": "OFAC SDN List",
+        "date_listed": "2018-05-10",
+        "reasons": ["Proliferation of weapons of mass destruction"],
+        "source_url": "https://home.treasury.gov/policy-issues/financial-sanctions/sanctions-list-search"
+    }
+]
+
 class SanctionsCheckService:
     """Service to check entities against public sanctions lists"""
     
@@ -31,8 +55,11 @@ class SanctionsCheckService:
                 - Dictionary with details of matches if any
         """
         try:
-            # In a real implementation, we would make API calls to the sanctions lists
-            # Here we'll simulate with a mock implementation
+            # Use the local sanctions-list index when lists are available,
+            # otherwise fall back to the mock implementation
+            index = get_sanctions_index()
+            if index is not None:
+                return cls.check_sanctions_index(index, entity_name, country_code, vat_id)
             return cls.check_sanctions_mock(entity_name, country_code, vat_id)
             
         except Exception as e:
@@ -40,49 +67,52 @@ class SanctionsCheckService:
             return False, {"error": f"Sanctions check service error: {str(e)}"}
     
     @classmethod
-    def check_sanctions_mock(cls, entity_name: str, country_code: str = None, vat_id: str = None) -> Tuple[bool, Dict[str, Any]]:
+    def check_sanctions_index(cls, index, entity_name: str, country_code: str = None, vat_id: str = None,
+                              threshold: float = SANCTIONS_MATCH_THRESHOLD) -> Tuple[bool, Dict[str, Any]]:
         """
-        Mock implementation for sanctions checking
+        Check an entity against the local sanctions-list index
         
         Args:
+            index: SanctionsIndex to search
             entity_name: Company or entity name to check
-            country_code: Optional country code (e.g. 'DE') 
+            country_code: Optional country code (e.g. 'DE'); reported per match
             vat_id: Optional VAT ID
+            threshold: Minimum name similarity for a match
             
         Returns:
             Tuple containing sanction status and details
         """
-        # Define some test sanctioned entities
-        sanctioned_entities = [
-            {
-                "name": "Sanctioned Entity",
-                "name_pattern": r"sanction(ed|s)",
-                "country_codes": ["RU", "BY", "IR"],
-                "list_name": "EU Restrictive Measures",
-                "date_listed": "2022-03-15",
-                "reasons": ["Violation of international law", "Support for illegal activities"],
-                "source_url": "https://sanctionsmap.eu/#/main/details/1,2"
-            },
+        matches = index.search(entity_name, threshold=threshold)
+        return cls._format_result([
             {
-                "name": "North Korea Trading Co",
-                "name_pattern": r"korea.*trading",
-                "country_codes": ["KP"],
-                "list_name": "OFAC SDN List",
-                "date_listed": "2018-05-10",
-                "reasons": ["Proliferation of weapons of mass destruction"],
-                "source_url": "https://home.treasury.gov/policy-issues/financial-sanctions/sanctions-list-search"
+                **match,
+                "country_match": bool(country_code and country_code.upper() in match.get("country_codes", []))
             }
-        ]
+            for match in matches
+        ], source="index")
+    
+    @classmethod
+    def check_sanctions_mock(cls, entity_name: str, country_code: str = None, vat_id: str = None) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Mock implementation for sanctions checking
         
+        Args:
+            entity_name: Company or entity name to check
+            country_code: Optional country code (e.g. 'DE') 
+            vat_id: Optional VAT ID
+            
+        Returns:
+            Tuple containing sanction status and details
+        """
         # Check for sanctions matches
         matches = []
         
         # Convert to lowercase for case-insensitive matching
         entity_name_lower = entity_name.lower()
         
-        for entity in sanctioned_entities:
-            # Match by name pattern
-            if re.search(entity["name_pattern"], entity_name_lower, re.IGNORECASE):
+        for entity in MOCK_SANCTIONED_ENTITIES:
+            # Match by name pattern (precompiled)
+            if entity["name_pattern"].search(entity_name_lower):
                 matches.append(entity)
                 continue
                 
@@ -96,24 +126,33 @@ class SanctionsCheckService:
                 # For country matches, we want a closer name match as well
                 # to avoid false positives just based on country
                 similarity = cls._calculate_name_similarity(entity_name_lower, entity["name"].lower())
-                if similarity > 0.5:  # Arbitrary threshold
+                if similarity >= SANCTIONS_MATCH_THRESHOLD:
                     matches.append(entity)
         
-        # Format response
+        return cls._format_result(matches, source="mock")
+    
+    @staticmethod
+    def _format_result(matches: List[Dict[str, Any]], source: str) -> Tuple[bool, Dict[str, Any]]:
+        """Format matches into the sanctions check response"""
         if matches:
+            formatted = []
+            for match in matches:
+                item = {
+                    "entity_name": match["name"],
+                    "list_name": match["list_name"],
+                    "date_listed": match["date_listed"],
+                    "reasons": match["reasons"],
+                    "source_url": match["source_url"]
+                }
+                for key in ("score", "matched_name", "entry_id", "country_match"):
+                    if key in match:
+                        item[key] = match[key]
+                formatted.append(item)
             return True, {
                 "is_sanctioned": True,
-                "matches": [
-                    {
-                        "entity_name": match["name"],
-                        "list_name": match["list_name"],
-                        "date_listed": match["date_listed"],
-                        "reasons": match["reasons"],
-                        "source_url": match["source_url"]
-                    } 
-                    for match in matches
-                ],
-                "match_count": len(matches),
+                "matches": formatted,
+                "match_count": len(formatted),
+                "source": source,
                 "check_date": datetime.now().isoformat()
             }
         else:
@@ -121,13 +160,14 @@ class SanctionsCheckService:
                 "is_sanctioned": False,
                 "matches": [],
                 "match_count": 0,
+                "source": source,
                 "check_date": datetime.now().isoformat()
             }
     
     @staticmethod
     def _calculate_name_similarity(name1: str, name2: str) -> float:
         """
-        Calculate similarity between two names (simplified version)
+        Calculate similarity between two names (Jaro-Winkler / Levenshtein on normalized names)
         
         Args:
             name1: First name
@@ -136,18 +176,4 @@ class SanctionsCheckService:
         Returns:
             Float representing similarity (0.0 to 1.0)
         """
-        # This is a very simplified version
-        # In production, you'd want to use a proper string similarity algorithm
-        # like Levenshtein distance, Jaro-Winkler, or cosine similarity with character n-grams
-        
-        # For now we'll use a naive approach
-        words1 = set(name1.lower().split())
-        words2 = set(name2.lower().split())
-        
-        if not words1 or not words2:
-            return 0.0
-            
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
+        return name_similarity(normalize_name(name1), normalize_name(name2))
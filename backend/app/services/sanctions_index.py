@@ -0,0 +1,561 @@
+"""Local sanctions-list index with fuzzy name matching.
+
+Sanctions lists (EU consolidated list XML, OFAC SDN XML or a simple CSV export)
+are loaded from local files, names are normalized and transliterated, and a
+character-trigram inverted index is built over all names and aliases. Lookups
+generate candidates from the index and re-rank them with Jaro-Winkler and
+Levenshtein similarity. The compiled index is pickled to disk so workers can
+start without re-parsing the source lists.
+"""
+import os
+import re
+import csv
+import glob
+import pickle
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+import xml.etree.ElementTree as ET
+from array import array
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SANCTIONS_DATA_DIR = os.getenv("SANCTIONS_DATA_DIR", "data/sanctions")
+SANCTIONS_INDEX_PATH = os.getenv("SANCTIONS_INDEX_PATH", os.path.join(SANCTIONS_DATA_DIR, "index.pkl"))
+SANCTIONS_MATCH_THRESHOLD = float(os.getenv("SANCTIONS_MATCH_THRESHOLD", "0.88"))
+SANCTIONS_INDEX_RELOAD_INTERVAL = float(os.getenv("SANCTIONS_INDEX_RELOAD_INTERVAL", "60"))
+
+INDEX_FORMAT_VERSION = 2
+NGRAM_SIZE = 3
+
+# Transliteration for characters NFKD does not decompose to ASCII
+_TRANSLIT = str.maketrans({
+    "ß": "ss", "æ": "ae", "ø": "o", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i",
+    # Cyrillic (Russian / Ukrainian / Belarusian)
+    "а": "a", "б": "b", "в": "v", "г": "g", "ґ": "g", "д": "d", "е": "e", "ё": "e", "є": "ye",
+    "ж": "zh", "з": "z", "и": "i", "і": "i", "ї": "yi", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ў": "u", "ф": "f",
+    "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya",
+    # Greek
+    "α": "a", "β": "v", "γ": "g", "δ": "d", "ε": "e", "ζ": "z", "η": "i", "θ": "th", "ι": "i",
+    "κ": "k", "λ": "l", "μ": "m", "ν": "n", "ξ": "x", "ο": "o", "π": "p", "ρ": "r", "σ": "s",
+    "ς": "s", "τ": "t", "υ": "y", "φ": "f", "χ": "ch", "ψ": "ps", "ω": "o",
+})
+
+# Legal-form tokens that carry no identifying information
+LEGAL_FORMS = frozenset({
+    "gmbh", "mbh", "ag", "kg", "ohg", "ug", "ev", "kgaa", "se", "ltd", "limited", "llc", "llp", "lp",
+    "inc", "incorporated", "corp", "corporation", "co", "company", "plc", "sa", "sarl", "sas", "spa",
+    "srl", "bv", "nv", "oy", "ab", "as", "aps", "sp", "zoo", "ooo", "oao", "zao", "pao", "ao", "jsc",
+    "ojsc", "pjsc", "cjsc", "tov", "fze", "fzco", "the",
+})
+
+# Country names as written in the OFAC SDN list, mapped to ISO 3166-1 alpha-2
+OFAC_COUNTRY_CODES = {
+    "afghanistan": "AF", "albania": "AL", "algeria": "DZ", "andorra": "AD", "angola": "AO",
+    "anguilla": "AI", "antigua and barbuda": "AG", "argentina": "AR", "armenia": "AM", "aruba": "AW",
+    "australia": "AU", "austria": "AT", "azerbaijan": "AZ", "bahamas, the": "BS", "bahamas": "BS",
+    "bahrain": "BH", "bangladesh": "BD", "barbados": "BB", "belarus": "BY", "belgium": "BE",
+    "belize": "BZ", "benin": "BJ", "bermuda": "BM", "bolivia": "BO", "bosnia and herzegovina": "BA",
+    "bosnia-herzegovina": "BA", "botswana": "BW", "brazil": "BR", "british virgin islands": "VG",
+    "virgin islands, british": "VG", "brunei": "BN", "bulgaria": "BG", "burkina faso": "BF",
+    "burma": "MM", "burundi": "BI", "cambodia": "KH", "cameroon": "CM", "canada": "CA",
+    "cayman islands": "KY", "central african republic": "CF", "chad": "TD", "chile": "CL",
+    "china": "CN", "colombia": "CO", "comoros": "KM", "congo, democratic republic of the": "CD",
+    "congo, republic of the": "CG", "costa rica": "CR", "cote d'ivoire": "CI", "croatia": "HR",
+    "cuba": "CU", "curacao": "CW", "cyprus": "CY", "czech republic": "CZ", "czechia": "CZ",
+    "denmark": "DK", "djibouti": "DJ", "dominica": "DM", "dominican republic": "DO", "ecuador": "EC",
+    "egypt": "EG", "el salvador": "SV", "equatorial guinea": "GQ", "eritrea": "ER", "estonia": "EE",
+    "eswatini": "SZ", "ethiopia": "ET", "fiji": "FJ", "finland": "FI", "france": "FR", "gabon": "GA",
+    "gambia, the": "GM", "gambia": "GM", "gaza": "PS", "georgia": "GE", "germany": "DE", "ghana": "GH",
+    "gibraltar": "GI", "greece": "GR", "guatemala": "GT", "guernsey": "GG", "guinea": "GN",
+    "guinea-bissau": "GW", "guyana": "GY", "haiti": "HT", "honduras": "HN", "hong kong": "HK",
+    "hungary": "HU", "iceland": "IS", "india": "IN", "indonesia": "ID", "iran": "IR", "iraq": "IQ",
+    "ireland": "IE", "isle of man": "IM", "israel": "IL", "italy": "IT", "jamaica": "JM", "japan": "JP",
+    "jersey": "JE", "jordan": "JO", "kazakhstan": "KZ", "kenya": "KE", "korea, north": "KP",
+    "korea, south": "KR", "kosovo": "XK", "kuwait": "KW", "kyrgyzstan": "KG", "laos": "LA",
+    "latvia": "LV", "lebanon": "LB", "lesotho": "LS", "liberia": "LR", "libya": "LY",
+    "liechtenstein": "LI", "lithuania": "LT", "luxembourg": "LU", "macau": "MO", "madagascar": "MG",
+    "malawi": "MW", "malaysia": "MY", "maldives": "MV", "mali": "ML", "malta": "MT",
+    "marshall islands": "MH", "mauritania": "MR", "mauritius": "MU", "mexico": "MX", "moldova": "MD",
+    "monaco": "MC", "mongolia": "MN", "montenegro": "ME", "morocco": "MA", "mozambique": "MZ",
+    "namibia": "NA", "nepal": "NP", "netherlands": "NL", "new zealand": "NZ", "nicaragua": "NI",
+    "niger": "NE", "nigeria": "NG", "north macedonia, the republic of": "MK", "north macedonia": "MK",
+    "norway": "NO", "oman": "OM", "pakistan": "PK", "palau": "PW", "panama": "PA",
+    "papua new guinea": "PG", "paraguay": "PY", "peru": "PE", "philippines": "PH", "poland": "PL",
+    "portugal": "PT", "qatar": "QA", "region: crimea": "UA", "romania": "RO", "russia": "RU",
+    "rwanda": "RW", "saint kitts and nevis": "KN", "saint lucia": "LC",
+    "saint vincent and the grenadines": "VC", "samoa": "WS", "san marino": "SM", "saudi arabia": "SA",
+    "senegal": "SN", "serbia": "RS", "seychelles": "SC", "sierra leone": "SL", "singapore": "SG",
+    "sint maarten": "SX", "slovakia": "SK", "slovenia": "SI", "solomon islands": "SB", "somalia": "SO",
+    "south africa": "ZA", "south sudan": "SS", "spain": "ES", "sri lanka": "LK", "sudan": "SD",
+    "suriname": "SR", "sweden": "SE", "switzerland": "CH", "syria": "SY", "taiwan": "TW",
+    "tajikistan": "TJ", "tanzania": "TZ", "thailand": "TH", "timor-leste": "TL", "togo": "TG",
+    "trinidad and tobago": "TT", "tunisia": "TN", "turkey": "TR", "turkiye": "TR",
+    "turkmenistan": "TM", "uganda": "UG", "ukraine": "UA", "united arab emirates": "AE",
+    "united kingdom": "GB", "united states": "US", "uruguay": "UY", "uzbekistan": "UZ",
+    "vanuatu": "VU", "venezuela": "VE", "vietnam": "VN", "west bank": "PS", "yemen": "YE",
+    "zambia": "ZM", "zimbabwe": "ZW",
+}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, transliterate to ASCII, drop punctuation and legal-form tokens"""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name.casefold().translate(_TRANSLIT))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    tokens = _NON_ALNUM.sub(" ", text).split()
+    significant = [token for token in tokens if token not in LEGAL_FORMS]
+    # Keep the legal form if it is all there is (e.g. "AG")
+    return " ".join(significant or tokens)
+
+
+def ngrams(normalized: str, n: int = NGRAM_SIZE) -> List[str]:
+    """Character n-grams of a normalized name, padded so word boundaries count"""
+    padded = f" {normalized} "
+    if len(padded) < n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def jaro_winkler(s1: str, s2: str, prefix_weight: float = 0.1) -> float:
+    """Jaro-Winkler similarity (0.0 to 1.0)"""
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+    window = max(max(len1, len2) // 2 - 1, 0)
+    matched1 = [False] * len1
+    matched2 = [False] * len2
+    matches = 0
+    for i, ch in enumerate(s1):
+        start, end = max(0, i - window), min(i + window + 1, len2)
+        for j in range(start, end):
+            if not matched2[j] and s2[j] == ch:
+                matched1[i] = matched2[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i in range(len1):
+        if matched1[i]:
+            while not matched2[j]:
+                j += 1
+            if s1[i] != s2[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / len1 + matches / len2 + (matches - transpositions / 2) / matches) / 3
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+def levenshtein_ratio(s1: str, s2: str, min_ratio: float = 0.0) -> float:
+    """
+    1 - normalized Levenshtein distance (0.0 to 1.0)
+
+    Returns 0.0 early once the ratio can no longer reach ``min_ratio``.
+    """
+    if s1 == s2:
+        return 1.0
+    if not s1 or not s2:
+        return 0.0
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    max_distance = int((1 - min_ratio) * len(s1)) if min_ratio > 0 else len(s1)
+    if len(s1) - len(s2) > max_distance:
+        return 0.0
+    previous = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current = [i]
+        for j, c2 in enumerate(s2, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (c1 != c2)))
+        if min(current) > max_distance:
+            return 0.0
+        previous = current
+    return 1 - previous[-1] / len(s1)
+
+
+def name_similarity(a: str, b: str, min_score: float = 0.0) -> float:
+    """
+    Similarity of two normalized names
+
+    Averages Jaro-Winkler and Levenshtein similarity, on the names as given and with
+    tokens sorted (so "Ivanov Petr" matches "Petr Ivanov"), and returns the best.
+    Levenshtein is skipped when Jaro-Winkler alone rules out reaching ``min_score``.
+    """
+    if a == b:
+        return 1.0
+    variants = [(a, b)]
+    sorted_a, sorted_b = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    if (sorted_a, sorted_b) != (a, b):
+        variants.append((sorted_a, sorted_b))
+    best = 0.0
+    for x, y in variants:
+        needed = max(min_score, best)
+        jw = jaro_winkler(x, y)
+        if (jw + 1) / 2 < needed:
+            continue
+        lev = levenshtein_ratio(x, y, min_ratio=2 * needed - jw)
+        best = max(best, (jw + lev) / 2)
+    return best
+
+
+class SanctionsIndex:
+    """Trigram inverted index over sanctioned entity names and aliases"""
+
+    def __init__(self, entries: Iterable[Dict[str, Any]] = (), fingerprint: Optional[str] = None):
+        self.version = INDEX_FORMAT_VERSION
+        self.fingerprint = fingerprint
+        self.entries: List[Dict[str, Any]] = []
+        self.names: List[str] = []             # normalized names, one per name/alias
+        self.name_entry = array("I")           # name id -> entry position
+        self.gram_counts = array("H")          # name id -> number of distinct n-grams
+        self.postings: Dict[str, array] = {}   # n-gram -> name ids
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        """Add an entry with "name" and optional "aliases" to the index"""
+        position = len(self.entries)
+        self.entries.append(entry)
+        seen = set()
+        for raw_name in [entry["name"], *entry.get("aliases", [])]:
+            normalized = normalize_name(raw_name)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+            name_id = len(self.names)
+            self.names.append(normalized)
+            self.name_entry.append(position)
+            grams = set(ngrams(normalized))
+            self.gram_counts.append(min(len(grams), 65535))
+            for gram in grams:
+                postings = self.postings.get(gram)
+                if postings is None:
+                    postings = self.postings[gram] = array("I")
+                postings.append(name_id)
+
+    def candidates(self, normalized: str, limit: int = 25, min_dice: float = 0.5,
+                   max_posting_ratio: float = 0.01) -> List[Tuple[int, float]]:
+        """
+        Candidate name ids for a normalized query, ranked by n-gram Dice coefficient
+
+        Names are ranked by how many selective n-grams they share with the query;
+        very frequent n-grams (posting lists above ``max_posting_ratio`` of all names)
+        are skipped, except that the rarest third of the query's n-grams is always
+        used. The Dice coefficient is estimated from the selective n-grams only;
+        exact scoring is left to the re-ranking step.
+        """
+        query_grams = set(ngrams(normalized))
+        if not query_grams or not self.names:
+            return []
+        max_postings = max(int(len(self.names) * max_posting_ratio), 64)
+        lists = sorted((self.postings[g] for g in query_grams if g in self.postings), key=len)
+        # Always use at least the rarest third of the query's n-grams
+        min_lists = -(-len(query_grams) // 3)
+        selective = [p for i, p in enumerate(lists) if i < min_lists or len(p) <= max_postings]
+        counts = Counter()
+        for postings in selective:
+            counts.update(postings)
+        query_size = len(query_grams)
+        # Scale shared selective n-grams up to an estimate over all query n-grams
+        coverage = len(selective) / query_size
+        scored = []
+        for name_id, shared in counts.most_common(limit * 2):
+            dice = min(2 * (shared / coverage) / (query_size + self.gram_counts[name_id]), 1.0)
+            if dice >= min_dice:
+                scored.append((name_id, dice))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def search(self, name: str, threshold: float = SANCTIONS_MATCH_THRESHOLD,
+               limit: int = 25) -> List[Dict[str, Any]]:
+        """
+        Search the index for an entity name
+
+        Returns:
+            One match per entry (best scoring alias), sorted by score, each with the
+            entry fields plus "score" and "matched_name"
+        """
+        normalized = normalize_name(name)
+        if not normalized:
+            return []
+        best: Dict[int, Tuple[float, str]] = {}
+        for name_id, _ in self.candidates(normalized, limit=limit):
+            candidate = self.names[name_id]
+            score = name_similarity(normalized, candidate, min_score=threshold)
+            if score < threshold:
+                continue
+            position = self.name_entry[name_id]
+            if position not in best or score > best[position][0]:
+                best[position] = (score, candidate)
+        matches = [
+            {**self.entries[position], "score": round(score, 4), "matched_name": matched}
+            for position, (score, matched) in best.items()
+        ]
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return matches
+
+    def save(self, path: str) -> None:
+        """Pickle the compiled index to disk (atomically)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SanctionsIndex"]:
+        """Load a pickled index; None if missing or built by an incompatible version"""
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load sanctions index from {path}: {e}")
+            return None
+        if not isinstance(index, cls) or getattr(index, "version", None) != INDEX_FORMAT_VERSION:
+            return None
+        return index
+
+
+# ---------------------------------------------------------------------------
+# List loaders
+# ---------------------------------------------------------------------------
+
+def _local(tag: str) -> str:
+    """Strip the XML namespace from a tag"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element, name: str) -> str:
+    for child in element:
+        if _local(child.tag) == name:
+            return (child.text or "").strip()
+    return ""
+
+
+def load_eu_consolidated_xml(path: str) -> Iterator[Dict[str, Any]]:
+    """Parse the EU Financial Sanctions consolidated list (XML, 1.1 format)"""
+    for _, element in ET.iterparse(path, events=("end",)):
+        if _local(element.tag) != "sanctionEntity":
+            continue
+        names, countries, regulations = [], set(), []
+        for child in element.iter():
+            tag = _local(child.tag)
+            if tag == "nameAlias" and child.get("wholeName"):
+                names.append(child.get("wholeName").strip())
+            elif tag in ("citizenship", "address") and child.get("countryIso2Code"):
+                countries.add(child.get("countryIso2Code").upper())
+            elif tag == "regulation":
+                regulations.append(child)
+        if names:
+            regulation = regulations[0] if regulations else None
+            yield {
+                "entry_id": f"EU:{element.get('logicalId') or element.get('euReferenceNumber') or names[0]}",
+                "name": names[0],
+                "aliases": names[1:],
+                "country_codes": sorted(countries),
+                "list_name": "EU Restrictive Measures",
+                "date_listed": regulation.get("publicationDate", "") if regulation is not None else "",
+                "reasons": [r for r in (_child_text(element, "remark"),) if r],
+                "source_url": "https://webgate.ec.europa.eu/fsd/fsf",
+            }
+        element.clear()
+
+
+def ofac_country_code(name: str) -> Optional[str]:
+    """ISO 3166-1 alpha-2 code for a country name from the OFAC list, None if unknown"""
+    key = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().strip().lower()
+    if len(key) == 2 and key.isalpha():
+        return key.upper()
+    return OFAC_COUNTRY_CODES.get(key)
+
+
+def load_ofac_sdn_xml(path: str) -> Iterator[Dict[str, Any]]:
+    """Parse the OFAC SDN list (sdn.xml)"""
+    for _, element in ET.iterparse(path, events=("end",)):
+        if _local(element.tag) != "sdnEntry":
+            continue
+        primary = " ".join(filter(None, [_child_text(element, "firstName"), _child_text(element, "lastName")]))
+        aliases, programs, countries = [], [], set()
+        for child in element.iter():
+            tag = _local(child.tag)
+            if tag == "aka":
+                alias = " ".join(filter(None, [_child_text(child, "firstName"), _child_text(child, "lastName")]))
+                if alias:
+                    aliases.append(alias)
+            elif tag == "program" and child.text:
+                programs.append(child.text.strip())
+            elif tag == "country" and child.text:
+                code = ofac_country_code(child.text)
+                if code:
+                    countries.add(code)
+                else:
+                    logger.debug(f"Unknown OFAC country name: {child.text.strip()}")
+        if primary:
+            yield {
+                "entry_id": f"OFAC:{_child_text(element, 'uid')}",
+                "name": primary,
+                "aliases": aliases,
+                "country_codes": sorted(countries),
+                "list_name": "OFAC SDN List",
+                "date_listed": "",
+                "reasons": programs,
+                "source_url": "https://sanctionssearch.ofac.treas.gov/",
+            }
+        element.clear()
+
+
+def load_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a simple CSV export with columns:
+    id, name, aliases (";"-separated), country_codes (";"-separated),
+    list_name, date_listed, reasons (";"-separated), source_url
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            split = lambda value: [part.strip() for part in (value or "").split(";") if part.strip()]
+            list_name = (row.get("list_name") or os.path.splitext(os.path.basename(path))[0]).strip()
+            yield {
+                "entry_id": f"{list_name}:{(row.get('id') or name).strip()}",
+                "name": name,
+                "aliases": split(row.get("aliases")),
+                "country_codes": [code.upper() for code in split(row.get("country_codes"))],
+                "list_name": list_name,
+                "date_listed": (row.get("date_listed") or "").strip(),
+                "reasons": split(row.get("reasons")),
+                "source_url": (row.get("source_url") or "").strip(),
+            }
+
+
+def load_list_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Load entries from a list file, picking the parser from its name/format"""
+    if path.lower().endswith(".csv"):
+        return load_csv(path)
+    with open(path, "rb") as f:
+        head = f.read(4096).decode("utf-8", errors="ignore")
+    if "sdnEntry" in head or "sdnList" in head:
+        return load_ofac_sdn_xml(path)
+    return load_eu_consolidated_xml(path)
+
+
+def list_source_files(data_dir: str = SANCTIONS_DATA_DIR) -> List[str]:
+    """Sanctions list files found in the data directory"""
+    patterns = ("*.xml", "*.csv")
+    return sorted(path for pattern in patterns for path in glob.glob(os.path.join(data_dir, pattern)))
+
+
+def sources_fingerprint(paths: List[str]) -> str:
+    """Fingerprint of the source files (path, size, mtime) used to detect a stale index"""
+    digest = hashlib.sha1(str(INDEX_FORMAT_VERSION).encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()
+
+
+def build_index(paths: List[str], fingerprint: Optional[str] = None) -> SanctionsIndex:
+    """Parse all list files and build a fresh index"""
+    index = SanctionsIndex(fingerprint=fingerprint)
+    for path in paths:
+        count = 0
+        for entry in load_list_file(path):
+            index.add(entry)
+            count += 1
+        logger.info(f"Loaded {count} sanctions entries from {path}")
+    return index
+
+
+def load_or_build_index(data_dir: str = SANCTIONS_DATA_DIR,
+                        index_path: str = SANCTIONS_INDEX_PATH) -> Optional[SanctionsIndex]:
+    """
+    Load the pickled index if it matches the current list files, otherwise rebuild it
+
+    Returns None when no list files are available.
+    """
+    paths = list_source_files(data_dir)
+    if not paths:
+        return None
+    fingerprint = sources_fingerprint(paths)
+    index = SanctionsIndex.load(index_path)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    index = build_index(paths, fingerprint)
+    try:
+        index.save(index_path)
+    except OSError as e:
+        logger.warning(f"Could not persist sanctions index to {index_path}: {e}")
+    return index
+
+
+# Initialize a global instance lazily
+_sanctions_index = None
+_sanctions_index_loaded = False
+_sanctions_index_mtime = None
+_sanctions_index_checked_at = 0.0
+_sanctions_index_lock = threading.Lock()
+
+def _index_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def get_sanctions_index() -> Optional[SanctionsIndex]:
+    """
+    Get the process-wide sanctions index (None if no local lists are configured)
+
+    The persisted index is re-read when another process (the refresh job) has
+    replaced it; the file is checked at most every SANCTIONS_INDEX_RELOAD_INTERVAL seconds.
+    """
+    global _sanctions_index, _sanctions_index_loaded, _sanctions_index_mtime, _sanctions_index_checked_at
+    now = time.monotonic()
+    if _sanctions_index_loaded and now - _sanctions_index_checked_at < SANCTIONS_INDEX_RELOAD_INTERVAL:
+        return _sanctions_index
+    with _sanctions_index_lock:
+        if not _sanctions_index_loaded:
+            _sanctions_index = load_or_build_index()
+            _sanctions_index_loaded = True
+            _sanctions_index_mtime = _index_mtime(SANCTIONS_INDEX_PATH)
+        elif now - _sanctions_index_checked_at >= SANCTIONS_INDEX_RELOAD_INTERVAL:
+            mtime = _index_mtime(SANCTIONS_INDEX_PATH)
+            if mtime is not None and mtime != _sanctions_index_mtime:
+                reloaded = SanctionsIndex.load(SANCTIONS_INDEX_PATH)
+                if reloaded is not None:
+                    logger.info(f"Reloaded sanctions index ({len(reloaded)} entries)")
+                    _sanctions_index = reloaded
+                    _sanctions_index_mtime = mtime
+        _sanctions_index_checked_at = now
+    return _sanctions_index
+
+
+def set_sanctions_index(index: Optional[SanctionsIndex]) -> None:
+    """Replace the process-wide index (e.g. after a list refresh)"""
+    global _sanctions_index, _sanctions_index_loaded, _sanctions_index_mtime
+    with _sanctions_index_lock:
+        _sanctions_index = index
+        _sanctions_index_loaded = True
+        _sanctions_index_mtime = _index_mtime(SANCTIONS_INDEX_PATH)
@@ -0,0 +1,174 @@
+"""Incremental sanctions list refresh with delta re-screening.
+
+The ingest job rebuilds the sanctions index from the current list files, diffs
+it against the previously persisted version and re-screens only the stored
+counterparties whose name n-grams overlap an added, removed or changed entry.
+Work is proportional to list churn instead of the number of counterparties.
+"""
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Iterable, Optional, Set
+
+from .sanctions_index import (
+    SanctionsIndex, build_index, list_source_files, sources_fingerprint, normalize_name,
+    set_sanctions_index, SANCTIONS_DATA_DIR, SANCTIONS_INDEX_PATH
+)
+from .sanctions_check import SanctionsCheckService
+
+logger = logging.getLogger(__name__)
+
+# Looser than the match threshold: any plausible overlap triggers a re-screen
+REFRESH_MIN_DICE = float(os.getenv("SANCTIONS_REFRESH_MIN_DICE", "0.3"))
+REFRESH_MAX_CANDIDATES = int(os.getenv("SANCTIONS_REFRESH_MAX_CANDIDATES", "500"))
+
+
+def entry_digest(entry: Dict[str, Any]) -> str:
+    """Stable content hash of a sanctions entry"""
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def diff_entries(old_entries: Iterable[Dict[str, Any]],
+                 new_entries: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Diff two versions of the sanctions lists by entry_id
+
+    Returns:
+        Dictionary with "added", "removed" and "changed" entries; changed items
+        hold both versions as {"old": ..., "new": ...}
+    """
+    old_by_id = {entry["entry_id"]: entry for entry in old_entries}
+    new_by_id = {entry["entry_id"]: entry for entry in new_entries}
+    delta = {"added": [], "removed": [], "changed": []}
+    for entry_id, entry in new_by_id.items():
+        previous = old_by_id.get(entry_id)
+        if previous is None:
+            delta["added"].append(entry)
+        elif entry_digest(previous) != entry_digest(entry):
+            delta["changed"].append({"old": previous, "new": entry})
+    for entry_id, entry in old_by_id.items():
+        if entry_id not in new_by_id:
+            delta["removed"].append(entry)
+    return delta
+
+
+def delta_names(delta: Dict[str, List[Dict[str, Any]]]) -> Set[str]:
+    """All normalized names and aliases touched by a delta (both versions of changed entries)"""
+    touched = list(delta["added"]) + list(delta["removed"])
+    for change in delta["changed"]:
+        touched.extend((change["old"], change["new"]))
+    names = set()
+    for entry in touched:
+        for raw_name in [entry["name"], *entry.get("aliases", [])]:
+            normalized = normalize_name(raw_name)
+            if normalized:
+                names.add(normalized)
+    return names
+
+
+def build_counterparty_index(counterparties: Iterable[Dict[str, Any]]) -> SanctionsIndex:
+    """
+    Build an n-gram index over stored counterparties
+
+    Args:
+        counterparties: Dicts with "id" and "name" (plus optional "country_code",
+                        "vat_id", "is_sanctioned" for the previous status)
+    """
+    return SanctionsIndex({**counterparty, "entry_id": counterparty["id"]} for counterparty in counterparties)
+
+
+def affected_counterparties(delta: Dict[str, List[Dict[str, Any]]],
+                            counterparty_index: SanctionsIndex,
+                            min_dice: float = REFRESH_MIN_DICE) -> List[Dict[str, Any]]:
+    """Counterparties whose name n-grams overlap any entry touched by the delta"""
+    positions = set()
+    for name in delta_names(delta):
+        for name_id, _ in counterparty_index.candidates(name, limit=REFRESH_MAX_CANDIDATES, min_dice=min_dice):
+            positions.add(counterparty_index.name_entry[name_id])
+    return [counterparty_index.entries[position] for position in sorted(positions)]
+
+
+def rescreen(counterparties: Iterable[Dict[str, Any]], index: SanctionsIndex) -> List[Dict[str, Any]]:
+    """Re-screen counterparties against the new index and report status changes"""
+    results = []
+    for counterparty in counterparties:
+        is_sanctioned, details = SanctionsCheckService.check_sanctions_index(
+            index, counterparty["name"], counterparty.get("country_code"), counterparty.get("vat_id")
+        )
+        previously = counterparty.get("is_sanctioned")
+        if previously is None:
+            change = "rescreened"
+        elif is_sanctioned and not previously:
+            change = "newly_sanctioned"
+        elif previously and not is_sanctioned:
+            change = "cleared"
+        else:
+            change = "unchanged"
+        results.append({
+            "id": counterparty["id"],
+            "name": counterparty["name"],
+            "is_sanctioned": is_sanctioned,
+            "change": change,
+            "sanctions_check": details,
+        })
+    return results
+
+
+def refresh_sanctions_lists(counterparty_index: Optional[SanctionsIndex] = None,
+                            data_dir: str = SANCTIONS_DATA_DIR,
+                            index_path: str = SANCTIONS_INDEX_PATH,
+                            force: bool = False) -> Dict[str, Any]:
+    """
+    Nightly ingest job: rebuild the index, diff against the previous version and
+    re-screen the affected counterparties
+
+    Args:
+        counterparty_index: Index over stored counterparties (see build_counterparty_index);
+                            if None, only the list diff is computed
+        data_dir: Directory with the sanctions list files
+        index_path: Path of the persisted index (the previous version is read from here)
+        force: Rebuild even if the list files did not change
+
+    Returns:
+        Report with delta counts, the number of re-screened counterparties and their results
+    """
+    started = datetime.utcnow()
+    paths = list_source_files(data_dir)
+    if not paths:
+        return {"status": "no_lists", "data_dir": data_dir}
+
+    previous = SanctionsIndex.load(index_path)
+    fingerprint = sources_fingerprint(paths)
+    if previous is not None and previous.fingerprint == fingerprint and not force:
+        return {"status": "unchanged", "entries": len(previous)}
+
+    index = build_index(paths, fingerprint)
+    delta = diff_entries(previous.entries if previous is not None else [], index.entries)
+    index.save(index_path)
+    if index_path == SANCTIONS_INDEX_PATH:
+        # Swap in this process; other workers pick up the new file on their next reload check
+        set_sanctions_index(index)
+
+    report = {
+        "status": "refreshed",
+        "entries": len(index),
+        "added": len(delta["added"]),
+        "removed": len(delta["removed"]),
+        "changed": len(delta["changed"]),
+        "rescreened": 0,
+        "results": [],
+    }
+    if counterparty_index is not None and any(delta.values()):
+        affected = affected_counterparties(delta, counterparty_index)
+        report["results"] = rescreen(affected, index)
+        report["rescreened"] = len(affected)
+        report["counterparties"] = len(counterparty_index)
+
+    report["duration_ms"] = round((datetime.utcnow() - started).total_seconds() * 1000, 1)
+    logger.info(
+        f"Sanctions refresh: +{report['added']} -{report['removed']} ~{report['changed']} entries, "
+        f"{report['rescreened']} counterparties re-screened"
+    )
+    return report
@@ -1,12 +1,103 @@
 import os
+import time
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from flask import current_app
 from .model_service import ModelService
+from .calendar_intent import has_calendar_intent
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Общий срок (секунды) для ответа и извлечения календарных данных в гибридном режиме
+SECRETARY_HYBRID_DEADLINE = float(os.getenv("SECRETARY_HYBRID_DEADLINE", "30"))
+
+SECRETARY_PROMPT = """
+                Ты - профессиональный секретарь. Ответь на следующий запрос пользователя 
+                вежливо, кратко и по существу. Ты должен быть максимально полезным.
+                
+                Запрос пользователя: {message}
+                """
+
+ERROR_TEXT = "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже."
+
+_executor = None
+
+def _get_executor():
+    """Пул потоков для параллельных вызовов гибридного режима"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="secretary-hybrid")
+    return _executor
+
+def _extract_calendar_data(message):
+    """Извлечение данных календаря специализированным эндпоинтом контейнера секретаря"""
+    calendar_extraction = ModelService.call_secretary_specialized_endpoints(
+        endpoint="calendar_data_extraction",
+        data={"message": message}
+    )
+    return calendar_extraction.get("extracted_data")
+
+def iter_hybrid_response(message, deadline=SECRETARY_HYBRID_DEADLINE):
+    """
+    Гибридный режим: ответ клиенту (OpenAI) и извлечение календарных данных (контейнер)
+    выполняются параллельно в пределах общего срока.
+    
+    Сначала отдает ("text", result), как только готов ответ; если извлечение
+    календарных данных к этому моменту не закончилось, затем отдает ("calendar", data).
+    Извлечение запускается, только если локальный классификатор видит в сообщении
+    календарное намерение.
+    """
+    deadline_at = time.monotonic() + deadline
+    executor = _get_executor()
+    # Контекст запроса (пользователь для журнала расхода) передается в потоки пула
+    reply_future = executor.submit(
+        contextvars.copy_context().run,
+        ModelService.call_openai_api,
+        prompt=SECRETARY_PROMPT.format(message=message),
+        model_name="gpt-4o"  # Используем более продвинутую модель для коммуникаций
+    )
+    calendar_future = None
+    if has_calendar_intent(message):
+        calendar_future = executor.submit(contextvars.copy_context().run, _extract_calendar_data, message)
+    
+    try:
+        client_response = reply_future.result(timeout=max(0, deadline_at - time.monotonic()))
+        result = {
+            "text": client_response["text"],
+            "model": client_response["model"],
+            "metadata": {"calendar_data": None}
+        }
+    except FutureTimeoutError:
+        logger.error(f"Secretary reply exceeded the {deadline}s deadline")
+        result = {"text": ERROR_TEXT, "model": "error", "error": "deadline exceeded",
+                  "metadata": {"calendar_data": None}}
+    except Exception as e:
+        logger.error(f"Error getting secretary reply: {e}")
+        result = {"text": ERROR_TEXT, "model": "error", "error": str(e), "metadata": {"calendar_data": None}}
+    
+    calendar_pending = calendar_future is not None and not calendar_future.done()
+    if calendar_future is not None and not calendar_pending:
+        result["metadata"]["calendar_data"] = _calendar_result(calendar_future, 0)
+    result["metadata"]["calendar_pending"] = calendar_pending
+    yield "text", result
+    
+    if calendar_pending:
+        yield "calendar", _calendar_result(calendar_future, max(0, deadline_at - time.monotonic()))
+
+def _calendar_result(future, timeout):
+    """Результат извлечения календарных данных или None при ошибке или истечении срока"""
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning("Calendar data extraction exceeded the deadline")
+    except Exception as e:
+        logger.error(f"Error extracting calendar data: {e}")
+    return None
+
 def get_secretary_response(message, user_id=None, conversation_id=None, mode="hybrid"):
     """
     Получение ответа от секретарского модуля
@@ -19,37 +110,13 @@ def get_secretary_response(message, user_id=None, conversation_id=None, mode="hy
     """
     try:
         if mode == "hybrid":
-            # Для коммуникации с клиентом используем OpenAI
-            client_response = ModelService.call_openai_api(
-                prompt=f"""
-                Ты - профессиональный секретарь. Ответь на следующий запрос пользователя 
-                вежливо, кратко и по существу. Ты должен быть максимально полезным.
-                
-                Запрос пользователя: {message}
-                """,
-                model_name="gpt-4o"  # Используем более продвинутую модель для коммуникаций
-            )
-            
-            # Для обработки данных и извлечения календарных событий используем Gemini
-            calendar_data = None
-            if "календарь" in message.lower() or "встреч" in message.lower() or "событи" in message.lower():
-                # Вызываем специализированный эндпоинт для извлечения данных календаря
-                calendar_extraction = ModelService.call_secretary_specialized_endpoints(
-                    endpoint="calendar_data_extraction",
-                    data={"message": message}
-                )
-                
-                calendar_data = calendar_extraction.get("extracted_data")
-            
-            # Объединяем результаты
-            result = {
-                "text": client_response["text"],
-                "model": client_response["model"],
-                "metadata": {
-                    "calendar_data": calendar_data
-                }
-            }
-            
+            # Ответ и календарные данные получаются параллельно; здесь ждем оба
+            result = None
+            for event, payload in iter_hybrid_response(message):
+                if event == "text":
+                    result = payload
+                elif event == "calendar":
+                    result["metadata"]["calendar_data"] = payload
             return result
             
         elif mode == "openai":
@@ -0,0 +1,370 @@
+"""LLM usage ledger.
+
+Every provider call, container call and response cache hit is recorded with
+provider, model, prompt/completion tokens, latency, cache-hit flag, user and
+module. Recording only puts a row on an in-memory queue. A background thread
+bulk-inserts the queue every few seconds, so the ledger adds no database
+round trip to a chat request. If the queue is full, rows are dropped and
+counted rather than blocking the caller. The ledger also answers the
+aggregate queries for capacity planning and enforces monthly token quotas
+per user. Quotas are soft: usage is cached briefly, so calls made within
+that window can overshoot the limit a little.
+"""
+import os
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select
+
+logger = logging.getLogger(__name__)
+
+USAGE_LEDGER_ENABLED = os.getenv("USAGE_LEDGER_ENABLED", "true").lower() == "true"
+# Seconds between bulk inserts, rows per insert and rows held in memory at most
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "2"))
+USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "500"))
+USAGE_QUEUE_SIZE = int(os.getenv("USAGE_QUEUE_SIZE", "20000"))
+# Default monthly token limit per user (0 = unlimited); usage_quotas rows override it
+USAGE_MONTHLY_TOKEN_QUOTA = int(os.getenv("USAGE_MONTHLY_TOKEN_QUOTA", "0"))
+# Seconds a user's monthly usage is cached for quota checks
+USAGE_QUOTA_CACHE_SECONDS = float(os.getenv("USAGE_QUOTA_CACHE_SECONDS", "30"))
+
+GROUP_BY = ("module", "provider", "model", "user", "source", "day")
+
+
+def current_scope() -> Tuple[Optional[str], Optional[str]]:
+    """(user_id, module) of the current Flask request, (None, None) outside of one"""
+    from flask import g, has_app_context, has_request_context, request
+    user_id = g.get("user_id") if has_app_context() else None
+    module = request.blueprint if has_request_context() else None
+    return user_id, module
+
+
+def month_start(now: Optional[datetime] = None) -> datetime:
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, 1)
+
+
+def gemini_usage(response) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens reported by a Gemini response, None if missing"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    if not isinstance(prompt, int):
+        return None
+    completion = getattr(usage, "candidates_token_count", 0)
+    return prompt, completion if isinstance(completion, int) else 0
+
+
+def openai_usage(response) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens reported by an OpenAI completion, None if missing"""
+    usage = getattr(response, "usage", None)
+    prompt = getattr(usage, "prompt_tokens", None)
+    if not isinstance(prompt, int):
+        return None
+    completion = getattr(usage, "completion_tokens", 0)
+    return prompt, completion if isinstance(completion, int) else 0
+
+
+class UsageLedger:
+    """Queues usage rows and writes them to llm_usage in batches"""
+
+    def __init__(self, session_factory=None, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 batch_size: int = USAGE_BATCH_SIZE, queue_size: int = USAGE_QUEUE_SIZE,
+                 default_quota: int = USAGE_MONTHLY_TOKEN_QUOTA,
+                 quota_cache_seconds: float = USAGE_QUOTA_CACHE_SECONDS,
+                 enabled: bool = USAGE_LEDGER_ENABLED, background: bool = True):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.default_quota = default_quota
+        self.quota_cache_seconds = quota_cache_seconds
+        self.enabled = enabled
+        self.background = background
+        self._session_factory = session_factory
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._counters = {"recorded": 0, "written": 0, "dropped": 0, "failed": 0}
+        # user_id -> (fetched_at, tokens this month in the database, limit)
+        self._quota_cache: Dict[str, Tuple[float, int, Optional[int]]] = {}
+        # Tokens per user that are queued but not yet in the database
+        self._unwritten_tokens: Dict[str, int] = defaultdict(int)
+        # Tokens per user not contained in their cached database total
+        self._uncached_tokens: Dict[str, int] = defaultdict(int)
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from ..db import get_session_factory
+            self._session_factory = get_session_factory()
+        return self._session_factory
+
+    def record(self, provider: str, model: Optional[str], prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0, cache_hit: bool = False, ok: bool = True, source: str = "",
+               user_id: Optional[str] = None, module: Optional[str] = None, estimated: bool = False) -> bool:
+        """
+        Queue one usage row; never blocks and never raises
+
+        Args:
+            provider: "gemini", "openai" or "container"
+            model: Model name (module name for containers)
+            prompt_tokens: Input tokens as reported by the provider, or estimated
+            completion_tokens: Output tokens
+            latency: Seconds the call took
+            cache_hit: Answer came from the response cache (no provider call)
+            ok: False if the call failed
+            source: Code path that made the call
+            user_id: Defaults to the user of the current request
+            module: Defaults to the blueprint of the current request
+            estimated: Token counts are estimates
+
+        Returns:
+            False if the row was dropped
+        """
+        if not self.enabled:
+            return False
+        if user_id is None or module is None:
+            scope_user, scope_module = current_scope()
+            user_id = user_id if user_id is not None else scope_user
+            module = module if module is not None else scope_module
+        row = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "module": getattr(module, "value", module),
+            "source": source,
+            "provider": provider,
+            "model": model or "unknown",
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "tokens_estimated": estimated,
+            "latency_ms": int(latency * 1000),
+            "cache_hit": cache_hit,
+            "ok": ok,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        with self._lock:
+            self._counters["recorded"] += 1
+            if user_id is not None:
+                tokens = row["prompt_tokens"] + row["completion_tokens"]
+                self._unwritten_tokens[user_id] += tokens
+                self._uncached_tokens[user_id] += tokens
+        if self.background:
+            self._ensure_worker()
+        return True
+
+    def record_call(self, provider: str, model: Optional[str], started: float,
+                    tokens: Optional[Tuple[int, int]] = None, prompt: str = "", completion: str = "",
+                    ok: bool = True, **fields) -> bool:
+        """
+        Record a finished call started at ``started`` (time.perf_counter())
+
+        Token counts reported by the provider are used as they are; without them
+        they are estimated from the prompt and completion text.
+        """
+        from .context_builder import estimate_tokens
+        estimated = tokens is None and ok
+        if tokens is None:
+            tokens = (estimate_tokens(prompt), estimate_tokens(completion)) if ok else (0, 0)
+        return self.record(provider=provider, model=model, prompt_tokens=tokens[0], completion_tokens=tokens[1],
+                           latency=time.perf_counter() - started, ok=ok, estimated=estimated, **fields)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Usage ledger worker error: {e}")
+
+    def flush(self) -> int:
+        """Write everything queued so far (tests, shutdown); returns the number of rows written"""
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> int:
+        from ..models import LlmUsage
+        try:
+            with self._write_lock, self.session_factory() as session:
+                session.execute(insert(LlmUsage), rows)
+                session.commit()
+            written = True
+        except Exception as e:
+            # Usage rows are best effort; losing a batch must not affect requests
+            logger.warning(f"Writing {len(rows)} usage rows failed: {e}")
+            written = False
+        with self._lock:
+            self._counters["written" if written else "failed"] += len(rows)
+            for row in rows:
+                if row["user_id"] is not None:
+                    self._unwritten_tokens[row["user_id"]] -= row["prompt_tokens"] + row["completion_tokens"]
+        return len(rows) if written else 0
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, queued=self._queue.qsize())
+
+    def quota_limit(self, session, user_id: str) -> Optional[int]:
+        """Monthly token limit of a user, None if unlimited"""
+        from ..models import UsageQuota
+        limit = session.scalar(select(UsageQuota.monthly_tokens).where(UsageQuota.user_id == user_id))
+        if limit is None:
+            limit = self.default_quota
+        return limit or None
+
+    def check_quota(self, user_id: str) -> Dict[str, Any]:
+        """
+        Token usage of the user in the current month against their limit
+
+        Returns:
+            {"used", "limit", "remaining", "exceeded"}; limit and remaining are None if unlimited
+        """
+        from ..models import LlmUsage
+        now = time.monotonic()
+        with self._lock:
+            cached = self._quota_cache.get(user_id)
+        if cached is None or now - cached[0] > self.quota_cache_seconds:
+            with self._lock:
+                # Queued rows are not in the database total yet; taken before the query,
+                # a row written meanwhile is counted twice rather than not at all
+                unwritten = self._unwritten_tokens.get(user_id, 0)
+                uncached_before = self._uncached_tokens.get(user_id, 0)
+            with self.session_factory() as session:
+                used = session.scalar(
+                    select(func.coalesce(func.sum(LlmUsage.prompt_tokens + LlmUsage.completion_tokens), 0))
+                    .where(LlmUsage.user_id == user_id, LlmUsage.created_at >= month_start())
+                ) or 0
+                limit = self.quota_limit(session, user_id)
+            with self._lock:
+                recorded_meanwhile = self._uncached_tokens.get(user_id, 0) - uncached_before
+                self._uncached_tokens[user_id] = unwritten + recorded_meanwhile
+                cached = self._quota_cache[user_id] = (now, int(used), limit)
+        _, used, limit = cached
+        with self._lock:
+            used += self._uncached_tokens.get(user_id, 0)
+        return {
+            "used": used,
+            "limit": limit,
+            "remaining": None if limit is None else max(0, limit - used),
+            "exceeded": limit is not None and used >= limit,
+        }
+
+    def forget_quota(self, user_id: str):
+        """Drop the cached usage of a user (after their limit changed)"""
+        with self._lock:
+            self._quota_cache.pop(user_id, None)
+
+    def aggregate(self, session, group_by: str = "module", since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Calls, tokens, latency and cache hits grouped by one dimension
+
+        Args:
+            session: Open database session
+            group_by: One of GROUP_BY
+            since: Start of the period (default: 30 days ago)
+            until: End of the period (default: now)
+            user_id: Only this user's calls
+
+        Returns:
+            One dict per group, most tokens first
+        """
+        from ..models import LlmUsage
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        column = func.date(LlmUsage.created_at) if group_by == "day" else getattr(
+            LlmUsage, "user_id" if group_by == "user" else group_by)
+        tokens = func.sum(LlmUsage.prompt_tokens + LlmUsage.completion_tokens)
+        query = (
+            select(
+                column.label("key"),
+                func.count().label("calls"),
+                func.sum(LlmUsage.prompt_tokens).label("prompt_tokens"),
+                func.sum(LlmUsage.completion_tokens).label("completion_tokens"),
+                func.avg(LlmUsage.latency_ms).label("avg_latency_ms"),
+                func.max(LlmUsage.latency_ms).label("max_latency_ms"),
+                func.sum(case((LlmUsage.cache_hit, 1), else_=0)).label("cache_hits"),
+                func.sum(case((LlmUsage.ok, 0), else_=1)).label("errors"),
+            )
+            .where(LlmUsage.created_at >= (since or datetime.utcnow() - timedelta(days=30)))
+            .group_by(column)
+            .order_by(tokens.desc())
+        )
+        if until is not None:
+            query = query.where(LlmUsage.created_at < until)
+        if user_id is not None:
+            query = query.where(LlmUsage.user_id == user_id)
+        return [
+            {
+                group_by: str(row.key) if row.key is not None else None,
+                "calls": row.calls,
+                "prompt_tokens": int(row.prompt_tokens or 0),
+                "completion_tokens": int(row.completion_tokens or 0),
+                "avg_latency_ms": round(float(row.avg_latency_ms or 0), 1),
+                "max_latency_ms": int(row.max_latency_ms or 0),
+                "cache_hits": int(row.cache_hits or 0),
+                "errors": int(row.errors or 0),
+            }
+            for row in session.execute(query)
+        ]
+
+
+# Initialize a global instance with default configuration
+_usage_ledger = None
+_usage_ledger_lock = threading.Lock()
+
+def get_usage_ledger() -> UsageLedger:
+    """Get or create the global usage ledger"""
+    global _usage_ledger
+    if _usage_ledger is None:
+        with _usage_ledger_lock:
+            if _usage_ledger is None:
+                _usage_ledger = UsageLedger()
+                # Rows still queued at shutdown are written before the process exits
+                atexit.register(_usage_ledger.flush)
+    return _usage_ledger
+
+
+def record_usage(**fields) -> bool:
+    """Record one call in the global usage ledger (see UsageLedger.record)"""
+    return get_usage_ledger().record(**fields)
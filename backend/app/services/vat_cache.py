@@ -0,0 +1,179 @@
+"""Two-tier cache for VIES VAT validation results.
+
+An in-process LRU sits in front of a SQL table (``vat_validation_cache``) that is
+shared by all gunicorn workers. Valid and invalid results have separate TTLs;
+service errors are never cached.
+"""
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VIES_CACHE_TTL = int(os.getenv("VIES_CACHE_TTL", str(24 * 3600)))
+VIES_CACHE_NEGATIVE_TTL = int(os.getenv("VIES_CACHE_NEGATIVE_TTL", "3600"))
+VIES_CACHE_MAX_ENTRIES = int(os.getenv("VIES_CACHE_MAX_ENTRIES", "10000"))
+VIES_CACHE_SQL_ENABLED = os.getenv("VIES_CACHE_SQL_ENABLED", "true").lower() == "true"
+
+
+class VatValidationCache:
+    """In-process LRU backed by a shared SQL tier"""
+
+    def __init__(self, ttl: int = VIES_CACHE_TTL, negative_ttl: int = VIES_CACHE_NEGATIVE_TTL,
+                 max_entries: int = VIES_CACHE_MAX_ENTRIES, session_factory=None,
+                 sql_enabled: bool = VIES_CACHE_SQL_ENABLED):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.sql_enabled = sql_enabled
+        self._session_factory = session_factory
+        self._entries: "OrderedDict[str, Tuple[datetime, bool, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "sql_hits": 0, "misses": 0, "stores": 0, "sql_errors": 0}
+
+    def get(self, key: str) -> Optional[Tuple[bool, Dict[str, Any]]]:
+        """Look up a cached result; returns (is_valid, details) or None"""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, is_valid, details = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return is_valid, dict(details)
+                del self._entries[key]
+
+        row = self._sql_get(key, now)
+        if row is not None:
+            expires_at, is_valid, details = row
+            self._remember(key, expires_at, is_valid, details)
+            with self._lock:
+                self._counters["sql_hits"] += 1
+            return is_valid, dict(details)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, key: str, is_valid: bool, details: Dict[str, Any]) -> None:
+        """Store a result in both tiers using the positive or negative TTL"""
+        ttl = self.ttl if is_valid else self.negative_ttl
+        if ttl <= 0:
+            return
+        # Round-trip through JSON so both tiers hold identical, serializable values
+        details = json.loads(json.dumps(details, default=str))
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        self._remember(key, expires_at, is_valid, details)
+        self._sql_set(key, expires_at, is_valid, details)
+        with self._lock:
+            self._counters["stores"] += 1
+
+    def clear(self) -> None:
+        """Drop the in-process tier (the SQL tier expires on its own)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit ratios for this process"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["memory_hits"] + counters["sql_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["sql_hits"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_hit_ratio": round(counters["memory_hits"] / lookups, 4) if lookups else 0.0,
+            "memory_entries": size,
+            "max_entries": self.max_entries,
+        }
+
+    def purge_expired(self) -> int:
+        """Delete expired rows from the SQL tier; returns the number of deleted rows"""
+        session_factory = self._get_session_factory()
+        if session_factory is None:
+            return 0
+        from ..models import VatValidationCacheEntry
+        with session_factory() as session:
+            deleted = (
+                session.query(VatValidationCacheEntry)
+                .filter(VatValidationCacheEntry.expires_at <= datetime.utcnow())
+                .delete(synchronize_session=False)
+            )
+            session.commit()
+        return deleted
+
+    def _remember(self, key, expires_at, is_valid, details):
+        with self._lock:
+            self._entries[key] = (expires_at, is_valid, dict(details))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_session_factory(self):
+        """Lazily bind to the application database so the SQL tier also works in worker threads"""
+        if not self.sql_enabled:
+            return None
+        if self._session_factory is None:
+            with self._lock:
+                if self._session_factory is None:
+                    from ..db import get_session_factory
+                    from ..models import VatValidationCacheEntry
+                    session_factory = get_session_factory()
+                    VatValidationCacheEntry.__table__.create(session_factory.kw["bind"], checkfirst=True)
+                    self._session_factory = session_factory
+        return self._session_factory
+
+    def _sql_get(self, key, now):
+        try:
+            session_factory = self._get_session_factory()
+            if session_factory is None:
+                return None
+            from ..models import VatValidationCacheEntry
+            with session_factory() as session:
+                row = session.get(VatValidationCacheEntry, key)
+                if row is None or row.expires_at <= now:
+                    return None
+                return row.expires_at, row.valid, json.loads(row.details)
+        except Exception as e:
+            logger.warning(f"VAT cache SQL lookup failed: {e}")
+            with self._lock:
+                self._counters["sql_errors"] += 1
+            return None
+
+    def _sql_set(self, key, expires_at, is_valid, details):
+        try:
+            session_factory = self._get_session_factory()
+            if session_factory is None:
+                return
+            from ..models import VatValidationCacheEntry
+            with session_factory() as session:
+                session.merge(VatValidationCacheEntry(
+                    cache_key=key,
+                    valid=is_valid,
+                    details=json.dumps(details),
+                    created_at=datetime.utcnow(),
+                    expires_at=expires_at
+                ))
+                session.commit()
+        except Exception as e:
+            logger.warning(f"VAT cache SQL store failed: {e}")
+            with self._lock:
+                self._counters["sql_errors"] += 1
+
+
+# Initialize a global instance with default configuration
+_vat_cache = None
+
+def get_vat_cache() -> VatValidationCache:
+    """Get or create the global VAT validation cache"""
+    global _vat_cache
+    if _vat_cache is None:
+        _vat_cache = VatValidationCache()
+    return _vat_cache
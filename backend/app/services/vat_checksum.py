@@ -0,0 +1,349 @@
+"""Offline VAT number format and checksum validation.
+
+Checks an EU VAT identification number against the national format and, where
+the member state publishes one, its check-digit algorithm. No network I/O:
+malformed numbers and typos are rejected before anything is sent to VIES.
+"""
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+# National number formats (without the country prefix)
+VAT_FORMATS: Dict[str, re.Pattern] = {
+    country: re.compile(pattern) for country, pattern in {
+        "AT": r"U\d{8}",
+        "BE": r"[01]\d{9}",
+        "BG": r"\d{9,10}",
+        "CY": r"[0-59]\d{7}[A-Z]",
+        "CZ": r"\d{8,10}",
+        "DE": r"\d{9}",
+        "DK": r"\d{8}",
+        "EE": r"10\d{7}",
+        "EL": r"\d{9}",
+        "ES": r"[0-9A-Z]\d{7}[0-9A-Z]",
+        "FI": r"\d{8}",
+        "FR": r"[0-9A-HJ-NP-Z]{2}\d{9}",
+        "HR": r"\d{11}",
+        "HU": r"\d{8}",
+        "IE": r"\d{7}[A-W][A-IW]?|\d[A-Z+*]\d{5}[A-W]",
+        "IT": r"\d{11}",
+        "LT": r"\d{9}|\d{12}",
+        "LU": r"\d{8}",
+        "LV": r"\d{11}",
+        "MT": r"[1-9]\d{7}",
+        "NL": r"\d{9}B\d{2}",
+        "PL": r"\d{10}",
+        "PT": r"\d{9}",
+        "RO": r"[1-9]\d{1,9}",
+        "SE": r"\d{10}01",
+        "SI": r"[1-9]\d{7}",
+        "SK": r"[1-9]\d{9}",
+        "XI": r"\d{9}|\d{12}|GD[0-4]\d{2}|HA[5-9]\d{2}",
+        # Not in VIES since 2021, still accepted by the mock provider
+        "GB": r"\d{9}|\d{12}|GD[0-4]\d{2}|HA[5-9]\d{2}",
+    }.items()
+}
+
+# VIES uses EL for Greece; GR is accepted as an alias
+COUNTRY_ALIASES = {"GR": "EL"}
+
+_SEPARATORS = re.compile(r"[^0-9A-Za-z+*]")
+
+
+def split_vat(vat_number: str) -> Tuple[str, str]:
+    """Split a VAT number into (country code, number) without separators, upper-cased"""
+    cleaned = _SEPARATORS.sub("", vat_number or "").upper()
+    country = COUNTRY_ALIASES.get(cleaned[:2], cleaned[:2])
+    return country, cleaned[2:]
+
+
+def _digits(number: str):
+    # Only called on numbers that already passed the format check
+    return [ord(ch) - 48 for ch in number]
+
+
+def _weighted_sum(digits, weights) -> int:
+    return sum(digit * weight for digit, weight in zip(digits, weights))
+
+
+def _mod_11_10(number: str) -> bool:
+    # ISO 7064 MOD 11,10; the last digit is the check digit
+    product = 10
+    for digit in _digits(number[:-1]):
+        total = (digit + product) % 10 or 10
+        product = (2 * total) % 11
+    return (11 - product) % 10 == ord(number[-1]) - 48
+
+
+def _luhn(number: str) -> bool:
+    total = 0
+    for i, digit in enumerate(reversed(_digits(number))):
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def _check_at(number: str) -> bool:
+    digits = _digits(number[1:])
+    total = 0
+    for i, digit in enumerate(digits[:7]):
+        if i % 2:
+            digit *= 2
+            digit = digit // 10 + digit % 10
+        total += digit
+    return (10 - (total + 4) % 10) % 10 == digits[7]
+
+
+def _check_be(number: str) -> bool:
+    return 97 - int(number[:8]) % 97 == int(number[8:])
+
+
+def _check_bg(number: str) -> bool:
+    digits = _digits(number)
+    if len(digits) == 9:
+        check = _weighted_sum(digits, range(1, 9)) % 11
+        if check == 10:
+            check = _weighted_sum(digits, range(3, 11)) % 11 % 10
+        return check == digits[8]
+    # Ten digits: natural persons, foreigners or other taxpayers
+    if _weighted_sum(digits, (2, 4, 8, 5, 10, 9, 7, 3, 6)) % 11 % 10 == digits[9]:
+        return True
+    if _weighted_sum(digits, (21, 19, 17, 13, 11, 9, 7, 3, 1)) % 10 == digits[9]:
+        return True
+    check = 11 - _weighted_sum(digits, (4, 3, 2, 7, 6, 5, 4, 3, 2)) % 11
+    return check != 10 and check % 11 == digits[9]
+
+
+_CY_ODD_VALUES = (1, 0, 5, 7, 9, 13, 15, 17, 19, 21)
+
+
+def _check_cy(number: str) -> bool:
+    digits = _digits(number[:8])
+    total = sum(_CY_ODD_VALUES[digit] if i % 2 == 0 else digit for i, digit in enumerate(digits))
+    return chr(65 + total % 26) == number[8]
+
+
+def _check_cz(number: str) -> bool:
+    digits = _digits(number)
+    if len(digits) == 8:
+        # Legal entities
+        return (11 - _weighted_sum(digits, range(8, 1, -1)) % 11) % 10 == digits[7]
+    if len(digits) == 10:
+        # Birth numbers of individuals are divisible by 11; before 1985 a
+        # remainder of 10 was written as check digit 0
+        return int(number) % 11 == 0 or (int(number[:9]) % 11 == 10 and digits[9] == 0)
+    # Nine digits: older birth numbers and special cases, format check only
+    return True
+
+
+def _check_de(number: str) -> bool:
+    return _mod_11_10(number)
+
+
+def _check_dk(number: str) -> bool:
+    return _weighted_sum(_digits(number), (2, 7, 6, 5, 4, 3, 2, 1)) % 11 == 0
+
+
+def _check_ee(number: str) -> bool:
+    digits = _digits(number)
+    return (10 - _weighted_sum(digits, (3, 7, 1, 3, 7, 1, 3, 7)) % 10) % 10 == digits[8]
+
+
+def _check_el(number: str) -> bool:
+    digits = _digits(number)
+    return _weighted_sum(digits, (256, 128, 64, 32, 16, 8, 4, 2)) % 11 % 10 == digits[8]
+
+
+_ES_PERSON_LETTERS = "TRWAGMYFPDXBNJZSQVHLCKE"
+_ES_ENTITY_LETTERS = "JABCDEFGHI"
+
+
+def _check_es(number: str) -> bool:
+    first, last = number[0], number[-1]
+    if first.isdigit() or first in "XYZ":
+        # DNI / NIE of natural persons
+        if first in "XYZ":
+            number = str("XYZ".index(first)) + number[1:]
+        return number[:8].isdigit() and _ES_PERSON_LETTERS[int(number[:8]) % 23] == last
+    if first in "KLM":
+        return _ES_PERSON_LETTERS[int(number[1:8]) % 23] == last
+    # Legal entities (CIF)
+    digits = _digits(number[1:8])
+    total = sum(digits[1::2])
+    for digit in digits[0::2]:
+        digit *= 2
+        total += digit // 10 + digit % 10
+    check = (10 - total % 10) % 10
+    if first in "ABCDEFGHJUV":
+        return last == str(check) or last == _ES_ENTITY_LETTERS[check]
+    return last == _ES_ENTITY_LETTERS[check]
+
+
+def _check_fi(number: str) -> bool:
+    digits = _digits(number)
+    remainder = _weighted_sum(digits, (7, 9, 10, 5, 8, 4, 2)) % 11
+    if remainder == 1:
+        return False
+    return (11 - remainder) % 11 == digits[7]
+
+
+def _check_fr(number: str) -> bool:
+    key, siren = number[:2], number[2:]
+    if not key.isdigit():
+        # Alphanumeric keys are not publicly documented; format check only
+        return True
+    return int(key) == (12 + 3 * (int(siren) % 97)) % 97
+
+
+def _check_hr(number: str) -> bool:
+    return _mod_11_10(number)
+
+
+def _check_hu(number: str) -> bool:
+    digits = _digits(number)
+    return (10 - _weighted_sum(digits, (9, 7, 3, 1, 9, 7, 3)) % 10) % 10 == digits[7]
+
+
+_IE_CHECK_LETTERS = "WABCDEFGHIJKLMNOPQRSTUV"
+
+
+def _check_ie(number: str) -> bool:
+    if not number[1].isdigit():
+        # Old format: the second character moves behind the digits
+        number = "0" + number[2:7] + number[0] + number[7:]
+    total = _weighted_sum(_digits(number[:7]), range(8, 1, -1))
+    if len(number) == 9:
+        total += 9 * ("WABCDEFGHI".index(number[8]))
+    return _IE_CHECK_LETTERS[total % 23] == number[7]
+
+
+def _check_it(number: str) -> bool:
+    return _luhn(number)
+
+
+def _check_lt(number: str) -> bool:
+    digits = _digits(number)
+    body = digits[:-1]
+    # Weights 1..9 repeating, then shifted by two if the remainder is 10
+    check = sum(digit * (1 + i % 9) for i, digit in enumerate(body)) % 11
+    if check == 10:
+        check = sum(digit * (1 + (i + 2) % 9) for i, digit in enumerate(body)) % 11 % 10
+    return check == digits[-1]
+
+
+def _check_lu(number: str) -> bool:
+    return int(number[:6]) % 89 == int(number[6:])
+
+
+def _check_lv(number: str) -> bool:
+    if number[0] <= "3":
+        # Personal codes of natural persons, format check only
+        return True
+    return _weighted_sum(_digits(number), (9, 1, 4, 8, 3, 10, 2, 5, 7, 6, 1)) % 11 == 3
+
+
+def _check_mt(number: str) -> bool:
+    return 37 - _weighted_sum(_digits(number[:6]), (3, 4, 6, 7, 8, 9)) % 37 == int(number[6:])
+
+
+def _check_nl(number: str) -> bool:
+    digits = _digits(number[:9])
+    if _weighted_sum(digits, range(9, 1, -1)) % 11 == digits[8]:
+        return True
+    # Sole-proprietor numbers issued since 2020 use ISO 7064 MOD 97-10 over "NL" + number
+    converted = "".join(str(int(ch, 36)) for ch in "NL" + number)
+    return int(converted) % 97 == 1
+
+
+def _check_pl(number: str) -> bool:
+    digits = _digits(number)
+    return _weighted_sum(digits, (6, 5, 7, 2, 3, 4, 5, 6, 7)) % 11 == digits[9]
+
+
+def _check_pt(number: str) -> bool:
+    digits = _digits(number)
+    check = 11 - _weighted_sum(digits, range(9, 1, -1)) % 11
+    return (0 if check > 9 else check) == digits[8]
+
+
+def _check_ro(number: str) -> bool:
+    digits = _digits(number[:-1].zfill(9))
+    return _weighted_sum(digits, (7, 5, 3, 2, 1, 7, 5, 3, 2)) * 10 % 11 % 10 == ord(number[-1]) - 48
+
+
+def _check_se(number: str) -> bool:
+    return _luhn(number[:10])
+
+
+def _check_si(number: str) -> bool:
+    digits = _digits(number)
+    check = 11 - _weighted_sum(digits, range(8, 1, -1)) % 11
+    if check == 11:
+        return False
+    return check % 10 == digits[7]
+
+
+def _check_sk(number: str) -> bool:
+    return int(number) % 11 == 0
+
+
+# Check-digit algorithms per member state; countries without an entry are format-checked only
+CHECKSUMS: Dict[str, Callable[[str], bool]] = {
+    "AT": _check_at,
+    "BE": _check_be,
+    "BG": _check_bg,
+    "CY": _check_cy,
+    "CZ": _check_cz,
+    "DE": _check_de,
+    "DK": _check_dk,
+    "EE": _check_ee,
+    "EL": _check_el,
+    "ES": _check_es,
+    "FI": _check_fi,
+    "FR": _check_fr,
+    "HR": _check_hr,
+    "HU": _check_hu,
+    "IE": _check_ie,
+    "IT": _check_it,
+    "LT": _check_lt,
+    "LU": _check_lu,
+    "LV": _check_lv,
+    "MT": _check_mt,
+    "NL": _check_nl,
+    "PL": _check_pl,
+    "PT": _check_pt,
+    "RO": _check_ro,
+    "SE": _check_se,
+    "SI": _check_si,
+    "SK": _check_sk,
+}
+
+
+def check_vat_number(vat_number: str) -> Tuple[bool, Optional[str]]:
+    """
+    Validate a VAT number offline
+
+    Args:
+        vat_number: VAT number with country prefix (e.g. 'DE123456789'); spaces,
+                    dots and dashes are ignored
+
+    Returns:
+        Tuple of (is well-formed, reason it is not or None)
+    """
+    country, number = split_vat(vat_number)
+    pattern = VAT_FORMATS.get(country)
+    if pattern is None:
+        return False, f"Unsupported country code: {country or vat_number!r}"
+    if not pattern.fullmatch(number):
+        return False, f"Invalid {country} VAT number format"
+    checksum = CHECKSUMS.get(country)
+    if checksum is not None and not checksum(number):
+        return False, f"Invalid {country} VAT number check digit"
+    return True, None
+
+
+def is_valid_vat_number(vat_number: str) -> bool:
+    """Whether a VAT number passes the offline format and checksum validation"""
+    return check_vat_number(vat_number)[0]
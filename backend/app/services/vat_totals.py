@@ -0,0 +1,184 @@
+"""Totals of a VAT declaration (Umsatzsteuervoranmeldung).
+
+Revenue, collected VAT, claimed expenses and input tax are computed in the
+database with one conditional-aggregate query over ``transactions``. This
+avoids loading every transaction of a period as an ORM object. All amounts
+are ``Decimal`` rounded to cents, the precision of the ``Numeric(10, 2)``
+columns. ``totals_from_transactions`` applies the same rules to transaction
+dicts for callers that already hold them. ``link_submission_transactions``
+links the same selection to a submission without loading it either, and the
+submission views read the links back as counts or pages of IDs.
+"""
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import and_, case, func, insert, literal, select
+
+CENT = Decimal("0.01")
+
+TOTAL_FIELDS = ("revenue", "tax_collected", "expenses", "tax_paid", "net_tax")
+
+
+def to_decimal(value: Any) -> Decimal:
+    """Amount as Decimal rounded to cents (None counts as zero)"""
+    if value is None:
+        return Decimal("0.00")
+    if not isinstance(value, Decimal):
+        # str() keeps the decimal digits a float was created from
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _totals(revenue, tax_collected, expenses, tax_paid) -> Dict[str, Decimal]:
+    totals = {
+        "revenue": to_decimal(revenue),
+        "tax_collected": to_decimal(tax_collected),
+        "expenses": abs(to_decimal(expenses)),
+        "tax_paid": to_decimal(tax_paid),
+    }
+    totals["net_tax"] = totals["tax_collected"] - totals["tax_paid"]
+    return totals
+
+
+def totals_from_transactions(transactions: Iterable[Dict[str, Any]]) -> Dict[str, Decimal]:
+    """
+    Declaration totals of transaction dicts in a single pass
+
+    Positive amounts are revenue with collected VAT. Negative amounts flagged
+    is_expense_claimed are expenses with deductible input tax.
+
+    Args:
+        transactions: Dicts with amount, tax_amount and is_expense_claimed
+
+    Returns:
+        revenue, tax_collected, expenses, tax_paid and net_tax
+    """
+    revenue = tax_collected = expenses = tax_paid = Decimal("0")
+    for tx in transactions:
+        amount = to_decimal(tx["amount"])
+        tax = to_decimal(tx.get("tax_amount"))
+        if amount > 0:
+            revenue += amount
+            tax_collected += tax
+        elif amount < 0 and tx.get("is_expense_claimed"):
+            expenses += amount
+            tax_paid += tax
+    return _totals(revenue, tax_collected, expenses, tax_paid)
+
+
+def _transaction_filter(user_id, transaction_ids=None, start=None, end=None) -> List[Any]:
+    """WHERE clauses selecting a user's transactions by ID or by date range"""
+    from ..models import Transaction
+
+    clauses = [Transaction.user_id == user_id]
+    if transaction_ids is not None:
+        clauses.append(Transaction.id.in_(transaction_ids))
+    if start is not None:
+        clauses.append(Transaction.date >= start)
+    if end is not None:
+        clauses.append(Transaction.date < end)
+    return clauses
+
+
+def aggregate_vat_totals(session, user_id: str, transaction_ids: Optional[Sequence[str]] = None,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Decimal]:
+    """
+    Declaration totals of a user's transactions computed by the database
+
+    Args:
+        session: Open database session
+        user_id: Owner of the transactions
+        transaction_ids: Only these transactions
+        start: Only transactions dated at or after start
+        end: Only transactions dated before end
+
+    Returns:
+        revenue, tax_collected, expenses, tax_paid and net_tax, plus the
+        number of matched transactions under "count"
+    """
+    from ..models import Transaction
+
+    income = Transaction.amount > 0
+    claimed = and_(Transaction.amount < 0, Transaction.is_expense_claimed.is_(True))
+    tax = func.coalesce(Transaction.tax_amount, 0)
+    query = select(
+        func.count().label("count"),
+        func.sum(case((income, Transaction.amount), else_=0)).label("revenue"),
+        func.sum(case((income, tax), else_=0)).label("tax_collected"),
+        func.sum(case((claimed, Transaction.amount), else_=0)).label("expenses"),
+        func.sum(case((claimed, tax), else_=0)).label("tax_paid"),
+    ).where(*_transaction_filter(user_id, transaction_ids, start, end))
+
+    row = session.execute(query).one()
+    totals = _totals(row.revenue, row.tax_collected, row.expenses, row.tax_paid)
+    totals["count"] = row.count
+    return totals
+
+
+def link_submission_transactions(session, submission_id: str, user_id: str,
+                                 transaction_ids: Optional[Sequence[str]] = None,
+                                 start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Link the selected transactions to a submission with one INSERT ... SELECT
+
+    The rows are copied inside the database; no transaction is loaded into
+    Python and the relationship collection is not touched.
+
+    Args:
+        session: Open database session (the submission must be flushed)
+        submission_id: Submission to link to
+        user_id, transaction_ids, start, end: Selection as in aggregate_vat_totals
+
+    Returns:
+        Number of linked transactions
+    """
+    from ..models import Transaction, submission_transactions
+
+    selection = select(literal(submission_id), Transaction.id).where(
+        *_transaction_filter(user_id, transaction_ids, start, end))
+    result = session.execute(
+        insert(submission_transactions).from_select(["submission_id", "transaction_id"], selection))
+    return result.rowcount
+
+
+def count_submission_transactions(session, submission_ids: Sequence[str]) -> Dict[str, int]:
+    """
+    Number of linked transactions per submission, counted in one grouped query
+
+    Args:
+        session: Open database session
+        submission_ids: Submissions to count for
+
+    Returns:
+        Dict of submission ID to count (submissions without links are missing)
+    """
+    from ..models import submission_transactions
+
+    if not submission_ids:
+        return {}
+    column = submission_transactions.c.submission_id
+    rows = session.execute(
+        select(column, func.count()).where(column.in_(submission_ids)).group_by(column))
+    return {submission_id: count for submission_id, count in rows}
+
+
+def submission_transaction_ids(session, submission_id: str, offset: int = 0, limit: int = 500) -> List[str]:
+    """
+    One page of the transaction IDs linked to a submission, ordered by ID
+
+    Args:
+        session: Open database session
+        submission_id: Submission whose links are read
+        offset: Number of IDs to skip
+        limit: Maximum number of IDs returned
+
+    Returns:
+        List of transaction IDs
+    """
+    from ..models import submission_transactions
+
+    transaction_id = submission_transactions.c.transaction_id
+    return list(session.scalars(
+        select(transaction_id).where(submission_transactions.c.submission_id == submission_id)
+        .order_by(transaction_id).offset(offset).limit(limit)))
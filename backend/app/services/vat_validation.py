@@ -1,17 +1,58 @@
 """VAT ID validation service using VIES API."""
+import os
+import threading
 import requests
 import zeep
 import logging
 from typing import Dict, Any, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from zeep.cache import InMemoryCache
 from zeep.exceptions import Fault
+from zeep.transports import Transport
+
+from .vat_cache import get_vat_cache
+from .vat_checksum import check_vat_number, split_vat
 
 logger = logging.getLogger(__name__)
 
+VIES_TIMEOUT = float(os.getenv("VIES_TIMEOUT", "10"))
+VIES_POOL_SIZE = int(os.getenv("VIES_POOL_SIZE", "10"))
+# Route lookups through the rate-limited, circuit-broken async client (see vies_async)
+VIES_ASYNC_ENABLED = os.getenv("VIES_ASYNC_ENABLED", "false").lower() == "true"
+
 class VatValidationService:
     """Service to validate European VAT numbers using VIES"""
     
     WSDL_URL = "https://ec.europa.eu/taxation_customs/vies/checkVatService.wsdl"
     
+    # Long-lived SOAP client, created on first use
+    _client = None
+    _client_lock = threading.Lock()
+    
+    @classmethod
+    def get_client(cls) -> zeep.Client:
+        """
+        Get the shared zeep client
+        
+        The WSDL is fetched and parsed once; the transport keeps a pooled
+        keep-alive session to the VIES endpoint.
+        """
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=VIES_POOL_SIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    transport = Transport(
+                        session=session,
+                        cache=InMemoryCache(timeout=24 * 3600),
+                        timeout=VIES_TIMEOUT,
+                        operation_timeout=VIES_TIMEOUT
+                    )
+                    cls._client = zeep.Client(cls.WSDL_URL, transport=transport)
+        return cls._client
+    
     @classmethod
     def validate_vat(cls, vat_number: str, requester_vat: str = None, requester_name: str = None, requester_country: str = None) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -32,11 +73,36 @@ class VatValidationService:
         if not vat_number or len(vat_number) < 3:
             return False, {"error": "Invalid VAT number format"}
             
-        country_code = vat_number[:2].upper()
-        number = vat_number[2:]
+        # GR is sent to VIES as EL; Irish + and * are kept
+        country_code, number = split_vat(vat_number)
+        requester_info_included = bool(requester_vat or requester_name)
+        
+        # Malformed numbers and typos never need a VIES round-trip
+        is_well_formed, format_error = check_vat_number(country_code + number)
+        if not is_well_formed:
+            return False, {
+                "valid": False,
+                "country_code": country_code,
+                "vat_number": number,
+                "error": format_error,
+                "checked_offline": True,
+                "requester_info_included": requester_info_included
+            }
+        
+        if VIES_ASYNC_ENABLED:
+            from .vies_async import validate_vat_sync
+            return validate_vat_sync(country_code + number, requester_vat, requester_name, requester_country)
+        
+        cache = get_vat_cache()
+        cached = cache.get(country_code + number)
+        if cached is not None:
+            is_valid, details = cached
+            details["cached"] = True
+            details["requester_info_included"] = requester_info_included
+            return is_valid, details
         
         try:
-            client = zeep.Client(cls.WSDL_URL)
+            client = cls.get_client()
             
             # For actual implementation, some VAT validation services require information
             # about the entity making the request. In production, you would include this.
@@ -63,9 +129,12 @@ class VatValidationService:
                 "request_date": result.requestDate,
                 "company_name": getattr(result, "name", ""),
                 "company_address": getattr(result, "address", ""),
-                "requester_info_included": bool(requester_vat or requester_name)
+                "requester_info_included": requester_info_included
             }
             
+            # Only definitive answers are cached; faults and errors fall through below
+            cache.set(country_code + number, is_valid, details)
+            
             return is_valid, details
             
         except Fault as e:
@@ -89,13 +158,13 @@ class VatValidationService:
         Returns:
             Tuple containing validation result and details
         """
-        # Define some test VAT numbers
+        # Define some test VAT numbers (with valid check digits, so they pass the offline validation)
         valid_vats = {
-            "DE123456789": {
+            "DE136695976": {
                 "company_name": "Test GmbH",
                 "company_address": "Test Street 1, 10115 Berlin, Germany"
             },
-            "FR12345678901": {
+            "FR40303265045": {
                 "company_name": "Test SARL",
                 "company_address": "1 Rue de Test, 75001 Paris, France"
             },
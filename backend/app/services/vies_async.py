@@ -0,0 +1,369 @@
+"""Asynchronous VIES client with rate limiting, circuit breaking and retries.
+
+Runs next to VatValidationService. Every member state has its own token bucket
+(VIES enforces per-state concurrency limits) and its own circuit breaker: while
+a state's registry is down, lookups return the cached answer or an "unverified"
+result immediately instead of waiting for the SOAP timeout. Transient faults
+(MS_UNAVAILABLE, TIMEOUT, ...) are retried with exponential backoff and full jitter.
+
+Synchronous callers (Flask workers) go through ``validate_vat_sync``, which runs
+the lookup on a shared background event loop and never waits longer than
+VIES_DEADLINE seconds.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
+
+from .vat_cache import get_vat_cache
+from .vat_checksum import check_vat_number, split_vat
+
+logger = logging.getLogger(__name__)
+
+VIES_RATE_PER_SECOND = float(os.getenv("VIES_RATE_PER_SECOND", "2"))
+VIES_RATE_BURST = int(os.getenv("VIES_RATE_BURST", "5"))
+# How long a lookup may wait for a rate-limit token before it is reported as unverified
+VIES_RATE_WAIT = float(os.getenv("VIES_RATE_WAIT", "2"))
+VIES_MAX_CONCURRENCY = int(os.getenv("VIES_MAX_CONCURRENCY", "20"))
+VIES_BREAKER_THRESHOLD = int(os.getenv("VIES_BREAKER_THRESHOLD", "3"))
+VIES_BREAKER_RESET = float(os.getenv("VIES_BREAKER_RESET", "60"))
+VIES_RETRIES = int(os.getenv("VIES_RETRIES", "2"))
+VIES_RETRY_BACKOFF = float(os.getenv("VIES_RETRY_BACKOFF", "0.5"))
+VIES_ATTEMPT_TIMEOUT = float(os.getenv("VIES_ATTEMPT_TIMEOUT", "4"))
+# Upper bound for a whole lookup including retries and rate-limit waits
+VIES_DEADLINE = float(os.getenv("VIES_DEADLINE", "8"))
+
+# VIES faults that say "try again later" rather than "this number is wrong"
+TRANSIENT_FAULTS = frozenset([
+    "MS_UNAVAILABLE", "MS_MAX_CONCURRENT_REQ", "GLOBAL_MAX_CONCURRENT_REQ",
+    "SERVICE_UNAVAILABLE", "TIMEOUT", "SERVER_BUSY",
+])
+
+
+class TransientViesError(Exception):
+    """A VIES failure worth retrying (member state down, overloaded, network error)"""
+
+
+class TokenBucket:
+    """Token bucket for one member state"""
+
+    def __init__(self, rate: float = VIES_RATE_PER_SECOND, capacity: int = VIES_RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a token, waiting at most ``timeout`` seconds; False if none became available"""
+        deadline = time.monotonic() + timeout
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one member state"""
+
+    def __init__(self, failure_threshold: int = VIES_BREAKER_THRESHOLD, reset_timeout: float = VIES_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out; in half-open state only a single probe is let through"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def release(self) -> None:
+        """Give back a half-open probe slot that was not used for a call"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # A failed probe re-opens the breaker for another reset period
+            self.opened_at = time.monotonic()
+
+
+CheckVatCall = Callable[[str, str], Awaitable[Any]]
+
+
+class AsyncViesClient:
+    """Rate-limited, circuit-broken asynchronous VIES client"""
+
+    WSDL_URL = "https://ec.europa.eu/taxation_customs/vies/checkVatService.wsdl"
+
+    def __init__(self, check_vat: Optional[CheckVatCall] = None, cache=None,
+                 retries: int = VIES_RETRIES, backoff: float = VIES_RETRY_BACKOFF,
+                 attempt_timeout: float = VIES_ATTEMPT_TIMEOUT, rate_wait: float = VIES_RATE_WAIT,
+                 max_concurrency: int = VIES_MAX_CONCURRENCY):
+        """
+        Args:
+            check_vat: Coroutine function (country_code, number) -> VIES response;
+                       defaults to the zeep async SOAP client
+            cache: VatValidationCache to read and fill (defaults to the global cache)
+        """
+        self._check_vat = check_vat or self._soap_check_vat
+        self._cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.attempt_timeout = attempt_timeout
+        self.rate_wait = rate_wait
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._soap_client = None
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = get_vat_cache()
+        return self._cache
+
+    def bucket(self, country_code: str) -> TokenBucket:
+        if country_code not in self._buckets:
+            self._buckets[country_code] = TokenBucket()
+        return self._buckets[country_code]
+
+    def breaker(self, country_code: str) -> CircuitBreaker:
+        if country_code not in self._breakers:
+            self._breakers[country_code] = CircuitBreaker()
+        return self._breakers[country_code]
+
+    def breaker_states(self) -> Dict[str, Dict[str, Any]]:
+        """Breaker state per member state, for health reporting"""
+        return {
+            country: {"state": breaker.state, "failures": breaker.failures,
+                      "retry_after": round(breaker.retry_after(), 1)}
+            for country, breaker in sorted(self._breakers.items())
+        }
+
+    async def validate(self, vat_number: str, requester_vat: str = None, requester_name: str = None,
+                       requester_country: str = None) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Validate a VAT number
+
+        Returns:
+            Tuple of (is valid, details) in the format of VatValidationService.validate_vat.
+            When VIES cannot be asked (breaker open, rate limit, upstream down) and nothing
+            is cached, details carry "unverified": True and the reason.
+        """
+        country_code, number = split_vat(vat_number)
+        requester_info_included = bool(requester_vat or requester_name)
+
+        is_well_formed, format_error = check_vat_number(country_code + number)
+        if not is_well_formed:
+            return False, {"valid": False, "country_code": country_code, "vat_number": number,
+                           "error": format_error, "checked_offline": True,
+                           "requester_info_included": requester_info_included}
+
+        key = country_code + number
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            is_valid, details = cached
+            details["cached"] = True
+            details["requester_info_included"] = requester_info_included
+            return is_valid, details
+
+        breaker = self.breaker(country_code)
+        if not breaker.allow():
+            return False, self._unverified(country_code, number, "circuit_open",
+                                           f"VIES unavailable for {country_code}", breaker.retry_after(),
+                                           requester_info_included)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, self.backoff * (2 ** (attempt - 1))))
+            if not await self.bucket(country_code).acquire(self.rate_wait):
+                breaker.release()
+                return False, self._unverified(country_code, number, "rate_limited",
+                                               f"VIES rate limit for {country_code} reached", self.rate_wait,
+                                               requester_info_included)
+            try:
+                async with self._semaphore:
+                    result = await asyncio.wait_for(self._check_vat(country_code, number), self.attempt_timeout)
+            except TransientViesError as e:
+                last_error = str(e)
+                logger.warning(f"VIES transient error for {country_code} (attempt {attempt + 1}): {e}")
+                continue
+            except asyncio.TimeoutError:
+                last_error = f"VIES did not answer within {self.attempt_timeout}s"
+                logger.warning(f"VIES timeout for {country_code} (attempt {attempt + 1})")
+                continue
+            except asyncio.CancelledError:
+                # The caller's deadline passed; failed attempts so far still count against the state
+                if last_error is not None:
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                raise
+            except Exception as e:
+                # Definitive faults such as INVALID_INPUT say nothing about availability
+                breaker.record_success()
+                logger.error(f"VIES service error: {e}")
+                return False, {"error": str(e), "requester_info_included": requester_info_included}
+
+            breaker.record_success()
+            is_valid = bool(result.valid)
+            details = {
+                "valid": is_valid,
+                "country_code": country_code,
+                "vat_number": number,
+                "request_date": str(getattr(result, "requestDate", "")),
+                "company_name": getattr(result, "name", ""),
+                "company_address": getattr(result, "address", ""),
+                "requester_info_included": requester_info_included
+            }
+            await asyncio.to_thread(self.cache.set, key, is_valid, details)
+            return is_valid, details
+
+        breaker.record_failure()
+        return False, self._unverified(country_code, number, "upstream_unavailable", last_error,
+                                       breaker.retry_after(), requester_info_included)
+
+    @staticmethod
+    def _unverified(country_code, number, reason, error, retry_after, requester_info_included) -> Dict[str, Any]:
+        return {
+            "valid": False,
+            "unverified": True,
+            "reason": reason,
+            "country_code": country_code,
+            "vat_number": number,
+            "error": error,
+            "retry_after": round(retry_after, 1),
+            "requester_info_included": requester_info_included
+        }
+
+    async def _soap_check_vat(self, country_code: str, number: str):
+        """checkVat through zeep's async transport; transient faults raise TransientViesError"""
+        import httpx
+        from zeep import AsyncClient
+        from zeep.cache import InMemoryCache
+        from zeep.exceptions import Fault
+        from zeep.transports import AsyncTransport
+
+        if self._soap_client is None:
+            transport = AsyncTransport(
+                client=httpx.AsyncClient(timeout=self.attempt_timeout,
+                                         limits=httpx.Limits(max_connections=self.max_concurrency)),
+                wsdl_client=httpx.Client(timeout=self.attempt_timeout),
+                cache=InMemoryCache(timeout=24 * 3600),
+            )
+            self._soap_client = AsyncClient(self.WSDL_URL, transport=transport)
+        try:
+            return await self._soap_client.service.checkVat(countryCode=country_code, vatNumber=number)
+        except Fault as e:
+            if any(code in str(e) for code in TRANSIENT_FAULTS):
+                raise TransientViesError(str(e)) from e
+            raise
+        except (OSError, ImportError) as e:
+            raise TransientViesError(str(e)) from e
+        except Exception as e:
+            if type(e).__module__.startswith("httpx"):
+                raise TransientViesError(str(e)) from e
+            raise
+
+
+class _BackgroundLoop:
+    """Event loop on a daemon thread shared by all synchronous callers"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="vies-async", daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine, timeout: float):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+
+# Global client and loop, created on first use
+_client = None
+_loop = None
+_lock = threading.Lock()
+
+def get_vies_client() -> AsyncViesClient:
+    """Get or create the global asynchronous VIES client"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = AsyncViesClient()
+    return _client
+
+
+def validate_vat_sync(vat_number: str, requester_vat: str = None, requester_name: str = None,
+                      requester_country: str = None, deadline: float = VIES_DEADLINE) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Validate through the async client from synchronous code, waiting at most ``deadline`` seconds
+
+    Returns:
+        Tuple of (is valid, details); an "unverified" result if the deadline passes
+    """
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                _loop = _BackgroundLoop()
+    try:
+        return _loop.run(
+            get_vies_client().validate(vat_number, requester_vat, requester_name, requester_country), deadline
+        )
+    except Exception as e:
+        country_code, number = split_vat(vat_number)
+        logger.warning(f"VIES lookup for {country_code} abandoned after {deadline}s: {e!r}")
+        return False, AsyncViesClient._unverified(country_code, number, "deadline_exceeded",
+                                                  f"VIES did not answer within {deadline}s", 0.0,
+                                                  bool(requester_vat or requester_name))
@@ -0,0 +1,63 @@
+"""Benchmark: sequential vs. concurrent counterparty checks with simulated provider latency.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_counterparty_check [--vat-latency 0.8] [--runs 5]
+"""
+import argparse
+import statistics
+import time
+from unittest.mock import patch
+
+from backend.app.services.counterparty_check import CounterpartyCheckService
+from backend.app.services.vat_validation import VatValidationService
+from backend.app.services.sanctions_check import SanctionsCheckService
+from backend.app.services.judicial_check import JudicialCheckService
+
+
+def _delayed(func, latency):
+    """Wrap a provider so every call takes at least `latency` seconds"""
+    def wrapper(*args, **kwargs):
+        time.sleep(latency)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _time_runs(runs, **kwargs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        CounterpartyCheckService.check_counterparty(**kwargs)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vat-latency", type=float, default=0.8, help="Simulated VIES latency (s)")
+    parser.add_argument("--sanctions-latency", type=float, default=0.4, help="Simulated sanctions latency (s)")
+    parser.add_argument("--judicial-latency", type=float, default=0.6, help="Simulated judicial latency (s)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with patch.object(VatValidationService, "validate_vat_mock",
+                      _delayed(VatValidationService.validate_vat_mock, args.vat_latency)), \
+         patch.object(SanctionsCheckService, "check_sanctions",
+                      _delayed(SanctionsCheckService.check_sanctions, args.sanctions_latency)), \
+         patch.object(JudicialCheckService, "check_judicial_cases",
+                      _delayed(JudicialCheckService.check_judicial_cases, args.judicial_latency)):
+        scenarios = [
+            # Official name equals the supplied one: no re-run needed
+            ("same official name", {"name": "Test GmbH", "vat_id": "DE136695976"}),
+            # VIES resolves a different name: name-dependent checks are re-run
+            ("different official name", {"name": "Test", "vat_id": "DE136695976"}),
+            ("no VAT ID", {"name": "Global Imports AG"}),
+        ]
+        print(f"{'scenario':<26}{'sequential':>12}{'concurrent':>12}{'speedup':>10}")
+        for label, kwargs in scenarios:
+            sequential = statistics.median(_time_runs(args.runs, **kwargs))
+            concurrent = statistics.median(_time_runs(args.runs, concurrent=True, **kwargs))
+            print(f"{label:<26}{sequential * 1000:>10.0f}ms{concurrent * 1000:>10.0f}ms{sequential / concurrent:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark: entity extraction and offline VAT validation for partner-check chat messages.
+
+Runs the extractor over a corpus of sample messages (German/English requests,
+several EU legal forms, valid and mistyped VAT IDs) and reports per-message
+latency and how many company names / VAT IDs were recognised, next to the
+previous regex heuristic.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_entity_extractor [--messages 20000]
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+
+from backend.app.services.entity_extractor import extract_entities
+from backend.app.services.vat_checksum import check_vat_number
+
+COMPANIES = [
+    "Müller & Söhne GmbH", "Acme Holding B.V.", "Rossi Costruzioni S.r.l.", "Dupont Logistique SAS",
+    "Nordic Timber AB", "Polska Firma Sp. z o.o.", "Iberia Foods S.L.", "Brno Strojírny s.r.o.",
+    "Helsinki Data Oy", "Dublin Software Ltd", "Schmidt Maschinenbau GmbH & Co. KG", "Tech Solutions AG",
+    "Global Imports UG (haftungsbeschränkt)", "Vienna Trade GmbH", "Copenhagen Design ApS",
+]
+VAT_IDS = ["DE136695976", "ATU13585627", "BE0776091951", "NL004495445B01", "FR40303265045",
+           "IT00743110157", "DE 136 695 976"]
+TYPO_VAT_IDS = ["DE136695975", "ATU1358562", "NL004495445B02", "IT00743110158", "FR41303265045"]
+TEMPLATES = [
+    "Bitte prüfe die {company}",
+    "Kannst du {company} überprüfen? USt-IdNr. {vat}",
+    "Check {company} ({vat}) and {company2}",
+    "Ist {vat} gültig?",
+    "Firma: {company}",
+    "{company}",
+    "Wir wollen mit {company} und {company2} zusammenarbeiten, bitte prüfen",
+    "Neue Lieferanten: {company} {vat}, {company2} {vat2}",
+]
+
+
+def legacy_extract(message):
+    """The previous heuristic (one company name and one VAT ID per message)"""
+    vat_match = re.search(r'\b([A-Z]{2}[0-9A-Z]{7,12})\b', message, re.IGNORECASE)
+    vat_id = vat_match.group(1).upper() if vat_match else None
+    company_patterns = [
+        r'(?:Firma|Unternehmen|company)[\s:]+([A-Z][A-Za-z0-9\s&\.]{2,50}(?:GmbH|AG|Ltd|Inc|KG|OHG|UG)?)',
+        r'\b([A-Z][A-Za-z0-9\s&\.]{2,20}\s(?:GmbH|AG|Ltd|Inc|KG|OHG|UG))\b'
+    ]
+    company_name = None
+    for pattern in company_patterns:
+        company_match = re.search(pattern, message)
+        if company_match:
+            company_name = company_match.group(1).strip()
+            break
+    if not company_name and not vat_id:
+        if len(message.split()) <= 5 and any(x.isupper() for x in message[:1]):
+            company_name = message.strip()
+    return company_name, vat_id
+
+
+def corpus(count, rng):
+    for _ in range(count):
+        companies = rng.sample(COMPANIES, 2)
+        vats = [rng.choice(VAT_IDS + TYPO_VAT_IDS) for _ in range(2)]
+        yield rng.choice(TEMPLATES).format(company=companies[0], company2=companies[1], vat=vats[0], vat2=vats[1])
+
+
+def _timed(function, items):
+    timings = []
+    results = []
+    for item in items:
+        started = time.perf_counter()
+        results.append(function(item))
+        timings.append(time.perf_counter() - started)
+    return timings, results
+
+
+def _report(label, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1e6
+    p95 = timings[int(len(timings) * 0.95)] * 1e6
+    print(f"{label:<22} p50 {p50:7.1f}µs  p95 {p95:7.1f}µs  {len(timings) / sum(timings):9.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    messages = list(corpus(args.messages, random.Random(args.seed)))
+
+    timings, extracted = _timed(extract_entities, messages)
+    _report("extract_entities", timings)
+    names = sum(1 for entities in extracted for entity in entities if entity["name"])
+    vats = [entity for entities in extracted for entity in entities if entity["vat_id"]]
+    rejected = sum(1 for entity in vats if not entity["vat_valid"])
+    print(f"  {names} company names, {len(vats)} VAT IDs ({rejected} rejected offline)")
+
+    timings, legacy = _timed(legacy_extract, messages)
+    _report("legacy heuristic", timings)
+    print(f"  {sum(1 for name, _ in legacy if name)} company names, {sum(1 for _, vat in legacy if vat)} VAT IDs")
+
+    vat_numbers = [rng_vat for rng_vat in (VAT_IDS + TYPO_VAT_IDS) * (args.messages // 10)]
+    timings, _ = _timed(check_vat_number, vat_numbers)
+    _report("check_vat_number", timings)
+
+
+if __name__ == "__main__":
+    main()
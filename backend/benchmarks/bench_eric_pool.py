@@ -0,0 +1,74 @@
+"""Benchmark: ERiC declarations cold, in one warm process and in a pool of warm processes.
+
+The mock library simulates the initialization (library + certificate) and
+per-step processing latency of the real ERiC. Each declaration runs
+prepare_vat_declaration (XML, validation) and submit_declaration
+(encryption, sending).
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_eric_pool [--declarations 24] [--workers 4] [--init-latency 0.3]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from backend.app.services import mock_eric_service
+from backend.app.services.eric_pool import ERiCPool
+from backend.app.services.mock_eric_service import ERiCIntegration, MockERiCLibrary
+
+TOTALS = {"revenue": Decimal("1000.00"), "tax_collected": Decimal("190.00"), "expenses": Decimal("0.00"),
+          "tax_paid": Decimal("0.00"), "net_tax": Decimal("190.00")}
+
+
+def declare(eric):
+    declaration = eric.prepare_vat_declaration(None, "12345678901", "Q2 2024", totals=TOTALS)
+    return eric.submit_declaration(declaration)
+
+
+def _report(label, count, seconds):
+    print(f"{label:34s} {seconds:6.2f}s  {count / seconds:6.1f} declarations/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--declarations", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--init-latency", type=float, default=0.3)
+    parser.add_argument("--processing-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    count = args.declarations
+
+    # Cold: every declaration initializes the library first (a process per request)
+    started = time.perf_counter()
+    for _ in range(count):
+        mock_eric_service.mock_eric = MockERiCLibrary(args.init_latency, args.processing_latency)
+        ERiCIntegration.initialize()
+        declare(ERiCIntegration)
+    _report("cold start per declaration", count, time.perf_counter() - started)
+
+    # One warm library in this process; concurrent callers are serialized by its lock
+    mock_eric_service.mock_eric = MockERiCLibrary(args.init_latency, args.processing_latency)
+    ERiCIntegration.initialize()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(lambda _: declare(ERiCIntegration), range(count)))
+    _report("one warm process", count, time.perf_counter() - started)
+
+    pool = ERiCPool(size=args.workers, init_latency=args.init_latency,
+                    processing_latency=args.processing_latency, health_interval=0)
+    started = time.perf_counter()
+    pool.start()
+    print(f"pool start ({args.workers} workers in parallel): {time.perf_counter() - started:.2f}s")
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda _: declare(pool), range(count)))
+        _report(f"pool of {args.workers} warm processes", count, time.perf_counter() - started)
+        print(f"pool average queue wait: {pool.stats()['avg_wait_ms']}ms")
+    finally:
+        pool.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: sanctions index build, single-name and batch screening latency.
+
+Builds a synthetic consolidated list of the size of the EU/OFAC lists
+(~20k entries with aliases) and screens single names and a 10k-name batch.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_sanctions_index [--entries 20000] [--batch 10000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from backend.app.services.sanctions_index import SanctionsIndex, normalize_name
+from backend.app.services.sanctions_check import SanctionsCheckService
+
+CONSONANTS = ["b", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "z",
+              "sh", "kh", "ch", "zh", "ts", "br", "tr", "st", "gr", "pr"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ov", "ar", "in", "el"]
+SYLLABLES = [c + v for c in CONSONANTS for v in VOWELS]
+SUFFIXES = ["LLC", "OOO", "GmbH", "Ltd", "JSC", "Trading Co", "Holding", "Group", ""]
+
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def _name(rng):
+    return " ".join([_word(rng) for _ in range(rng.randint(1, 3))] + [rng.choice(SUFFIXES)]).strip()
+
+
+def _typo(rng, name):
+    chars = list(name)
+    position = rng.randrange(len(chars))
+    chars[position] = rng.choice("aeiou")
+    return "".join(chars)
+
+
+def synthetic_entries(count, rng):
+    for i in range(count):
+        yield {
+            "entry_id": f"SYN:{i}",
+            "name": _name(rng),
+            "aliases": [_name(rng) for _ in range(rng.randint(0, 2))],
+            "country_codes": [rng.choice(["RU", "BY", "IR", "KP", "SY"])],
+            "list_name": "Synthetic List",
+            "date_listed": "2024-01-01",
+            "reasons": [],
+            "source_url": "",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    entries = list(synthetic_entries(args.entries, rng))
+    started = time.perf_counter()
+    index = SanctionsIndex(entries)
+    build_time = time.perf_counter() - started
+    print(f"index build: {len(index)} entries / {len(index.names)} names / "
+          f"{len(index.postings)} n-grams in {build_time:.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.pkl")
+        index.save(path)
+        started = time.perf_counter()
+        SanctionsIndex.load(path)
+        print(f"pickle load: {(time.perf_counter() - started) * 1000:.0f}ms "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    # Queries: half near-duplicates of listed names (typos), half unrelated names
+    queries = []
+    for _ in range(args.batch):
+        if rng.random() < 0.5:
+            queries.append(_typo(rng, rng.choice(entries)["name"]))
+        else:
+            queries.append(_name(rng))
+
+    candidate_times, search_times = [], []
+    for query in queries[:1000]:
+        normalized = normalize_name(query)
+        started = time.perf_counter()
+        index.candidates(normalized)
+        candidate_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        index.search(query)
+        search_times.append(time.perf_counter() - started)
+
+    def pct(values, q):
+        return sorted(values)[int(len(values) * q) - 1] * 1000
+
+    print(f"candidate generation: p50 {pct(candidate_times, 0.5):.3f}ms  p95 {pct(candidate_times, 0.95):.3f}ms")
+    print(f"single-name search:   p50 {pct(search_times, 0.5):.3f}ms  p95 {pct(search_times, 0.95):.3f}ms")
+
+    started = time.perf_counter()
+    hits = sum(1 for query in queries if SanctionsCheckService.check_sanctions_index(index, query)[0])
+    batch_time = time.perf_counter() - started
+    print(f"batch of {len(queries)}: {batch_time:.2f}s ({len(queries) / batch_time:.0f} names/s, {hits} flagged)")
+
+    # Baseline: the previous per-call scan (regex + word-set comparison per entry)
+    sample = entries[:2000]
+    started = time.perf_counter()
+    for query in queries[:200]:
+        lowered = query.lower()
+        for entry in sample:
+            if entry["name"].lower() in lowered:
+                break
+            words1, words2 = set(lowered.split()), set(entry["name"].lower().split())
+            len(words1 & words2) / len(words1 | words2)
+    linear = (time.perf_counter() - started) / 200 * (args.entries / len(sample))
+    print(f"linear scan estimate: {linear * 1000:.2f}ms per name over {args.entries} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark: VAT declaration totals summed in SQL vs. hydrated ORM rows summed in Python.
+
+Fills a SQLite database with a quarter of synthetic Stripe charges and expenses
+for one user and computes the declaration totals both ways: the previous path
+(load every Transaction, build dicts, sum in Python) and aggregate_vat_totals
+(one conditional-aggregate query).
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_vat_totals [--transactions 100000] [--runs 5] [--db sqlite:///...]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine, insert
+
+from backend.app.db import create_session_factory
+from backend.app.models import Base, Transaction, User
+from backend.app.services.vat_totals import aggregate_vat_totals, totals_from_transactions
+
+START, END = datetime(2024, 4, 1), datetime(2024, 7, 1)
+
+
+def synthetic_transactions(count, rng):
+    seconds = int((END - START).total_seconds())
+    for i in range(count):
+        amount = Decimal(rng.randint(-30000, 120000)) / 100
+        yield {
+            "id": f"tx-{i}",
+            "user_id": "bench-user",
+            "stripe_id": f"ch_{i}",
+            "date": START + timedelta(seconds=rng.randrange(seconds)),
+            "description": "Stripe charge" if amount > 0 else "Expense",
+            "amount": amount,
+            "currency": "EUR",
+            "status": "succeeded",
+            "tax_amount": (abs(amount) * Decimal("0.19")).quantize(Decimal("0.01")),
+            "is_expense_claimed": rng.random() < 0.8,
+            "created_at": datetime.utcnow(),
+        }
+
+
+def python_path(session):
+    """The previous path: hydrate every ORM row, build dicts, sum in Python"""
+    transactions = session.query(Transaction).filter(
+        Transaction.user_id == "bench-user", Transaction.date >= START, Transaction.date < END).all()
+    tx_data = [{
+        "id": tx.id,
+        "date": tx.date.isoformat(),
+        "amount": float(tx.amount),
+        "tax_amount": float(tx.tax_amount) if tx.tax_amount else None,
+        "is_expense_claimed": tx.is_expense_claimed,
+    } for tx in transactions]
+    return totals_from_transactions(tx_data)
+
+
+def sql_path(session):
+    totals = aggregate_vat_totals(session, "bench-user", start=START, end=END)
+    totals.pop("count")
+    return totals
+
+
+def _time_runs(session_factory, func, runs):
+    timings, result = [], None
+    for _ in range(runs):
+        with session_factory() as session:
+            started = time.perf_counter()
+            result = func(session)
+            timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="Database URL (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(args.db or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = create_session_factory(engine)
+
+        rows = list(synthetic_transactions(args.transactions, random.Random(args.seed)))
+        started = time.perf_counter()
+        with session_factory() as session:
+            session.execute(insert(User), [{"id": "bench-user", "email": "bench@example.de", "password_hash": "x"}])
+            for offset in range(0, len(rows), 10000):
+                session.execute(insert(Transaction), rows[offset:offset + 10000])
+            session.commit()
+        print(f"loaded {len(rows)} transactions in {time.perf_counter() - started:.1f}s")
+
+        python_times, python_totals = _time_runs(session_factory, python_path, args.runs)
+        sql_times, sql_totals = _time_runs(session_factory, sql_path, args.runs)
+        for label, timings in (("ORM rows + Python sums", python_times), ("SQL aggregate", sql_times)):
+            print(f"{label:24s} median {statistics.median(timings) * 1000:8.1f}ms  "
+                  f"min {min(timings) * 1000:8.1f}ms")
+        print(f"speedup: {statistics.median(python_times) / statistics.median(sql_times):.1f}x")
+        print(f"totals match: {python_totals == sql_totals}  net tax {sql_totals['net_tax']}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
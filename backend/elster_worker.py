@@ -0,0 +1,74 @@
+"""
+Фоновые воркеры отправки деклараций в ELSTER
+
+Каждый процесс забирает из таблицы submission_jobs пачки готовых к работе
+заданий (SELECT ... FOR UPDATE SKIP LOCKED), прогоняет конвейер ERiC и
+опрашивает статус по transfer ticket с экспоненциальной задержкой.
+С --eric-processes N декларации обрабатываются параллельно в пуле из N
+заранее инициализированных процессов ERiC.
+
+Запуск:
+    python elster_worker.py [--processes 2] [--eric-processes 4] [--once]
+"""
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+
+# Добавляем родительский каталог в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elster_jobs import SubmissionWorker
+from app.services.eric_pool import ERiCPool
+
+
+def run_worker(once=False, eric_processes=0):
+    """Цикл одного процесса-воркера; SIGTERM/SIGINT завершают его после текущей пачки"""
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "info").upper())
+    if eric_processes > 0:
+        worker = SubmissionWorker(eric=ERiCPool(eric_processes), concurrency=eric_processes)
+    else:
+        worker = SubmissionWorker()
+    try:
+        if once:
+            worker.eric.initialize()
+            while worker.run_once():
+                pass
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        worker.run_forever(stop)
+    finally:
+        worker.eric.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued ELSTER submissions and poll their status")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("ELSTER_WORKER_PROCESSES", "1")))
+    parser.add_argument("--eric-processes", type=int, default=int(os.getenv("ERIC_POOL_SIZE", "0")),
+                        help="Warm ERiC processes per worker (0 = ERiC in the worker process itself)")
+    parser.add_argument("--once", action="store_true", help="Process all due jobs and exit")
+    args = parser.parse_args()
+
+    if args.once or args.processes <= 1:
+        run_worker(args.once, args.eric_processes)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, name=f"elster-worker-{i}",
+                                         kwargs={"eric_processes": args.eric_processes})
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    # Сигнал родителю пересылается воркерам
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Загрузка выгрузки судебного реестра (CSV/JSONL) в локальное хранилище судебных дел
+
+Запуск:
+    python import_judicial_cases.py cases.csv --source handelsregister
+"""
+import os
+import sys
+import argparse
+
+# Добавляем родительский каталог в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.judicial_store import get_judicial_store, load_case_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a court-register export into the judicial case store")
+    parser.add_argument("path", help="CSV or JSONL export")
+    parser.add_argument("--source", help="Source name (defaults to the file name); replaces earlier imports of it")
+    args = parser.parse_args()
+
+    source = args.source or os.path.splitext(os.path.basename(args.path))[0]
+    count = get_judicial_store().import_cases(load_case_export(args.path), source)
+    print(f"Imported {count} cases from {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Ночное обновление санкционных списков с повторной проверкой затронутых контрагентов
+
+По умолчанию повторно проверяются сохранённые партнёры (таблица partners),
+их статус санкций обновляется по результатам.
+
+Запуск:
+    python refresh_sanctions.py [--counterparties counterparties.jsonl] [--no-store] [--force]
+"""
+import os
+import sys
+import json
+import argparse
+
+# Добавляем родительский каталог в путь для импорта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.sanctions_refresh import refresh_sanctions_lists, build_counterparty_index
+from app.services.partner_history import get_partner_history
+
+
+def load_counterparties(path):
+    """Загрузка сохранённых контрагентов из JSONL (id, name, country_code, vat_id, is_sanctioned)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh sanctions lists and re-screen affected counterparties")
+    parser.add_argument("--counterparties", help="JSONL file with counterparties (instead of the partners table)")
+    parser.add_argument("--no-store", action="store_true", help="Only diff the lists, do not re-screen stored partners")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the list files did not change")
+    args = parser.parse_args()
+
+    counterparty_index = None
+    history = None
+    if args.counterparties:
+        counterparty_index = build_counterparty_index(load_counterparties(args.counterparties))
+    elif not args.no_store:
+        history = get_partner_history()
+        counterparty_index = build_counterparty_index(history.counterparties())
+
+    report = refresh_sanctions_lists(counterparty_index=counterparty_index, force=args.force)
+    if history is not None and report.get("results"):
+        report["partners_updated"] = history.apply_rescreen_results(report["results"])
+    print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
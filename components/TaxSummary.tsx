@@ -21,7 +21,7 @@ const TaxSummary: React.FC<TaxSummaryProps> = ({ transactions, submissions }) =>
         // Calculate tax reported (from submitted transactions)
         const submittedTransactionIds = new Set<string>();
         submissions.forEach(sub => {
-            sub.transactionIds.forEach(id => submittedTransactionIds.add(id));
+            sub.transactionIds?.forEach(id => submittedTransactionIds.add(id));
         });
         
         const taxReported = transactions
@@ -1,4 +1,9 @@
 import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 import logging
 
@@ -6,47 +11,208 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "gemini-1.5-pro"
+
+# Параметры генерации по умолчанию
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+# Окно (мс), за которое одновременные запросы собираются в один пакет, и размер пакета
+BATCH_WINDOW_MS = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "10"))
+BATCH_MAX_SIZE = int(os.getenv("GEMINI_BATCH_MAX_SIZE", "32"))
+# Потоки для синхронного SDK Gemini: столько генераций идет одновременно в одном процессе
+INFERENCE_WORKERS = int(os.getenv("GEMINI_INFERENCE_WORKERS", "16"))
+
+# Экземпляры моделей по (имя модели, параметры генерации), общие для всех запросов
+_models = {}
+_models_lock = threading.Lock()
+_configured = False
+
+# Хуки метрик: hook(kind, model_name, seconds), kind - "construct" или "inference"
+_metrics_hooks = []
+_stats = {}
+_stats_lock = threading.Lock()
+
 def init_gemini():
-    """Инициализация API Gemini"""
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set")
-    
-    genai.configure(api_key=api_key)
-    logger.info("Gemini API initialized")
+    """Инициализация API Gemini (однократно: повторный configure сбрасывает клиента и его соединения)"""
+    global _configured
+    if _configured:
+        return genai
+    with _models_lock:
+        if not _configured:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable not set")
+            
+            genai.configure(api_key=api_key)
+            _configured = True
+            logger.info("Gemini API initialized")
     return genai
 
-def get_model(model_name="gemini-1.5-pro"):
-    """Получение модели Gemini"""
+def get_model(model_name=DEFAULT_MODEL, generation_config=None):
+    """Получение модели Gemini из кэша; создается при первом обращении"""
+    generation_config = generation_config or GENERATION_CONFIG
+    key = (model_name, tuple(sorted(generation_config.items())))
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
     genai_instance = init_gemini()
-    model = genai_instance.GenerativeModel(model_name)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            started = time.perf_counter()
+            model = genai_instance.GenerativeModel(model_name, generation_config=generation_config)
+            _report("construct", model_name, time.perf_counter() - started)
+            _models[key] = model
     return model
 
-async def generate_response(prompt, context=None, model_name="gemini-1.5-pro"):
-    """Генерация ответа от модели Gemini"""
+def warm_up(model_names=(DEFAULT_MODEL,)):
+    """Создает модели при старте сервиса, чтобы первый запрос не тратил на это время"""
+    for model_name in model_names:
+        try:
+            get_model(model_name)
+        except Exception as e:
+            logger.warning(f"Warm-up of {model_name} failed: {e}")
+
+def add_metrics_hook(hook):
+    """Подписка на время создания моделей и время генерации"""
+    _metrics_hooks.append(hook)
+
+def model_stats():
+    """Количество и суммарное время созданий моделей и генераций по каждой модели"""
+    with _stats_lock:
+        return {name: dict(values) for name, values in _stats.items()}
+
+def _report(kind, model_name, seconds):
+    with _stats_lock:
+        stats = _stats.setdefault(model_name, {
+            "construct_count": 0, "construct_seconds": 0.0,
+            "inference_count": 0, "inference_seconds": 0.0,
+        })
+        stats[f"{kind}_count"] += 1
+        stats[f"{kind}_seconds"] += seconds
+    for hook in _metrics_hooks:
+        try:
+            hook(kind, model_name, seconds)
+        except Exception as e:
+            logger.warning(f"Metrics hook failed: {e}")
+
+_executor = None
+
+def get_executor():
+    """Пул потоков для вызовов SDK Gemini, чтобы они не блокировали цикл событий"""
+    global _executor
+    if _executor is None:
+        with _models_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="gemini-inference")
+    return _executor
+
+def generate_text(prompt, model_name=DEFAULT_MODEL):
+    """Синхронная генерация текста (выполняется в пуле потоков)"""
+    model = get_model(model_name)
+    started = time.perf_counter()
     try:
-        model = get_model(model_name)
-        
-        # Настройки для запроса
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
+        return model.generate_content(prompt).text
+    finally:
+        _report("inference", model_name, time.perf_counter() - started)
+
+class MicroBatcher:
+    """
+    Очередь, которая собирает одновременные запросы за короткое окно в пакет.
+    
+    У онлайн-API Gemini нет вызова для нескольких промптов сразу, поэтому пакет
+    обрабатывается так: одинаковые запросы (модель и промпт) объединяются в один
+    вызов, остальные параллельно уходят в пул потоков. Цикл событий при этом
+    не блокируется, а число одновременных вызовов ограничено размером пула.
+    """
+    
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_size=BATCH_MAX_SIZE, executor=None, generate=None):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._executor = executor
+        self._generate = generate or generate_text
+        self._queue = None
+        self._loop = None
+        self._worker = None
+        self.stats = {"requests": 0, "batches": 0, "calls": 0, "coalesced": 0}
+    
+    async def submit(self, prompt, model_name=DEFAULT_MODEL):
+        """Ставит запрос в очередь и ждет текст ответа"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Очередь и обработчик привязаны к циклу событий процесса
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self.stats["requests"] += 1
+        await self._queue.put((model_name, prompt, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._dispatch(loop, batch)
+    
+    def _dispatch(self, loop, batch):
+        """Объединяет одинаковые запросы пакета и отправляет вызовы в пул потоков"""
+        groups = {}
+        for model_name, prompt, future in batch:
+            groups.setdefault((model_name, prompt), []).append(future)
+        self.stats["batches"] += 1
+        self.stats["calls"] += len(groups)
+        self.stats["coalesced"] += len(batch) - len(groups)
         
+        executor = self._executor or get_executor()
+        for (model_name, prompt), futures in groups.items():
+            call = loop.run_in_executor(executor, self._generate, prompt, model_name)
+            call.add_done_callback(lambda call, futures=futures: self._resolve(call, futures))
+    
+    @staticmethod
+    def _resolve(call, futures):
+        for future in futures:
+            if future.done():
+                # Клиент отключился и запрос отменен
+                continue
+            if call.exception() is not None:
+                future.set_exception(call.exception())
+            else:
+                future.set_result(call.result())
+
+_batcher = MicroBatcher()
+
+def batch_stats():
+    """Счетчики очереди: запросы, пакеты, вызовы модели и объединенные запросы"""
+    return dict(_batcher.stats)
+
+async def generate_response(prompt, context=None, model_name=DEFAULT_MODEL):
+    """Генерация ответа от модели Gemini (через очередь пакетов, без блокировки цикла событий)"""
+    try:
         # Формирование контекста запроса
         if context:
             prompt = f"{context}\n\n{prompt}"
         
         # Получение ответа от модели
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
+        text = await _batcher.submit(prompt, model_name)
         
         return {
-            "text": response.text,
+            "text": text,
             "model": model_name
         }
     
@@ -57,3 +223,67 @@ async def generate_response(prompt, context=None, model_name="gemini-1.5-pro"):
             "error": str(e),
             "model": model_name
         }
+
+async def stream_response(prompt, context=None, model_name=DEFAULT_MODEL):
+    """
+    Потоковая генерация: фрагменты текста отдаются по мере поступления от Gemini.
+    Синхронный поток SDK читается в пуле потоков, фрагменты передаются в цикл событий через очередь.
+    """
+    if context:
+        prompt = f"{context}\n\n{prompt}"
+    
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+    stopped = threading.Event()
+    
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Цикл событий уже закрыт
+            stopped.set()
+    
+    def produce():
+        started = time.perf_counter()
+        try:
+            response = get_model(model_name).generate_content(prompt, stream=True)
+            for chunk in response:
+                if stopped.is_set():
+                    # Клиент отключился, дальше не читаем
+                    break
+                # Фрагменты без текста (например, только с метаданными безопасности) пропускаем
+                if chunk.parts:
+                    put(chunk.text)
+            put(finished)
+        except Exception as e:
+            put(e)
+        finally:
+            _report("inference", model_name, time.perf_counter() - started)
+    
+    loop.run_in_executor(get_executor(), produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+async def ndjson_stream(chunks, **done):
+    """
+    События NDJSON для потоковых эндпоинтов: {"type": "chunk", "text"} на каждый фрагмент,
+    в конце {"type": "done", ...done} или {"type": "error", "error"}, если генерация прервалась
+    """
+    try:
+        async for text in chunks:
+            yield json.dumps({"type": "chunk", "text": text}, ensure_ascii=False) + "\n"
+    except Exception as e:
+        # Статус ответа уже отправлен, поэтому ошибка передается событием
+        logger.error(f"Error streaming response: {e}")
+        yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+        return
+    yield json.dumps({"type": "done", **done}, ensure_ascii=False, default=str) + "\n"
@@ -1,6 +1,7 @@
 import os
 import logging
 from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 
@@ -9,7 +10,8 @@ import sys
 import os
 sys.path.append("/app")
 from common.database import init_db
-from common.gemini_service import generate_response
+from common.gemini_service import (generate_response, stream_response, ndjson_stream, warm_up, model_stats,
+                                   batch_stats, DEFAULT_MODEL)
 from common.prompts import get_specialized_prompt
 
 # Настройка логирования
@@ -19,6 +21,9 @@ logger = logging.getLogger(__name__)
 # Инициализация базы данных
 init_db()
 
+# Создаем модель Gemini при старте, а не на первом запросе
+warm_up()
+
 # Создаем роутер здоровья напрямую
 from fastapi import APIRouter
 
@@ -69,11 +74,32 @@ async def chat(request: ChatRequest):
         logger.error(f"Error processing partner check chat request: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Потоковый вариант /chat модуля проверки контрагентов: NDJSON-события chunk по мере генерации, затем done"""
+    specialized_prompt = get_specialized_prompt(request.message)
+    
+    return StreamingResponse(
+        ndjson_stream(
+            stream_response(specialized_prompt),
+            model=DEFAULT_MODEL,
+            conversation_id=request.conversation_id,
+            metadata=request.metadata
+        ),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health")
 async def health_check():
     """Эндпоинт для проверки работоспособности сервиса"""
     return {"status": "ok", "module": "partner_check"}
 
+@app.get("/stats")
+async def stats():
+    """Время создания моделей и генерации, счетчики очереди пакетов"""
+    return {"models": model_stats(), "batching": batch_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
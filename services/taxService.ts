@@ -63,7 +63,7 @@ export function getUnsubmittedTransactions(
     // Get all transaction IDs that are part of submissions
     const submittedIds = new Set<string>();
     submissions.forEach(sub => {
-        sub.transactionIds.forEach(id => submittedIds.add(id));
+        sub.transactionIds?.forEach(id => submittedIds.add(id));
     });
     
     // Filter transactions that are not in any submission
@@ -22,3 +22,42 @@ def app_context():
     app = create_app(testing=True)
     with app.app_context():
         yield app
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Create a per-test SQLite database with all tables and return its session factory."""
+    from sqlalchemy import create_engine
+    from backend.app import db
+    from backend.app.models import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'shared.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield db.create_session_factory(engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(session_factory, monkeypatch):
+    """Point services that fall back to the shared session factory at the per-test database.
+
+    Without this, stores such as the judicial case store and the usage ledger
+    would open DATABASE_URL (sqlite:///local.db in the working directory) and
+    depend on its contents.
+    """
+    from backend.app import db
+    from backend.app.services import judicial_store, usage_ledger
+
+    monkeypatch.setattr(db, "_session_factory", session_factory)
+    monkeypatch.setattr(judicial_store, "_judicial_store", None)
+    # No background writer that could outlive the test
+    monkeypatch.setattr(usage_ledger, "_usage_ledger",
+                        usage_ledger.UsageLedger(session_factory=session_factory, background=False))
+
+
+@pytest.fixture(autouse=True)
+def isolated_response_cache(monkeypatch):
+    """Give each test an empty response cache so answers never leak between tests."""
+    from backend.app.services import response_cache
+
+    monkeypatch.setattr(response_cache, "_response_cache", response_cache.ResponseCache())
@@ -0,0 +1,49 @@
+import io
+import pytest
+from unittest.mock import patch
+
+from backend.app.services.bulk_partner_check import parse_rows, screen_rows, detect_format, BulkUploadError
+
+
+def test_parse_rows_csv_with_semicolons():
+    """Test that Excel-style CSV uploads are parsed with normalized columns."""
+    data = io.BytesIO("Firma;USt_IdNr\nTest GmbH;de 123456789\n".encode("utf-8-sig"))
+    rows = list(parse_rows(data, "csv"))
+    assert rows == [{"name": "Test GmbH", "vat_id": "DE123456789", "country_code": ""}]
+
+
+def test_detect_format_rejects_unknown_upload():
+    """Test that unsupported uploads are rejected."""
+    assert detect_format("suppliers.jsonl", None) == "jsonl"
+    with pytest.raises(BulkUploadError):
+        detect_format("suppliers.xlsx", "application/vnd.ms-excel")
+
+
+def test_parse_rows_rejects_bad_uploads_before_iteration():
+    """Test that an unknown format or a CSV without usable header raises on the call, not mid-stream."""
+    with pytest.raises(BulkUploadError, match="Unsupported format"):
+        parse_rows(io.BytesIO(b"x"), "xml")
+    with pytest.raises(BulkUploadError, match="header"):
+        parse_rows(io.BytesIO(b"foo,bar\n1,2\n"), "csv")
+
+
+@patch('backend.app.services.bulk_partner_check.CounterpartyCheckService.check_counterparty')
+def test_screen_rows_deduplicates_and_reports_every_row(mock_check):
+    """Test that duplicate VAT IDs are checked once but every row gets a result line."""
+    mock_check.side_effect = lambda **kwargs: {"counterparty_name": kwargs["name"], "overall_status": "verified"}
+    rows = [
+        {"name": "Test GmbH", "vat_id": "DE123456789", "country_code": ""},
+        {"name": "Test", "vat_id": "DE123456789", "country_code": ""},
+        {"name": "", "vat_id": "", "country_code": ""},
+        {"parse_error": "Invalid JSON: Expecting value"},
+    ]
+
+    lines = list(screen_rows(rows, max_workers=2))
+
+    assert mock_check.call_count == 1
+    by_row = {line["row"]: line for line in lines if "row" in line}
+    assert set(by_row) == {1, 2, 3, 4}
+    assert by_row[2]["result"]["counterparty_name"] == "Test GmbH"
+    assert "error" in by_row[3] and "error" in by_row[4]
+    assert lines[-1]["summary"]["unique_checks"] == 1
+    assert lines[-1]["summary"]["duplicates"] == 1
@@ -0,0 +1,125 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+_PATH = os.path.join(os.path.dirname(__file__), "../../model-containers/common/gemini_service.py")
+_spec = importlib.util.spec_from_file_location("container_gemini_service", _PATH)
+gemini_service = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(gemini_service)
+
+
+def _slow_generate(calls, delay=0.2):
+    def generate(prompt, model_name):
+        calls.append((prompt, threading.current_thread().name))
+        time.sleep(delay)
+        if prompt == "boom":
+            raise RuntimeError("quota")
+        return f"Antwort auf {prompt}"
+    return generate
+
+
+def test_concurrent_requests_run_in_parallel_off_the_event_loop():
+    """Test that blocking SDK calls run in the pool so concurrent requests overlap."""
+    calls = []
+    batcher = gemini_service.MicroBatcher(window_ms=5, generate=_slow_generate(calls))
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(f"Frage {i}") for i in range(8)))
+        elapsed = time.perf_counter() - started
+        tick_task.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+
+    assert results == [f"Antwort auf Frage {i}" for i in range(8)]
+    assert elapsed < 0.6  # eight 0.2 s calls, not serialized
+    assert ticks >= 5  # the event loop kept running during the calls
+    assert all(name.startswith("gemini-inference") for _, name in calls)
+
+
+def test_identical_requests_in_a_window_are_coalesced():
+    """Test that the same prompt arriving in one window is generated once."""
+    calls = []
+    batcher = gemini_service.MicroBatcher(window_ms=50, generate=_slow_generate(calls, delay=0.01))
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit("Wie hoch ist die Umsatzsteuer?") for _ in range(5)),
+                                    batcher.submit("Andere Frage"))
+
+    results = asyncio.run(main())
+
+    assert results[:5] == ["Antwort auf Wie hoch ist die Umsatzsteuer?"] * 5
+    assert len(calls) == 2
+    assert batcher.stats == {"requests": 6, "batches": 1, "calls": 2, "coalesced": 4}
+
+
+def test_errors_reach_only_their_requests():
+    """Test that a failing call rejects its own requests while the rest of the batch succeeds."""
+    batcher = gemini_service.MicroBatcher(window_ms=20, generate=_slow_generate([], delay=0.01))
+
+    async def main():
+        return await asyncio.gather(batcher.submit("boom"), batcher.submit("ok"), return_exceptions=True)
+
+    failed, ok = asyncio.run(main())
+
+    assert isinstance(failed, RuntimeError) and ok == "Antwort auf ok"
+
+
+def test_stream_response_yields_chunks_while_generating():
+    """Test that the first chunk reaches the event loop before generation has finished."""
+    def chunks():
+        yield SimpleNamespace(parts=[1], text="Erster ")
+        time.sleep(0.3)
+        yield SimpleNamespace(parts=[], text="")
+        yield SimpleNamespace(parts=[1], text="Teil")
+
+    model = SimpleNamespace(generate_content=lambda prompt, stream: chunks())
+
+    async def main():
+        started = time.perf_counter()
+        received = []
+        async for line in gemini_service.ndjson_stream(gemini_service.stream_response("Hallo"), model="gemini"):
+            received.append((time.perf_counter() - started, line))
+        return received
+
+    original = gemini_service.get_model
+    gemini_service.get_model = lambda model_name=None: model
+    try:
+        received = asyncio.run(main())
+    finally:
+        gemini_service.get_model = original
+
+    assert [line for _, line in received] == ['{"type": "chunk", "text": "Erster "}\n', '{"type": "chunk", "text": "Teil"}\n',
+                                              '{"type": "done", "model": "gemini"}\n']
+    assert received[0][0] < 0.2
+
+
+def test_stream_error_becomes_an_error_event():
+    """Test that a failure during generation ends the stream with an error event."""
+    def generate_content(prompt, stream):
+        raise RuntimeError("quota")
+
+    async def main():
+        return [line async for line in gemini_service.ndjson_stream(gemini_service.stream_response("Hallo"))]
+
+    original = gemini_service.get_model
+    gemini_service.get_model = lambda model_name=None: SimpleNamespace(generate_content=generate_content)
+    try:
+        lines = asyncio.run(main())
+    finally:
+        gemini_service.get_model = original
+
+    assert lines == ['{"type": "error", "error": "quota"}\n']
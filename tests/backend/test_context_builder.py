@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from backend.app.db import add_missing_columns_and_indexes
+from backend.app.models import Base, User, ConversationThread, Message, ConversationSummary
+from backend.app.services.context_builder import ContextBuilder, estimate_tokens
+
+
+def _thread(session_factory, contents):
+    start = datetime(2025, 1, 1)
+    with session_factory() as session:
+        session.add(User(id="u1", email="u1@example.com", password_hash="x"))
+        session.add(ConversationThread(id="t1", user_id="u1", module="accounting"))
+        for i, content in enumerate(contents):
+            session.add(Message(thread_id="t1", role="user" if i % 2 == 0 else "ai", content=content,
+                                created_at=start + timedelta(minutes=i)))
+        session.commit()
+
+
+def test_context_is_filled_newest_first_within_budget(session_factory):
+    """Test that only the newest turns fitting the budget are used and token counts are stored."""
+    _thread(session_factory, [f"Nachricht {i} " + "x" * 36 for i in range(10)])  # ~12 tokens each
+    builder = ContextBuilder(token_budget=40, summarizer=None)
+
+    with session_factory() as session:
+        context = builder.build(session, "t1")
+        session.commit()
+
+    assert [msg["content"][:12] for msg in context] == ["Nachricht 7 ", "Nachricht 8 ", "Nachricht 9 "]
+    with session_factory() as session:
+        assert all(message.token_count for message in session.query(Message))
+
+
+def test_oversized_message_is_truncated(session_factory):
+    """Test that a pasted document is shortened instead of filling the whole prompt."""
+    _thread(session_factory, ["Rechnung " + "9" * 20000, "Danke"])
+    builder = ContextBuilder(token_budget=500, message_max_tokens=100, summarizer=None)
+
+    with session_factory() as session:
+        context = builder.build(session, "t1")
+
+    assert len(context) == 2
+    assert estimate_tokens(context[0]["content"]) <= 100 and context[0]["content"].endswith("[gekürzt]")
+
+
+def test_overflow_is_folded_into_the_rolling_summary(session_factory):
+    """Test that old turns are summarized incrementally and replaced by the summary."""
+    _thread(session_factory, [f"Nachricht {i} " + "x" * 36 for i in range(10)])
+    calls = []
+
+    def summarizer(previous, messages):
+        calls.append((previous, [msg["content"][:12] for msg in messages]))
+        return (previous + " | " if previous else "") + f"{len(messages)} Nachrichten"
+
+    builder = ContextBuilder(token_budget=40, summarizer=summarizer, summary_min_messages=4,
+                             session_factory=session_factory, background=False)
+
+    with session_factory() as session:
+        builder.build(session, "t1")
+    # Messages 0-6 did not fit and were summarized
+    assert calls == [("", [f"Nachricht {i} " for i in range(7)])]
+
+    with session_factory() as session:
+        for i in range(10, 14):
+            session.add(Message(thread_id="t1", role="user", content=f"Nachricht {i} " + "x" * 36,
+                                created_at=datetime(2025, 1, 1) + timedelta(minutes=i)))
+        session.commit()
+        context = builder.build(session, "t1")
+
+    # Only the new overflow is sent to the summarizer, together with the previous summary
+    assert calls[1] == ("7 Nachrichten", [f"Nachricht {i} "[:12] for i in range(7, 12)])
+    assert context[0] == {"role": "summary", "content": "7 Nachrichten"}
+    with session_factory() as session:
+        summary = session.query(ConversationSummary).one()
+        assert summary.summary == "7 Nachrichten | 5 Nachrichten" and summary.message_count == 12
+
+
+def test_missing_columns_are_added_to_existing_tables(tmp_path):
+    """Test that a messages table created before token_count existed gets the column."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE messages (id VARCHAR PRIMARY KEY, thread_id VARCHAR, role VARCHAR(16), "
+                          "content TEXT, created_at DATETIME)"))
+
+    add_missing_columns_and_indexes(engine, Base.metadata)
+
+    with engine.connect() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(messages)"))]
+        indexes = [row[1] for row in conn.execute(text("PRAGMA index_list(messages)"))]
+    assert "token_count" in columns
+    assert "ix_messages_thread_created" in indexes
@@ -0,0 +1,52 @@
+import time
+from unittest.mock import patch
+
+from backend.app.services.counterparty_check import CounterpartyCheckService
+from backend.app.services.sanctions_check import SanctionsCheckService
+from backend.app.services.judicial_check import JudicialCheckService
+
+
+def test_concurrent_mode_matches_sequential():
+    """Test that the fan-out mode produces the same checks as the sequential path."""
+    sequential = CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976")
+    concurrent = CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976", concurrent=True)
+
+    assert concurrent["overall_status"] == sequential["overall_status"] == "verified"
+    assert concurrent["official_name"] == "Test GmbH"
+    assert concurrent["checks"]["judicial_check"]["entity_name"] == "Test GmbH"
+    assert "partial" not in concurrent
+
+
+def test_name_checks_rerun_only_for_different_official_name():
+    """Test that sanctions/judicial checks are re-run only when VIES resolves another name."""
+    with patch.object(SanctionsCheckService, 'check_sanctions',
+                      return_value=(False, {"is_sanctioned": False, "matches": []})) as mock_sanctions, \
+         patch.object(JudicialCheckService, 'check_judicial_cases',
+                      return_value={"case_count": 0, "cases": []}) as mock_judicial:
+        CounterpartyCheckService.check_counterparty("test  gmbh", vat_id="DE136695976", concurrent=True)
+        assert mock_sanctions.call_count == 1
+        assert mock_judicial.call_count == 1
+
+        CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976", concurrent=True)
+        assert mock_sanctions.call_count == 3
+        assert [c.args[0] for c in mock_judicial.call_args_list[1:]] == ["Test", "Test GmbH"]
+
+
+def test_provider_deadline_returns_partial_result():
+    """Test that a provider missing its deadline yields a partial result instead of blocking."""
+    def slow_judicial(name, country_code=None):
+        time.sleep(0.5)
+        return {"case_count": 0, "cases": []}
+
+    with patch.object(JudicialCheckService, 'check_judicial_cases', side_effect=slow_judicial):
+        started = time.monotonic()
+        result = CounterpartyCheckService.check_counterparty(
+            "Test GmbH", vat_id="DE136695976", concurrent=True, deadlines={"judicial_check": 0.05}
+        )
+
+    assert time.monotonic() - started < 0.4
+    assert result["partial"] is True
+    assert result["timed_out_checks"] == ["judicial_check"]
+    assert result["checks"]["judicial_check"]["timed_out"] is True
+    # An incomplete check must never be reported as verified
+    assert result["overall_status"] == "unknown"
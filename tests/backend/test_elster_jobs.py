@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from backend.app.models import Submission, SubmissionJob
+from backend.app.services.elster_jobs import SubmissionWorker, enqueue_submission
+from backend.app.services.mock_eric_service import ERiCIntegration
+
+TOTALS = {"revenue": Decimal("1000.00"), "tax_collected": Decimal("190.00"), "expenses": Decimal("100.00"),
+          "tax_paid": Decimal("19.00"), "net_tax": Decimal("171.00")}
+
+
+class FakeClock:
+    def __init__(self):
+        # Slightly ahead so jobs created with the real time are due
+        self.now = datetime.utcnow() + timedelta(seconds=1)
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedEric(ERiCIntegration):
+    """ERiC integration with scripted send failures and status answers"""
+    send_failures = 0
+    statuses = []
+    sent = []
+
+    @classmethod
+    def submit_declaration(cls, declaration_data):
+        if cls.send_failures:
+            cls.send_failures -= 1
+            raise RuntimeError("ELSTER unreachable")
+        cls.sent.append(declaration_data)
+        return super().submit_declaration(declaration_data)
+
+    @classmethod
+    def check_submission_status(cls, transfer_ticket):
+        return {"transfer_ticket": transfer_ticket, "status": cls.statuses.pop(0)}
+
+
+@pytest.fixture(autouse=True)
+def reset_scripted_eric():
+    ScriptedEric.send_failures, ScriptedEric.statuses, ScriptedEric.sent = 0, [], []
+
+
+def _enqueue(session_factory, count=1):
+    with session_factory() as session:
+        jobs = []
+        for i in range(count):
+            submission = Submission(user_id="u1", period=f"Q{i % 4 + 1} 2024", timestamp=datetime(2024, 7, 1))
+            session.add(submission)
+            session.flush()
+            jobs.append(enqueue_submission(session, submission, "12345678901", TOTALS))
+        session.commit()
+        return [job.id for job in jobs]
+
+
+def _state(session_factory, job_id):
+    with session_factory() as session:
+        job = session.get(SubmissionJob, job_id)
+        return job, session.get(Submission, job.submission_id).status
+
+
+def test_job_is_sent_then_polled_with_backoff_until_accepted(session_factory):
+    """Test the send -> poll -> accepted lifecycle and the growing poll delays."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    worker = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, poll_initial_delay=30, clock=clock)
+
+    assert worker.run_once() == 1
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status, job.locked_by) == ("polling", "processing", None)
+    assert job.transfer_ticket.startswith("ERIC-") and job.run_at == clock.now + timedelta(seconds=30)
+    assert "<Summe>171.00</Summe>" in ScriptedEric.sent[0]["xml_data"]
+
+    # Not due yet
+    assert worker.run_once() == 0
+    ScriptedEric.statuses = ["processing", "accepted"]
+    clock.now += timedelta(seconds=30)
+    assert worker.run_once() == 1
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status) == ("polling", "processing")
+    assert job.run_at == clock.now + timedelta(seconds=60)
+
+    clock.now += timedelta(seconds=60)
+    assert worker.run_once() == 1
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status) == ("done", "accepted")
+
+
+def test_claimed_jobs_are_not_taken_by_another_worker(session_factory):
+    """Test that a leased job is skipped by other workers until the lease expires."""
+    job_ids = _enqueue(session_factory, 3)
+    clock = FakeClock()
+    first = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, batch_size=2, lease_seconds=60, clock=clock)
+    second = SubmissionWorker(session_factory, "w2", eric=ScriptedEric, batch_size=2, lease_seconds=60, clock=clock)
+
+    claimed = first.claim()
+    assert len(claimed) == 2
+    remaining = second.claim()
+    assert {job.id for job in remaining} == set(job_ids) - {job.id for job in claimed}
+    assert second.claim() == []
+
+    # A crashed worker's jobs become claimable once its lease runs out
+    clock.now += timedelta(seconds=61)
+    assert len(second.claim()) == 2
+
+
+def test_send_errors_are_retried_then_marked_as_error(session_factory):
+    """Test that failed sends back off and give up after the maximum attempts."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    worker = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, max_attempts=2, retry_delay=10, clock=clock)
+    ScriptedEric.send_failures = 2
+
+    worker.run_once()
+    job, status = _state(session_factory, job_id)
+    assert (job.state, job.attempts, status) == ("queued", 1, "submitted")
+    assert job.last_error == "ELSTER unreachable" and job.run_at == clock.now + timedelta(seconds=10)
+
+    clock.now += timedelta(seconds=10)
+    worker.run_once()
+    job, status = _state(session_factory, job_id)
+    assert (job.state, job.attempts, status) == ("failed", 2, "error")
+
+
+def test_batch_status_updates(session_factory):
+    """Test that one batch finalizes several submissions with different outcomes."""
+    job_ids = _enqueue(session_factory, 3)
+    clock = FakeClock()
+    worker = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, poll_initial_delay=0, concurrency=3,
+                              clock=clock)
+    worker.run_once()
+
+    ScriptedEric.statuses = ["accepted", "error", "accepted"]
+    assert worker.run_once() == 3
+    statuses = sorted(_state(session_factory, job_id)[1] for job_id in job_ids)
+    assert statuses == ["accepted", "accepted", "error"]
+
+
+def test_job_taken_over_after_lease_expiry_is_not_sent_twice(session_factory):
+    """Test that a worker whose lease expired before it reached a job skips it and cannot overwrite it."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    slow = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, lease_seconds=60, clock=clock)
+    other = SubmissionWorker(session_factory, "w2", eric=ScriptedEric, lease_seconds=60, clock=clock)
+
+    [stale] = slow.claim()
+    clock.now += timedelta(seconds=61)
+    assert other.run_once() == 1
+
+    # The first worker now gets to the job of its old batch
+    assert slow._process(stale) is None
+    slow._apply([(stale, {"state": "failed", "locked_by": None}, "error")])
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status) == ("polling", "processing")
+    assert len(ScriptedEric.sent) == 1
+
+
+def test_job_interrupted_while_sending_is_failed_not_resent(session_factory):
+    """Test that a job whose worker died during send_data is failed instead of being sent again."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    crashed = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, lease_seconds=60, clock=clock)
+    [job] = crashed.claim()
+    assert crashed._hold(job, state="sending")
+
+    clock.now += timedelta(seconds=61)
+    worker = SubmissionWorker(session_factory, "w2", eric=ScriptedEric, clock=clock)
+    assert worker.run_once() == 0
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status) == ("failed", "error") and "may have reached ELSTER" in job.last_error
+    assert ScriptedEric.sent == []
+
+
+def test_transfer_ticket_is_persisted_right_after_sending(session_factory):
+    """Test that a sent job is stored as polling before the batch ends, even if the worker then crashes."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    worker = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, poll_initial_delay=30, clock=clock)
+
+    with patch.object(SubmissionWorker, "_apply", side_effect=RuntimeError("worker killed")):
+        with pytest.raises(RuntimeError):
+            worker.run_once()
+    job, status = _state(session_factory, job_id)
+    assert (job.state, status, job.locked_by) == ("polling", "processing", None)
+    assert job.transfer_ticket.startswith("ERIC-")
+
+
+def test_send_finishing_after_lease_expiry_recovers_the_job(session_factory):
+    """Test that a job failed as interrupted gets its ticket back when the slow send did succeed."""
+    [job_id] = _enqueue(session_factory)
+    clock = FakeClock()
+    slow = SubmissionWorker(session_factory, "w1", eric=ScriptedEric, lease_seconds=60, clock=clock)
+    [job] = slow.claim()
+    assert slow._hold(job, state="sending")
+
+    # Another worker gives up on the send while it is still running
+    clock.now += timedelta(seconds=61)
+    SubmissionWorker(session_factory, "w2", eric=ScriptedEric, clock=clock).claim()
+    assert _state(session_factory, job_id)[0].state == "failed"
+
+    slow._record_sent(job, "ERIC-42")
+    job, status = _state(session_factory, job_id)
+    assert (job.state, job.transfer_ticket, status, job.last_error) == ("polling", "ERIC-42", "processing", None)
@@ -0,0 +1,94 @@
+import io
+import os
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from backend.app.models import Submission
+from backend.app.services import elster_xml
+from backend.app.services.elster_jobs import SubmissionWorker, enqueue_submission
+from backend.app.services.elster_xml import (declaration_xml, load_schema, validate_xml, validate_xml_file,
+                                             write_declaration)
+from backend.app.services.mock_eric_service import ERiCIntegration
+
+DECLARATION = {
+    "submission_id": "sub-1",
+    "tax_id": "12345678901",
+    "period": "Q2 2024",
+    "totals": {"revenue": Decimal("1000.00"), "tax_collected": Decimal("190.00"), "expenses": Decimal("100.00"),
+               "tax_paid": Decimal("19.00"), "net_tax": Decimal("171.00")},
+}
+
+
+def _items(count):
+    for i in range(count):
+        yield {"id": f"tx-{i}", "date": datetime(2024, 4, 1) + timedelta(minutes=i),
+               "amount": Decimal("119.00"), "tax_amount": Decimal("19.00") if i % 2 else None}
+
+
+def test_declaration_is_valid_against_the_cached_schema():
+    """Test that generated documents pass XSD validation and broken ones report errors."""
+    xml = declaration_xml("UStVA", DECLARATION, _items(3))
+
+    assert "<Summe>171.00</Summe>" in xml and xml.count("<Position ") == 3
+    assert validate_xml(xml) == {"valid": True}
+
+    broken = xml.replace("<Summe>171.00</Summe>", "<Summe>viel</Summe>")
+    result = validate_xml(broken)
+    assert not result["valid"] and "Summe" in result["errors"][0]
+    assert validate_xml("<Elster>")["valid"] is False
+
+
+def test_schema_is_compiled_once():
+    """Test that repeated validations reuse the compiled schema."""
+    xml = declaration_xml("UStVA", DECLARATION)
+    with patch.object(elster_xml.etree, "XMLSchema", wraps=elster_xml.etree.XMLSchema) as compile_schema:
+        elster_xml._schemas.clear()
+        for _ in range(5):
+            assert validate_xml(xml)["valid"]
+    assert compile_schema.call_count == 1
+    assert load_schema() is load_schema()
+
+
+def test_large_declaration_streams_with_flat_memory(tmp_path):
+    """Test that writing and validating 50k positions keeps memory independent of document size."""
+    path = tmp_path / "large.xml"
+    tracemalloc.start()
+    written = write_declaration(str(path), "UStVA", DECLARATION, _items(50_000))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert written == 50_000
+    assert os.path.getsize(path) > 3_500_000
+    assert peak < 2_000_000
+    assert validate_xml_file(str(path)) == {"valid": True}
+
+
+def test_writer_accepts_file_objects():
+    """Test that the writer streams into any binary file object (e.g. a socket file)."""
+    stream = io.BytesIO()
+    write_declaration(stream, "UStVA", DECLARATION, _items(2))
+    assert stream.getvalue().startswith(b"<?xml") and b"tx-1" in stream.getvalue()
+
+
+def test_sent_declaration_is_archived_under_its_submission_id(tmp_path, session_factory):
+    """Test that the archive holds exactly the XML passed to submit_declaration, named after the submission."""
+    with session_factory() as session:
+        submission = Submission(user_id="u1", period="Q2 2024")
+        session.add(submission)
+        session.flush()
+        enqueue_submission(session, submission, "12345678901", DECLARATION["totals"])
+        session.commit()
+        submission_id = submission.id
+
+    archive = tmp_path / "archive"
+    worker = SubmissionWorker(session_factory, "w1", archive_dir=str(archive),
+                              clock=lambda: datetime.utcnow() + timedelta(seconds=1))
+    with patch.object(ERiCIntegration, "submit_declaration", wraps=ERiCIntegration.submit_declaration) as submit:
+        assert worker.run_once() == 1
+
+    sent = submit.call_args.args[0]["xml_data"]
+    assert os.listdir(archive) == [f"{submission_id}.xml"]
+    assert (archive / f"{submission_id}.xml").read_bytes() == sent.encode("utf-8")
+    assert validate_xml_file(str(archive / f"{submission_id}.xml")) == {"valid": True}
@@ -0,0 +1,41 @@
+from backend.app.services.entity_extractor import extract_entities
+from backend.app.services.vat_checksum import check_vat_number
+
+
+def _summary(message):
+    return [(entity["name"], entity["vat_id"], entity["vat_valid"]) for entity in extract_entities(message)]
+
+
+def test_extracts_multiple_entities_with_eu_legal_forms():
+    """Test that several companies are found and each is paired with the VAT ID written next to it."""
+    message = "Check Acme Holding B.V. (NL004495445B01) and Rossi Costruzioni S.r.l. IT00743110157"
+    assert _summary(message) == [
+        ("Acme Holding B.V.", "NL004495445B01", True),
+        ("Rossi Costruzioni S.r.l.", "IT00743110157", True),
+    ]
+    assert _summary("Prüfe A GmbH und B AG") == [("A GmbH", None, None), ("B AG", None, None)]
+    assert _summary("Bitte prüfe die Müller & Söhne GmbH & Co. KG") == [("Müller & Söhne GmbH & Co. KG", None, None)]
+
+
+def test_invalid_vat_ids_are_rejected_offline():
+    """Test that VAT IDs failing the national check digit are flagged without a provider call."""
+    entity = extract_entities("Ist DE 136 695 975 gültig?")[0]
+    assert entity["vat_id"] == "DE136695975"
+    assert entity["vat_valid"] is False
+    assert "check digit" in entity["vat_error"]
+    assert check_vat_number("DE136695976") == (True, None)
+    assert check_vat_number("ATU1358562")[0] is False
+
+
+def test_keyword_and_bare_name_fallbacks():
+    """Test that names without legal form are taken after a keyword or from short messages."""
+    assert _summary("Firma: Global Imports") == [("Global Imports", None, None)]
+    assert _summary("Tech Solutions") == [("Tech Solutions", None, None)]
+    assert _summary("hallo, wie geht es dir heute?") == []
+
+
+def test_legal_form_only_ends_a_name():
+    """Test that lead keywords are not taken as a name and a legal form inside a name does not end it."""
+    assert _summary("Kannst du die Firma AS Trading prüfen") == [("AS Trading", None, None)]
+    assert _summary("Bitte prüfe Firma Müller GmbH") == [("Müller GmbH", None, None)]
+    assert _summary("Check AS Trading Ltd") == [("AS Trading Ltd", None, None)]
@@ -0,0 +1,80 @@
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from backend.app.services.eric_pool import ERiCPool, ERiCPoolBusyError
+
+TOTALS = {"revenue": Decimal("1000.00"), "tax_collected": Decimal("190.00"), "expenses": Decimal("0.00"),
+          "tax_paid": Decimal("0.00"), "net_tax": Decimal("190.00")}
+
+
+@pytest.fixture
+def pool():
+    pool = ERiCPool(size=2, init_latency=0.3, processing_latency=0.1, health_interval=0, call_timeout=10,
+                    queue_timeout=5)
+    pool.start()
+    yield pool
+    pool.cleanup()
+
+
+def _declare(pool):
+    declaration = pool.prepare_vat_declaration(None, "12345678901", "Q2 2024", totals=TOTALS)
+    return pool.submit_declaration(declaration)
+
+
+def test_workers_are_warm_and_run_declarations_in_parallel(pool):
+    """Test that calls skip the init latency and two declarations run at the same time."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda _: _declare(pool), range(2)))
+    elapsed = time.perf_counter() - started
+
+    # Four processing steps of 0.1s each per declaration, no 0.3s init, both in parallel
+    assert all(result["success"] and result["transfer_ticket"].startswith("ERIC-") for result in results)
+    assert elapsed < 0.75
+    stats = pool.stats()
+    assert stats["calls"] == 4 and len({worker["pid"] for worker in stats["workers"]}) == 2
+    assert all(worker["init_seconds"] >= 0.3 for worker in stats["workers"])
+
+
+def test_operation_errors_are_raised_and_the_worker_stays_usable(pool):
+    """Test that a ValueError from ERiC reaches the caller without losing the worker."""
+    with pytest.raises(ValueError):
+        pool.prepare_vat_declaration(None, "123", "Q2 2024", totals=TOTALS)
+    with pytest.raises(ValueError):
+        pool.call("cleanup")
+
+    assert pool.check_submission_status("ERIC-1")["transfer_ticket"] == "ERIC-1"
+    assert pool.stats()["restarts"] == 0
+
+
+def test_dead_worker_is_replaced_by_the_health_check(pool):
+    """Test that a killed worker process is detected and restarted."""
+    victim = pool.stats()["workers"][0]["pid"]
+    os.kill(victim, signal.SIGKILL)
+    time.sleep(0.2)
+
+    assert pool.health_check() == {"checked": 2, "replaced": 1}
+    pids = [worker["pid"] for worker in pool.stats()["workers"]]
+    assert victim not in pids and all(worker["alive"] for worker in pool.stats()["workers"])
+    assert _declare(pool)["success"]
+
+
+def test_busy_pool_rejects_after_queue_timeout():
+    """Test that callers give up when every worker stays busy."""
+    pool = ERiCPool(size=1, processing_latency=0.5, health_interval=0, queue_timeout=0.1)
+    pool.start()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            running = executor.submit(pool.check_submission_status, "ERIC-1")
+            time.sleep(0.1)
+            with pytest.raises(ERiCPoolBusyError):
+                pool.check_submission_status("ERIC-2")
+            assert running.result()["transfer_ticket"] == "ERIC-1"
+        assert pool.stats()["rejected"] == 1
+    finally:
+        pool.cleanup()
@@ -0,0 +1,63 @@
+from sqlalchemy import create_engine
+
+from backend.app.db import create_session_factory
+from backend.app.services.judicial_store import JudicialCaseStore, token_phrases
+from backend.app.services.judicial_check import JudicialCheckService
+
+
+def _store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cases.db'}")
+    return JudicialCaseStore(create_session_factory(engine))
+
+
+def _case(number, party, date_filed, country="DE"):
+    return {"case_number": number, "court": "Landgericht Berlin", "date_filed": date_filed,
+            "description": "Zahlungsverzug", "status": "Laufend", "party_name": party, "country_code": country}
+
+
+def test_token_phrases_cover_contiguous_sub_phrases():
+    """Test that all contiguous token runs of a name are generated."""
+    assert token_phrases("global imports berlin") == [
+        "global imports berlin", "global imports", "imports berlin", "global", "imports", "berlin"
+    ]
+
+
+def test_store_search_is_indexed_paginated_and_deterministic(tmp_path):
+    """Test that store lookups match sub-phrases and containment and page in a stable order."""
+    store = _store(tmp_path)
+    store.import_cases([
+        _case("C-1/2023", "Global Imports GmbH", "2023-01-10"),
+        _case("C-2/2024", "Global Imports", "2024-03-01"),
+        _case("C-3/2024", "Global Imports Berlin Holding AG", "2024-05-01"),
+        _case("C-4/2024", "Unrelated Trading", "2024-06-01"),
+        _case("C-5/2024", "Global Imports", "2024-07-01", country="FR"),
+    ], source="test")
+
+    total, first_page = store.search("Global Imports Berlin GmbH", country_code="DE", page=1, page_size=2)
+    _, second_page = store.search("Global Imports Berlin GmbH", country_code="DE", page=2, page_size=2)
+
+    assert total == 3
+    assert [c["case_number"] for c in first_page + second_page] == ["C-3/2024", "C-2/2024", "C-1/2023"]
+    assert store.search("Global Imports Berlin GmbH", country_code="DE", page=1, page_size=2)[1] == first_page
+    assert store.search("Nothing Here", country_code="DE") == (0, [])
+
+
+def test_reimport_replaces_source_and_mock_is_deterministic(tmp_path):
+    """Test that re-importing a source replaces its cases and unknown names never get random cases."""
+    store = _store(tmp_path)
+    store.import_cases([_case("C-1/2023", "Alpha GmbH", "2023-01-10")], source="test")
+    store.import_cases([_case("C-9/2024", "Alpha GmbH", "2024-01-10")], source="test")
+
+    assert [c["case_number"] for c in store.search("Alpha")[1]] == ["C-9/2024"]
+    results = [JudicialCheckService.check_judicial_cases_mock("Unknown Company GmbH") for _ in range(20)]
+    assert all(result["case_count"] == 0 for result in results)
+
+
+def test_check_uses_the_injected_store(tmp_path):
+    """Test that an injected store is searched and an empty shared store falls back to mock data."""
+    store = _store(tmp_path)
+    store.import_cases([_case("C-1/2023", "Alpha GmbH", "2023-01-10")], source="test")
+
+    result = JudicialCheckService.check_judicial_cases("Alpha GmbH", "DE", store=store)
+    assert result["source"] == "court_register" and result["case_count"] == 1
+    assert JudicialCheckService.check_judicial_cases("Alpha GmbH", "DE")["source"] == "mock"
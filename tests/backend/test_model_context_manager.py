@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from flask import Flask
+
+from backend.app.models import ModuleEnum
+from backend.app.services import model_context_manager
+from backend.app.services.model_context_manager import ModelContextManager, ERROR_REPLY
+from backend.app.services.model_registry import ModelHandleRegistry
+from backend.app.services.response_cache import ResponseCache
+
+
+def _openai_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def _manager(gemini=None, openai=None, response_cache=None):
+    """Manager whose registry builds the given mock handles"""
+    return ModelContextManager(registry=ModelHandleRegistry(factories={
+        "gemini": lambda model, config: gemini,
+        "openai": lambda model, config: openai,
+    }), response_cache=response_cache or ResponseCache(enabled=False))
+
+
+def _stream(manager, model_type):
+    with Flask(__name__).app_context():
+        return list(manager.stream_response(ModuleEnum.marketing, "Hallo", model_type=model_type))
+
+
+def test_openai_chunks_are_passed_through_as_they_arrive():
+    """Test that OpenAI deltas are yielded one by one and the stream is closed."""
+    stream = MagicMock()
+    stream.__iter__.return_value = iter([_openai_chunk("Hal"), _openai_chunk(None), _openai_chunk("lo")])
+    create = MagicMock(return_value=stream)
+
+    with patch.object(model_context_manager, "OPENAI_API_KEY", "key"):
+        chunks = _stream(_manager(openai=create), "openai")
+
+    assert chunks == ["Hal", "lo"]
+    assert create.call_args.kwargs["stream"] is True
+    stream.close.assert_called_once()
+
+
+def test_falls_back_before_first_chunk():
+    """Test that a provider failing before any output falls back to the other one."""
+    gemini = MagicMock()
+    gemini.generate_content.side_effect = RuntimeError("quota")
+    stream = MagicMock()
+    stream.__iter__.return_value = iter([_openai_chunk("Antwort")])
+
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), \
+         patch.object(model_context_manager, "OPENAI_API_KEY", "key"):
+        chunks = _stream(_manager(gemini=gemini, openai=MagicMock(return_value=stream)), "gemini")
+
+    assert chunks == ["Antwort"]
+
+
+def test_error_after_first_chunk_keeps_partial_answer():
+    """Test that a stream breaking mid-answer ends with the error note instead of switching models."""
+    def chunks():
+        yield SimpleNamespace(parts=[1], text="Teil")
+        raise RuntimeError("connection reset")
+
+    gemini = MagicMock()
+    gemini.generate_content.return_value = chunks()
+    create = MagicMock()
+
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), \
+         patch.object(model_context_manager, "OPENAI_API_KEY", "key"):
+        result = _stream(_manager(gemini=gemini, openai=create), "gemini")
+
+    assert result == ["Teil", "\n\n" + ERROR_REPLY]
+    create.assert_not_called()
+
+
+def test_registry_builds_each_handle_once_across_threads():
+    """Test that concurrent lookups of the same model and config share one handle."""
+    built = []
+
+    def factory(model, config):
+        built.append((model, config))
+        return object()
+
+    registry = ModelHandleRegistry(factories={"gemini": factory})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        handles = list(pool.map(lambda _: registry.get("gemini", "gemini-pro", {"temperature": 0.2}), range(32)))
+
+    assert len({id(handle) for handle in handles}) == 1
+    assert built == [("gemini-pro", {"temperature": 0.2})]
+    # A different generation config is a different handle
+    assert registry.get("gemini", "gemini-pro", {"temperature": 0.7}) is not handles[0]
+
+
+def test_registry_reports_construction_and_inference_separately():
+    """Test that the metrics hooks see handle construction and inference as separate events."""
+    events = []
+    registry = ModelHandleRegistry(factories={"openai": lambda model, config: object()},
+                                   metrics_hooks=[lambda kind, provider, model, seconds: events.append(kind)])
+
+    registry.get("openai", "gpt-4o")
+    registry.get("openai", "gpt-4o")
+    with registry.inference("openai", "gpt-4o"):
+        pass
+
+    assert events == ["construct", "inference"]
+    stats = registry.stats()
+    assert stats["handles"] == 1
+    assert stats["models"]["openai/gpt-4o"]["inference_count"] == 1
+
+
+def test_warm_up_builds_handles_for_available_providers():
+    """Test that warm-up builds one handle per distinct module configuration."""
+    gemini = MagicMock()
+    manager = _manager(gemini=gemini)
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), \
+         patch.object(model_context_manager, "OPENAI_API_KEY", None):
+        ready = manager.warm_up()
+
+    assert ready == 4
+    assert manager.registry.stats()["handles"] == 4
+
+
+def test_cached_answer_skips_the_provider():
+    """Test that a repeated question is answered from the response cache."""
+    gemini = MagicMock()
+    gemini.generate_content.return_value = SimpleNamespace(text="19 %")
+    manager = _manager(gemini=gemini, response_cache=ResponseCache(modules=["accounting"]))
+
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), Flask(__name__).app_context():
+        first = manager.generate_response(ModuleEnum.accounting, "Wie hoch ist die Umsatzsteuer?", model_type="gemini")
+        second = manager.generate_response(ModuleEnum.accounting, "wie hoch ist die  Umsatzsteuer", model_type="gemini")
+        streamed = list(manager.stream_response(ModuleEnum.accounting, "Wie hoch ist die Umsatzsteuer", model_type="gemini"))
+        manager.generate_response(ModuleEnum.accounting, "Wie hoch ist die Umsatzsteuer?", model_type="gemini",
+                                  personalized=True)
+
+    assert first == second == "19 %"
+    assert streamed == ["19 %"]
+    assert gemini.generate_content.call_count == 2
@@ -0,0 +1,196 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from backend.app.services.model_gateway import ModelGateway, GatewayError, GatewayBusyError, LatencyHistogram
+from backend.app.services.model_service import ModelService
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+    def close(self):
+        pass
+
+
+class FakeStreamResponse(FakeResponse):
+    """Streaming response yielding NDJSON lines, optionally breaking off"""
+
+    def __init__(self, lines, error=None, status_code=200):
+        super().__init__(status_code)
+        self.lines = lines
+        self.error = error
+        self.closed = False
+
+    def iter_lines(self):
+        for line in self.lines:
+            yield line.encode()
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(requests.Session):
+    """Session whose post() plays back scripted outcomes (responses, exceptions or delays)"""
+
+    script = []
+    calls = []
+
+    def post(self, url, json=None, timeout=None, **kwargs):
+        FakeSession.calls.append((url, json, timeout))
+        outcome = FakeSession.script.pop(0) if FakeSession.script else FakeResponse(body={"text": "ok"})
+        if isinstance(outcome, tuple):
+            delay, outcome = outcome
+            time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def _reset_fake_session():
+    FakeSession.script = []
+    FakeSession.calls = []
+
+
+def _gateway(**kwargs):
+    kwargs.setdefault("hedging", False)
+    return ModelGateway(backoff=0.001, session_factory=FakeSession, **kwargs)
+
+
+def test_transient_failures_are_retried_with_timeouts():
+    """Test that connection errors and 503s are retried and every call carries timeouts."""
+    FakeSession.script = [requests.ConnectionError("refused"), FakeResponse(503),
+                          FakeResponse(body={"text": "Antwort"})]
+    gateway = _gateway(connect_timeout=1, read_timeout=9)
+
+    result = gateway.post("accounting", "http://accounting-model:8000/chat", {"message": "Hallo"})
+
+    assert result == {"text": "Antwort"}
+    assert [timeout for _, _, timeout in FakeSession.calls] == [(1, 9)] * 3
+    stats = gateway.stats()["accounting"]
+    assert stats["retries"] == 2 and stats["latency"]["count"] == 1
+
+
+def test_client_errors_are_not_retried():
+    """Test that a 4xx answer fails immediately."""
+    FakeSession.script = [FakeResponse(422)]
+    gateway = _gateway()
+
+    with pytest.raises(GatewayError) as error:
+        gateway.post("marketing", "http://marketing-model:8000/generate_content", {})
+    assert error.value.status_code == 422 and len(FakeSession.calls) == 1
+
+
+def test_concurrency_is_bounded_per_module():
+    """Test that a module without free slots rejects instead of queueing forever."""
+    gateway = _gateway(max_concurrency=1, queue_timeout=0.05, retries=0)
+    FakeSession.script = [(0.5, FakeResponse(body={"text": "slow"}))]
+    worker = threading.Thread(target=gateway.post, args=("secretary", "http://secretary-model:8000/chat", {}))
+    worker.start()
+    time.sleep(0.1)
+
+    with pytest.raises(GatewayBusyError):
+        gateway.post("secretary", "http://secretary-model:8000/chat", {})
+    # Other modules have their own slots
+    assert gateway.post("accounting", "http://accounting-model:8000/chat", {}) == {"text": "ok"}
+    worker.join()
+    assert gateway.stats()["secretary"]["rejected"] == 1
+
+
+def test_slow_request_is_hedged_and_fastest_answer_wins():
+    """Test that a request slower than the hedge delay gets a second request whose answer is used."""
+    FakeSession.script = [(1.0, FakeResponse(body={"text": "slow"})), FakeResponse(body={"text": "fast"})]
+    gateway = _gateway(hedging=True, hedge_min_delay=0.05, read_timeout=0.1)
+
+    started = time.perf_counter()
+    result = gateway.post("accounting", "http://accounting-model:8000/chat", {})
+
+    assert result == {"text": "fast"}
+    assert time.perf_counter() - started < 0.9
+    stats = gateway.stats()["accounting"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_slow_requests_are_not_hedged_by_default():
+    """Test that paid container calls are sent once unless hedging is enabled."""
+    FakeSession.script = [(0.3, FakeResponse(body={"text": "slow"})), FakeResponse(body={"text": "duplicate"})]
+    gateway = ModelGateway(backoff=0.001, session_factory=FakeSession, hedge_min_delay=0.05)
+
+    assert gateway.post("accounting", "http://accounting-model:8000/chat", {}) == {"text": "slow"}
+    assert len(FakeSession.calls) == 1 and gateway.stats()["accounting"]["hedges"] == 0
+
+
+def test_latency_histogram_quantiles():
+    """Test that quantiles report the bucket bound containing the rank."""
+    histogram = LatencyHistogram(buckets=(0.1, 1.0, float("inf")))
+    for seconds in [0.05] * 90 + [0.5] * 9 + [3.0]:
+        histogram.observe(seconds)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.95) == 1.0
+    assert histogram.snapshot()["buckets"] == {"0.1": 90, "1.0": 99, "+Inf": 100}
+
+
+def test_container_calls_go_through_the_gateway():
+    """Test that ModelService uses the shared gateway for container calls."""
+    gateway = _gateway()
+    with patch("backend.app.services.model_service.get_model_gateway", return_value=gateway):
+        result = ModelService.call_container_model("partner_check", "Prüfe Test GmbH", conversation_id="c1")
+
+    assert result == {"text": "ok"}
+    url, payload, _ = FakeSession.calls[0]
+    assert url.endswith("/chat") and payload["conversation_id"] == "c1"
+
+
+def test_stream_yields_events_and_frees_the_slot():
+    """Test that NDJSON events are yielded one by one and the request slot is released."""
+    response = FakeStreamResponse(['{"type": "chunk", "text": "Hal"}', "", '{"type": "chunk", "text": "lo"}',
+                                   '{"type": "done", "model": "gemini-1.5-pro"}'])
+    FakeSession.script = [FakeResponse(503), response]
+    gateway = _gateway(max_concurrency=1)
+
+    events = list(gateway.stream("accounting", "http://accounting-model:8000/chat/stream", {"message": "Hallo"}))
+
+    assert [event["type"] for event in events] == ["chunk", "chunk", "done"]
+    assert response.closed
+    stats = gateway.stats()["accounting"]
+    assert stats["streams"] == 1 and stats["retries"] == 1 and stats["ttfb"]["count"] == 1
+    # The slot was released, so a second call does not block
+    FakeSession.script = [FakeResponse(body={"text": "ok"})]
+    assert gateway.post("accounting", "http://accounting-model:8000/chat", {}) == {"text": "ok"}
+
+
+def test_interrupted_stream_raises():
+    """Test that a stream breaking off mid-answer surfaces as a gateway error."""
+    FakeSession.script = [FakeStreamResponse(['{"type": "chunk", "text": "Teil"}'],
+                                             error=requests.exceptions.ChunkedEncodingError("reset"))]
+    events = _gateway().stream("accounting", "http://accounting-model:8000/chat/stream", {})
+
+    assert next(events) == {"type": "chunk", "text": "Teil"}
+    with pytest.raises(GatewayError):
+        next(events)
+
+
+def test_container_stream_falls_back_to_chat_without_stream_endpoint():
+    """Test that ModelService streams chunks and uses /chat for containers without /chat/stream."""
+    gateway = _gateway()
+    FakeSession.script = [FakeStreamResponse(['{"type": "chunk", "text": "Soll "}', '{"type": "chunk", "text": "an Haben"}',
+                                              '{"type": "done"}'])]
+    with patch("backend.app.services.model_service.get_model_gateway", return_value=gateway):
+        assert list(ModelService.stream_container_model("accounting", "Buchungssatz?")) == ["Soll ", "an Haben"]
+
+        FakeSession.script = [FakeResponse(404), FakeResponse(body={"text": "komplett"})]
+        assert list(ModelService.stream_container_model("accounting", "Buchungssatz für Miete?")) == ["komplett"]
+    assert FakeSession.calls[-1][0].endswith("/chat")
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from backend.app.models import User
+from backend.app.services.partner_history import PartnerCheckHistory
+from backend.app.services.module_data_access import PartnerCheckDataAccess
+from backend.app.services.counterparty_check import CounterpartyCheckService
+
+
+def _history(session_factory):
+    with session_factory() as session:
+        session.add(User(id="u1", email="u1@example.com", password_hash="x"))
+        session.commit()
+    return PartnerCheckHistory(session_factory, reuse_window=3600)
+
+
+def _result(status="verified", sanctioned=False):
+    return {"counterparty_name": "Test GmbH", "overall_status": status,
+            "checks": {"sanctions_check": {"is_sanctioned": sanctioned}}}
+
+
+def test_fresh_result_is_reused_until_rescreen(session_factory):
+    """Test that stored results are reused for the same counterparty until a re-screen changes it."""
+    history = _history(session_factory)
+    partner_id = history.record_result("u1", "Test GmbH", "de 123456789", None, _result())
+
+    reused = history.find_fresh_result("u1", "TEST", "DE123456789")
+    assert reused["cached"] is True and reused["partner_id"] == partner_id
+    assert history.find_fresh_result("u1", "Test GmbH", "DE123456789", max_age=0) is None
+    assert history.find_fresh_result("u2", "Test GmbH", "DE123456789") is None
+
+    stored = list(history.counterparties())
+    assert stored == [{"id": partner_id, "name": "Test GmbH", "country_code": "DE",
+                       "vat_id": "DE123456789", "is_sanctioned": False}]
+    assert history.apply_rescreen_results([{"id": partner_id, "is_sanctioned": True, "change": "newly_sanctioned"}]) == 1
+    assert history.find_fresh_result("u1", "Test GmbH", "DE123456789") is None
+
+    with session_factory() as session:
+        partners = PartnerCheckDataAccess(session, "u1").get_partners()
+        assert [(p.id, p.last_status) for p in partners] == [(partner_id, "sanctioned")]
+        assert len(PartnerCheckDataAccess(session, "u1").get_partner_checks(partner_id=partner_id)) == 1
+
+
+def test_check_counterparty_skips_providers_for_fresh_result(session_factory):
+    """Test that a user's second check within the window does not call the providers."""
+    history = _history(session_factory)
+    with patch('backend.app.services.counterparty_check.get_partner_history', return_value=history), \
+         patch.object(CounterpartyCheckService, '_run_vat_validation',
+                      wraps=CounterpartyCheckService._run_vat_validation) as mock_vat:
+        first = CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976", user_id="u1")
+        second = CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976", user_id="u1")
+        refreshed = CounterpartyCheckService.check_counterparty("Test", vat_id="DE136695976", user_id="u1", max_age=0)
+
+    assert mock_vat.call_count == 2
+    assert "cached" not in first and second["cached"] is True and "cached" not in refreshed
+    assert second["overall_status"] == first["overall_status"]
@@ -0,0 +1,163 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from flask import Flask
+
+from backend.app.models import ModuleEnum
+from backend.app.services import model_context_manager, model_service
+from backend.app.services.model_context_manager import ModelContextManager
+from backend.app.services.model_registry import ModelHandleRegistry
+from backend.app.services.model_service import ModelService
+from backend.app.services.provider_router import STREAM, ProviderRouter
+from backend.app.services.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _feed(router, provider, model, seconds, count=5, ok=True):
+    for _ in range(count):
+        router.record(provider, model, seconds, ok)
+
+
+def test_fastest_healthy_provider_is_ranked_first():
+    """Test that candidates are ordered by p50 and an explicit preference wins while healthy."""
+    router = ProviderRouter(min_samples=3)
+    _feed(router, "gemini", "gemini-pro", 4.0)
+    _feed(router, "openai", "gpt-4o", 1.0)
+    candidates = [("gemini", "gemini-pro"), ("openai", "gpt-4o")]
+
+    assert router.rank(candidates) == [("openai", "gpt-4o"), ("gemini", "gemini-pro")]
+    assert router.rank(candidates, preferred="gemini")[0] == ("gemini", "gemini-pro")
+    assert router.percentile("gemini", "gemini-pro", 0.95) == 4.0
+
+
+def test_failing_provider_is_skipped_until_cooldown_ends():
+    """Test that a provider reaching the error threshold is ranked last for the cooldown."""
+    clock = FakeClock()
+    router = ProviderRouter(min_samples=4, error_threshold=0.5, cooldown=30, clock=clock)
+    _feed(router, "openai", "gpt-4o", 1.0, count=2)
+    _feed(router, "openai", "gpt-4o", 1.0, count=2, ok=False)
+    candidates = [("openai", "gpt-4o"), ("gemini", "gemini-pro")]
+
+    assert not router.healthy("openai", "gpt-4o")
+    assert router.rank(candidates, preferred="openai")[0] == ("gemini", "gemini-pro")
+
+    clock.now += 31
+    assert router.healthy("openai", "gpt-4o")
+    assert router.stats()["providers"]["openai/gpt-4o"]["trips"] == 1
+
+
+def test_call_falls_back_to_next_candidate():
+    """Test that an error moves on to the next provider and is recorded."""
+    router = ProviderRouter()
+
+    def fn(provider, model):
+        if provider == "gemini":
+            raise RuntimeError("quota")
+        return "Antwort"
+
+    assert router.call([("gemini", "gemini-pro"), ("openai", "gpt-4o")], fn) == ("openai", "gpt-4o", "Antwort")
+    assert router.stats()["providers"]["gemini/gemini-pro"]["error_rate"] == 1.0
+
+
+def test_slow_primary_is_hedged():
+    """Test that a primary slower than the hedge delay races a second provider."""
+    router = ProviderRouter(hedging=True, hedge_min_delay=0.05)
+
+    def fn(provider, model):
+        time.sleep(0.5 if provider == "gemini" else 0.01)
+        return provider
+
+    started = time.perf_counter()
+    provider, _, result = router.call([("gemini", "gemini-pro"), ("openai", "gpt-4o")], fn)
+
+    assert provider == result == "openai"
+    assert time.perf_counter() - started < 0.4
+    stats = router.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_stream_records_time_to_first_chunk():
+    """Test that streams are ranked by their own TTFB samples, not by whole-call latency."""
+    router = ProviderRouter(min_samples=3)
+    _feed(router, "gemini", "gemini-pro", 0.5)
+    _feed(router, "openai", "gpt-4o", 5.0)
+
+    def fn(provider, model):
+        time.sleep(0.05 if provider == "gemini" else 0.0)
+        yield "Hal"
+        yield "lo"
+
+    for _ in range(3):
+        for candidates in ([("gemini", "gemini-pro"), ("openai", "gpt-4o")], [("openai", "gpt-4o")]):
+            provider, _, chunks = router.stream(candidates, fn)
+            assert "".join(chunks) == "Hallo"
+
+    candidates = [("gemini", "gemini-pro"), ("openai", "gpt-4o")]
+    assert router.rank(candidates)[0] == ("gemini", "gemini-pro")
+    assert router.rank(candidates, kind=STREAM)[0] == ("openai", "gpt-4o")
+    stats = router.stats()["providers"]["gemini/gemini-pro"]
+    assert stats["p50"] == 0.5 and stats["ttfb_p50"] >= 0.05
+
+
+def test_stream_with_slow_first_chunk_is_hedged():
+    """Test that a stream whose first chunk is late races a second provider and the loser is closed."""
+    router = ProviderRouter(hedging=True, hedge_min_delay=0.05)
+    closed = []
+
+    def fn(provider, model):
+        try:
+            time.sleep(0.5 if provider == "gemini" else 0.01)
+            yield provider
+            yield "!"
+        finally:
+            closed.append(provider)
+
+    started = time.perf_counter()
+    provider, _, chunks = router.stream([("gemini", "gemini-pro"), ("openai", "gpt-4o")], fn)
+
+    assert provider == "openai"
+    assert "".join(chunks) == "openai!"
+    assert time.perf_counter() - started < 0.4
+    time.sleep(0.6)
+    assert sorted(closed) == ["gemini", "openai"]
+    stats = router.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_generate_response_uses_the_faster_provider():
+    """Test that the context manager asks the provider the router ranks first."""
+    gemini = MagicMock()
+    gemini.generate_content.return_value = SimpleNamespace(text="von Gemini")
+    openai = MagicMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="von OpenAI"))]))
+    router = ProviderRouter(min_samples=3)
+    _feed(router, "gemini", "gemini-pro", 6.0)
+    _feed(router, "openai", "gpt-4o", 0.8)
+    manager = ModelContextManager(
+        registry=ModelHandleRegistry(factories={"gemini": lambda model, config: gemini,
+                                                "openai": lambda model, config: openai}),
+        response_cache=ResponseCache(enabled=False), router=router)
+
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), \
+         patch.object(model_context_manager, "OPENAI_API_KEY", "key"), Flask(__name__).app_context():
+        assert manager.generate_response(ModuleEnum.marketing, "Hallo") == "von OpenAI"
+        assert manager.generate_response(ModuleEnum.marketing, "Hallo", model_type="gemini") == "von Gemini"
+
+
+def test_openai_call_without_client_falls_back_to_gemini():
+    """Test that call_openai_api answers with Gemini when no OpenAI client is configured."""
+    with patch.object(model_service, "openai_client", None), \
+         patch.object(model_service, "get_provider_router", return_value=ProviderRouter()), \
+         patch.object(ModelService, "call_gemini_api", return_value={"text": "Hallo", "model": "gemini-1.5-pro"}) as gemini:
+        result = ModelService.call_openai_api("Hallo", "gpt-4o")
+
+    assert result == {"text": "Hallo", "model": "gemini-1.5-pro"}
+    assert gemini.call_count == 1 and gemini.call_args.args[:2] == ("Hallo", "gemini-1.5-pro")
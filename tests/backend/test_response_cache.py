@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock, patch
+
+from backend.app.models import ModuleEnum
+from backend.app.services.response_cache import ResponseCache, get_response_cache, normalize_prompt
+
+
+def _cache(**kwargs):
+    kwargs.setdefault("modules", ["accounting", "partner_check"])
+    return ResponseCache(**kwargs)
+
+
+def test_normalized_prompt_and_context_form_the_key():
+    """Test that case, whitespace and trailing punctuation are ignored but context is not."""
+    cache = _cache()
+    _, key = cache.lookup(ModuleEnum.accounting, "gemini", "Wie hoch ist die Umsatzsteuer?")
+    cache.store(key, "19 %")
+
+    assert normalize_prompt("  Wie hoch   ist die UMSATZSTEUER?! ") == "wie hoch ist die umsatzsteuer"
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "wie hoch ist die umsatzsteuer")[0] == "19 %"
+    # Other module, model or context: miss
+    assert cache.lookup(ModuleEnum.partner_check, "gemini", "Wie hoch ist die Umsatzsteuer?")[0] is None
+    assert cache.lookup(ModuleEnum.accounting, "openai", "Wie hoch ist die Umsatzsteuer?")[0] is None
+    context = [{"role": "user", "content": "Ich bin Kleinunternehmer"}]
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "Wie hoch ist die Umsatzsteuer?", context)[0] is None
+
+
+def test_opted_out_modules_and_personalized_requests_bypass():
+    """Test that modules outside the allow-list and personalized requests are never cached."""
+    cache = _cache()
+    assert cache.lookup(ModuleEnum.secretary, "gemini", "Termine heute?") == (None, None)
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "Meine Umsätze?", personalized=True) == (None, None)
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    """Test that the least recently used entry is evicted and expired entries miss."""
+    cache = _cache(max_entries=2)
+    for prompt in ("a", "b"):
+        cache.store(cache.lookup(ModuleEnum.accounting, "gemini", prompt)[1], prompt.upper())
+    cache.lookup(ModuleEnum.accounting, "gemini", "a")  # "a" is now most recently used
+    cache.store(cache.lookup(ModuleEnum.accounting, "gemini", "c")[1], "C")
+
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "a")[0] == "A"
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "b")[0] is None
+
+    expired = _cache(ttl=0)
+    assert expired.lookup(ModuleEnum.accounting, "gemini", "a") == (None, None)
+
+
+def test_similarity_tier_matches_paraphrases():
+    """Test that an embedding close enough to a cached prompt is served from the cache."""
+    vectors = {
+        "wie hoch ist die umsatzsteuer": [1.0, 0.0, 0.1],
+        "welcher umsatzsteuersatz gilt": [0.99, 0.0, 0.12],
+        "wann ist die abgabefrist": [0.0, 1.0, 0.0],
+    }
+    cache = _cache(embed=vectors.__getitem__, similarity=0.98)
+    cache.store(cache.lookup(ModuleEnum.accounting, "gemini", "Wie hoch ist die Umsatzsteuer?")[1], "19 %")
+
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "Welcher Umsatzsteuersatz gilt?")[0] == "19 %"
+    assert cache.lookup(ModuleEnum.accounting, "gemini", "Wann ist die Abgabefrist?")[0] is None
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_accounting_container_answers_are_cached():
+    """Test that repeated accounting questions are answered once by the container, streamed or not."""
+    from backend.app.services.accounting_service import get_accounting_response, stream_accounting_response
+
+    gateway = MagicMock()
+    gateway.post.return_value = {"text": "19 %", "model": "accounting-llm"}
+    gateway.stream.return_value = iter([{"type": "chunk", "text": "7 "}, {"type": "chunk", "text": "%"},
+                                        {"type": "done"}])
+    with patch("backend.app.services.model_service.get_model_gateway", return_value=gateway):
+        assert get_accounting_response("Wie hoch ist die Umsatzsteuer?", user_id="u1")["text"] == "19 %"
+        repeated = get_accounting_response("wie hoch ist die umsatzsteuer", user_id="u2")
+        assert "".join(stream_accounting_response("Ermäßigter Steuersatz?")) == "7 %"
+        assert list(stream_accounting_response("ermäßigter steuersatz")) == ["7 %"]
+
+    assert repeated == {"text": "19 %", "model": "cache", "cached": True}
+    assert gateway.post.call_count == 1 and gateway.stream.call_count == 1
+    assert get_response_cache().stats()["exact_hits"] == 2
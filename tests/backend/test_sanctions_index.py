@@ -0,0 +1,82 @@
+import os
+import pytest
+
+from backend.app.services.sanctions_index import (
+    SanctionsIndex, normalize_name, jaro_winkler, load_or_build_index, load_ofac_sdn_xml
+)
+from backend.app.services.sanctions_check import SanctionsCheckService
+
+LIST_CSV = """id,name,aliases,country_codes,list_name,date_listed,reasons,source_url
+1,OOO Rosneftegaz Trading,Роснефтегаз Трейдинг,RU,EU Restrictive Measures,2022-03-15,Support for illegal activities,https://example.org/1
+2,Korea Kwangson Banking Corp,KKBC,KP,OFAC SDN List,2018-05-10,Proliferation,https://example.org/2
+"""
+
+OFAC_XML = """<?xml version="1.0" encoding="utf-8"?>
+<sdnList xmlns="http://tempuri.org/sdnList.xsd">
+  <sdnEntry>
+    <uid>36</uid>
+    <lastName>Korea Kwangson Banking Corp</lastName>
+    <programList><program>NPWMD</program></programList>
+    <addressList>
+      <address><city>Pyongyang</city><country>Korea, North</country></address>
+      <address><city>Moscow</city><country>Russia</country></address>
+      <address><country>C\u00f4te d'Ivoire</country></address>
+      <address><country>Atlantis</country></address>
+    </addressList>
+  </sdnEntry>
+</sdnList>
+"""
+
+
+def test_normalize_name_transliterates_and_drops_legal_forms():
+    """Test normalization of diacritics, Cyrillic and legal-form suffixes."""
+    assert normalize_name("Müller & Söhne GmbH") == "muller sohne"
+    assert normalize_name("ООО «Роснефтегаз»") == "rosneftegaz"
+    assert normalize_name("AG") == "ag"
+
+
+def test_jaro_winkler_known_values():
+    """Test Jaro-Winkler against reference values."""
+    assert jaro_winkler("martha", "marhta") == pytest.approx(0.9611, abs=1e-4)
+    assert jaro_winkler("abc", "xyz") == 0.0
+
+
+def test_index_matches_typos_aliases_and_reordered_names(tmp_path):
+    """Test fuzzy lookups through the pickled index built from a CSV list."""
+    (tmp_path / "lists.csv").write_text(LIST_CSV, encoding="utf-8")
+    index_path = str(tmp_path / "index.pkl")
+
+    index = load_or_build_index(str(tmp_path), index_path)
+    assert len(index) == 2 and os.path.exists(index_path)
+
+    # A second load reuses the pickle instead of re-parsing the lists
+    reloaded = load_or_build_index(str(tmp_path), index_path)
+    assert reloaded.fingerprint == index.fingerprint
+
+    assert reloaded.search("Rosneftgaz Trading LLC")[0]["entry_id"] == "EU Restrictive Measures:1"
+    assert reloaded.search("Роснефтегаз Трейдинг АО")[0]["matched_name"] == "rosneftegaz treyding"
+    assert reloaded.search("Kwangson Korea Banking")[0]["list_name"] == "OFAC SDN List"
+    assert reloaded.search("Siemens AG") == []
+
+
+def test_ofac_country_names_become_iso_codes(tmp_path):
+    """Test that OFAC address countries are stored as the ISO-2 codes the country match compares."""
+    path = tmp_path / "sdn.xml"
+    path.write_text(OFAC_XML, encoding="utf-8")
+
+    [entry] = load_ofac_sdn_xml(str(path))
+    assert entry["entry_id"] == "OFAC:36"
+    assert entry["country_codes"] == ["CI", "KP", "RU"]
+
+
+def test_check_sanctions_index_result_format():
+    """Test that index matches are reported in the sanctions check format."""
+    index = SanctionsIndex([{
+        "entry_id": "EU:1", "name": "Sanctioned Trading Ltd", "aliases": [], "country_codes": ["RU"],
+        "list_name": "EU Restrictive Measures", "date_listed": "2022-03-15", "reasons": [], "source_url": ""
+    }])
+    is_sanctioned, details = SanctionsCheckService.check_sanctions_index(index, "Sanctioned Tradng", "RU")
+    assert is_sanctioned is True
+    assert details["source"] == "index"
+    assert details["matches"][0]["country_match"] is True
+    assert details["matches"][0]["score"] >= 0.88
@@ -0,0 +1,49 @@
+import os
+import time
+
+from backend.app.services.sanctions_refresh import (
+    diff_entries, refresh_sanctions_lists, build_counterparty_index
+)
+
+HEADER = "id,name,aliases,country_codes,list_name,date_listed,reasons,source_url\n"
+
+
+def _entry(entry_id, name, reasons=""):
+    return {"entry_id": entry_id, "name": name, "aliases": [], "reasons": reasons}
+
+
+def test_diff_entries_classifies_changes():
+    """Test that list versions are diffed into added, removed and changed entries."""
+    old = [_entry("1", "Alpha Trading"), _entry("2", "Beta Holding"), _entry("3", "Gamma Oil")]
+    new = [_entry("1", "Alpha Trading"), _entry("2", "Beta Holding", "Amended"), _entry("4", "Delta Shipping")]
+
+    delta = diff_entries(old, new)
+
+    assert [e["entry_id"] for e in delta["added"]] == ["4"]
+    assert [e["entry_id"] for e in delta["removed"]] == ["3"]
+    assert delta["changed"][0]["new"]["reasons"] == "Amended"
+
+
+def test_refresh_rescreens_only_overlapping_counterparties(tmp_path):
+    """Test that only counterparties resembling changed entries are re-screened."""
+    list_file = tmp_path / "eu.csv"
+    index_path = str(tmp_path / "index.pkl")
+    list_file.write_text(HEADER + "1,Rosneftegaz Trading,,RU,EU,2022-01-01,,\n", encoding="utf-8")
+    refresh_sanctions_lists(data_dir=str(tmp_path), index_path=index_path)
+
+    counterparties = build_counterparty_index([
+        {"id": "c1", "name": "Volga Shipping Ltd", "is_sanctioned": False},
+        {"id": "c2", "name": "Rosneftegaz Trading OOO", "is_sanctioned": True},
+        {"id": "c3", "name": "Müller Maschinenbau GmbH", "is_sanctioned": False},
+    ])
+
+    # Unchanged files: nothing to do
+    assert refresh_sanctions_lists(counterparties, str(tmp_path), index_path)["status"] == "unchanged"
+
+    list_file.write_text(HEADER + "2,Volga Shiping,,RU,EU,2024-01-01,,\n", encoding="utf-8")
+    os.utime(list_file, (time.time() + 5, time.time() + 5))
+    report = refresh_sanctions_lists(counterparties, str(tmp_path), index_path)
+
+    assert (report["added"], report["removed"], report["changed"]) == (1, 1, 0)
+    changes = {result["id"]: result["change"] for result in report["results"]}
+    assert changes == {"c1": "newly_sanctioned", "c2": "cleared"}
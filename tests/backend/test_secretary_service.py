@@ -0,0 +1,117 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.app.services.calendar_intent import has_calendar_intent
+from backend.app.services.secretary_service import iter_hybrid_response, get_secretary_response
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Запланируй встречу с Иваном", True),
+    ("Завтра в 15:00 у меня стоматолог", True),
+    ("Bitte einen Termin mit Frau Weber eintragen", True),
+    ("Can you schedule a call with the auditor?", True),
+    ("Guten Morgen", False),
+    ("Спасибо за помощь", False),
+    ("Wie hoch ist die Umsatzsteuer?", False),
+    ("Morgen", False),
+])
+def test_calendar_intent_classifier(message, expected):
+    """Test that the local classifier detects calendar requests in Russian, German and English."""
+    assert has_calendar_intent(message) is expected
+
+
+def _reply(delay):
+    def call_openai_api(prompt, model_name):
+        time.sleep(delay)
+        return {"text": "Gern, ich trage es ein.", "model": model_name}
+    return call_openai_api
+
+
+def _extraction(delay, calls):
+    def call_secretary_specialized_endpoints(endpoint, data):
+        calls.append(endpoint)
+        time.sleep(delay)
+        return {"extracted_data": {"title": "Termin", "date": "2025-01-02"}}
+    return call_secretary_specialized_endpoints
+
+
+def test_text_is_returned_before_slow_calendar_extraction():
+    """Test that the reply is yielded as soon as it is ready and the calendar data follows."""
+    calls = []
+    with patch("backend.app.services.secretary_service.ModelService.call_openai_api", side_effect=_reply(0.05)), \
+         patch("backend.app.services.secretary_service.ModelService.call_secretary_specialized_endpoints",
+               side_effect=_extraction(0.4, calls)):
+        started = time.perf_counter()
+        events = iter_hybrid_response("Termin morgen um 10 Uhr eintragen", deadline=5)
+        event, result = next(events)
+        text_latency = time.perf_counter() - started
+        rest = list(events)
+
+    assert event == "text" and result["text"] == "Gern, ich trage es ein."
+    assert text_latency < 0.3
+    assert result["metadata"] == {"calendar_data": None, "calendar_pending": True}
+    assert rest == [("calendar", {"title": "Termin", "date": "2025-01-02"})]
+
+
+def test_calls_run_concurrently_and_merge_in_blocking_mode():
+    """Test that get_secretary_response waits for both calls, which run in parallel."""
+    calls = []
+    with patch("backend.app.services.secretary_service.ModelService.call_openai_api", side_effect=_reply(0.3)), \
+         patch("backend.app.services.secretary_service.ModelService.call_secretary_specialized_endpoints",
+               side_effect=_extraction(0.3, calls)):
+        started = time.perf_counter()
+        result = get_secretary_response("Schedule a meeting tomorrow", user_id="u1", mode="hybrid")
+
+    assert time.perf_counter() - started < 0.55
+    assert result["metadata"]["calendar_data"] == {"title": "Termin", "date": "2025-01-02"}
+
+
+def test_extraction_is_skipped_without_calendar_intent():
+    """Test that the container is not called for messages without calendar intent."""
+    calls = []
+    with patch("backend.app.services.secretary_service.ModelService.call_openai_api", side_effect=_reply(0)), \
+         patch("backend.app.services.secretary_service.ModelService.call_secretary_specialized_endpoints",
+               side_effect=_extraction(0, calls)):
+        events = list(iter_hybrid_response("Guten Morgen"))
+
+    assert calls == []
+    assert [event for event, _ in events] == ["text"]
+    assert events[0][1]["metadata"] == {"calendar_data": None, "calendar_pending": False}
+
+
+def test_slow_extraction_is_dropped_at_the_deadline():
+    """Test that calendar extraction slower than the shared deadline does not delay the stream."""
+    calls = []
+    with patch("backend.app.services.secretary_service.ModelService.call_openai_api", side_effect=_reply(0)), \
+         patch("backend.app.services.secretary_service.ModelService.call_secretary_specialized_endpoints",
+               side_effect=_extraction(1.0, calls)):
+        started = time.perf_counter()
+        events = list(iter_hybrid_response("Встреча завтра в 10:00", deadline=0.2))
+
+    assert time.perf_counter() - started < 0.6
+    assert events[-1] == ("calendar", None)
+
+
+
+def test_late_calendar_data_is_merged_into_the_saved_reply(session_factory):
+    """Test that calendar data arriving after the text is added to the stored AI message."""
+    import json
+
+    from backend.app.api.utils import save_message, update_message_metadata
+    from backend.app.models import Message
+
+    with session_factory() as session:
+        message_id = save_message(session, "thread-1", "ai", "Gern, ich trage es ein.",
+                                  metadata={"model": "gpt-4o", "calendar_data": None}).id
+        session.commit()
+
+    with session_factory() as session:
+        update_message_metadata(session, message_id, calendar_data={"title": "Termin", "date": "2025-01-02"})
+        session.commit()
+        assert update_message_metadata(session, "missing", calendar_data=None) is None
+
+    with session_factory() as session:
+        assert json.loads(session.get(Message, message_id).meta) == {
+            "model": "gpt-4o", "calendar_data": {"title": "Termin", "date": "2025-01-02"}}
@@ -0,0 +1,119 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from backend.app.models import LlmUsage, Message, ModuleEnum, UsageQuota, User
+from backend.app.services import model_context_manager
+from backend.app.services.model_context_manager import ModelContextManager
+from backend.app.services.model_registry import ModelHandleRegistry
+from backend.app.services.response_cache import ResponseCache
+from backend.app.services.usage_ledger import UsageLedger
+
+
+def _ledger(session_factory, **kwargs):
+    kwargs.setdefault("background", False)
+    return UsageLedger(session_factory=session_factory, **kwargs)
+
+
+def test_rows_are_queued_and_written_in_one_batch(session_factory):
+    """Test that record() only queues and flush() bulk-inserts the rows."""
+    ledger = _ledger(session_factory)
+    ledger.record("gemini", "gemini-pro", 100, 20, latency=0.5, user_id="u1", module="accounting")
+    ledger.record("openai", "gpt-4o", 50, 10, latency=1.5, user_id="u1", module="marketing")
+    ledger.record("gemini", "gemini-pro", cache_hit=True, user_id="u2", module="accounting")
+
+    with session_factory() as session:
+        assert session.scalars(select(LlmUsage)).all() == []
+    assert ledger.flush() == 3
+
+    with session_factory() as session:
+        rows = ledger.aggregate(session, "module")
+    assert rows[0] == {"module": "accounting", "calls": 2, "prompt_tokens": 100, "completion_tokens": 20,
+                       "avg_latency_ms": 250.0, "max_latency_ms": 500, "cache_hits": 1, "errors": 0}
+    assert rows[1]["module"] == "marketing" and rows[1]["prompt_tokens"] == 50
+    assert ledger.stats() == {"recorded": 3, "written": 3, "dropped": 0, "failed": 0, "queued": 0}
+
+
+def test_full_queue_drops_rows_without_blocking(session_factory):
+    """Test that a full queue drops and counts rows instead of blocking the caller."""
+    ledger = _ledger(session_factory, queue_size=2)
+    results = [ledger.record("gemini", "gemini-pro", 1, 1, user_id="u1") for _ in range(3)]
+
+    assert results == [True, True, False]
+    assert ledger.stats()["dropped"] == 1
+
+
+def test_quota_counts_queued_rows_and_honours_overrides(session_factory):
+    """Test that unwritten rows count against the quota and a user's own limit beats the default."""
+    with session_factory() as session:
+        session.add_all([User(id="u1", email="a@example.de", password_hash="x"),
+                         User(id="u2", email="b@example.de", password_hash="x")])
+        session.add(UsageQuota(user_id="u2", monthly_tokens=10_000))
+        session.commit()
+    ledger = _ledger(session_factory, default_quota=1000, quota_cache_seconds=60)
+
+    assert ledger.check_quota("u1") == {"used": 0, "limit": 1000, "remaining": 1000, "exceeded": False}
+    ledger.record("gemini", "gemini-pro", 800, 300, user_id="u1")
+    # Queued, not written: the cached total plus the queued tokens exceed the limit
+    assert ledger.check_quota("u1")["exceeded"]
+    ledger.flush()
+    ledger.forget_quota("u1")
+    assert ledger.check_quota("u1") == {"used": 1100, "limit": 1000, "remaining": 0, "exceeded": True}
+
+    ledger.record("gemini", "gemini-pro", 800, 300, user_id="u2")
+    assert ledger.check_quota("u2") == {"used": 1100, "limit": 10_000, "remaining": 8900, "exceeded": False}
+
+
+def test_context_manager_records_provider_tokens_and_cache_hits(session_factory):
+    """Test that provider-reported tokens and response cache hits end up in the ledger."""
+    gemini = MagicMock()
+    gemini.generate_content.return_value = SimpleNamespace(
+        text="Antwort", usage_metadata=SimpleNamespace(prompt_token_count=120, candidates_token_count=30))
+    ledger = _ledger(session_factory)
+
+    with patch.object(model_context_manager, "GEMINI_API_KEY", "key"), \
+         patch.object(model_context_manager, "OPENAI_API_KEY", None), Flask(__name__).app_context():
+        manager = ModelContextManager(
+            registry=ModelHandleRegistry(factories={"gemini": lambda model, config: gemini}),
+            response_cache=ResponseCache(), usage_ledger=ledger)
+        assert manager.generate_response(ModuleEnum.accounting, "Was ist eine Vorsteuer?") == "Antwort"
+        assert manager.generate_response(ModuleEnum.accounting, "Was ist eine Vorsteuer?") == "Antwort"
+    ledger.flush()
+
+    with session_factory() as session:
+        rows = session.scalars(select(LlmUsage).order_by(LlmUsage.cache_hit)).all()
+    assert [(row.provider, row.module, row.cache_hit) for row in rows] == [
+        ("gemini", "accounting", False), ("gemini", "accounting", True)]
+    assert (rows[0].prompt_tokens, rows[0].completion_tokens, rows[0].tokens_estimated) == (120, 30, False)
+    assert rows[1].prompt_tokens == 0 and gemini.generate_content.call_count == 1
+
+
+def test_save_message_stores_metadata(session_factory):
+    """Test that save_message accepts metadata and stores it as JSON."""
+    from backend.app.api.utils import save_message
+
+    with session_factory() as session:
+        message = save_message(session, "t1", "ai", "Termin eingetragen",
+                               metadata={"model": "secretary", "calendar_data": {"title": "Steuerberater"}})
+        session.commit()
+        stored = session.get(Message, message.id)
+    assert json.loads(stored.meta) == {"model": "secretary", "calendar_data": {"title": "Steuerberater"}}
+
+
+def test_failed_container_call_raises_the_original_error(session_factory):
+    """Test that an unknown module surfaces its ValueError and is recorded as a failed call."""
+    from backend.app.services.model_service import ModelService
+
+    ledger = _ledger(session_factory)
+    with patch("backend.app.services.model_service.get_usage_ledger", return_value=ledger), \
+         pytest.raises(ValueError, match="Unknown module"):
+        ModelService.call_container_model("unknown", "Hallo", metadata={"user_id": "u1"})
+
+    ledger.flush()
+    with session_factory() as session:
+        row = session.scalars(select(LlmUsage)).one()
+    assert (row.ok, row.user_id, row.module) == (False, "u1", "unknown")
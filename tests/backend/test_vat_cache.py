@@ -0,0 +1,65 @@
+from unittest.mock import patch, MagicMock
+
+from backend.app.services.vat_cache import VatValidationCache
+
+
+def test_cache_tiers_and_hit_ratio(tmp_path):
+    """Test that results are served from the LRU, then from the shared SQL tier."""
+    from sqlalchemy import create_engine
+    from backend.app.db import create_session_factory
+    from backend.app.models import VatValidationCacheEntry
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    VatValidationCacheEntry.__table__.create(engine)
+    session_factory = create_session_factory(engine)
+
+    worker_a = VatValidationCache(session_factory=session_factory)
+    worker_b = VatValidationCache(session_factory=session_factory)
+
+    assert worker_a.get("DE123456789") is None
+    worker_a.set("DE123456789", True, {"valid": True, "company_name": "Test GmbH"})
+    assert worker_a.get("DE123456789") == (True, {"valid": True, "company_name": "Test GmbH"})
+
+    # Another worker process only shares the SQL tier
+    assert worker_b.get("DE123456789")[0] is True
+    assert worker_b.stats()["sql_hits"] == 1
+
+    stats = worker_a.stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_negative_results_use_separate_ttl():
+    """Test that a zero negative TTL disables caching of invalid numbers only."""
+    cache = VatValidationCache(negative_ttl=0, sql_enabled=False)
+    cache.set("DE000000000", False, {"valid": False})
+    cache.set("DE123456789", True, {"valid": True})
+    assert cache.get("DE000000000") is None
+    assert cache.get("DE123456789") is not None
+
+
+def test_lru_evicts_oldest_entry():
+    """Test that the in-process tier is bounded."""
+    cache = VatValidationCache(max_entries=2, sql_enabled=False)
+    for key in ("A", "B", "C"):
+        cache.set(key, True, {"valid": True})
+    assert cache.get("A") is None
+    assert cache.stats()["memory_entries"] == 2
+
+
+@patch('backend.app.services.vat_validation.get_vat_cache')
+@patch('backend.app.services.vat_validation.VatValidationService.get_client')
+def test_validate_vat_reuses_client_and_cache(mock_get_client, mock_get_cache):
+    """Test that validate_vat normalizes the key and skips VIES on a cache hit."""
+    from backend.app.services.vat_validation import VatValidationService
+
+    mock_get_cache.return_value = VatValidationCache(sql_enabled=False)
+    mock_get_client.return_value.service.checkVat.return_value = MagicMock(
+        valid=True, requestDate="2025-01-01", name="Test GmbH", address="Berlin"
+    )
+
+    assert VatValidationService.validate_vat("DE 136 695 976")[0] is True
+    is_valid, details = VatValidationService.validate_vat("de136695976")
+
+    assert is_valid is True and details["cached"] is True
+    mock_get_client.return_value.service.checkVat.assert_called_once_with(countryCode="DE", vatNumber="136695976")
@@ -0,0 +1,65 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from backend.app.services.vat_checksum import check_vat_number, VAT_FORMATS, CHECKSUMS
+
+
+@pytest.mark.parametrize("vat_number", [
+    "ATU13585627", "BE0776091951", "BG175074752", "CY10259033P", "CZ25123891", "DE136695976",
+    "DK13585628", "EE100931558", "EL094259216", "ESA78304516", "ESX5253868R", "FI20774740",
+    "FR40303265045", "HR33392005961", "HU12892312", "IE6433435F", "IE8D79739I", "IT00743110157",
+    "LT119511515", "LU15027442", "LV40003521600", "MT11679112", "NL004495445B01", "PL8567346215",
+    "PT501964843", "RO18547290", "SE123456789701", "SI50223054", "SK2022749619",
+])
+def test_valid_numbers_pass_and_typos_fail(vat_number):
+    """Test that real numbers pass and a changed check character is caught for every member state."""
+    assert check_vat_number(vat_number) == (True, None)
+    # The check character is last, except before the SE "01" and NL "Bnn" suffixes
+    position = {"SE": -3, "NL": -4}.get(vat_number[:2], -1) % len(vat_number)
+    check = vat_number[position]
+    typo = str((int(check) + 1) % 10) if check.isdigit() else ("A" if check != "A" else "B")
+    mistyped = vat_number[:position] + typo + vat_number[position + 1:]
+    assert check_vat_number(mistyped)[0] is False
+
+
+def test_every_member_state_has_a_checksum():
+    """Test that all EU member states are covered by a check-digit algorithm."""
+    assert set(VAT_FORMATS) - set(CHECKSUMS) == {"XI", "GB"}
+    assert check_vat_number("GR094259216") == (True, None)
+    assert check_vat_number("US123456789")[0] is False
+
+
+@patch('backend.app.services.vat_validation.VatValidationService.get_client')
+def test_validate_vat_rejects_malformed_numbers_offline(mock_get_client):
+    """Test that validate_vat never calls VIES for a number with a wrong check digit."""
+    from backend.app.services.vat_validation import VatValidationService
+
+    is_valid, details = VatValidationService.validate_vat("DE 136 695 975")
+
+    assert is_valid is False
+    assert details["checked_offline"] is True
+    mock_get_client.assert_not_called()
+
+
+def test_old_czech_birth_numbers_with_remainder_ten():
+    """Test that pre-1985 birth numbers with remainder 10 and check digit 0 are accepted."""
+    assert check_vat_number("CZ7504307790") == (True, None)
+    assert check_vat_number("CZ7504307791")[0] is False
+
+
+@patch('backend.app.services.vat_validation.get_vat_cache')
+@patch('backend.app.services.vat_validation.VatValidationService.get_client')
+def test_validate_vat_sends_greek_numbers_as_el(mock_get_client, mock_get_cache):
+    """Test that the GR alias is checked offline and sent to VIES as EL."""
+    from backend.app.services.vat_cache import VatValidationCache
+    from backend.app.services.vat_validation import VatValidationService
+
+    mock_get_cache.return_value = VatValidationCache(sql_enabled=False)
+    mock_get_client.return_value.service.checkVat.return_value = MagicMock(
+        valid=True, requestDate="2025-01-01", name="Test AE", address="Athens"
+    )
+
+    is_valid, details = VatValidationService.validate_vat("GR 094259216")
+
+    assert is_valid is True and details["country_code"] == "EL"
+    mock_get_client.return_value.service.checkVat.assert_called_once_with(countryCode="EL", vatNumber="094259216")
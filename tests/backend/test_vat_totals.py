@@ -0,0 +1,98 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from backend.app.models import Submission, Transaction, submission_transactions
+from backend.app.services.elster_service import ElsterService
+from backend.app.services.mock_eric_service import ERiCIntegration
+from backend.app.services.vat_totals import (aggregate_vat_totals, count_submission_transactions,
+                                              link_submission_transactions, submission_transaction_ids,
+                                              totals_from_transactions)
+
+
+def _transactions(rng, count):
+    for i in range(count):
+        amount = Decimal(rng.randint(-50000, 90000)) / 100
+        yield {
+            "id": f"tx{i}",
+            "user_id": "u1",
+            "date": datetime(2024, 4, 1) + timedelta(hours=rng.randint(0, 24 * 120)),
+            "description": "Stripe charge",
+            "amount": amount,
+            "tax_amount": None if rng.random() < 0.1 else (abs(amount) * Decimal("0.19")).quantize(Decimal("0.01")),
+            "is_expense_claimed": rng.random() < 0.7,
+        }
+
+
+def test_sql_aggregate_matches_python_totals(session_factory):
+    """Test that the database totals equal the per-transaction sums, to the cent."""
+    rows = list(_transactions(random.Random(7), 2000))
+    with session_factory() as session:
+        session.add_all(Transaction(**row) for row in rows)
+        session.add(Transaction(id="other", user_id="u2", date=datetime(2024, 5, 1), description="x",
+                                amount=Decimal("1000.00"), tax_amount=Decimal("190.00")))
+        session.commit()
+
+        q2 = [row for row in rows if datetime(2024, 4, 1) <= row["date"] < datetime(2024, 7, 1)]
+        totals = aggregate_vat_totals(session, "u1", start=datetime(2024, 4, 1), end=datetime(2024, 7, 1))
+        assert totals.pop("count") == len(q2)
+        assert totals == totals_from_transactions(q2)
+        assert all(isinstance(value, Decimal) for value in totals.values())
+
+        selected = aggregate_vat_totals(session, "u1", transaction_ids=["tx1", "tx2", "other"])
+        assert selected.pop("count") == 2
+        assert selected == totals_from_transactions(rows[1:3])
+
+
+def test_python_totals_are_exact_and_skip_unclaimed_expenses():
+    """Test the classification rules and that float amounts do not drift."""
+    totals = totals_from_transactions([
+        {"amount": 0.1, "tax_amount": 0.02},
+        {"amount": 0.2, "tax_amount": None},
+        {"amount": -100.0, "tax_amount": 19.0, "is_expense_claimed": True},
+        {"amount": -50.0, "tax_amount": 9.5, "is_expense_claimed": False},
+    ])
+
+    assert totals == {"revenue": Decimal("0.30"), "tax_collected": Decimal("0.02"), "expenses": Decimal("100.00"),
+                      "tax_paid": Decimal("19.00"), "net_tax": Decimal("-18.98")}
+
+
+def test_declarations_accept_precomputed_totals():
+    """Test that both declaration builders use totals from the database without transactions."""
+    totals = {"revenue": Decimal("1000.00"), "tax_collected": Decimal("190.00"), "expenses": Decimal("0.00"),
+              "tax_paid": Decimal("0.00"), "net_tax": Decimal("190.00"), "count": 3}
+
+    declaration = ElsterService.prepare_vat_declaration(None, "12345678901", "Q2 2024", totals=totals)
+    assert declaration["totals"]["net_tax"] == Decimal("190.00") and "count" not in declaration["totals"]
+
+    eric = ERiCIntegration.prepare_vat_declaration(None, "12345678901", "Q2 2024", totals=totals)
+    assert "<Summe>190.00</Summe>" in eric["xml_data"]
+
+
+def test_period_range_and_bulk_linking(session_factory):
+    """Test that a period resolves to a date range and its transactions are linked in one statement."""
+    assert ElsterService.period_range("Q4 2024") == (datetime(2024, 10, 1), datetime(2025, 1, 1))
+    assert ElsterService.period_range("02 2024") == (datetime(2024, 2, 1), datetime(2024, 3, 1))
+
+    rows = list(_transactions(random.Random(3), 500))
+    with session_factory() as session:
+        session.add_all(Transaction(**row) for row in rows)
+        submission = Submission(user_id="u1", period="Q2 2024")
+        session.add(submission)
+        session.flush()
+
+        start, end = ElsterService.period_range("Q2 2024")
+        linked = link_submission_transactions(session, submission.id, "u1", start=start, end=end)
+        session.commit()
+
+        assert linked == sum(1 for row in rows if start <= row["date"] < end)
+        assert {tx.id for tx in session.get(Submission, submission.id).transactions} == {
+            row["id"] for row in rows if start <= row["date"] < end}
+        assert session.query(submission_transactions).count() == linked
+
+        # The submission views read the links back as a count and as pages of IDs
+        assert count_submission_transactions(session, [submission.id, "other"]) == {submission.id: linked}
+        pages = [submission_transaction_ids(session, submission.id, offset=offset, limit=50)
+                 for offset in range(0, linked, 50)]
+        assert [tx_id for page in pages for tx_id in page] == sorted(
+            row["id"] for row in rows if start <= row["date"] < end)
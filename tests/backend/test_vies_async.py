@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from backend.app.services.vat_cache import VatValidationCache
+from backend.app.services.vies_async import AsyncViesClient, TransientViesError, TokenBucket
+
+
+def _client(check_vat, **kwargs):
+    return AsyncViesClient(check_vat=check_vat, cache=VatValidationCache(sql_enabled=False),
+                           backoff=0.001, **kwargs)
+
+
+def test_transient_faults_are_retried_and_cached():
+    """Test that MS_UNAVAILABLE is retried and the eventual answer is cached."""
+    calls = []
+
+    async def check_vat(country_code, number):
+        calls.append(country_code)
+        if len(calls) < 2:
+            raise TransientViesError("MS_UNAVAILABLE")
+        return SimpleNamespace(valid=True, requestDate="2025-01-01", name="Test GmbH", address="Berlin")
+
+    client = _client(check_vat)
+    is_valid, details = asyncio.run(client.validate("DE136695976"))
+    assert is_valid is True and details["company_name"] == "Test GmbH"
+    assert len(calls) == 2
+
+    is_valid, details = asyncio.run(client.validate("DE 136 695 976"))
+    assert details["cached"] is True and len(calls) == 2
+
+
+def test_open_breaker_answers_unverified_without_calling_upstream():
+    """Test that a member state that keeps failing is short-circuited until the reset timeout."""
+    calls = []
+
+    async def check_vat(country_code, number):
+        calls.append(country_code)
+        raise TransientViesError("MS_UNAVAILABLE")
+
+    client = _client(check_vat, retries=0)
+    for _ in range(3):
+        is_valid, details = asyncio.run(client.validate("DE136695976"))
+        assert details["reason"] == "upstream_unavailable"
+
+    is_valid, details = asyncio.run(client.validate("DE136695976"))
+    assert is_valid is False and details["unverified"] is True
+    assert details["reason"] == "circuit_open" and details["retry_after"] > 0
+    assert len(calls) == 3
+    assert client.breaker_states()["DE"]["state"] == "open"
+    # Other member states are unaffected
+    asyncio.run(client.validate("ATU13585627"))
+    assert len(calls) == 4
+
+
+def test_token_bucket_refuses_when_wait_exceeds_timeout():
+    """Test that the bucket hands out its burst and then refuses instead of queueing past the timeout."""
+    async def run():
+        bucket = TokenBucket(rate=1, capacity=2)
+        return [await bucket.acquire(timeout=0.01) for _ in range(3)]
+
+    assert asyncio.run(run()) == [True, True, False]
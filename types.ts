@@ -29,7 +29,9 @@ export interface Submission {
   timestamp: string;
   period: string; // e.g., 'Q3 2024'
   status: 'submitted' | 'processing' | 'error' | 'accepted';
-  transactionIds: string[];
+  // The API returns only the count; IDs are paged via /api/elster/submissions/:id/transactions
+  transactionCount?: number;
+  transactionIds?: string[];
 }
 
 export interface TaxFormData {